@@ -34,6 +34,15 @@ a = Analysis(
         'markdown',
         'google.cloud.bigquery',
         'google.oauth2.service_account',
+        'google.auth.transport.requests',
+        'google.cloud.storage',
+        'sqlite3',
+        'pyarrow',
+        'pyarrow.dataset',
+        'pyarrow.parquet',
+        'pyarrow.compute',
+        'pyarrow.csv',
+        'xlsxwriter',
         'PIL',
         'PIL.Image',
         'PIL.ImageDraw',
@@ -5,6 +5,7 @@ Este é o arquivo principal que será compilado para o executável.
 
 import os
 import sys
+import threading
 from pathlib import Path
 
 # Adiciona o diretório src ao PYTHONPATH
@@ -12,6 +13,7 @@ sys.path.append(str(Path(__file__).parent))
 
 # Importa a aplicação Flask
 from src.importador_controladoria.interface import app
+from src.importador_controladoria.clientes_gcp import aquecer_clientes
 
 def main():
     """Função principal que inicia a aplicação."""
@@ -19,6 +21,9 @@ def main():
     for dir_path in ["data", "data/processados", "data/rejeitados", "logs"]:
         Path(dir_path).mkdir(parents=True, exist_ok=True)
     
+    # Aquece credenciais e clientes do GCP em segundo plano para não atrasar a abertura
+    threading.Thread(target=aquecer_clientes, name="AquecimentoGCP", daemon=True).start()
+    
     # Inicia o servidor Flask
     app.run(debug=False, host='0.0.0.0', port=5000)
 
@@ -1,4 +1,4 @@
-from .interface import main
+from .servidor import main
 
 if __name__ == "__main__":
     main() 
\ No newline at end of file
@@ -0,0 +1,176 @@
+"""
+Agendador dos processamentos em segundo plano.
+
+Em vez de uma thread por arquivo enviado, os processamentos entram em uma
+fila FIFO atendida por um número fixo de workers. A fila tem tamanho máximo:
+quando está cheia, `submeter` levanta FilaCheia e a rota responde 429, em vez
+de aceitar trabalho que o servidor não consegue atender.
+
+Dentro de cada processamento, as etapas pesadas são delimitadas com
+`etapa("cpu")` (leitura do Excel, transformações, arquivos processados) e
+`etapa("rede")` (envio ao BigQuery), cada uma com seu próprio limite de
+execuções simultâneas. Assim um worker pode enviar dados ao BigQuery enquanto
+outro transforma um arquivo, sem que todos disputem a CPU ao mesmo tempo.
+"""
+
+import logging
+import threading
+from collections import deque
+from contextlib import contextmanager
+
+from .config import AGENDADOR_CONFIG
+
+logger = logging.getLogger(__name__)
+
+
+class FilaCheia(Exception):
+    """A fila de processamentos atingiu o tamanho máximo."""
+
+
+class Agendador:
+    """Pool fixo de workers com fila FIFO limitada e limites por etapa."""
+
+    def __init__(self, nome, workers, tamanho_fila, limites_etapas):
+        self.nome = nome
+        self.workers = workers
+        self.tamanho_fila = tamanho_fila
+        self._condicao = threading.Condition()
+        self._fila = deque()
+        self._em_execucao = set()
+        self._threads = []
+        self._etapas = {
+            etapa: threading.BoundedSemaphore(max(1, limite))
+            for etapa, limite in limites_etapas.items()
+        }
+
+    def _iniciar_workers(self):
+        """Cria os workers na primeira submissão (chamado com a condição adquirida)."""
+        if self._threads:
+            return
+        for indice in range(self.workers):
+            thread = threading.Thread(
+                target=self._trabalhar, name=f"{self.nome}-{indice + 1}", daemon=True
+            )
+            thread.start()
+            self._threads.append(thread)
+
+    def _posicoes(self):
+        """Posição atual de cada tarefa da fila (chamado com a condição adquirida)."""
+        return [
+            (ao_mudar_posicao, posicao, len(self._fila))
+            for posicao, (_, _, ao_mudar_posicao) in enumerate(self._fila, start=1)
+            if ao_mudar_posicao
+        ]
+
+    def _notificar(self, posicoes):
+        """Chama os callbacks de posição, fora da condição; um erro em um deles não afeta os demais."""
+        for ao_mudar_posicao, posicao, total in posicoes:
+            try:
+                ao_mudar_posicao(posicao, total)
+            except Exception as e:
+                logger.error(f"[AGENDADOR] {self.nome}: erro ao informar a posição na fila: {str(e)}")
+
+    def submeter(self, tarefa_id, funcao, ao_mudar_posicao=None):
+        """
+        Coloca a tarefa no fim da fila.
+
+        Args:
+            tarefa_id: Identificador da tarefa (ex.: processamento_id)
+            funcao: Função sem argumentos executada por um worker
+            ao_mudar_posicao: Função opcional chamada com (posição, tamanho da
+                fila) sempre que a posição da tarefa muda
+
+        Returns:
+            Posição da tarefa na fila (1 = próxima a ser executada)
+
+        Raises:
+            FilaCheia: Se a fila já tiver `tamanho_fila` tarefas aguardando
+        """
+        with self._condicao:
+            if len(self._fila) >= self.tamanho_fila:
+                raise FilaCheia(
+                    f"Há {len(self._fila)} processamentos aguardando; tente novamente em alguns minutos"
+                )
+            self._iniciar_workers()
+            self._fila.append((tarefa_id, funcao, ao_mudar_posicao))
+            posicoes = self._posicoes()
+            self._condicao.notify()
+            posicao = len(self._fila)
+        self._notificar(posicoes)
+        logger.info(f"[AGENDADOR] {self.nome}: tarefa {tarefa_id} na fila (posição {posicao})")
+        return posicao
+
+    def remover(self, tarefa_id):
+        """
+        Retira da fila uma tarefa que ainda não começou.
+
+        Returns:
+            True se a tarefa estava na fila; False se já começou (ou não existe)
+        """
+        with self._condicao:
+            for item in self._fila:
+                if item[0] == tarefa_id:
+                    self._fila.remove(item)
+                    posicoes = self._posicoes()
+                    break
+            else:
+                return False
+        self._notificar(posicoes)
+        logger.info(f"[AGENDADOR] {self.nome}: tarefa {tarefa_id} retirada da fila")
+        return True
+
+    def posicao(self, tarefa_id):
+        """Posição da tarefa na fila, ou None se ela não estiver aguardando."""
+        with self._condicao:
+            for posicao, (item_id, _, _) in enumerate(self._fila, start=1):
+                if item_id == tarefa_id:
+                    return posicao
+        return None
+
+    def situacao(self):
+        """Ocupação atual do agendador."""
+        with self._condicao:
+            return {
+                "workers": self.workers,
+                "em_execucao": len(self._em_execucao),
+                "na_fila": len(self._fila),
+                "tamanho_fila": self.tamanho_fila
+            }
+
+    @contextmanager
+    def etapa(self, nome):
+        """Delimita uma etapa com limite próprio de execuções simultâneas ("cpu" ou "rede")."""
+        semaforo = self._etapas[nome]
+        semaforo.acquire()
+        try:
+            yield
+        finally:
+            semaforo.release()
+
+    def _trabalhar(self):
+        while True:
+            with self._condicao:
+                while not self._fila:
+                    self._condicao.wait()
+                tarefa_id, funcao, ao_mudar_posicao = self._fila.popleft()
+                self._em_execucao.add(tarefa_id)
+                posicoes = self._posicoes()
+            try:
+                self._notificar(posicoes + ([(ao_mudar_posicao, None, None)] if ao_mudar_posicao else []))
+                funcao()
+            except Exception as e:
+                logger.error(f"[AGENDADOR] {self.nome}: tarefa {tarefa_id} terminou com erro: {str(e)}")
+            finally:
+                with self._condicao:
+                    self._em_execucao.discard(tarefa_id)
+
+
+agendador_importacoes = Agendador(
+    "Importacao",
+    workers=AGENDADOR_CONFIG["workers"],
+    tamanho_fila=AGENDADOR_CONFIG["tamanho_fila"],
+    limites_etapas={
+        "cpu": AGENDADOR_CONFIG["max_etapas_cpu"],
+        "rede": AGENDADOR_CONFIG["max_etapas_rede"]
+    }
+)
@@ -0,0 +1,135 @@
+"""
+Atualização agrupada do catálogo de versões e do resumo do ORCADO.
+
+Cada escrita na tabela ORCADO muda o catálogo (ORCADO_VERSOES) e o resumo
+(ORCADO_RESUMO) das versões afetadas. Recalculá-los logo após cada DML
+custava dois jobs extras por edição de uma célula. Para as edições, o
+`AtualizadorAgregados` apenas marca as versões afetadas; uma thread em segundo
+plano recalcula de uma vez todas as versões marcadas quando passa
+AGREGADOS_CONFIG["intervalo_segundos"] desde a primeira marcação pendente, e
+ao encerrar o processo (atexit) as pendentes são recalculadas.
+
+Importações e deleções marcam com `imediato=True`: os agregados das versões
+que elas tocaram são recalculados antes de a operação retornar, junto com as
+edições pendentes. Só as versões editadas ficam desatualizadas por até o
+intervalo; ao recalcular, o cache de resultados é invalidado para que as
+telas leiam os novos totais. Se o recálculo falhar, as versões continuam
+marcadas e a thread tenta de novo no próximo ciclo.
+"""
+
+import atexit
+import logging
+import threading
+import time
+
+from .cache import invalidar_cache_orcado
+from .config import AGREGADOS_CONFIG
+
+logger = logging.getLogger(__name__)
+
+
+class AtualizadorAgregados:
+    """
+    Acumula as versões afetadas pelas escritas e recalcula os agregados em lote.
+
+    Args:
+        aplicar: Função chamada com a lista de versões a recalcular, ou None
+            para reconstruir os agregados por completo
+        intervalo_segundos: Tempo máximo entre a primeira marcação pendente e o recálculo
+    """
+
+    def __init__(self, aplicar, intervalo_segundos=None):
+        self.aplicar = aplicar
+        self.intervalo_segundos = (
+            AGREGADOS_CONFIG["intervalo_segundos"] if intervalo_segundos is None else intervalo_segundos
+        )
+        self._lock = threading.Lock()
+        self._lock_aplicacao = threading.Lock()
+        self._sinal = threading.Event()
+        self._parar = threading.Event()
+        self._versoes = set()
+        self._reconstruir = False
+        self._primeira_marcacao = None
+        self._thread = None
+
+    def iniciar(self):
+        """Inicia a thread de recálculo e registra o recálculo final no encerramento."""
+        with self._lock:
+            if self._thread is not None:
+                return
+            self._thread = threading.Thread(target=self._executar, name="agregados", daemon=True)
+            self._thread.start()
+        atexit.register(self.encerrar)
+
+    def marcar(self, versoes, imediato=False):
+        """
+        Marca as versões afetadas por uma escrita (None: versões desconhecidas, reconstrói tudo).
+
+        Com `imediato` as versões marcadas são recalculadas antes de retornar,
+        em vez de esperar o intervalo.
+        """
+        with self._lock:
+            if versoes is None:
+                self._reconstruir = True
+            else:
+                self._versoes.update(str(versao) for versao in versoes if versao)
+            if not (self._reconstruir or self._versoes):
+                return
+            if self._primeira_marcacao is None:
+                self._primeira_marcacao = time.monotonic()
+        if self._thread is None:
+            self.iniciar()
+        if imediato or self.intervalo_segundos <= 0:
+            self.descarregar()
+
+    def pendentes(self):
+        """Versões marcadas e ainda não recalculadas (None se uma reconstrução está pendente)."""
+        with self._lock:
+            return None if self._reconstruir else sorted(self._versoes)
+
+    def descarregar(self):
+        """Recalcula agora os agregados das versões marcadas."""
+        with self._lock_aplicacao:
+            with self._lock:
+                reconstruir, versoes = self._reconstruir, sorted(self._versoes)
+                self._reconstruir = False
+                self._versoes = set()
+                self._primeira_marcacao = None
+            if not (reconstruir or versoes):
+                return
+            try:
+                self.aplicar(None if reconstruir else versoes)
+                logger.info(
+                    "Agregados do ORCADO reconstruídos" if reconstruir
+                    else f"Agregados do ORCADO atualizados para: {versoes}"
+                )
+            except Exception as e:
+                # As versões voltam a ficar pendentes para o próximo ciclo
+                logger.error(f"Erro ao atualizar agregados do ORCADO: {str(e)}")
+                with self._lock:
+                    self._reconstruir = self._reconstruir or reconstruir
+                    self._versoes.update(versoes)
+                    if self._primeira_marcacao is None:
+                        self._primeira_marcacao = time.monotonic()
+                return
+            invalidar_cache_orcado("agregados atualizados")
+
+    def _executar(self):
+        while not self._parar.is_set():
+            self._sinal.wait(timeout=1)
+            self._sinal.clear()
+            with self._lock:
+                vencido = (
+                    self._primeira_marcacao is not None
+                    and time.monotonic() - self._primeira_marcacao >= self.intervalo_segundos
+                )
+            if vencido:
+                self.descarregar()
+
+    def encerrar(self):
+        """Para a thread e recalcula as versões pendentes."""
+        self._parar.set()
+        self._sinal.set()
+        if self._thread is not None and self._thread is not threading.current_thread():
+            self._thread.join(timeout=5)
+        self.descarregar()
@@ -0,0 +1,891 @@
+"""
+Armazém de dados da tabela ORCADO.
+
+As rotas e a importação acessam os dados por meio de um `ArmazemOrcado`, que
+tem duas implementações:
+
+- `ArmazemBigQuery`: a tabela ORCADO no BigQuery (padrão);
+- `ArmazemLocal` (armazem_local.py): um arquivo SQLite com o mesmo esquema,
+  para executar a importação e a tela de registros sem credenciais do GCP,
+  em testes e benchmarks.
+
+A implementação é escolhida por ARMAZEM_CONFIG["backend"] (variável de
+ambiente ARMAZEM_BACKEND).
+"""
+
+import logging
+import threading
+
+import pandas as pd
+import pyarrow as pa
+from google.api_core.exceptions import Conflict
+from google.cloud import bigquery
+
+from .config import ARMAZEM_CONFIG, AUDITORIA_CONFIG, BIGQUERY_CONFIG, CONSULTAS_CONFIG, REPLICA_CONFIG
+from .clientes_gcp import obter_cliente_bigquery, provedor_gcp
+from .auditoria import EscritorAuditoria, SPOOL_DIR, criar_evento, desserializar_evento
+from .consultas import executar_consultas_paralelas, buscar_resultado_paralelo, iterar_resultado_em_lotes
+from .custo_consultas import estimar_bytes, preparar_consulta
+from .coordenador_escrita import coordenador_escrita
+from .catalogo_versoes import catalogo_versoes
+from .agregados_orcado import AtualizadorAgregados
+from .resumo_orcado import AGRUPAMENTO_PADRAO, resumo_orcado
+from .filtros import compilar_filtros, possui_filtros
+from .esquema import SCHEMA_ORCADO, SCHEMA_METADATA, garantir_tabela_orcado, garantir_tabela_metadata
+from .cancelamento import ProcessamentoCancelado
+from .carga_bigquery import chave_carga, carregar_em_lotes, descartar_checkpoint
+from .transacao_importacao import (
+    SCHEMA_CHAVES, SCHEMA_EDICAO, montar_script_importacao, parametros_importacao, montar_script_delta,
+    parametros_delta, montar_script_edicao, parametros_edicao, executar_script_importacao
+)
+from .delta_importacao import (
+    COLUNAS_CHAVE, calcular_delta, com_hash, descrever_delta, hash_registro, hashes_lote,
+    ler_cache_hashes, gravar_cache_hashes
+)
+from .edicao_lote import COLUNAS_EDITAVEIS, quadro_edicoes
+from .paginacao import EXPRESSAO_CHAVE_ORDEM, clausulas_keyset
+
+logger = logging.getLogger(__name__)
+
+COLUNAS_REGISTRO = [
+    "N_CONTA", "N_CENTRO_CUSTO", "DESCRICAO", "VALOR", "DATA", "VERSAO",
+    "OPERACAO", "DATA_ATUALIZACAO", "FILIAL", "RATEIO", "ORIGEM"
+]
+
+
+class ArmazemOrcado:
+    """
+    Operações sobre a tabela ORCADO usadas pela aplicação.
+
+    Registros são dicionários com as colunas de COLUNAS_REGISTRO; DATA é um
+    `date` e DATA_ATUALIZACAO um `datetime` em UTC. A chave de um registro é
+    um dicionário com VERSAO, DATA, N_CONTA e N_CENTRO_CUSTO.
+    """
+
+    nome = ""
+
+    def disponivel(self):
+        """Indica se o armazém pode ser usado (ex.: credenciais presentes)."""
+        raise NotImplementedError
+
+    def descricao(self):
+        """Texto que identifica o armazém nos logs e no diagnóstico."""
+        raise NotImplementedError
+
+    def descricao_indisponivel(self):
+        """Mensagem mostrada ao usuário quando `disponivel()` é falso."""
+        return f"Armazém de dados indisponível: {self.descricao()}"
+
+    def preparar(self):
+        """Garante que as tabelas existam antes de uma importação."""
+        raise NotImplementedError
+
+    def importar(self, df, arquivo, usuario, sistema_operacional, versao_sistema, ao_progredir=None,
+                 cancelamento=None):
+        """
+        Importa um lote já transformado e registra a importação nos metadados.
+
+        Quando a versão ainda não existe a importação é completa; caso
+        contrário os registros existentes com a mesma chave são atualizados.
+
+        Args:
+            ao_progredir: Função chamada com (partes concluídas, total de partes)
+            cancelamento: SinalCancelamento verificado entre as partes da carga
+
+        Returns:
+            Dicionário com REGISTROS_EXISTENTES, IMPORTACAO_COMPLETA e LINHAS_MERGE
+
+        Raises:
+            ProcessamentoCancelado: Se cancelado antes de a importação ser aplicada
+        """
+        raise NotImplementedError
+
+    def importar_delta(self, df, arquivo, usuario, sistema_operacional, versao_sistema, ao_progredir=None,
+                       cancelamento=None):
+        """
+        Importa o lote no modo delta: as versões do arquivo passam a ter
+        exatamente as linhas do arquivo, mas só as linhas novas ou alteradas
+        são enviadas, e as ausentes no arquivo são excluídas.
+
+        Returns:
+            Dicionário com INSERIDOS, ATUALIZADOS, INALTERADOS, EXCLUIDOS,
+            REGISTROS_EXISTENTES, IMPORTACAO_COMPLETA e LINHAS_MERGE
+        """
+        df = com_hash(df)
+        versoes = sorted(df['VERSAO'].astype(str).unique().tolist())
+        # Leitura da base, cálculo e aplicação do delta sob a mesma trava, para
+        # que outra escrita na versão não mude a base no meio da importação
+        with coordenador_escrita.escrita(versoes):
+            if cancelamento is not None:
+                cancelamento.verificar()
+            existentes = pd.concat([self.hashes_versao(versao) for versao in versoes], ignore_index=True)
+            df_envio, df_exclusoes, contagens = calcular_delta(df, existentes)
+            logger.info(f"Importação delta de {', '.join(versoes)}: {descrever_delta(contagens)}")
+
+            metadata = {
+                "DATA_IMPORTACAO": pd.Timestamp.now(),
+                "USUARIO": usuario,
+                "SISTEMA_OPERACIONAL": sistema_operacional,
+                "VERSAO_SISTEMA": versao_sistema,
+                "ARQUIVO_ORIGEM": f"IMPORTACAO_DELTA: {arquivo}",
+                "TOTAL_REGISTROS": int(len(df)),
+                "STATUS": "IMPORTACAO_DELTA",
+                "DETALHES": f"Importação delta da versão {', '.join(versoes)}: {descrever_delta(contagens)}"
+            }
+            if df_envio.empty and df_exclusoes.empty:
+                self.registrar_metadados(metadata)
+                linhas_merge = 0
+                if ao_progredir:
+                    ao_progredir(1, 1)
+            else:
+                linhas_merge = self.aplicar_delta(df_envio, df_exclusoes, versoes, metadata, ao_progredir, cancelamento)
+
+            # Após a importação as versões têm exatamente as linhas do arquivo
+            novos_hashes = hashes_lote(df)
+            for versao in versoes:
+                gravar_cache_hashes(
+                    self.nome, versao, self.assinatura_versao(versao),
+                    novos_hashes[novos_hashes['VERSAO'] == versao]
+                )
+
+            return {
+                **contagens,
+                "REGISTROS_EXISTENTES": int(len(existentes)),
+                "IMPORTACAO_COMPLETA": existentes.empty,
+                "LINHAS_MERGE": linhas_merge
+            }
+
+    def hashes_versao(self, versao):
+        """Chaves e HASH_CONTEUDO das linhas da versão, do cache local quando ainda válido."""
+        assinatura = self.assinatura_versao(versao)
+        hashes = ler_cache_hashes(self.nome, versao, assinatura)
+        if hashes is not None:
+            logger.info(f"Hashes da versão {versao} obtidos do cache local ({len(hashes)} linhas)")
+            return hashes
+        hashes = self.consultar_hashes(versao)
+        gravar_cache_hashes(self.nome, versao, assinatura, hashes)
+        return hashes
+
+    def assinatura_versao(self, versao):
+        """Texto que muda sempre que as linhas da versão mudam (total e última atualização)."""
+        raise NotImplementedError
+
+    def consultar_hashes(self, versao):
+        """Chaves normalizadas (ver `delta_importacao.normalizar_chaves`) e HASH_CONTEUDO das linhas da versão."""
+        raise NotImplementedError
+
+    def aplicar_delta(self, df_envio, df_exclusoes, versoes, metadata, ao_progredir=None, cancelamento=None):
+        """
+        Exclui as chaves de `df_exclusoes`, grava as linhas de `df_envio` e
+        registra os metadados em uma única transação.
+
+        Returns:
+            Número de linhas gravadas (inseridas ou atualizadas)
+        """
+        raise NotImplementedError
+
+    def consultar_pagina(self, filtros, cursor, direcao, tamanho, contar_total=True):
+        """
+        Busca uma página da tela de registros (tamanho + 1 linhas, com CHAVE_ORDEM).
+
+        Returns:
+            Tupla (linhas, total de registros com os filtros ou None se não contado)
+        """
+        raise NotImplementedError
+
+    def listar_versoes(self):
+        """Lista as versões com TOTAL_REGISTROS e ULTIMA_ATUALIZACAO, da mais recente para a mais antiga."""
+        raise NotImplementedError
+
+    def selecionar(self, filtros):
+        """Retorna todos os registros que atendem aos filtros, do mais recente para o mais antigo."""
+        raise NotImplementedError
+
+    def selecionar_lotes(self, filtros, linhas_por_lote=None):
+        """
+        Como `selecionar`, mas entrega os registros em tabelas Arrow de até
+        `linhas_por_lote` linhas, para exportações que não cabem em memória.
+        """
+        linhas_por_lote = linhas_por_lote or CONSULTAS_CONFIG["linhas_por_fatia"]
+        registros = self.selecionar(filtros)
+        for inicio in range(0, len(registros), linhas_por_lote):
+            yield pa.Table.from_pylist(registros[inicio:inicio + linhas_por_lote])
+
+    def estimar_exclusao(self, filtros):
+        """
+        Prévia de `excluir`, sem alterar nada.
+
+        Returns:
+            Dicionário com REGISTROS (linhas que seriam excluídas) e
+            BYTES_ESTIMADOS (bytes que a deleção processaria, ou None se o
+            armazém não cobra por leitura)
+
+        Raises:
+            ValueError: Se nenhum filtro for informado
+        """
+        raise NotImplementedError
+
+    def versoes_afetadas(self, filtros):
+        """Versões que têm registros atendendo aos filtros (a do filtro, se informada)."""
+        raise NotImplementedError
+
+    def excluir(self, filtros):
+        """
+        Exclui os registros que atendem aos filtros.
+
+        Returns:
+            Número de registros excluídos
+
+        Raises:
+            ValueError: Se nenhum filtro for informado
+        """
+        raise NotImplementedError
+
+    def excluir_registro(self, chave):
+        """
+        Exclui o registro com a chave informada (as quatro colunas, por igualdade).
+
+        Returns:
+            Número de registros excluídos (0 ou 1)
+        """
+        raise NotImplementedError
+
+    def obter_registro(self, chave):
+        """Retorna o registro com a chave informada ou None."""
+        raise NotImplementedError
+
+    def atualizar_registro(self, chave, valores):
+        """
+        Atualiza as colunas editáveis de um registro.
+
+        Returns:
+            Número de registros atualizados: 1, ou 0 se o registro não existe mais
+        """
+        raise NotImplementedError
+
+    def atualizar_registros(self, edicoes, metadata):
+        """
+        Aplica um lote de edições (ver edicao_lote.ler_edicoes) de uma vez.
+
+        Cada edição só é aplicada se o registro ainda tiver a
+        DATA_ATUALIZACAO lida na tela. As edições aplicadas e um único registro
+        de metadados (com os DETALHES de todas) são gravados na mesma transação.
+
+        Args:
+            metadata: Metadados da operação, sem ARQUIVO_ORIGEM, TOTAL_REGISTROS,
+                STATUS e DETALHES (preenchidos a partir das edições aplicadas)
+
+        Returns:
+            Dicionário com ATUALIZADOS (número de registros) e CONFLITOS
+            (ID_EDICAO das edições não aplicadas)
+        """
+        raise NotImplementedError
+
+    def resumo(self, versao, filial=None, n_conta=None, agrupar=AGRUPAMENTO_PADRAO):
+        """
+        Totais de VALOR por mês de uma versão, agrupados por filial e/ou conta.
+
+        Returns:
+            Lista de dicionários com as colunas do agrupamento (ver
+            resumo_orcado.AGRUPAMENTOS), MES, TOTAL_VALOR e QTD_REGISTROS
+        """
+        raise NotImplementedError
+
+    def estado_replica(self):
+        """Situação da réplica local de leitura (None quando não há réplica)."""
+        return None
+
+    _auditoria = None
+    _lock_auditoria = threading.Lock()
+
+    @property
+    def auditoria(self):
+        """Escritor em lote dos metadados deste armazém (criado no primeiro uso)."""
+        with self._lock_auditoria:
+            if self._auditoria is None:
+                self._auditoria = EscritorAuditoria(self.gravar_metadados, SPOOL_DIR / self.nome)
+                self._auditoria.iniciar()
+            return self._auditoria
+
+    def registrar_metadados(self, metadata):
+        """
+        Registra uma operação na tabela de metadados (auditoria).
+
+        Com AUDITORIA_CONFIG["em_lote"] o evento vai para o spool local e é
+        gravado junto com os próximos; caso contrário é gravado na hora.
+        """
+        if AUDITORIA_CONFIG["em_lote"]:
+            self.auditoria.registrar(metadata)
+        else:
+            evento = criar_evento(metadata)
+            self.gravar_metadados(f"evento_{evento['ID_EVENTO']}", [evento])
+
+    def gravar_metadados(self, id_lote, eventos):
+        """
+        Grava um lote de eventos de auditoria na tabela de metadados.
+
+        Args:
+            id_lote: Identificador estável do lote (o mesmo a cada nova tentativa)
+            eventos: Eventos criados por `auditoria.criar_evento`
+        """
+        raise NotImplementedError
+
+
+class ArmazemBigQuery(ArmazemOrcado):
+    """Tabela ORCADO no BigQuery."""
+
+    nome = "bigquery"
+
+    def __init__(self):
+        self.dataset_id = BIGQUERY_CONFIG.get("dataset_id", "silver")
+        self.table_id = BIGQUERY_CONFIG.get("table_id", "ORCADO")
+        self.metadata_table_id = BIGQUERY_CONFIG.get("metadata_table_id", "ORCADO_METADATA")
+        self.project_id = BIGQUERY_CONFIG.get("project_id")
+        self.tabela = self._referencia(self.table_id)
+        self.tabela_metadata = self._referencia(self.metadata_table_id)
+        self.agregados = AtualizadorAgregados(self._recalcular_agregados)
+
+    def _referencia(self, tabela_id):
+        """Nome qualificado (projeto.dataset.tabela) usado em todas as consultas."""
+        return f"{self.project_id}.{self.dataset_id}.{tabela_id}"
+
+    @property
+    def client(self):
+        return obter_cliente_bigquery()
+
+    def disponivel(self):
+        return provedor_gcp.credenciais_disponiveis()
+
+    def descricao(self):
+        return f"BigQuery {self.tabela}"
+
+    def descricao_indisponivel(self):
+        return "Credenciais do BigQuery não encontradas"
+
+    def preparar(self):
+        client = self.client
+        garantir_tabela_orcado(client, client.dataset(self.dataset_id).table(self.table_id))
+        garantir_tabela_metadata(client, client.dataset(self.dataset_id).table(self.metadata_table_id))
+
+    def _recalcular_agregados(self, versoes):
+        """Recalcula o catálogo de versões e o resumo (None reconstrói ambos)."""
+        client = self.client
+        catalogo_versoes.atualizar_ou_reconstruir(client, versoes)
+        resumo_orcado.atualizar_ou_reconstruir(client, versoes)
+
+    def _atualizar_agregados(self, versoes):
+        """Recalcula agora o catálogo e o resumo das versões importadas ou excluídas."""
+        self.agregados.marcar(versoes, imediato=True)
+
+    def _marcar_agregados(self, versoes):
+        """Marca as versões editadas; o catálogo e o resumo delas são recalculados em lote."""
+        self.agregados.marcar(versoes)
+
+    def importar(self, df, arquivo, usuario, sistema_operacional, versao_sistema, ao_progredir=None,
+                 cancelamento=None):
+        client = self.client
+        self.preparar()
+        versao = df['VERSAO'].iloc[0]
+        df = com_hash(df)
+
+        # Importações da mesma versão são serializadas; versões diferentes seguem em paralelo
+        with coordenador_escrita.escrita([versao]):
+            # Tabela de staging com nome derivado do conteúdo, para permitir retomar a carga
+            chave = chave_carga(df, self.tabela)
+            temp_table_id = f"temp_{self.table_id}_{chave[:16]}"
+            temp_table_ref = client.dataset(self.dataset_id).table(temp_table_id)
+            importacao_concluida = False
+            cancelada = False
+
+            try:
+                logger.info(f"Iniciando carregamento dos dados na tabela temporária {temp_table_id}")
+                carregar_em_lotes(
+                    client, df, temp_table_ref, SCHEMA_ORCADO, chave,
+                    ao_progredir=ao_progredir, cancelamento=cancelamento
+                )
+                logger.info("Dados carregados com sucesso na tabela temporária")
+                if cancelamento is not None:
+                    cancelamento.verificar()
+
+                # Contagem, deleção, MERGE e metadados em uma única transação
+                script = montar_script_importacao(
+                    self.tabela, self._referencia(temp_table_id), self.tabela_metadata
+                )
+                parametros = parametros_importacao(
+                    df,
+                    versao=versao,
+                    arquivo=arquivo,
+                    usuario=usuario,
+                    sistema_operacional=sistema_operacional,
+                    versao_sistema=versao_sistema
+                )
+                logger.info("Executando script transacional da importação")
+                resumo, script_job = executar_script_importacao(client, script, parametros, cancelamento)
+                importacao_concluida = True
+                logger.info(f"Script da importação processou {script_job.total_bytes_processed or 0} bytes")
+            except ProcessamentoCancelado:
+                cancelada = True
+                raise
+            finally:
+                # Após o sucesso ou o cancelamento remove a staging e o checkpoint; em caso de erro eles são
+                # mantidos para que a próxima importação do mesmo arquivo retome a carga (a staging expira sozinha)
+                if importacao_concluida or cancelada:
+                    try:
+                        client.delete_table(temp_table_ref, not_found_ok=True)
+                        descartar_checkpoint(chave)
+                        logger.info(f"Tabela temporária {temp_table_id} removida com sucesso")
+                    except Exception as e:
+                        logger.error(f"Erro ao remover tabela temporária {temp_table_id}: {str(e)}")
+                else:
+                    logger.info(f"Tabela temporária {temp_table_id} mantida para retomada da carga")
+
+            self._atualizar_agregados([versao])
+            return resumo
+
+    def assinatura_versao(self, versao):
+        query = f"""
+            SELECT COUNT(*) AS TOTAL, MAX(DATA_ATUALIZACAO) AS ULTIMA_ATUALIZACAO
+            FROM `{self.tabela}`
+            WHERE VERSAO = @versao
+        """
+        job_config = bigquery.QueryJobConfig(
+            query_parameters=[bigquery.ScalarQueryParameter("versao", "STRING", versao)]
+        )
+        linha = next(iter(self.client.query(query, job_config=job_config).result()))
+        ultima = linha.ULTIMA_ATUALIZACAO.isoformat() if linha.ULTIMA_ATUALIZACAO else ""
+        return f"{linha.TOTAL}|{ultima}"
+
+    def consultar_hashes(self, versao):
+        query = f"""
+            SELECT
+                N_CONTA,
+                N_CENTRO_CUSTO,
+                FORMAT_DATE('%Y-%m-%d', DATA) AS DATA,
+                VERSAO,
+                ROW_HASH AS HASH_CONTEUDO
+            FROM `{self.tabela}`
+            WHERE VERSAO = @versao
+        """
+        job_config = bigquery.QueryJobConfig(
+            query_parameters=[bigquery.ScalarQueryParameter("versao", "STRING", versao)]
+        )
+        hashes = self.client.query(query, job_config=job_config).to_dataframe()
+        logger.info(f"Hashes da versão {versao} consultados no BigQuery ({len(hashes)} linhas)")
+        return hashes[COLUNAS_CHAVE + ["HASH_CONTEUDO"]] if not hashes.empty else pd.DataFrame(
+            columns=COLUNAS_CHAVE + ["HASH_CONTEUDO"]
+        )
+
+    def _carregar_staging(self, df, sufixo, schema, ao_progredir=None, cancelamento=None):
+        """Carrega o DataFrame em uma staging de nome derivado do conteúdo; retorna (referência, nome, chave)."""
+        client = self.client
+        chave = chave_carga(df, f"{self.tabela}#{sufixo}")
+        staging_id = f"temp_{self.table_id}_{sufixo}_{chave[:16]}"
+        staging_ref = client.dataset(self.dataset_id).table(staging_id)
+        carregar_em_lotes(client, df, staging_ref, schema, chave, ao_progredir=ao_progredir, cancelamento=cancelamento)
+        return staging_ref, staging_id, chave
+
+    def _remover_staging(self, staging_ref, staging_id, chave):
+        try:
+            self.client.delete_table(staging_ref, not_found_ok=True)
+            descartar_checkpoint(chave)
+            logger.info(f"Tabela temporária {staging_id} removida com sucesso")
+        except Exception as e:
+            logger.error(f"Erro ao remover tabela temporária {staging_id}: {str(e)}")
+
+    def aplicar_delta(self, df_envio, df_exclusoes, versoes, metadata, ao_progredir=None, cancelamento=None):
+        client = self.client
+        self.preparar()
+        with coordenador_escrita.escrita(versoes):
+            stagings = []
+            concluido = False
+            cancelado = False
+            try:
+                if not df_exclusoes.empty:
+                    stagings.append(("exclusoes",) + self._carregar_staging(
+                        df_exclusoes, "exclusoes", SCHEMA_CHAVES, cancelamento=cancelamento
+                    ))
+                if not df_envio.empty:
+                    stagings.append(("envio",) + self._carregar_staging(
+                        df_envio, "delta", SCHEMA_ORCADO, ao_progredir, cancelamento
+                    ))
+                if cancelamento is not None:
+                    cancelamento.verificar()
+                nomes = {tipo: self._referencia(staging_id) for tipo, _, staging_id, _ in stagings}
+
+                script = montar_script_delta(
+                    self.tabela, nomes.get("envio"), nomes.get("exclusoes"), self.tabela_metadata
+                )
+                parametros = parametros_delta(versoes, df_envio, df_exclusoes, metadata)
+                logger.info("Executando script transacional da importação delta")
+                resumo, script_job = executar_script_importacao(client, script, parametros, cancelamento)
+                concluido = True
+                logger.info(
+                    f"Script da importação delta processou {script_job.total_bytes_processed or 0} bytes: "
+                    f"{resumo.get('LINHAS_MERGE')} linhas no MERGE, {resumo.get('LINHAS_EXCLUIDAS')} excluídas"
+                )
+            except ProcessamentoCancelado:
+                cancelado = True
+                raise
+            finally:
+                if concluido or cancelado:
+                    for _, staging_ref, staging_id, chave in stagings:
+                        self._remover_staging(staging_ref, staging_id, chave)
+
+            self._atualizar_agregados(versoes)
+            return int(resumo.get("LINHAS_MERGE") or 0)
+
+    def consultar_pagina(self, filtros, cursor, direcao, tamanho, contar_total=True):
+        clausula_where, parametros_filtro = compilar_filtros(filtros)
+        query = f"""
+            SELECT
+                {', '.join(COLUNAS_REGISTRO)},
+                {EXPRESSAO_CHAVE_ORDEM} AS CHAVE_ORDEM
+            FROM `{self.tabela}`
+            {clausula_where}
+        """
+        count_query = f"""
+            SELECT COUNT(*) as total
+            FROM `{self.tabela}`
+            {clausula_where}
+        """
+
+        # Aplica o cursor, a ordenação e o limite (uma linha a mais indica se há outra página)
+        predicado_cursor, ordenacao, parametros_cursor = clausulas_keyset(cursor, direcao)
+        query += predicado_cursor + ordenacao + f" LIMIT {tamanho + 1}"
+
+        # Submete as consultas de uma vez e aguarda todas
+        consultas = {
+            "registros": (query, bigquery.QueryJobConfig(query_parameters=parametros_filtro + parametros_cursor))
+        }
+        if contar_total:
+            consultas["total"] = (count_query, bigquery.QueryJobConfig(query_parameters=parametros_filtro))
+        resultados = executar_consultas_paralelas(self.client, consultas, "registros_consultas")
+
+        total = resultados["total"][0].total if contar_total else None
+        return [dict(row) for row in resultados["registros"]], total
+
+    def listar_versoes(self):
+        return catalogo_versoes.listar(self.client)
+
+    def resumo(self, versao, filial=None, n_conta=None, agrupar=AGRUPAMENTO_PADRAO):
+        return resumo_orcado.consultar(self.client, versao, filial, n_conta, agrupar)
+
+    def selecionar(self, filtros):
+        client = self.client
+        clausula_where, parametros_filtro = compilar_filtros(filtros)
+        query = f"""
+            SELECT
+                {', '.join(COLUNAS_REGISTRO)}
+            FROM `{self.tabela}`
+            {clausula_where}
+            ORDER BY DATA_ATUALIZACAO DESC
+        """
+        # Executa a query e baixa o resultado em fatias paralelas
+        query_job = client.query(query, job_config=bigquery.QueryJobConfig(query_parameters=parametros_filtro))
+        return buscar_resultado_paralelo(client, query_job, "exportar_excel_consulta")
+
+    def selecionar_lotes(self, filtros, linhas_por_lote=None):
+        client = self.client
+        clausula_where, parametros_filtro = compilar_filtros(filtros)
+        query = f"""
+            SELECT
+                {', '.join(COLUNAS_REGISTRO)}
+            FROM `{self.tabela}`
+            {clausula_where}
+            ORDER BY DATA_ATUALIZACAO DESC
+        """
+        _, job_config = preparar_consulta(client, "exportacao", query, parametros_filtro)
+        query_job = client.query(query, job_config=job_config)
+        return iterar_resultado_em_lotes(client, query_job, "exportar_excel_lotes", linhas_por_lote)
+
+    def estimar_exclusao(self, filtros):
+        if not possui_filtros(filtros):
+            raise ValueError("É necessário informar pelo menos um filtro para excluir registros")
+        client = self.client
+        clausula_where, parametros_filtro = compilar_filtros(filtros)
+        bytes_estimados = estimar_bytes(client, f"DELETE FROM `{self.tabela}` {clausula_where}", parametros_filtro)
+        count_query = f"SELECT COUNT(*) AS total FROM `{self.tabela}` {clausula_where}"
+        linha = next(iter(client.query(
+            count_query, job_config=bigquery.QueryJobConfig(query_parameters=parametros_filtro)
+        ).result()))
+        return {"REGISTROS": linha.total, "BYTES_ESTIMADOS": bytes_estimados}
+
+    def excluir(self, filtros):
+        if not possui_filtros(filtros):
+            raise ValueError("É necessário informar pelo menos um filtro para excluir registros")
+        client = self.client
+        clausula_where, parametros_filtro = compilar_filtros(filtros)
+        delete_query = f"""
+        DELETE FROM `{self.tabela}`
+        {clausula_where}
+        """
+        logger.info(f"Executando query de deleção: {delete_query}")
+
+        # Dry-run antes de executar: recusa a deleção acima do limite de custo.
+        # O total de linhas afetadas vem do próprio job, dispensando uma contagem anterior
+        _, job_config = preparar_consulta(client, "exclusao", delete_query, parametros_filtro)
+
+        # Sem versão no filtro a deleção pode tocar qualquer versão: trava a tabela inteira
+        # e consulta quais versões serão afetadas, para recalcular só os agregados delas
+        versao = filtros.get('versao')
+        with coordenador_escrita.escrita([versao] if versao else None):
+            versoes = self.versoes_afetadas(filtros)
+            delete_job = client.query(delete_query, job_config=job_config)
+            delete_job.result()
+            logger.info(
+                f"Deleção removeu {delete_job.num_dml_affected_rows or 0} registros "
+                f"({delete_job.total_bytes_processed or 0} bytes processados)"
+            )
+            self._atualizar_agregados(versoes)
+        return delete_job.num_dml_affected_rows or 0
+
+    def versoes_afetadas(self, filtros):
+        versao = filtros.get('versao')
+        if versao:
+            return [versao]
+        clausula_where, parametros_filtro = compilar_filtros(filtros)
+        query = f"SELECT DISTINCT VERSAO FROM `{self.tabela}` {clausula_where}"
+        job_config = bigquery.QueryJobConfig(query_parameters=parametros_filtro)
+        return sorted(row.VERSAO for row in self.client.query(query, job_config=job_config).result())
+
+    @staticmethod
+    def _parametros_chave(chave):
+        """Chave original do registro, filtrada pelas colunas de partição e cluster."""
+        return [
+            bigquery.ScalarQueryParameter("versao_original", "STRING", chave["VERSAO"]),
+            bigquery.ScalarQueryParameter("data_original", "DATE", chave["DATA"]),
+            bigquery.ScalarQueryParameter("n_conta_original", "STRING", chave["N_CONTA"]),
+            bigquery.ScalarQueryParameter("n_centro_custo_original", "STRING", chave["N_CENTRO_CUSTO"])
+        ]
+
+    _CLAUSULA_CHAVE = """
+            VERSAO = @versao_original
+            AND DATA = @data_original
+            AND N_CONTA = @n_conta_original
+            AND N_CENTRO_CUSTO = @n_centro_custo_original
+    """
+
+    def obter_registro(self, chave):
+        query = f"""
+        SELECT {', '.join(COLUNAS_REGISTRO)}
+        FROM `{self.tabela}`
+        WHERE {self._CLAUSULA_CHAVE}
+        """
+        job_config = bigquery.QueryJobConfig(query_parameters=self._parametros_chave(chave))
+        linha = next(iter(self.client.query(query, job_config=job_config).result()), None)
+        return dict(linha) if linha is not None else None
+
+    def excluir_registro(self, chave):
+        client = self.client
+        delete_query = f"""
+        DELETE FROM `{self.tabela}`
+        WHERE {self._CLAUSULA_CHAVE}
+        """
+        job_config = bigquery.QueryJobConfig(query_parameters=self._parametros_chave(chave))
+        with coordenador_escrita.escrita([chave["VERSAO"]]):
+            delete_job = client.query(delete_query, job_config=job_config)
+            delete_job.result()
+            self._atualizar_agregados([chave["VERSAO"]])
+        return delete_job.num_dml_affected_rows or 0
+
+    def atualizar_registro(self, chave, valores):
+        # Edições da mesma versão que chegam enquanto ela está ocupada vão em uma única DML
+        return coordenador_escrita.agrupar(
+            ("atualizar_registro", chave["VERSAO"]), [chave["VERSAO"]], (chave, valores), self._atualizar_lote
+        )
+
+    _ATRIBUICOES_EDICAO = ",\n                ".join(
+        [f"{coluna} = E.{coluna}" for coluna in COLUNAS_EDITAVEIS] + ["ROW_HASH = E.ROW_HASH"]
+    )
+
+    def _atualizar_lote(self, itens):
+        """
+        Aplica edições de registros de uma mesma versão (chamado pelo coordenador).
+
+        Uma edição sozinha usa o UPDATE pela chave; várias usam um script com
+        um único UPDATE, as edições em um parâmetro de array, que retorna as
+        chaves encontradas. Edições repetidas da mesma chave ficam com a última,
+        como se tivessem sido aplicadas em sequência.
+
+        Returns:
+            Um resultado por item: 1 se o registro foi atualizado, 0 se não existe mais
+        """
+        client = self.client
+        versao = itens[0][0]["VERSAO"]
+        if len(itens) == 1:
+            chave, valores = itens[0]
+            atribuicoes = ",\n                ".join(f"{coluna} = @{coluna.lower()}" for coluna in COLUNAS_EDITAVEIS)
+            query = f"""
+            UPDATE `{self.tabela}`
+            SET
+                {atribuicoes},
+                ROW_HASH = @row_hash,
+                DATA_ATUALIZACAO = CURRENT_TIMESTAMP()
+            WHERE {self._CLAUSULA_CHAVE}
+            """
+            parametros = self._parametros_chave(chave) + [
+                bigquery.ScalarQueryParameter(
+                    coluna.lower(), "FLOAT64" if coluna == "VALOR" else "STRING", valores.get(coluna)
+                )
+                for coluna in COLUNAS_EDITAVEIS
+            ] + [bigquery.ScalarQueryParameter("row_hash", "STRING", hash_registro(valores))]
+        else:
+            ultimas = {}
+            for chave, valores in itens:
+                ultimas[(chave["DATA"], chave["N_CONTA"], chave["N_CENTRO_CUSTO"])] = (chave, valores)
+            edicoes = [
+                bigquery.StructQueryParameter(
+                    None,
+                    bigquery.ScalarQueryParameter("DATA", "DATE", chave["DATA"]),
+                    bigquery.ScalarQueryParameter("N_CONTA_ORIGINAL", "STRING", chave["N_CONTA"]),
+                    bigquery.ScalarQueryParameter("N_CENTRO_CUSTO_ORIGINAL", "STRING", chave["N_CENTRO_CUSTO"]),
+                    *[
+                        bigquery.ScalarQueryParameter(
+                            coluna, "FLOAT64" if coluna == "VALOR" else "STRING", valores.get(coluna)
+                        )
+                        for coluna in COLUNAS_EDITAVEIS
+                    ],
+                    bigquery.ScalarQueryParameter("ROW_HASH", "STRING", hash_registro(valores))
+                )
+                for chave, valores in ultimas.values()
+            ]
+            datas = [chave["DATA"] for chave, _ in ultimas.values()]
+            # As chaves encontradas antes do UPDATE indicam o resultado de cada edição
+            query = f"""
+            BEGIN TRANSACTION;
+            CREATE TEMP TABLE encontradas AS
+            SELECT E.DATA, E.N_CONTA_ORIGINAL, E.N_CENTRO_CUSTO_ORIGINAL
+            FROM UNNEST(@edicoes) E
+            JOIN (
+                SELECT DATA, N_CONTA, N_CENTRO_CUSTO
+                FROM `{self.tabela}`
+                WHERE VERSAO = @versao AND DATA BETWEEN @data_min AND @data_max
+            ) T
+            ON T.DATA = E.DATA
+                AND T.N_CONTA = E.N_CONTA_ORIGINAL
+                AND T.N_CENTRO_CUSTO = E.N_CENTRO_CUSTO_ORIGINAL;
+            UPDATE `{self.tabela}` T
+            SET
+                {self._ATRIBUICOES_EDICAO},
+                DATA_ATUALIZACAO = CURRENT_TIMESTAMP()
+            FROM UNNEST(@edicoes) E
+            WHERE T.VERSAO = @versao
+                AND T.DATA BETWEEN @data_min AND @data_max
+                AND T.DATA = E.DATA
+                AND T.N_CONTA = E.N_CONTA_ORIGINAL
+                AND T.N_CENTRO_CUSTO = E.N_CENTRO_CUSTO_ORIGINAL;
+            COMMIT TRANSACTION;
+            SELECT DATA, N_CONTA_ORIGINAL, N_CENTRO_CUSTO_ORIGINAL FROM encontradas;
+            """
+            parametros = [
+                bigquery.ArrayQueryParameter("edicoes", "STRUCT", edicoes),
+                bigquery.ScalarQueryParameter("versao", "STRING", versao),
+                bigquery.ScalarQueryParameter("data_min", "DATE", min(datas)),
+                bigquery.ScalarQueryParameter("data_max", "DATE", max(datas))
+            ]
+        query_job = client.query(query, job_config=bigquery.QueryJobConfig(query_parameters=parametros))
+        linhas = query_job.result()
+        self._marcar_agregados([versao])
+        if len(itens) == 1:
+            return [query_job.num_dml_affected_rows or 0]
+        encontradas = {(linha.DATA, linha.N_CONTA_ORIGINAL, linha.N_CENTRO_CUSTO_ORIGINAL) for linha in linhas}
+        return [
+            1 if (chave["DATA"], chave["N_CONTA"], chave["N_CENTRO_CUSTO"]) in encontradas else 0
+            for chave, _ in itens
+        ]
+
+    def atualizar_registros(self, edicoes, metadata):
+        client = self.client
+        df_edicoes = quadro_edicoes(edicoes)
+        with coordenador_escrita.escrita(df_edicoes['VERSAO'].unique().tolist()):
+            staging_ref, staging_id, chave = self._carregar_staging(df_edicoes, "edicao", SCHEMA_EDICAO)
+            concluido = False
+            try:
+                script = montar_script_edicao(self.tabela, self._referencia(staging_id), self.tabela_metadata)
+                logger.info(f"Executando script da edição em lote ({len(edicoes)} edições)")
+                resumo, script_job = executar_script_importacao(client, script, parametros_edicao(df_edicoes, metadata))
+                concluido = True
+                logger.info(
+                    f"Edição em lote processou {script_job.total_bytes_processed or 0} bytes: "
+                    f"{resumo.get('LINHAS_ATUALIZADAS')} registros atualizados, {len(resumo.get('CONFLITOS') or [])} conflitos"
+                )
+            finally:
+                if concluido:
+                    self._remover_staging(staging_ref, staging_id, chave)
+
+            self._marcar_agregados(sorted(df_edicoes['VERSAO'].unique().tolist()))
+        return {
+            "ATUALIZADOS": int(resumo.get("LINHAS_ATUALIZADAS") or 0),
+            "CONFLITOS": list(resumo.get("CONFLITOS") or [])
+        }
+
+    def gravar_metadados(self, id_lote, eventos):
+        client = self.client
+        metadata_table_ref = client.dataset(self.dataset_id).table(self.metadata_table_id)
+
+        if AUDITORIA_CONFIG["metodo"] == "streaming":
+            linhas = [{campo.name: evento[campo.name] for campo in SCHEMA_METADATA} for evento in eventos]
+            # row_ids permite ao BigQuery descartar linhas repetidas em um reenvio
+            erros = client.insert_rows_json(
+                metadata_table_ref, linhas, row_ids=[evento["ID_EVENTO"] for evento in eventos]
+            )
+            if erros:
+                raise RuntimeError(f"Erro ao inserir metadados: {erros}")
+            return
+
+        registros = [desserializar_evento(evento) for evento in eventos]
+        df_metadata = pd.DataFrame({
+            campo.name: [registro[campo.name] for registro in registros] for campo in SCHEMA_METADATA
+        })
+        metadata_job_config = bigquery.LoadJobConfig(
+            write_disposition=bigquery.WriteDisposition.WRITE_APPEND,
+            schema=SCHEMA_METADATA
+        )
+        # O ID do job vem do lote: um reenvio do mesmo lote não duplica as linhas
+        job_id = f"auditoria_{id_lote}"
+        logger.info(f"Gravando {len(eventos)} eventos na tabela {self.metadata_table_id}")
+        try:
+            job = client.load_table_from_dataframe(
+                df_metadata, metadata_table_ref, job_config=metadata_job_config, job_id=job_id
+            )
+        except Conflict:
+            job = client.get_job(job_id)
+        job.result()
+
+
+_armazem = None
+_lock_armazem = threading.Lock()
+
+
+def criar_armazem(backend=None):
+    """Cria o armazém do backend informado (ou o configurado)."""
+    backend = (backend or ARMAZEM_CONFIG["backend"]).lower()
+    if backend == "local":
+        from .armazem_local import ArmazemLocal
+        armazem = ArmazemLocal(ARMAZEM_CONFIG["caminho_local"])
+    elif backend == "bigquery":
+        armazem = ArmazemBigQuery()
+    else:
+        raise ValueError(f"Backend de armazém desconhecido: {backend}")
+
+    if REPLICA_CONFIG["ativa"]:
+        from .replica_local import ArmazemReplicado
+        armazem = ArmazemReplicado(armazem, REPLICA_CONFIG["diretorio"])
+    return armazem
+
+
+def obter_armazem():
+    """Retorna o armazém compartilhado pelo processo."""
+    global _armazem
+    with _lock_armazem:
+        if _armazem is None:
+            _armazem = criar_armazem()
+            logger.info(f"Armazém de dados: {_armazem.descricao()}")
+        return _armazem
+
+
+def definir_armazem(armazem):
+    """Substitui o armazém compartilhado (usado por testes e benchmarks)."""
+    global _armazem
+    with _lock_armazem:
+        _armazem = armazem
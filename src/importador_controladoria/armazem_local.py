@@ -0,0 +1,491 @@
+"""
+Armazém local (SQLite) com o mesmo esquema e semântica da tabela ORCADO.
+
+Permite executar a importação e a tela de registros sem credenciais do GCP,
+em testes e benchmarks. Usa apenas a biblioteca padrão: a importação é uma
+transação com contagem, deleção e UPSERT (equivalente ao MERGE pela chave
+N_CONTA, N_CENTRO_CUSTO, DATA, VERSAO), e os filtros e a paginação reutilizam
+as mesmas expressões SQL do BigQuery.
+"""
+
+import logging
+import sqlite3
+import threading
+from contextlib import contextmanager
+from datetime import date, datetime, timezone
+from pathlib import Path
+
+import pandas as pd
+import pyarrow as pa
+
+from .armazem import ArmazemOrcado, COLUNAS_REGISTRO, COLUNAS_EDITAVEIS
+from .auditoria import desserializar_evento
+from .config import CARGA_CONFIG, CONSULTAS_CONFIG
+from .delta_importacao import COLUNAS_CHAVE, com_hash, hash_registro, normalizar_chaves
+from .esquema import SCHEMA_METADATA
+from .filtros import predicados_filtros, montar_where, possui_filtros
+from .paginacao import predicado_keyset
+from .resumo_orcado import AGRUPAMENTO_PADRAO, AGRUPAMENTOS, normalizar_agrupamento
+
+logger = logging.getLogger(__name__)
+
+EXPRESSAO_CHAVE_ORDEM_LOCAL = "VERSAO || '|' || N_CONTA || '|' || N_CENTRO_CUSTO || '|' || DATA"
+
+_FORMATO_TIMESTAMP = "%Y-%m-%d %H:%M:%S.%f"
+
+_DDL = """
+CREATE TABLE IF NOT EXISTS ORCADO (
+    N_CONTA TEXT NOT NULL,
+    N_CENTRO_CUSTO TEXT NOT NULL,
+    DESCRICAO TEXT NOT NULL,
+    VALOR REAL NOT NULL,
+    DATA TEXT NOT NULL,
+    VERSAO TEXT NOT NULL,
+    OPERACAO TEXT,
+    DATA_ATUALIZACAO TEXT NOT NULL,
+    FILIAL TEXT NOT NULL,
+    RATEIO TEXT,
+    ORIGEM TEXT,
+    ROW_HASH TEXT,
+    PRIMARY KEY (N_CONTA, N_CENTRO_CUSTO, DATA, VERSAO)
+);
+CREATE INDEX IF NOT EXISTS IX_ORCADO_CLUSTER ON ORCADO (VERSAO, FILIAL, N_CONTA);
+CREATE INDEX IF NOT EXISTS IX_ORCADO_DATA ON ORCADO (DATA);
+CREATE INDEX IF NOT EXISTS IX_ORCADO_ATUALIZACAO ON ORCADO (DATA_ATUALIZACAO);
+CREATE TABLE IF NOT EXISTS ORCADO_METADATA (
+    DATA_IMPORTACAO TEXT NOT NULL,
+    USUARIO TEXT NOT NULL,
+    SISTEMA_OPERACIONAL TEXT NOT NULL,
+    VERSAO_SISTEMA TEXT NOT NULL,
+    ARQUIVO_ORIGEM TEXT NOT NULL,
+    TOTAL_REGISTROS INTEGER NOT NULL,
+    STATUS TEXT NOT NULL,
+    DETALHES TEXT NOT NULL
+);
+"""
+
+
+def _texto_timestamp(valor):
+    """Converte um datetime (com ou sem fuso; sem fuso é tratado como UTC) para texto ordenável."""
+    if valor.tzinfo is not None:
+        valor = valor.astimezone(timezone.utc).replace(tzinfo=None)
+    return valor.strftime(_FORMATO_TIMESTAMP)
+
+
+def _agora():
+    return _texto_timestamp(datetime.now(timezone.utc))
+
+
+def _valor_parametro(valor):
+    if isinstance(valor, datetime):
+        return _texto_timestamp(valor)
+    if isinstance(valor, date):
+        return valor.isoformat()
+    return valor
+
+
+def _concat(*partes):
+    if any(parte is None for parte in partes):
+        return None
+    return "".join(str(parte) for parte in partes)
+
+
+def _registro(linha):
+    """Converte uma linha do SQLite nos tipos retornados pelo BigQuery."""
+    registro = dict(linha)
+    if registro.get("DATA") is not None:
+        registro["DATA"] = date.fromisoformat(registro["DATA"])
+    if registro.get("DATA_ATUALIZACAO") is not None:
+        registro["DATA_ATUALIZACAO"] = datetime.strptime(
+            registro["DATA_ATUALIZACAO"], _FORMATO_TIMESTAMP
+        ).replace(tzinfo=timezone.utc)
+    return registro
+
+
+class ArmazemLocal(ArmazemOrcado):
+    """Tabela ORCADO em um arquivo SQLite."""
+
+    nome = "local"
+
+    def __init__(self, caminho):
+        self.caminho = Path(caminho)
+        self._lock_escrita = threading.Lock()
+        self._preparado = False
+
+    @contextmanager
+    def _conexao(self):
+        conexao = sqlite3.connect(self.caminho, timeout=30)
+        conexao.row_factory = sqlite3.Row
+        conexao.create_function("CONCAT", -1, _concat, deterministic=True)
+        conexao.execute("PRAGMA case_sensitive_like = ON")
+        try:
+            yield conexao
+        finally:
+            conexao.close()
+
+    def disponivel(self):
+        return True
+
+    def descricao(self):
+        return f"SQLite {self.caminho}"
+
+    def preparar(self):
+        if self._preparado:
+            return
+        self.caminho.parent.mkdir(parents=True, exist_ok=True)
+        with self._conexao() as conexao:
+            conexao.execute("PRAGMA journal_mode = WAL")
+            conexao.executescript(_DDL)
+            colunas = {linha["name"] for linha in conexao.execute("PRAGMA table_info(ORCADO)")}
+            if "ROW_HASH" not in colunas:
+                conexao.execute("ALTER TABLE ORCADO ADD COLUMN ROW_HASH TEXT")
+        self._preparado = True
+
+    @staticmethod
+    def _gravar_linhas(conexao, df, ao_progredir=None, cancelamento=None):
+        """UPSERT das linhas em partes de CARGA_CONFIG["linhas_por_lote"]; retorna as linhas gravadas."""
+        linhas_por_lote = max(1, CARGA_CONFIG["linhas_por_lote"])
+        total_lotes = max(1, -(-len(df) // linhas_por_lote))
+        agora = _agora()
+
+        colunas = [c for c in COLUNAS_REGISTRO if c != "DATA_ATUALIZACAO"] + ["ROW_HASH"]
+        dados = com_hash(df)[colunas].copy()
+        dados["DATA"] = pd.to_datetime(dados["DATA"]).dt.strftime("%Y-%m-%d")
+        dados["VALOR"] = dados["VALOR"].astype(float)
+        atualizacoes = ", ".join(f"{c} = excluded.{c}" for c in colunas if c not in ("N_CONTA", "N_CENTRO_CUSTO", "DATA", "VERSAO"))
+        upsert = f"""
+            INSERT INTO ORCADO ({', '.join(colunas)}, DATA_ATUALIZACAO)
+            VALUES ({', '.join('?' for _ in colunas)}, ?)
+            ON CONFLICT (N_CONTA, N_CENTRO_CUSTO, DATA, VERSAO) DO UPDATE SET
+                {atualizacoes},
+                DATA_ATUALIZACAO = excluded.DATA_ATUALIZACAO
+            WHERE ORCADO.ROW_HASH IS NOT excluded.ROW_HASH
+        """
+
+        linhas_merge = 0
+        for indice in range(total_lotes):
+            # Cancelado, a transação é desfeita pelo chamador
+            if cancelamento is not None:
+                cancelamento.verificar()
+            lote = dados.iloc[indice * linhas_por_lote:(indice + 1) * linhas_por_lote]
+            cursor = conexao.executemany(
+                upsert, (tuple(linha) + (agora,) for linha in lote.itertuples(index=False, name=None))
+            )
+            linhas_merge += cursor.rowcount
+            if ao_progredir:
+                ao_progredir(indice + 1, total_lotes)
+        return linhas_merge
+
+    def importar(self, df, arquivo, usuario, sistema_operacional, versao_sistema, ao_progredir=None,
+                 cancelamento=None):
+        self.preparar()
+        versao = str(df['VERSAO'].iloc[0])
+
+        with self._lock_escrita, self._conexao() as conexao:
+            try:
+                conexao.execute("BEGIN IMMEDIATE")
+                existentes = conexao.execute(
+                    "SELECT COUNT(*) FROM ORCADO WHERE VERSAO = ?", (versao,)
+                ).fetchone()[0]
+                completa = existentes == 0
+                if completa:
+                    conexao.execute("DELETE FROM ORCADO WHERE VERSAO = ?", (versao,))
+
+                linhas_merge = self._gravar_linhas(conexao, df, ao_progredir, cancelamento)
+
+                tipo = "IMPORTACAO_COMPLETA" if completa else "ATUALIZACAO_PARCIAL"
+                self._inserir_metadados(conexao, {
+                    "DATA_IMPORTACAO": pd.Timestamp.now(),
+                    "USUARIO": usuario,
+                    "SISTEMA_OPERACIONAL": sistema_operacional,
+                    "VERSAO_SISTEMA": versao_sistema,
+                    "ARQUIVO_ORIGEM": f"{tipo}: {arquivo}",
+                    "TOTAL_REGISTROS": int(len(df)),
+                    "STATUS": tipo,
+                    "DETALHES": f"{'Importação completa' if completa else 'Atualização parcial'} de {len(df)} registros da versão {versao}"
+                })
+                conexao.commit()
+            except Exception:
+                conexao.rollback()
+                raise
+
+        return {
+            "REGISTROS_EXISTENTES": existentes,
+            "IMPORTACAO_COMPLETA": completa,
+            "LINHAS_MERGE": linhas_merge
+        }
+
+    def assinatura_versao(self, versao):
+        self.preparar()
+        with self._conexao() as conexao:
+            total, ultima = conexao.execute(
+                "SELECT COUNT(*), MAX(DATA_ATUALIZACAO) FROM ORCADO WHERE VERSAO = ?", (versao,)
+            ).fetchone()
+        return f"{total}|{ultima or ''}"
+
+    def consultar_hashes(self, versao):
+        self.preparar()
+        colunas = COLUNAS_CHAVE + ["HASH_CONTEUDO"]
+        with self._conexao() as conexao:
+            linhas = conexao.execute(
+                "SELECT N_CONTA, N_CENTRO_CUSTO, DATA, VERSAO, ROW_HASH FROM ORCADO WHERE VERSAO = ?", (versao,)
+            ).fetchall()
+        return pd.DataFrame([tuple(linha) for linha in linhas], columns=colunas)
+
+    def aplicar_delta(self, df_envio, df_exclusoes, versoes, metadata, ao_progredir=None, cancelamento=None):
+        self.preparar()
+        exclusoes = normalizar_chaves(df_exclusoes) if not df_exclusoes.empty else None
+        with self._lock_escrita, self._conexao() as conexao:
+            try:
+                conexao.execute("BEGIN IMMEDIATE")
+                if exclusoes is not None:
+                    conexao.executemany(
+                        "DELETE FROM ORCADO WHERE N_CONTA = ? AND N_CENTRO_CUSTO = ? AND DATA = ? AND VERSAO = ?",
+                        exclusoes[COLUNAS_CHAVE].itertuples(index=False, name=None)
+                    )
+                linhas_merge = (
+                    self._gravar_linhas(conexao, df_envio, ao_progredir, cancelamento) if not df_envio.empty else 0
+                )
+                self._inserir_metadados(conexao, metadata)
+                conexao.commit()
+            except Exception:
+                conexao.rollback()
+                raise
+        return linhas_merge
+
+    @staticmethod
+    def _filtros_sql(filtros):
+        predicados = predicados_filtros(filtros)
+        parametros = {campo: _valor_parametro(valor) for campo, _, _, valor in predicados}
+        return montar_where([expressao for _, expressao, _, _ in predicados]), parametros
+
+    def consultar_pagina(self, filtros, cursor, direcao, tamanho, contar_total=True):
+        self.preparar()
+        clausula_where, parametros = self._filtros_sql(filtros)
+        predicado_cursor, ordenacao = predicado_keyset(cursor, direcao, EXPRESSAO_CHAVE_ORDEM_LOCAL)
+        if cursor is not None:
+            parametros = dict(parametros, cursor_ts=_texto_timestamp(cursor[0]), cursor_chave=cursor[1])
+        query = f"""
+            SELECT {', '.join(COLUNAS_REGISTRO)}, {EXPRESSAO_CHAVE_ORDEM_LOCAL} AS CHAVE_ORDEM
+            FROM ORCADO
+            {clausula_where}
+            {predicado_cursor}
+            {ordenacao}
+            LIMIT {int(tamanho) + 1}
+        """
+        with self._conexao() as conexao:
+            linhas = [_registro(linha) for linha in conexao.execute(query, parametros)]
+            total = None
+            if contar_total:
+                total = conexao.execute(
+                    f"SELECT COUNT(*) FROM ORCADO {clausula_where}",
+                    {k: v for k, v in parametros.items() if not k.startswith("cursor_")}
+                ).fetchone()[0]
+        return linhas, total
+
+    def listar_versoes(self):
+        self.preparar()
+        with self._conexao() as conexao:
+            linhas = conexao.execute("""
+                SELECT VERSAO, COUNT(*) AS TOTAL_REGISTROS, MAX(DATA_ATUALIZACAO) AS DATA_ATUALIZACAO
+                FROM ORCADO
+                GROUP BY VERSAO
+                ORDER BY VERSAO DESC
+            """).fetchall()
+        versoes = []
+        for linha in linhas:
+            registro = _registro(linha)
+            versoes.append({
+                "VERSAO": registro["VERSAO"],
+                "TOTAL_REGISTROS": registro["TOTAL_REGISTROS"],
+                "ULTIMA_ATUALIZACAO": registro["DATA_ATUALIZACAO"]
+            })
+        return versoes
+
+    def resumo(self, versao, filial=None, n_conta=None, agrupar=AGRUPAMENTO_PADRAO):
+        # Sem tabela de resumo: o índice (VERSAO, FILIAL, N_CONTA) já torna a agregação barata
+        self.preparar()
+        colunas = AGRUPAMENTOS[normalizar_agrupamento(agrupar)]
+        condicoes = ["VERSAO = :versao"]
+        parametros = {"versao": versao}
+        if filial:
+            condicoes.append("FILIAL = :filial")
+            parametros["filial"] = filial
+        if n_conta:
+            condicoes.append("N_CONTA = :n_conta")
+            parametros["n_conta"] = n_conta
+        grupo = ", ".join(colunas + ["MES"])
+        query = f"""
+            SELECT {', '.join(colunas)}, substr(DATA, 1, 7) || '-01' AS MES,
+                   SUM(VALOR) AS TOTAL_VALOR, COUNT(*) AS QTD_REGISTROS
+            FROM ORCADO
+            WHERE {' AND '.join(condicoes)}
+            GROUP BY {grupo}
+            ORDER BY {grupo}
+        """
+        with self._conexao() as conexao:
+            return [
+                {**dict(linha), "MES": date.fromisoformat(linha["MES"])}
+                for linha in conexao.execute(query, parametros)
+            ]
+
+    def selecionar(self, filtros):
+        self.preparar()
+        clausula_where, parametros = self._filtros_sql(filtros)
+        with self._conexao() as conexao:
+            return [
+                _registro(linha)
+                for linha in conexao.execute(
+                    f"SELECT {', '.join(COLUNAS_REGISTRO)} FROM ORCADO {clausula_where} ORDER BY DATA_ATUALIZACAO DESC",
+                    parametros
+                )
+            ]
+
+    def selecionar_lotes(self, filtros, linhas_por_lote=None):
+        linhas_por_lote = linhas_por_lote or CONSULTAS_CONFIG["linhas_por_fatia"]
+        self.preparar()
+        clausula_where, parametros = self._filtros_sql(filtros)
+        with self._conexao() as conexao:
+            cursor = conexao.execute(
+                f"SELECT {', '.join(COLUNAS_REGISTRO)} FROM ORCADO {clausula_where} ORDER BY DATA_ATUALIZACAO DESC",
+                parametros
+            )
+            while True:
+                linhas = cursor.fetchmany(linhas_por_lote)
+                if not linhas:
+                    break
+                yield pa.Table.from_pylist([_registro(linha) for linha in linhas])
+
+    def estimar_exclusao(self, filtros):
+        if not possui_filtros(filtros):
+            raise ValueError("É necessário informar pelo menos um filtro para excluir registros")
+        self.preparar()
+        clausula_where, parametros = self._filtros_sql(filtros)
+        with self._conexao() as conexao:
+            total = conexao.execute(f"SELECT COUNT(*) FROM ORCADO {clausula_where}", parametros).fetchone()[0]
+        return {"REGISTROS": total, "BYTES_ESTIMADOS": None}
+
+    def versoes_afetadas(self, filtros):
+        if filtros.get('versao'):
+            return [filtros['versao']]
+        self.preparar()
+        clausula_where, parametros = self._filtros_sql(filtros)
+        with self._conexao() as conexao:
+            return [
+                linha["VERSAO"]
+                for linha in conexao.execute(f"SELECT DISTINCT VERSAO FROM ORCADO {clausula_where} ORDER BY VERSAO", parametros)
+            ]
+
+    def excluir(self, filtros):
+        if not possui_filtros(filtros):
+            raise ValueError("É necessário informar pelo menos um filtro para excluir registros")
+        self.preparar()
+        clausula_where, parametros = self._filtros_sql(filtros)
+        with self._lock_escrita, self._conexao() as conexao:
+            cursor = conexao.execute(f"DELETE FROM ORCADO {clausula_where}", parametros)
+            conexao.commit()
+            return cursor.rowcount
+
+    @staticmethod
+    def _parametros_chave(chave):
+        return {
+            "versao_original": chave["VERSAO"],
+            "data_original": _valor_parametro(chave["DATA"]),
+            "n_conta_original": chave["N_CONTA"],
+            "n_centro_custo_original": chave["N_CENTRO_CUSTO"]
+        }
+
+    _CLAUSULA_CHAVE = """
+        VERSAO = @versao_original
+        AND DATA = @data_original
+        AND N_CONTA = @n_conta_original
+        AND N_CENTRO_CUSTO = @n_centro_custo_original
+    """
+
+    def obter_registro(self, chave):
+        self.preparar()
+        with self._conexao() as conexao:
+            linha = conexao.execute(
+                f"SELECT {', '.join(COLUNAS_REGISTRO)} FROM ORCADO WHERE {self._CLAUSULA_CHAVE}",
+                self._parametros_chave(chave)
+            ).fetchone()
+        return _registro(linha) if linha is not None else None
+
+    def excluir_registro(self, chave):
+        self.preparar()
+        with self._lock_escrita, self._conexao() as conexao:
+            cursor = conexao.execute(f"DELETE FROM ORCADO WHERE {self._CLAUSULA_CHAVE}", self._parametros_chave(chave))
+            conexao.commit()
+            return cursor.rowcount
+
+    def atualizar_registro(self, chave, valores):
+        self.preparar()
+        atribuicoes = ", ".join(f"{coluna} = @{coluna.lower()}" for coluna in COLUNAS_EDITAVEIS)
+        parametros = dict(
+            self._parametros_chave(chave),
+            agora=_agora(),
+            row_hash=hash_registro(valores),
+            **{coluna.lower(): valores.get(coluna) for coluna in COLUNAS_EDITAVEIS}
+        )
+        with self._lock_escrita, self._conexao() as conexao:
+            cursor = conexao.execute(
+                f"UPDATE ORCADO SET {atribuicoes}, ROW_HASH = @row_hash, DATA_ATUALIZACAO = @agora "
+                f"WHERE {self._CLAUSULA_CHAVE}",
+                parametros
+            )
+            conexao.commit()
+            return cursor.rowcount
+
+    def atualizar_registros(self, edicoes, metadata):
+        self.preparar()
+        atribuicoes = ", ".join(f"{coluna} = @{coluna.lower()}" for coluna in COLUNAS_EDITAVEIS)
+        query = (
+            f"UPDATE ORCADO SET {atribuicoes}, ROW_HASH = @row_hash, DATA_ATUALIZACAO = @agora "
+            f"WHERE {self._CLAUSULA_CHAVE} AND DATA_ATUALIZACAO = @data_atualizacao_lida"
+        )
+        agora = _agora()
+        aplicadas, conflitos = [], []
+        with self._lock_escrita, self._conexao() as conexao:
+            try:
+                conexao.execute("BEGIN IMMEDIATE")
+                for edicao in edicoes:
+                    cursor = conexao.execute(query, dict(
+                        self._parametros_chave(edicao["chave"]),
+                        agora=agora,
+                        row_hash=edicao["ROW_HASH"],
+                        data_atualizacao_lida=_valor_parametro(edicao["DATA_ATUALIZACAO_LIDA"]),
+                        **{coluna.lower(): edicao["valores"].get(coluna) for coluna in COLUNAS_EDITAVEIS}
+                    ))
+                    (aplicadas if cursor.rowcount else conflitos).append(edicao)
+                if aplicadas:
+                    self._inserir_metadados(conexao, {
+                        **metadata,
+                        "ARQUIVO_ORIGEM": f"EDITADO_LOTE: {len(aplicadas)} registros",
+                        "TOTAL_REGISTROS": len(aplicadas),
+                        "STATUS": "EDITADO_LOTE",
+                        "DETALHES": f"Alterações: {'; '.join(edicao['DETALHES'] for edicao in aplicadas)}"
+                    })
+                conexao.commit()
+            except Exception:
+                conexao.rollback()
+                raise
+        return {"ATUALIZADOS": len(aplicadas), "CONFLITOS": [edicao["ID_EDICAO"] for edicao in conflitos]}
+
+    @staticmethod
+    def _inserir_metadados(conexao, metadata):
+        colunas = [campo.name for campo in SCHEMA_METADATA]
+        conexao.execute(
+            f"INSERT INTO ORCADO_METADATA ({', '.join(colunas)}) VALUES ({', '.join('?' for _ in colunas)})",
+            [_valor_parametro(metadata[coluna]) for coluna in colunas]
+        )
+
+    def gravar_metadados(self, id_lote, eventos):
+        self.preparar()
+        with self._lock_escrita, self._conexao() as conexao:
+            try:
+                for evento in eventos:
+                    self._inserir_metadados(conexao, desserializar_evento(evento))
+                conexao.commit()
+            except Exception:
+                conexao.rollback()
+                raise
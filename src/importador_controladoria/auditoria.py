@@ -0,0 +1,244 @@
+"""
+Gravação em lotes dos registros de auditoria (tabela ORCADO_METADATA).
+
+Cada edição ou deleção gerava um job de carga com uma única linha, o que
+custava alguns segundos por operação e consumia a cota de jobs. O
+`EscritorAuditoria` acumula os eventos e os grava em lotes:
+
+- cada evento é acrescentado a um spool local (JSON Lines em disco) antes de
+  ser aceito, para não se perder se o processo terminar;
+- uma thread em segundo plano descarrega o lote quando ele atinge
+  AUDITORIA_CONFIG["registros_por_lote"] eventos ou quando passa
+  AUDITORIA_CONFIG["intervalo_segundos"] desde o primeiro evento pendente;
+- ao encerrar o processo (atexit) os eventos pendentes são descarregados.
+
+Ao descarregar, o spool é renomeado para um arquivo de lote, e o lote só é
+removido depois de gravado no destino. Lotes que falharam são reenviados no
+próximo ciclo. Cada lote e cada evento têm identificadores estáveis, usados
+pelo destino para não duplicar linhas quando um envio é repetido.
+
+No modo produção vários processos usam o mesmo diretório: cada escritor tem o
+próprio spool e os próprios lotes, com o PID do processo no nome, e nenhum
+deles renomeia ou envia os arquivos de outro processo em execução. O spool e
+os lotes de processos que já terminaram (ou de uma execução anterior) são
+assumidos pelo próximo escritor que descarregar.
+"""
+
+import atexit
+import json
+import logging
+import os
+import re
+import threading
+import time
+import uuid
+from pathlib import Path
+
+import pandas as pd
+
+from .config import AUDITORIA_CONFIG, DATA_DIR
+from .estado_compartilhado import processo_ativo
+
+logger = logging.getLogger(__name__)
+
+SPOOL_DIR = DATA_DIR / "auditoria"
+
+# Spools e lotes levam o PID do processo dono (os de versões anteriores não têm PID)
+_PID_ARQUIVO = re.compile(r"^(?:pendentes|lote)_pid(\d+)_")
+# O identificador do lote (enviado ao destino) não muda quando outro processo assume o lote
+_ID_LOTE = re.compile(r"^lote_(?:pid\d+_[0-9a-f]+_)?(\d+_[0-9a-f]+)$")
+
+
+def criar_evento(metadata):
+    """Converte os metadados em um evento serializável em JSON, com ID_EVENTO único."""
+    evento = {}
+    for campo, valor in metadata.items():
+        if hasattr(valor, "isoformat"):
+            valor = valor.isoformat()
+        elif hasattr(valor, "item"):
+            valor = valor.item()
+        evento[campo] = valor
+    evento["ID_EVENTO"] = uuid.uuid4().hex
+    return evento
+
+
+def desserializar_evento(evento):
+    """Converte um evento do spool de volta para os tipos da tabela de metadados."""
+    metadata = dict(evento)
+    metadata.pop("ID_EVENTO", None)
+    metadata["DATA_IMPORTACAO"] = pd.Timestamp(metadata["DATA_IMPORTACAO"])
+    metadata["TOTAL_REGISTROS"] = int(metadata["TOTAL_REGISTROS"])
+    return metadata
+
+
+class EscritorAuditoria:
+    """
+    Acumula eventos de auditoria e os grava em lotes no destino.
+
+    Args:
+        destino: Função chamada com (id do lote, lista de eventos); cada evento
+            é um dicionário com as colunas da tabela de metadados e ID_EVENTO
+        diretorio: Diretório do spool local
+        config: Sobrescreve AUDITORIA_CONFIG (opcional)
+    """
+
+    def __init__(self, destino, diretorio, config=None):
+        self.destino = destino
+        self.diretorio = Path(diretorio)
+        self.config = {**AUDITORIA_CONFIG, **(config or {})}
+        self._pid = os.getpid()
+        self._id_escritor = uuid.uuid4().hex[:8]
+        self._spool = self.diretorio / f"pendentes_pid{self._pid}_{self._id_escritor}.jsonl"
+        self._lock = threading.Lock()
+        self._lock_envio = threading.Lock()
+        self._sinal = threading.Event()
+        self._parar = threading.Event()
+        self._pendentes = 0
+        self._primeiro_pendente = None
+        self._thread = None
+        self._estatisticas = {"registrados": 0, "enviados": 0, "lotes": 0, "falhas": 0}
+
+        self.diretorio.mkdir(parents=True, exist_ok=True)
+        # Spools e lotes deixados por uma execução anterior entram nos próximos envios
+        self._assumir_orfaos()
+
+    def iniciar(self):
+        """Inicia a thread de descarga e registra a descarga final no encerramento."""
+        with self._lock:
+            if self._thread is not None:
+                return
+            self._thread = threading.Thread(target=self._executar, name="auditoria", daemon=True)
+            self._thread.start()
+        atexit.register(self.encerrar)
+        if self._pendentes or self._lotes_pendentes():
+            self._sinal.set()
+
+    def registrar(self, metadata):
+        """Acrescenta um evento ao spool; a gravação no destino é feita em lote."""
+        linha = json.dumps(criar_evento(metadata), ensure_ascii=False, default=str)
+        with self._lock:
+            with open(self._spool, "a", encoding="utf-8") as f:
+                f.write(linha + "\n")
+                f.flush()
+            self._pendentes += 1
+            self._estatisticas["registrados"] += 1
+            if self._primeiro_pendente is None:
+                self._primeiro_pendente = time.monotonic()
+            lote_cheio = self._pendentes >= self.config["registros_por_lote"]
+        if self._thread is None:
+            self.iniciar()
+        if lote_cheio:
+            self._sinal.set()
+
+    def _novo_lote(self, id_lote=None):
+        id_lote = id_lote or f"{time.time_ns()}_{uuid.uuid4().hex[:8]}"
+        return self.diretorio / f"lote_pid{self._pid}_{self._id_escritor}_{id_lote}.jsonl"
+
+    def _lotes_pendentes(self):
+        return sorted(self.diretorio.glob(f"lote_pid{self._pid}_{self._id_escritor}_*.jsonl"))
+
+    def _assumir_orfaos(self):
+        """Renomeia para lotes deste processo os spools e lotes de processos que já terminaram."""
+        assumidos = 0
+        for arquivo in sorted(self.diretorio.glob("pendentes*.jsonl")) + sorted(self.diretorio.glob("lote_*.jsonl")):
+            dono = _PID_ARQUIVO.match(arquivo.stem)
+            if dono is not None and processo_ativo(int(dono.group(1))):
+                continue
+            id_lote = _ID_LOTE.match(arquivo.stem)
+            try:
+                arquivo.replace(self._novo_lote(id_lote.group(1) if id_lote else None))
+            except FileNotFoundError:
+                # Outro processo o assumiu primeiro
+                continue
+            assumidos += 1
+        if assumidos:
+            logger.info(f"{assumidos} arquivos de auditoria pendentes de execuções anteriores recuperados")
+
+    def _fechar_lote(self):
+        """Renomeia o spool atual para um arquivo de lote (se houver eventos)."""
+        with self._lock:
+            if not self._pendentes:
+                return
+            try:
+                self._spool.replace(self._novo_lote())
+            except FileNotFoundError:
+                # Já renomeado (ex.: assumido como órfão); os eventos seguem no lote de quem o renomeou
+                logger.warning(f"Spool de auditoria {self._spool.name} não encontrado; considerado já enviado")
+            self._pendentes = 0
+            self._primeiro_pendente = None
+
+    def descarregar(self):
+        """
+        Grava no destino todos os eventos pendentes.
+
+        Returns:
+            Número de eventos gravados
+        """
+        with self._lock_envio:
+            self._fechar_lote()
+            self._assumir_orfaos()
+            enviados = 0
+            for lote in self._lotes_pendentes():
+                try:
+                    with open(lote, encoding="utf-8") as f:
+                        eventos = [json.loads(linha) for linha in f if linha.strip()]
+                except FileNotFoundError:
+                    continue
+                if eventos:
+                    try:
+                        self.destino(f"lote_{_ID_LOTE.match(lote.stem).group(1)}", eventos)
+                    except Exception as e:
+                        self._estatisticas["falhas"] += 1
+                        logger.warning(
+                            f"Falha ao gravar {len(eventos)} eventos de auditoria ({lote.name}); "
+                            f"nova tentativa no próximo ciclo: {e}"
+                        )
+                        break
+                lote.unlink(missing_ok=True)
+                enviados += len(eventos)
+                self._estatisticas["enviados"] += len(eventos)
+                self._estatisticas["lotes"] += 1
+            if enviados:
+                logger.info(f"{enviados} eventos de auditoria gravados")
+            return enviados
+
+    def _executar(self):
+        intervalo = self.config["intervalo_segundos"]
+        ultima_tentativa = 0.0
+        while not self._parar.is_set():
+            self._sinal.wait(timeout=1)
+            self._sinal.clear()
+            agora = time.monotonic()
+            with self._lock:
+                cheio = self._pendentes >= self.config["registros_por_lote"]
+                vencido = (
+                    self._primeiro_pendente is not None
+                    and agora - self._primeiro_pendente >= intervalo
+                )
+            # Lotes que falharam são reenviados a cada intervalo
+            repetir = agora - ultima_tentativa >= intervalo and bool(self._lotes_pendentes())
+            if cheio or vencido or repetir:
+                ultima_tentativa = agora
+                try:
+                    self.descarregar()
+                except Exception as e:
+                    logger.error(f"Erro na descarga da auditoria: {e}")
+
+    def encerrar(self):
+        """Para a thread e descarrega os eventos pendentes."""
+        self._parar.set()
+        self._sinal.set()
+        if self._thread is not None and self._thread is not threading.current_thread():
+            self._thread.join(timeout=5)
+        try:
+            self.descarregar()
+        except Exception as e:
+            logger.error(f"Eventos de auditoria mantidos no spool para a próxima execução: {e}")
+
+    def estatisticas(self):
+        with self._lock:
+            return {
+                **self._estatisticas,
+                "pendentes": self._pendentes,
+                "lotes_pendentes": len(self._lotes_pendentes())
+            }
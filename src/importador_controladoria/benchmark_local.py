@@ -0,0 +1,147 @@
+"""
+Benchmark offline da importação e da tela de registros usando o armazém local.
+
+Uso:
+    python -m importador_controladoria.benchmark_local --linhas 200000
+    python -m importador_controladoria.benchmark_local --parquet dados.parquet
+
+Gera (ou lê de um Parquet) um lote no formato da tabela ORCADO, importa cada
+versão em um arquivo SQLite temporário, reimporta uma versão (atualização
+parcial) e mede as consultas da tela de registros (primeira página, filtros e
+navegação por cursor) e a exportação para Excel, incluindo a rota /registros
+completa via cliente de testes do Flask. Não usa credenciais nem rede.
+"""
+
+import argparse
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from .armazem import definir_armazem
+from .armazem_local import ArmazemLocal
+from .exportacao import escrever_excel
+from .paginacao import DIRECAO_PROXIMA, montar_pagina, decodificar_cursor
+
+
+def gerar_lote(linhas, versoes, filiais, semente=42):
+    """Gera registros sintéticos com a distribuição aproximada de um orçamento."""
+    rng = np.random.default_rng(semente)
+    meses = pd.date_range("2024-01-01", periods=24, freq="MS").date
+    return pd.DataFrame({
+        'N_CONTA': rng.integers(30000000, 30000000 + 800, linhas).astype(str),
+        'N_CENTRO_CUSTO': rng.integers(100000000, 100000000 + 400, linhas).astype(str),
+        'DESCRICAO': "Conta de teste",
+        'VALOR': rng.normal(10000, 2500, linhas).round(2),
+        'DATA': rng.choice(meses, linhas),
+        'VERSAO': rng.choice([f"2025-V{i + 1:02d}" for i in range(versoes)], linhas),
+        'OPERACAO': rng.choice(["OPERACIONAL", "NAO OPERACIONAL"], linhas),
+        'DATA_ATUALIZACAO': pd.Timestamp.now(),
+        'FILIAL': rng.choice([f"{i + 1:04d}" for i in range(filiais)], linhas),
+        'RATEIO': rng.choice(["S", "N"], linhas),
+        'ORIGEM': rng.choice(["PLANILHA", "SISTEMA"], linhas)
+    })
+
+
+def _medir(resultados, nome, funcao):
+    inicio = time.perf_counter()
+    retorno = funcao()
+    resultados.append((nome, (time.perf_counter() - inicio) * 1000))
+    return retorno
+
+
+def executar(df, caminho_banco, paginas=5, tamanho=100):
+    """Executa o benchmark e retorna a lista (etapa, milissegundos)."""
+    armazem = ArmazemLocal(caminho_banco)
+    definir_armazem(armazem)
+    resultados = []
+
+    # Chaves duplicadas dentro da mesma versão seriam agregadas pelo UPSERT
+    df = df.drop_duplicates(subset=['N_CONTA', 'N_CENTRO_CUSTO', 'DATA', 'VERSAO'], keep='last')
+    versoes = sorted(df['VERSAO'].unique())
+    for versao in versoes:
+        lote = df[df['VERSAO'] == versao].reset_index(drop=True)
+        _medir(resultados, f"importação {versao} ({len(lote)} linhas)", lambda: armazem.importar(
+            lote, arquivo="benchmark.xlsx", usuario="benchmark",
+            sistema_operacional="benchmark", versao_sistema="benchmark"
+        ))
+
+    # Reimportação parcial de 10% da primeira versão
+    parcial = df[df['VERSAO'] == versoes[0]].sample(frac=0.1, random_state=1).reset_index(drop=True)
+    parcial['VALOR'] = parcial['VALOR'] * 1.05
+    _medir(resultados, f"atualização parcial {versoes[0]} ({len(parcial)} linhas)", lambda: armazem.importar(
+        parcial, arquivo="benchmark.xlsx", usuario="benchmark",
+        sistema_operacional="benchmark", versao_sistema="benchmark"
+    ))
+
+    filial = str(df['FILIAL'].iloc[0])
+    cenarios = {
+        "sem filtros": {},
+        "versão": {'versao': versoes[-1]},
+        "versão + filial": {'versao': versoes[-1], 'filial': filial},
+        "filial + período": {'filial': filial, 'data_inicio': '2024-06-01', 'data_fim': '2024-12-31'}
+    }
+    for nome, filtros in cenarios.items():
+        cursor = None
+        for pagina in range(1, paginas + 1):
+            linhas, _ = _medir(
+                resultados, f"registros [{nome}] página {pagina}",
+                lambda: armazem.consultar_pagina(filtros, cursor, DIRECAO_PROXIMA, tamanho, contar_total=pagina == 1)
+            )
+            _, cursor_proximo, _ = montar_pagina(linhas, tamanho, DIRECAO_PROXIMA, cursor is not None)
+            cursor = decodificar_cursor(cursor_proximo)
+            if cursor is None:
+                break
+
+    # Exportação para Excel de todas as linhas, em lotes e com memória constante
+    with tempfile.TemporaryDirectory() as diretorio:
+        total = len(df)
+        _medir(resultados, f"exportação Excel ({total} linhas)", lambda: escrever_excel(
+            armazem.selecionar_lotes({}), Path(diretorio) / "exportacao.xlsx"
+        ))
+
+    # Rota completa (template, cache e catálogo de versões) pelo cliente de testes do Flask
+    from .interface import app
+    from .cache import invalidar_cache_orcado
+    invalidar_cache_orcado("benchmark")
+    with app.test_client() as cliente:
+        resposta = _medir(resultados, "GET /registros (sem cache)", lambda: cliente.get("/registros"))
+        if resposta.status_code != 200:
+            raise RuntimeError(f"/registros retornou {resposta.status_code}")
+        _medir(resultados, "GET /registros (com cache)", lambda: cliente.get("/registros"))
+
+    return resultados
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark offline da importação e da tela de registros")
+    parser.add_argument("--linhas", type=int, default=100000, help="linhas sintéticas a gerar")
+    parser.add_argument("--versoes", type=int, default=3, help="versões sintéticas")
+    parser.add_argument("--filiais", type=int, default=20, help="filiais sintéticas")
+    parser.add_argument("--parquet", help="usa os registros de um arquivo Parquet em vez de gerar dados")
+    parser.add_argument("--banco", help="arquivo SQLite (padrão: arquivo temporário)")
+    parser.add_argument("--paginas", type=int, default=5, help="páginas navegadas por cenário")
+    args = parser.parse_args(argv)
+
+    if args.parquet:
+        df = pd.read_parquet(args.parquet)
+        df['DATA'] = pd.to_datetime(df['DATA']).dt.date
+    else:
+        df = gerar_lote(args.linhas, args.versoes, args.filiais)
+
+    with tempfile.TemporaryDirectory() as diretorio:
+        caminho = Path(args.banco) if args.banco else Path(diretorio) / "benchmark.sqlite3"
+        resultados = executar(df, caminho, paginas=args.paginas)
+
+    print(f"\nBenchmark local ({len(df)} linhas)")
+    print("-" * 72)
+    for nome, ms in resultados:
+        print(f"{nome:<58} {ms:>10.1f} ms")
+    print("-" * 72)
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
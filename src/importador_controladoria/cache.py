@@ -0,0 +1,152 @@
+"""
+Cache em memória dos resultados de consulta ao BigQuery.
+
+As entradas expiram após um TTL e o cache é limitado em número de entradas,
+descartando as menos usadas (LRU). Qualquer escrita na tabela ORCADO deve
+chamar `invalidar_cache_orcado`, que limpa o cache e avança a geração para
+que consultas iniciadas antes da escrita não gravem resultados antigos.
+
+No modo produção (vários processos) a geração também é compartilhada: uma
+invalidação em um processo limpa o cache dos outros na próxima leitura.
+"""
+
+import logging
+import threading
+import time
+from collections import OrderedDict
+
+from .config import CACHE_CONFIG, SERVIDOR_CONFIG
+from .estado_compartilhado import GeracaoCompartilhada
+
+logger = logging.getLogger(__name__)
+
+
+class CacheResultados:
+    """Cache LRU com expiração por TTL, seguro para uso entre threads."""
+
+    def __init__(self, nome, ttl_segundos=300, max_entradas=256, geracao_compartilhada=None):
+        self.nome = nome
+        self.ttl_segundos = ttl_segundos
+        self.max_entradas = max_entradas
+        self.geracao_compartilhada = geracao_compartilhada
+        self._geracao_compartilhada_vista = None
+        self._lock = threading.Lock()
+        self._entradas = OrderedDict()
+        self._geracao = 0
+        self._acertos = 0
+        self._falhas = 0
+        self._expiradas = 0
+        self._descartadas = 0
+        self._invalidacoes = 0
+
+    def _sincronizar(self):
+        """Descarta as entradas se outro processo invalidou o cache (chamado com o lock adquirido)."""
+        if self.geracao_compartilhada is None:
+            return
+        valor = self.geracao_compartilhada.valor()
+        if valor != self._geracao_compartilhada_vista:
+            if self._geracao_compartilhada_vista is not None:
+                self._entradas.clear()
+                self._geracao += 1
+            self._geracao_compartilhada_vista = valor
+
+    @property
+    def geracao(self):
+        """Geração atual; muda a cada invalidação."""
+        with self._lock:
+            self._sincronizar()
+            return self._geracao
+
+    def obter(self, chave):
+        """Retorna o valor em cache ou None se ausente/expirado."""
+        agora = time.monotonic()
+        with self._lock:
+            self._sincronizar()
+            entrada = self._entradas.get(chave)
+            if entrada is None:
+                self._falhas += 1
+                return None
+            expira_em, valor = entrada
+            if expira_em <= agora:
+                del self._entradas[chave]
+                self._expiradas += 1
+                self._falhas += 1
+                return None
+            self._entradas.move_to_end(chave)
+            self._acertos += 1
+            return valor
+
+    def armazenar(self, chave, valor, geracao=None):
+        """
+        Guarda um valor no cache.
+
+        Se `geracao` for informada e o cache tiver sido invalidado desde então,
+        o valor é descartado, pois pode refletir dados anteriores à escrita.
+        """
+        with self._lock:
+            self._sincronizar()
+            if geracao is not None and geracao != self._geracao:
+                return False
+            self._entradas[chave] = (time.monotonic() + self.ttl_segundos, valor)
+            self._entradas.move_to_end(chave)
+            while len(self._entradas) > self.max_entradas:
+                self._entradas.popitem(last=False)
+                self._descartadas += 1
+            return True
+
+    def invalidar(self, motivo=""):
+        """Remove todas as entradas e avança a geração."""
+        with self._lock:
+            self._entradas.clear()
+            self._geracao += 1
+            self._invalidacoes += 1
+            if self.geracao_compartilhada is not None:
+                self._geracao_compartilhada_vista = self.geracao_compartilhada.avancar()
+        logger.info(f"Cache '{self.nome}' invalidado{': ' + motivo if motivo else ''}")
+
+    def estatisticas(self):
+        """Contadores do cache para acompanhamento pelos operadores."""
+        with self._lock:
+            consultas = self._acertos + self._falhas
+            return {
+                "nome": self.nome,
+                "entradas": len(self._entradas),
+                "max_entradas": self.max_entradas,
+                "ttl_segundos": self.ttl_segundos,
+                "acertos": self._acertos,
+                "falhas": self._falhas,
+                "taxa_acerto": round(self._acertos / consultas, 3) if consultas else 0.0,
+                "expiradas": self._expiradas,
+                "descartadas": self._descartadas,
+                "invalidacoes": self._invalidacoes,
+                "geracao": self._geracao
+            }
+
+
+def chave_filtros(prefixo, filtros, *extras):
+    """Normaliza um conjunto de filtros em uma chave de cache estável."""
+    itens = tuple(sorted(
+        (nome, str(valor).strip())
+        for nome, valor in filtros.items()
+        if valor is not None and str(valor).strip() != ''
+    ))
+    return (prefixo, itens) + tuple(extras)
+
+
+# Geração das escritas na tabela ORCADO, compartilhada entre os processos no modo produção
+geracao_orcado = (
+    GeracaoCompartilhada(SERVIDOR_CONFIG["caminho_estado"], "orcado")
+    if SERVIDOR_CONFIG["estado_compartilhado"] else None
+)
+
+cache_registros = CacheResultados(
+    "registros",
+    ttl_segundos=CACHE_CONFIG["ttl_segundos"],
+    max_entradas=CACHE_CONFIG["max_entradas"],
+    geracao_compartilhada=geracao_orcado
+)
+
+
+def invalidar_cache_orcado(motivo=""):
+    """Invalida os caches que dependem da tabela ORCADO após uma escrita."""
+    cache_registros.invalidar(motivo)
@@ -0,0 +1,160 @@
+"""
+Cancelamento cooperativo e tempo limite dos processamentos.
+
+Um processamento recebe um SinalCancelamento e chama `verificar()` entre as
+etapas e entre as partes de cada carga; se o cancelamento foi pedido (pelo
+usuário ou por tempo limite), `verificar` levanta ProcessamentoCancelado e o
+processamento para ali. As etapas longas (leitura do Excel, transformações)
+não são interrompidas no meio: o cancelamento vale ao final delas.
+
+Os jobs do BigQuery acompanhados com `aguardar_job` são registrados no sinal
+e cancelados no servidor assim que o cancelamento é pedido, de modo que uma
+carga ou o script da importação param sem esperar o job terminar. O script
+da importação roda em uma transação: cancelado, nada é aplicado na tabela.
+Se o job já tinha terminado com sucesso quando o cancelamento chegou (ex.: o
+script já fez o COMMIT), o cancelamento não tem efeito sobre ele e
+`aguardar_job` retorna o resultado normalmente.
+
+Cada etapa pode ter tempo limite (`etapa(nome, limite_segundos)`); esgotado o
+tempo, o sinal é cancelado como se o usuário tivesse pedido.
+"""
+
+import concurrent.futures
+import logging
+import threading
+from contextlib import contextmanager
+
+logger = logging.getLogger(__name__)
+
+# Intervalo entre verificações do cancelamento enquanto um job do BigQuery roda
+INTERVALO_VERIFICACAO_SEGUNDOS = 1.0
+
+
+class ProcessamentoCancelado(Exception):
+    """O processamento foi cancelado pelo usuário ou por tempo limite."""
+
+
+class SinalCancelamento:
+    """Pedido de cancelamento de um processamento, verificado nos pontos de parada."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._cancelado = threading.Event()
+        self._motivo = None
+        self._jobs = set()
+
+    @property
+    def cancelado(self):
+        return self._cancelado.is_set()
+
+    @property
+    def motivo(self):
+        return self._motivo
+
+    def cancelar(self, motivo="Processamento cancelado pelo usuário"):
+        """Pede o cancelamento e cancela os jobs do BigQuery em andamento."""
+        with self._lock:
+            if self._cancelado.is_set():
+                return
+            self._motivo = motivo
+            self._cancelado.set()
+            jobs = list(self._jobs)
+        logger.info(f"[CANCELAMENTO] {motivo}")
+        for job in jobs:
+            self._cancelar_job(job)
+
+    @staticmethod
+    def _cancelar_job(job):
+        try:
+            job.cancel()
+            logger.info(f"[CANCELAMENTO] Job {job.job_id} cancelado no BigQuery")
+        except Exception as e:
+            logger.warning(f"[CANCELAMENTO] Não foi possível cancelar o job {job.job_id}: {str(e)}")
+
+    def verificar(self):
+        """
+        Ponto de parada do processamento.
+
+        Raises:
+            ProcessamentoCancelado: Se o cancelamento foi pedido
+        """
+        if self._cancelado.is_set():
+            raise ProcessamentoCancelado(self._motivo)
+
+    @contextmanager
+    def etapa(self, nome, limite_segundos=None):
+        """
+        Delimita uma etapa, verificando o cancelamento na entrada e na saída.
+
+        Com `limite_segundos`, o sinal é cancelado se a etapa passar desse tempo.
+        """
+        self.verificar()
+        temporizador = None
+        if limite_segundos:
+            temporizador = threading.Timer(
+                limite_segundos, self.cancelar,
+                args=(f"Tempo limite da etapa {nome} excedido ({limite_segundos}s)",)
+            )
+            temporizador.daemon = True
+            temporizador.start()
+        try:
+            yield
+        finally:
+            if temporizador is not None:
+                temporizador.cancel()
+        self.verificar()
+
+    def _registrar_job(self, job):
+        with self._lock:
+            if not self._cancelado.is_set():
+                self._jobs.add(job)
+                return
+        # Cancelado antes do registro: o job é cancelado logo após ser criado
+        self._cancelar_job(job)
+
+    def _liberar_job(self, job):
+        with self._lock:
+            self._jobs.discard(job)
+
+
+def _concluido_com_sucesso(job):
+    """Indica se o job já terminou sem erro (consultando o estado atual no BigQuery)."""
+    try:
+        job.reload()
+    except Exception as e:
+        logger.warning(f"[CANCELAMENTO] Não foi possível consultar o job {job.job_id}: {str(e)}")
+        return False
+    return job.done() and job.error_result is None
+
+
+def aguardar_job(job, cancelamento=None):
+    """
+    Aguarda o job do BigQuery terminar, cancelando-o se o processamento for cancelado.
+
+    Se o job terminou com sucesso antes de o cancelamento ter efeito, o
+    resultado é retornado: o que ele gravou já está aplicado.
+
+    Raises:
+        ProcessamentoCancelado: Se o cancelamento foi pedido e o job não chegou a concluir
+    """
+    if cancelamento is None:
+        return job.result()
+
+    cancelamento._registrar_job(job)
+    try:
+        while True:
+            if cancelamento.cancelado:
+                if _concluido_com_sucesso(job):
+                    logger.info(f"[CANCELAMENTO] Job {job.job_id} já havia concluído; o resultado é mantido")
+                    return job.result()
+                cancelamento.verificar()
+            try:
+                return job.result(timeout=INTERVALO_VERIFICACAO_SEGUNDOS)
+            except concurrent.futures.TimeoutError:
+                continue
+            except Exception:
+                # O job cancelado termina com erro; informa o cancelamento em vez do erro
+                cancelamento.verificar()
+                raise
+    finally:
+        cancelamento._liberar_job(job)
@@ -0,0 +1,253 @@
+"""
+Carga em lotes, retomável, do DataFrame de importação para a tabela de staging.
+
+O lote de importação é dividido em partes de tamanho fixo, cada uma enviada
+em um job de carga com ID determinístico (chave do conteúdo + geração da
+staging + índice da parte + tentativa). Com isso:
+
+- erros transitórios são repetidos com espera exponencial, e antes de cada
+  nova tentativa o job anterior é consultado, evitando carregar a mesma parte
+  duas vezes quando apenas a resposta se perdeu;
+- as partes concluídas são registradas em um checkpoint em disco, e uma nova
+  importação do mesmo arquivo retoma a partir da última parte enviada,
+  enquanto a tabela de staging ainda existir.
+
+Uma carga cancelada (ver cancelamento) para antes da próxima parte, cancela o
+job em andamento e remove a staging e o checkpoint: ela não será retomada.
+"""
+
+import hashlib
+import json
+import logging
+import random
+import time
+
+import pandas as pd
+import requests
+from google.api_core import exceptions as gexc
+from google.cloud import bigquery
+
+from .cancelamento import ProcessamentoCancelado, aguardar_job
+from .config import CARGA_CONFIG, DATA_DIR
+from .transacao_importacao import criar_tabela_staging, EXPIRACAO_STAGING
+
+logger = logging.getLogger(__name__)
+
+CHECKPOINT_DIR = DATA_DIR / "cargas"
+
+_EXCECOES_RETENTAVEIS = (
+    gexc.TooManyRequests,
+    gexc.InternalServerError,
+    gexc.BadGateway,
+    gexc.ServiceUnavailable,
+    gexc.GatewayTimeout,
+    requests.exceptions.ConnectionError,
+    requests.exceptions.Timeout,
+    ConnectionError,
+    TimeoutError
+)
+
+_MOTIVOS_RETENTAVEIS = {"backendError", "internalError", "rateLimitExceeded", "jobRateLimitExceeded"}
+
+
+def erro_retentavel(erro):
+    """Indica se o erro é transitório e a operação pode ser repetida."""
+    if isinstance(erro, _EXCECOES_RETENTAVEIS):
+        return True
+    motivos = {e.get("reason") for e in (getattr(erro, "errors", None) or []) if isinstance(e, dict)}
+    return bool(motivos & _MOTIVOS_RETENTAVEIS)
+
+
+def chave_carga(df, destino):
+    """
+    Chave estável do conteúdo a ser carregado.
+
+    DATA_ATUALIZACAO é ignorada, pois muda a cada execução, para que o mesmo
+    arquivo importado novamente gere a mesma chave e possa ser retomado.
+    """
+    conteudo = df.drop(columns=["DATA_ATUALIZACAO"], errors="ignore")
+    hashes = pd.util.hash_pandas_object(conteudo, index=False).values
+    digest = hashlib.sha256(destino.encode("utf-8"))
+    digest.update(hashes.tobytes())
+    return digest.hexdigest()[:32]
+
+
+def _caminho_checkpoint(chave):
+    return CHECKPOINT_DIR / f"{chave}.json"
+
+
+def _ler_checkpoint(chave):
+    try:
+        with open(_caminho_checkpoint(chave), encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def _gravar_checkpoint(chave, checkpoint):
+    CHECKPOINT_DIR.mkdir(parents=True, exist_ok=True)
+    caminho = _caminho_checkpoint(chave)
+    temporario = caminho.with_suffix(".tmp")
+    with open(temporario, "w", encoding="utf-8") as f:
+        json.dump(checkpoint, f)
+    temporario.replace(caminho)
+
+
+def descartar_checkpoint(chave):
+    """Remove o checkpoint de uma carga concluída."""
+    _caminho_checkpoint(chave).unlink(missing_ok=True)
+
+
+def remover_staging_cancelada(client, staging_ref, chave):
+    """Remove a staging e o checkpoint de uma carga cancelada."""
+    try:
+        client.delete_table(staging_ref, not_found_ok=True)
+        descartar_checkpoint(chave)
+        logger.info(f"Carga {chave} cancelada; tabela temporária {staging_ref.table_id} removida")
+    except Exception as e:
+        logger.error(f"Erro ao remover a tabela temporária {staging_ref.table_id}: {str(e)}")
+
+
+def _job_concluido(client, job_id):
+    """Retorna o job se ele existir e tiver terminado com sucesso (aguarda se em andamento)."""
+    try:
+        job = client.get_job(job_id)
+        job.result()
+        return job
+    except Exception:
+        return None
+
+
+def _preparar_staging(client, chave, staging_ref, schema, total_lotes, linhas_por_lote):
+    """
+    Reaproveita a staging e o checkpoint de uma carga interrompida ou cria
+    uma staging nova.
+
+    Returns:
+        Checkpoint com a geração da staging e as partes já concluídas
+    """
+    checkpoint = _ler_checkpoint(chave)
+    compativel = (
+        checkpoint is not None
+        and checkpoint.get("staging") == str(staging_ref)
+        and checkpoint.get("total_lotes") == total_lotes
+        and checkpoint.get("linhas_por_lote") == linhas_por_lote
+    )
+    if compativel:
+        try:
+            tabela = client.get_table(staging_ref)
+            tabela.expires = pd.Timestamp.now(tz="UTC").to_pydatetime() + EXPIRACAO_STAGING
+            client.update_table(tabela, ["expires"])
+            logger.info(
+                f"Retomando carga {chave}: {len(checkpoint['lotes_concluidos'])}/{total_lotes} "
+                "partes já enviadas"
+            )
+            return checkpoint
+        except gexc.NotFound:
+            logger.info(f"Staging da carga {chave} expirou; a carga será refeita")
+
+    client.delete_table(staging_ref, not_found_ok=True)
+    criar_tabela_staging(client, staging_ref, schema)
+    checkpoint = {
+        "staging": str(staging_ref),
+        "geracao": int(time.time()),
+        "total_lotes": total_lotes,
+        "linhas_por_lote": linhas_por_lote,
+        "lotes_concluidos": []
+    }
+    _gravar_checkpoint(chave, checkpoint)
+    return checkpoint
+
+
+def _carregar_lote(client, df_lote, staging_ref, job_config, job_id_base, config, cancelamento=None):
+    """Carrega uma parte com repetição e sem duplicar a carga."""
+    max_tentativas = config["max_tentativas"]
+    for tentativa in range(max_tentativas):
+        job_id = f"{job_id_base}_{tentativa}"
+        try:
+            try:
+                job = client.load_table_from_dataframe(
+                    df_lote, staging_ref, job_config=job_config, job_id=job_id
+                )
+            except gexc.Conflict:
+                # O job já foi criado (ex.: resposta perdida); acompanha o existente
+                job = client.get_job(job_id)
+            aguardar_job(job, cancelamento)
+            return job
+        except Exception as e:
+            if not erro_retentavel(e):
+                raise
+            # A tentativa pode ter sido concluída apesar do erro na resposta
+            job = _job_concluido(client, job_id)
+            if job is not None:
+                return job
+            if tentativa == max_tentativas - 1:
+                raise
+            espera = min(
+                config["espera_maxima_segundos"],
+                config["espera_inicial_segundos"] * (2 ** tentativa)
+            ) * random.uniform(0.5, 1.0)
+            logger.warning(
+                f"Erro transitório no job {job_id} ({type(e).__name__}: {e}); "
+                f"nova tentativa em {espera:.1f}s"
+            )
+            time.sleep(espera)
+
+
+def carregar_em_lotes(client, df, staging_ref, schema, chave, ao_progredir=None, config=None, cancelamento=None):
+    """
+    Carrega o DataFrame na tabela de staging em partes.
+
+    Args:
+        client: Cliente do BigQuery
+        df: Dados a carregar
+        staging_ref: Referência da tabela de staging (nome derivado da chave)
+        schema: Schema da staging
+        chave: Chave da carga, retornada por `chave_carga`
+        ao_progredir: Função chamada com (partes concluídas, total de partes)
+        config: Sobrescreve CARGA_CONFIG (opcional)
+        cancelamento: SinalCancelamento verificado entre as partes (opcional)
+
+    Returns:
+        Número de partes enviadas nesta execução (as retomadas não contam)
+
+    Raises:
+        ProcessamentoCancelado: Se o cancelamento foi pedido durante a carga
+    """
+    config = {**CARGA_CONFIG, **(config or {})}
+    linhas_por_lote = max(1, config["linhas_por_lote"])
+    total_lotes = max(1, -(-len(df) // linhas_por_lote))
+
+    checkpoint = _preparar_staging(client, chave, staging_ref, schema, total_lotes, linhas_por_lote)
+    concluidos = set(checkpoint["lotes_concluidos"])
+    job_config = bigquery.LoadJobConfig(
+        write_disposition=bigquery.WriteDisposition.WRITE_APPEND,
+        schema=schema
+    )
+    if ao_progredir:
+        ao_progredir(len(concluidos), total_lotes)
+
+    enviados = 0
+    for indice in range(total_lotes):
+        if indice in concluidos:
+            continue
+        inicio = indice * linhas_por_lote
+        df_lote = df.iloc[inicio:inicio + linhas_por_lote]
+        job_id_base = f"importacao_{chave}_{checkpoint['geracao']}_{indice:05d}"
+        try:
+            if cancelamento is not None:
+                cancelamento.verificar()
+            _carregar_lote(client, df_lote, staging_ref, job_config, job_id_base, config, cancelamento)
+        except ProcessamentoCancelado:
+            remover_staging_cancelada(client, staging_ref, chave)
+            raise
+
+        concluidos.add(indice)
+        checkpoint["lotes_concluidos"] = sorted(concluidos)
+        _gravar_checkpoint(chave, checkpoint)
+        enviados += 1
+        logger.info(f"Parte {indice + 1}/{total_lotes} carregada ({len(df_lote)} linhas)")
+        if ao_progredir:
+            ao_progredir(len(concluidos), total_lotes)
+
+    return enviados
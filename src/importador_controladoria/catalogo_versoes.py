@@ -0,0 +1,173 @@
+"""
+Catálogo de versões da tabela ORCADO.
+
+Mantém uma tabela pequena (ORCADO_VERSOES) com uma linha por versão, o total
+de registros e a data da última atualização. A tabela é atualizada pelas
+rotas de importação, edição e deleção apenas para as versões afetadas, e a
+tela de registros lê o catálogo (com cache em memória) em vez de executar
+`SELECT DISTINCT VERSAO` sobre a tabela de fatos a cada acesso. No modo
+produção, a cópia em memória também é descartada quando outro processo
+escreve na tabela ORCADO.
+"""
+
+import logging
+import threading
+import time
+
+from google.api_core.exceptions import NotFound
+from google.cloud import bigquery
+
+from .cache import geracao_orcado
+from .config import BIGQUERY_CONFIG, CACHE_CONFIG
+
+logger = logging.getLogger(__name__)
+
+SCHEMA_VERSOES = [
+    bigquery.SchemaField("VERSAO", "STRING", mode="REQUIRED"),
+    bigquery.SchemaField("TOTAL_REGISTROS", "INTEGER", mode="REQUIRED"),
+    bigquery.SchemaField("ULTIMA_ATUALIZACAO", "TIMESTAMP", mode="NULLABLE")
+]
+
+
+def _tabelas():
+    """Retorna os nomes qualificados da tabela de fatos e do catálogo."""
+    dataset_id = BIGQUERY_CONFIG.get("dataset_id", "silver")
+    table_id = BIGQUERY_CONFIG.get("table_id", "ORCADO")
+    versoes_table_id = BIGQUERY_CONFIG.get("versoes_table_id", "ORCADO_VERSOES")
+    return f"{dataset_id}.{table_id}", f"{dataset_id}.{versoes_table_id}"
+
+
+class CatalogoVersoes:
+    """Leitura e manutenção do catálogo de versões, com cache em memória."""
+
+    def __init__(self, ttl_segundos=600):
+        self.ttl_segundos = ttl_segundos
+        self._lock = threading.Lock()
+        self._versoes = None
+        self._carregado_em = 0.0
+        self._geracao_carregada = None
+
+    def invalidar(self):
+        """Descarta a cópia em memória do catálogo."""
+        with self._lock:
+            self._versoes = None
+
+    def listar(self, client):
+        """
+        Lista as versões com total de registros e última atualização.
+
+        Returns:
+            Lista de dicionários com VERSAO, TOTAL_REGISTROS e ULTIMA_ATUALIZACAO,
+            ordenada da versão mais recente para a mais antiga
+        """
+        geracao = geracao_orcado.valor() if geracao_orcado is not None else None
+        with self._lock:
+            if (self._versoes is not None and self._geracao_carregada == geracao
+                    and time.monotonic() - self._carregado_em < self.ttl_segundos):
+                return self._versoes
+
+        _, tabela_versoes = _tabelas()
+        query = f"""
+            SELECT VERSAO, TOTAL_REGISTROS, ULTIMA_ATUALIZACAO
+            FROM `{tabela_versoes}`
+            ORDER BY VERSAO DESC
+        """
+        try:
+            versoes = [dict(row) for row in client.query(query).result()]
+        except NotFound:
+            # Primeira execução: o catálogo ainda não existe e é montado a partir da tabela de fatos
+            logger.info("Catálogo de versões não encontrado, reconstruindo")
+            self.reconstruir(client)
+            versoes = [dict(row) for row in client.query(query).result()]
+
+        with self._lock:
+            self._versoes = versoes
+            self._carregado_em = time.monotonic()
+            self._geracao_carregada = geracao
+        return versoes
+
+    def reconstruir(self, client):
+        """Recria o catálogo inteiro a partir da tabela ORCADO."""
+        tabela_orcado, tabela_versoes = _tabelas()
+        query = f"""
+            CREATE OR REPLACE TABLE `{tabela_versoes}` AS
+            SELECT
+                VERSAO,
+                COUNT(*) AS TOTAL_REGISTROS,
+                MAX(DATA_ATUALIZACAO) AS ULTIMA_ATUALIZACAO
+            FROM `{tabela_orcado}`
+            GROUP BY VERSAO
+        """
+        try:
+            client.query(query).result()
+            logger.info("Catálogo de versões reconstruído")
+        except NotFound:
+            # Sem tabela de fatos ainda: cria o catálogo vazio
+            tabela = bigquery.Table(f"{client.project}.{tabela_versoes}", schema=SCHEMA_VERSOES)
+            client.create_table(tabela, exists_ok=True)
+            logger.info("Catálogo de versões criado vazio")
+        finally:
+            self.invalidar()
+
+    def atualizar(self, client, versoes):
+        """
+        Recalcula as linhas do catálogo apenas para as versões informadas.
+
+        Se o catálogo ainda não existir, ele é reconstruído por completo. Os
+        demais erros são propagados, para que o `AtualizadorAgregados` mantenha
+        as versões pendentes e tente de novo.
+        """
+        versoes = sorted({str(v) for v in versoes if v})
+        if not versoes:
+            return
+        tabela_orcado, tabela_versoes = _tabelas()
+        query = f"""
+            MERGE `{tabela_versoes}` T
+            USING (
+                SELECT
+                    v AS VERSAO,
+                    COUNT(O.VERSAO) AS TOTAL_REGISTROS,
+                    MAX(O.DATA_ATUALIZACAO) AS ULTIMA_ATUALIZACAO
+                FROM UNNEST(@versoes) AS v
+                LEFT JOIN (
+                    SELECT VERSAO, DATA_ATUALIZACAO
+                    FROM `{tabela_orcado}`
+                    WHERE VERSAO IN UNNEST(@versoes)
+                ) O ON O.VERSAO = v
+                GROUP BY v
+            ) S
+            ON T.VERSAO = S.VERSAO
+            WHEN MATCHED AND S.TOTAL_REGISTROS = 0 THEN
+                DELETE
+            WHEN MATCHED THEN
+                UPDATE SET
+                    T.TOTAL_REGISTROS = S.TOTAL_REGISTROS,
+                    T.ULTIMA_ATUALIZACAO = S.ULTIMA_ATUALIZACAO
+            WHEN NOT MATCHED AND S.TOTAL_REGISTROS > 0 THEN
+                INSERT (VERSAO, TOTAL_REGISTROS, ULTIMA_ATUALIZACAO)
+                VALUES (S.VERSAO, S.TOTAL_REGISTROS, S.ULTIMA_ATUALIZACAO)
+        """
+        job_config = bigquery.QueryJobConfig(
+            query_parameters=[bigquery.ArrayQueryParameter("versoes", "STRING", versoes)]
+        )
+        try:
+            client.query(query, job_config=job_config).result()
+            logger.info(f"Catálogo de versões atualizado para: {versoes}")
+        except NotFound:
+            self.reconstruir(client)
+        finally:
+            self.invalidar()
+
+    def atualizar_ou_reconstruir(self, client, versoes=None):
+        """
+        Atualiza as versões informadas ou, se não for possível saber quais
+        versões foram afetadas (ex.: deleção por filial), reconstrói o catálogo.
+        Erros são propagados para quem chamou.
+        """
+        if versoes:
+            self.atualizar(client, versoes)
+        else:
+            self.reconstruir(client)
+
+
+catalogo_versoes = CatalogoVersoes(ttl_segundos=CACHE_CONFIG["ttl_catalogo_segundos"])
@@ -0,0 +1,206 @@
+"""
+Provedor compartilhado de clientes do Google Cloud (BigQuery e Storage).
+
+As credenciais da conta de serviço são lidas uma única vez (e relidas apenas
+se o arquivo for alterado), o token de acesso é renovado antes de expirar e os
+clientes reutilizam uma mesma sessão HTTP com pool de conexões. Os clientes do
+BigQuery e do Storage são thread-safe e podem ser usados por todas as rotas e
+threads de processamento ao mesmo tempo.
+"""
+
+import logging
+import threading
+from datetime import datetime, timedelta
+
+import requests
+from google.auth.transport.requests import AuthorizedSession, Request
+from google.cloud import bigquery
+from google.cloud import storage
+from google.oauth2 import service_account
+
+from .config import BIGQUERY_CONFIG, CONFIG_DIR, GCP_CLIENT_CONFIG
+
+logger = logging.getLogger(__name__)
+
+SCOPES = ["https://www.googleapis.com/auth/cloud-platform"]
+
+
+class ProvedorClientesGCP:
+    """Mantém credenciais, sessão HTTP e clientes do GCP em cache para o processo."""
+
+    def __init__(self, caminho_credenciais, project_id, pool_maxsize=32, margem_renovacao=300):
+        self.caminho_credenciais = caminho_credenciais
+        self.project_id = project_id
+        self.pool_maxsize = pool_maxsize
+        self.margem_renovacao = timedelta(seconds=margem_renovacao)
+        # Protege credenciais, sessão e clientes; a renovação do token (requisição
+        # HTTP) usa uma trava própria para não bloquear quem só precisa do cliente
+        self._lock = threading.RLock()
+        self._lock_renovacao = threading.Lock()
+        self._credenciais = None
+        self._mtime_credenciais = None
+        self._sessao = None
+        self._cliente_bigquery = None
+        self._cliente_storage = None
+        self._renovador = None
+        self._parar_renovador = threading.Event()
+
+    def credenciais_disponiveis(self):
+        """Indica se o arquivo de credenciais existe."""
+        return self.caminho_credenciais.exists()
+
+    def _carregar_credenciais(self):
+        """Carrega as credenciais, recriando sessão e clientes se o arquivo mudou."""
+        if not self.credenciais_disponiveis():
+            raise FileNotFoundError(f"Arquivo de credenciais não encontrado: {self.caminho_credenciais}")
+
+        mtime = self.caminho_credenciais.stat().st_mtime
+        if self._credenciais is None or mtime != self._mtime_credenciais:
+            logger.info(f"Carregando credenciais do GCP de: {self.caminho_credenciais}")
+            self._credenciais = service_account.Credentials.from_service_account_file(
+                str(self.caminho_credenciais),
+                scopes=SCOPES
+            )
+            self._mtime_credenciais = mtime
+            self._sessao = None
+            self._cliente_bigquery = None
+            self._cliente_storage = None
+        return self._credenciais
+
+    def _obter_sessao(self):
+        """Cria (uma única vez) a sessão HTTP autenticada com pool de conexões."""
+        if self._sessao is None:
+            sessao = AuthorizedSession(self._credenciais)
+            adaptador = requests.adapters.HTTPAdapter(
+                pool_connections=self.pool_maxsize,
+                pool_maxsize=self.pool_maxsize
+            )
+            sessao.mount("https://", adaptador)
+            self._sessao = sessao
+        return self._sessao
+
+    def _token_precisa_renovar(self, credenciais):
+        """Verifica se o token expira dentro da margem de renovação."""
+        if credenciais is None or not credenciais.token or credenciais.expiry is None:
+            return True
+        # O google-auth armazena a expiração como datetime UTC sem timezone
+        return credenciais.expiry - datetime.utcnow() <= self.margem_renovacao
+
+    def renovar_token(self, forcar=False):
+        """
+        Renova o token de acesso antes que ele expire.
+
+        A renovação é feita fora da trava dos clientes: enquanto ela acontece,
+        as demais threads seguem usando o token atual, ainda válido pela margem.
+        """
+        with self._lock:
+            credenciais = self._carregar_credenciais()
+        with self._lock_renovacao:
+            if forcar or self._token_precisa_renovar(credenciais):
+                credenciais.refresh(Request())
+                logger.info(f"Token do GCP renovado, expira em: {credenciais.expiry}")
+
+    def obter_cliente_bigquery(self):
+        """
+        Retorna o cliente compartilhado do BigQuery.
+
+        O token é renovado pelo renovador em segundo plano; se ainda assim
+        expirar, a sessão autenticada o renova antes da próxima requisição.
+        """
+        with self._lock:
+            self._carregar_credenciais()
+            if self._cliente_bigquery is None:
+                self._cliente_bigquery = bigquery.Client(
+                    project=self.project_id,
+                    credentials=self._credenciais,
+                    _http=self._obter_sessao()
+                )
+                logger.info(f"Cliente BigQuery inicializado com projeto: {self.project_id}")
+            return self._cliente_bigquery
+
+    def obter_cliente_storage(self):
+        """Retorna o cliente compartilhado do Storage (token renovado como no BigQuery)."""
+        with self._lock:
+            self._carregar_credenciais()
+            if self._cliente_storage is None:
+                self._cliente_storage = storage.Client(
+                    project=self.project_id,
+                    credentials=self._credenciais,
+                    _http=self._obter_sessao()
+                )
+                logger.info(f"Cliente Storage inicializado com projeto: {self.project_id}")
+            return self._cliente_storage
+
+    def _loop_renovacao(self):
+        """Renova o token em segundo plano pouco antes de cada expiração."""
+        while not self._parar_renovador.is_set():
+            espera = 60
+            try:
+                self.renovar_token()
+                expiry = self._credenciais.expiry
+                if expiry is not None:
+                    restante = (expiry - datetime.utcnow() - self.margem_renovacao).total_seconds()
+                    espera = max(restante, 30)
+            except Exception as e:
+                logger.warning(f"Falha ao renovar token do GCP: {str(e)}")
+            self._parar_renovador.wait(espera)
+
+    def aquecer(self):
+        """Carrega credenciais, obtém o token e cria os clientes na inicialização."""
+        if not self.credenciais_disponiveis():
+            logger.warning(f"Clientes do GCP não aquecidos: credenciais não encontradas em {self.caminho_credenciais}")
+            return False
+        try:
+            self.renovar_token()
+            self.obter_cliente_bigquery()
+            self.obter_cliente_storage()
+        except Exception as e:
+            logger.error(f"Erro ao aquecer clientes do GCP: {str(e)}")
+            return False
+
+        with self._lock:
+            if self._renovador is None or not self._renovador.is_alive():
+                self._parar_renovador.clear()
+                self._renovador = threading.Thread(
+                    target=self._loop_renovacao,
+                    name="RenovadorTokenGCP",
+                    daemon=True
+                )
+                self._renovador.start()
+        logger.info("Clientes do GCP aquecidos com sucesso")
+        return True
+
+    def estado(self):
+        """Resumo do estado do provedor para a página de diagnóstico."""
+        with self._lock:
+            return {
+                "credenciais_carregadas": self._credenciais is not None,
+                "token_expira_em": str(self._credenciais.expiry) if self._credenciais is not None else "",
+                "cliente_bigquery_ativo": self._cliente_bigquery is not None,
+                "cliente_storage_ativo": self._cliente_storage is not None,
+                "renovador_ativo": self._renovador is not None and self._renovador.is_alive(),
+                "pool_maxsize": self.pool_maxsize
+            }
+
+
+provedor_gcp = ProvedorClientesGCP(
+    CONFIG_DIR / "bigquery-credentials.json",
+    BIGQUERY_CONFIG.get("project_id", "projeto-teste"),
+    pool_maxsize=GCP_CLIENT_CONFIG["pool_maxsize"],
+    margem_renovacao=GCP_CLIENT_CONFIG["margem_renovacao_token"]
+)
+
+
+def obter_cliente_bigquery():
+    """Atalho para o cliente BigQuery compartilhado do processo."""
+    return provedor_gcp.obter_cliente_bigquery()
+
+
+def obter_cliente_storage():
+    """Atalho para o cliente Storage compartilhado do processo."""
+    return provedor_gcp.obter_cliente_storage()
+
+
+def aquecer_clientes():
+    """Atalho para aquecer os clientes do GCP na inicialização."""
+    return provedor_gcp.aquecer()
@@ -39,7 +39,9 @@ BIGQUERY_CONFIG = {
     "project_id": os.getenv("BIGQUERY_PROJECT_ID", "gcp-sian-proj-controladoria"),
     "dataset_id": os.getenv("BIGQUERY_DATASET_ID", "silver"),
     "table_id": os.getenv("BIGQUERY_TABLE_ID", "ORCADO"),
-    "metadata_table_id": os.getenv("BIGQUERY_METADATA_TABLE_ID", "ORCADO_METADATA")
+    "metadata_table_id": os.getenv("BIGQUERY_METADATA_TABLE_ID", "ORCADO_METADATA"),
+    "versoes_table_id": os.getenv("BIGQUERY_VERSOES_TABLE_ID", "ORCADO_VERSOES"),
+    "resumo_table_id": os.getenv("BIGQUERY_RESUMO_TABLE_ID", "ORCADO_RESUMO")
 }
 
 # Configuração do GCP Storage
@@ -48,6 +50,135 @@ GCP_STORAGE_CONFIG = {
     "modelo_path": os.getenv("GCP_STORAGE_MODELO_PATH", "utils/modelo_importacao.xlsx")
 }
 
+# Configuração dos clientes do GCP (pool de conexões HTTP e renovação do token)
+GCP_CLIENT_CONFIG = {
+    "pool_maxsize": int(os.getenv("GCP_HTTP_POOL_MAXSIZE", "32")),
+    "margem_renovacao_token": int(os.getenv("GCP_TOKEN_REFRESH_MARGIN", "300"))
+}
+
+# Configuração da execução de consultas no BigQuery
+CONSULTAS_CONFIG = {
+    "max_paralelo": int(os.getenv("BIGQUERY_MAX_CONSULTAS_PARALELAS", "8")),
+    "linhas_por_fatia": int(os.getenv("BIGQUERY_LINHAS_POR_FATIA", "20000"))
+}
+
+# Configuração do cache de resultados da tela de registros
+CACHE_CONFIG = {
+    "ttl_segundos": int(os.getenv("CACHE_REGISTROS_TTL", "300")),
+    "max_entradas": int(os.getenv("CACHE_REGISTROS_MAX_ENTRADAS", "256")),
+    "ttl_catalogo_segundos": int(os.getenv("CACHE_CATALOGO_VERSOES_TTL", "600"))
+}
+
+# Configuração da paginação da tela de registros
+PAGINACAO_CONFIG = {
+    "tamanho_padrao": int(os.getenv("REGISTROS_TAMANHO_PAGINA", "100")),
+    "tamanhos_permitidos": [50, 100, 250, 500]
+}
+
+# Configuração da carga em lotes para o BigQuery
+CARGA_CONFIG = {
+    "linhas_por_lote": int(os.getenv("BIGQUERY_LINHAS_POR_LOTE", "50000")),
+    "max_tentativas": int(os.getenv("BIGQUERY_CARGA_MAX_TENTATIVAS", "5")),
+    "espera_inicial_segundos": float(os.getenv("BIGQUERY_CARGA_ESPERA_INICIAL", "1")),
+    "espera_maxima_segundos": float(os.getenv("BIGQUERY_CARGA_ESPERA_MAXIMA", "60"))
+}
+
+# Armazém de dados usado pela aplicação: "bigquery" (padrão) ou "local" (SQLite,
+# para testes e benchmarks sem acesso ao GCP)
+ARMAZEM_CONFIG = {
+    "backend": os.getenv("ARMAZEM_BACKEND", "bigquery").lower(),
+    "caminho_local": Path(os.getenv("ARMAZEM_LOCAL_PATH", str(DATA_DIR / "armazem_local.sqlite3")))
+}
+
+# Réplica local em Parquet para a tela de registros e a exportação (opcional)
+REPLICA_CONFIG = {
+    "ativa": os.getenv("REPLICA_LOCAL", "false").lower() == "true",
+    "diretorio": Path(os.getenv("REPLICA_LOCAL_PATH", str(DATA_DIR / "replica")))
+}
+
+# Gravação em lotes da auditoria (ORCADO_METADATA): os eventos ficam em um spool
+# local e são enviados ao atingir o tamanho do lote ou após o intervalo
+AUDITORIA_CONFIG = {
+    "em_lote": os.getenv("AUDITORIA_EM_LOTE", "true").lower() == "true",
+    "registros_por_lote": int(os.getenv("AUDITORIA_REGISTROS_POR_LOTE", "50")),
+    "intervalo_segundos": float(os.getenv("AUDITORIA_INTERVALO_SEGUNDOS", "30")),
+    # "carga" (job de carga, sem custo) ou "streaming" (insertAll, visível na hora)
+    "metodo": os.getenv("AUDITORIA_METODO", "carga").lower()
+}
+
+# Exportações em segundo plano (CSV, Parquet e XLSX): arquivos gerados ficam
+# disponíveis para download até expirarem
+EXPORTACAO_CONFIG = {
+    "diretorio": Path(os.getenv("EXPORTACAO_PATH", str(DATA_DIR / "exportacoes"))),
+    "max_simultaneas": int(os.getenv("EXPORTACAO_MAX_SIMULTANEAS", "2")),
+    "retencao_horas": float(os.getenv("EXPORTACAO_RETENCAO_HORAS", "24"))
+}
+
+# Agendador das importações: workers fixos atendendo uma fila FIFO limitada
+# (fila cheia responde 429) e limites de etapas simultâneas de CPU
+# (Excel e transformações) e de rede (envio ao BigQuery)
+AGENDADOR_CONFIG = {
+    "workers": int(os.getenv("IMPORTACAO_WORKERS", "4")),
+    "tamanho_fila": int(os.getenv("IMPORTACAO_TAMANHO_FILA", "20")),
+    "max_etapas_cpu": int(os.getenv("IMPORTACAO_MAX_ETAPAS_CPU", "2")),
+    "max_etapas_rede": int(os.getenv("IMPORTACAO_MAX_ETAPAS_REDE", "3"))
+}
+
+# Tempo limite, em segundos, de cada etapa da importação (0 desativa); esgotado,
+# o processamento é cancelado como se o usuário tivesse pedido
+TEMPO_LIMITE_ETAPAS_CONFIG = {
+    "load": int(os.getenv("IMPORTACAO_TEMPO_LIMITE_LEITURA", "600")),
+    "validation": int(os.getenv("IMPORTACAO_TEMPO_LIMITE_VALIDACAO", "900")),
+    "upload": int(os.getenv("IMPORTACAO_TEMPO_LIMITE_ENVIO", "3600")),
+    "metadata": int(os.getenv("IMPORTACAO_TEMPO_LIMITE_ARQUIVOS", "900"))
+}
+
+# Catálogo de versões e resumo: as versões afetadas pelas edições são
+# recalculadas juntas, no máximo este intervalo após a primeira edição
+# (importações e deleções recalculam na hora)
+AGREGADOS_CONFIG = {
+    "intervalo_segundos": float(os.getenv("AGREGADOS_INTERVALO_SEGUNDOS", "10"))
+}
+
+# Limites de custo das operações pesadas no BigQuery, em GB processados
+# (estimados por dry-run antes da execução; 0 desativa o limite)
+LIMITES_CUSTO_CONFIG = {
+    "max_bytes_exclusao": int(float(os.getenv("LIMITE_GB_EXCLUSAO", "50")) * 1024 ** 3),
+    "max_bytes_exportacao": int(float(os.getenv("LIMITE_GB_EXPORTACAO", "200")) * 1024 ** 3)
+}
+
+# Status e histórico dos processamentos e exportações
+HISTORICO_CONFIG = {
+    "caminho": Path(os.getenv("HISTORICO_PATH", str(DATA_DIR / "processamentos.sqlite3"))),
+    "max_memoria": int(os.getenv("HISTORICO_MAX_MEMORIA", "200")),
+    "ttl_memoria_segundos": int(os.getenv("HISTORICO_TTL_MEMORIA", "3600")),
+    "retencao_erros_dias": int(os.getenv("HISTORICO_RETENCAO_ERROS_DIAS", "7")),
+    "retencao_dias": int(os.getenv("HISTORICO_RETENCAO_DIAS", "90"))
+}
+
+# Servidor web: "desktop" (servidor do Flask, um processo) ou "producao"
+# (servidor WSGI com vários processos e estado compartilhado em DATA_DIR)
+_MODO_SERVIDOR = os.getenv("SERVIDOR_MODO", "desktop").lower()
+SERVIDOR_CONFIG = {
+    "modo": _MODO_SERVIDOR,
+    "host": os.getenv("SERVIDOR_HOST", "0.0.0.0"),
+    "porta": int(os.getenv("SERVIDOR_PORTA", "5000")),
+    "workers": int(os.getenv("SERVIDOR_WORKERS", str(min(4, os.cpu_count() or 1)))),
+    "threads": int(os.getenv("SERVIDOR_THREADS", "8")),
+    "timeout_segundos": int(os.getenv("SERVIDOR_TIMEOUT", "300")),
+    "estado_compartilhado": _MODO_SERVIDOR == "producao",
+    "caminho_estado": Path(os.getenv("ESTADO_COMPARTILHADO_PATH", str(DATA_DIR / "estado_compartilhado.sqlite3"))),
+    "diretorio_travas": Path(os.getenv("TRAVAS_ESCRITA_PATH", str(DATA_DIR / "travas_escrita"))),
+    "chave_secreta_path": Path(os.getenv("CHAVE_SECRETA_PATH", str(CONFIG_DIR / "chave_secreta")))
+}
+
+# Streams de progresso (Server-Sent Events): cada um ocupa uma thread do servidor
+# enquanto está aberto, então o total por processo e a duração são limitados
+PROGRESSO_CONFIG = {
+    "max_streams": int(os.getenv("PROGRESSO_MAX_STREAMS", str(max(1, SERVIDOR_CONFIG["threads"] // 2)))),
+    "duracao_maxima_segundos": float(os.getenv("PROGRESSO_DURACAO_MAXIMA_SEGUNDOS", "45"))
+}
+
 # Tenta carregar credenciais do arquivo ou usa variáveis de ambiente
 try:
     credentials_path = BASE_DIR / "config" / "bigquery-credentials.json"
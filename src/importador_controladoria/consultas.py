@@ -0,0 +1,176 @@
+"""
+Execução de consultas no BigQuery e instrumentação de latência.
+
+As consultas independentes de uma mesma página são submetidas de uma vez em
+um pool de threads (o cliente do BigQuery é thread-safe) e os resultados são
+reunidos ao final, de forma que o tempo da página passa a ser o da consulta
+mais lenta em vez da soma de todas.
+"""
+
+import logging
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+from .config import CONSULTAS_CONFIG
+
+logger = logging.getLogger(__name__)
+
+_executor = ThreadPoolExecutor(
+    max_workers=CONSULTAS_CONFIG["max_paralelo"],
+    thread_name_prefix="ConsultaBigQuery"
+)
+
+
+class MetricasLatencia:
+    """Guarda as últimas medições de latência por operação."""
+
+    def __init__(self, amostras=200):
+        self._lock = threading.Lock()
+        self._amostras = amostras
+        self._medicoes = {}
+
+    def registrar(self, operacao, total_ms, serial_ms=None):
+        """Registra o tempo total e, opcionalmente, a soma dos tempos individuais."""
+        with self._lock:
+            if operacao not in self._medicoes:
+                self._medicoes[operacao] = deque(maxlen=self._amostras)
+            self._medicoes[operacao].append((total_ms, serial_ms if serial_ms is not None else total_ms))
+
+    def resumo(self):
+        """Retorna média, p95 e última medição de cada operação."""
+        with self._lock:
+            resumo = {}
+            for operacao, medicoes in self._medicoes.items():
+                totais = sorted(m[0] for m in medicoes)
+                seriais = [m[1] for m in medicoes]
+                p95 = totais[min(len(totais) - 1, int(len(totais) * 0.95))]
+                resumo[operacao] = {
+                    "amostras": len(medicoes),
+                    "ultima_ms": round(medicoes[-1][0], 1),
+                    "media_ms": round(sum(totais) / len(totais), 1),
+                    "p95_ms": round(p95, 1),
+                    "media_serial_ms": round(sum(seriais) / len(seriais), 1)
+                }
+            return resumo
+
+
+metricas_latencia = MetricasLatencia()
+
+
+def _normalizar_consulta(consulta):
+    """Aceita a consulta como SQL puro ou como tupla (sql, job_config)."""
+    if isinstance(consulta, tuple):
+        return consulta
+    return consulta, None
+
+
+def _executar_consulta(client, sql, job_config):
+    """Executa uma consulta e materializa as linhas, medindo o tempo gasto."""
+    inicio = time.perf_counter()
+    job = client.query(sql, job_config=job_config)
+    linhas = list(job.result())
+    return linhas, (time.perf_counter() - inicio) * 1000
+
+
+def executar_consultas_paralelas(client, consultas, operacao):
+    """
+    Submete várias consultas independentes ao mesmo tempo e aguarda todas.
+
+    Args:
+        client: Cliente do BigQuery
+        consultas: Dicionário nome -> SQL (ou tupla (sql, job_config))
+        operacao: Nome usado no registro de latência
+
+    Returns:
+        Dicionário nome -> lista de linhas do resultado
+    """
+    inicio = time.perf_counter()
+    futuros = {
+        nome: _executor.submit(_executar_consulta, client, *_normalizar_consulta(consulta))
+        for nome, consulta in consultas.items()
+    }
+
+    resultados = {}
+    tempos = {}
+    for nome, futuro in futuros.items():
+        resultados[nome], tempos[nome] = futuro.result()
+
+    total_ms = (time.perf_counter() - inicio) * 1000
+    serial_ms = sum(tempos.values())
+    metricas_latencia.registrar(operacao, total_ms, serial_ms)
+    detalhes = ", ".join(f"{nome}={tempo:.1f} ms" for nome, tempo in tempos.items())
+    logger.info(f"[LATENCIA] {operacao}: {total_ms:.1f} ms em paralelo (soma serial {serial_ms:.1f} ms; {detalhes})")
+    return resultados
+
+
+def _buscar_fatia(client, tabela, inicio, quantidade):
+    """Lê uma fatia das linhas de uma tabela de resultado."""
+    return [dict(row) for row in client.list_rows(tabela, start_index=inicio, max_results=quantidade)]
+
+
+def buscar_resultado_paralelo(client, job, operacao, linhas_por_fatia=None):
+    """
+    Aguarda um job de consulta e baixa as linhas do resultado em fatias paralelas.
+
+    Returns:
+        Lista de dicionários com as linhas na ordem do resultado
+    """
+    linhas_por_fatia = linhas_por_fatia or CONSULTAS_CONFIG["linhas_por_fatia"]
+    inicio = time.perf_counter()
+    resultado = job.result()
+    total = resultado.total_rows or 0
+
+    if total <= linhas_por_fatia or job.destination is None:
+        registros = [dict(row) for row in resultado]
+    else:
+        futuros = [
+            _executor.submit(_buscar_fatia, client, job.destination, posicao, linhas_por_fatia)
+            for posicao in range(0, total, linhas_por_fatia)
+        ]
+        registros = []
+        for futuro in futuros:
+            registros.extend(futuro.result())
+
+    total_ms = (time.perf_counter() - inicio) * 1000
+    metricas_latencia.registrar(operacao, total_ms)
+    logger.info(f"[LATENCIA] {operacao}: {total} linhas em {total_ms:.1f} ms")
+    return registros
+
+
+def _buscar_fatia_arrow(client, tabela, inicio, quantidade):
+    """Lê uma fatia das linhas de uma tabela de resultado como tabela Arrow."""
+    return client.list_rows(tabela, start_index=inicio, max_results=quantidade).to_arrow()
+
+
+def iterar_resultado_em_lotes(client, job, operacao, linhas_por_fatia=None):
+    """
+    Aguarda um job de consulta e entrega o resultado em tabelas Arrow, uma por fatia.
+
+    As fatias são baixadas em paralelo, mas no máximo CONSULTAS_CONFIG["max_paralelo"]
+    ficam em memória ao mesmo tempo, e são entregues na ordem do resultado.
+    """
+    linhas_por_fatia = linhas_por_fatia or CONSULTAS_CONFIG["linhas_por_fatia"]
+    inicio = time.perf_counter()
+    resultado = job.result(page_size=linhas_por_fatia)
+    total = resultado.total_rows or 0
+    pendentes = deque()
+    try:
+        if total <= linhas_por_fatia or job.destination is None:
+            yield from resultado.to_arrow_iterable()
+        else:
+            tabela = client.get_table(job.destination)
+            for posicao in range(0, total, linhas_por_fatia):
+                pendentes.append(_executor.submit(_buscar_fatia_arrow, client, tabela, posicao, linhas_por_fatia))
+                if len(pendentes) >= CONSULTAS_CONFIG["max_paralelo"]:
+                    yield pendentes.popleft().result()
+            while pendentes:
+                yield pendentes.popleft().result()
+    finally:
+        # Se o consumidor parar antes do fim, as fatias ainda não iniciadas são descartadas
+        for futuro in pendentes:
+            futuro.cancel()
+        total_ms = (time.perf_counter() - inicio) * 1000
+        metricas_latencia.registrar(operacao, total_ms)
+        logger.info(f"[LATENCIA] {operacao}: {total} linhas em lotes em {total_ms:.1f} ms")
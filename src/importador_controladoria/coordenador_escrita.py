@@ -0,0 +1,224 @@
+"""
+Coordenação das escritas na tabela ORCADO.
+
+Importações, edições e deleções emitem DML na mesma tabela. No BigQuery, DMLs
+concorrentes que tocam as mesmas partições entram em fila ou falham por
+conflito de transação, e duas importações da mesma VERSAO calculariam o delta
+sobre a mesma base. O coordenador serializa, dentro do processo, as escritas
+que tocam a mesma VERSAO, enquanto escritas de versões diferentes seguem em
+paralelo. Escritas sem versão definida (ex.: deleção por filial) bloqueiam a
+tabela inteira; quando uma delas aguarda, novas escritas por versão esperam
+que ela passe, para que não fique na fila indefinidamente.
+
+Mutações pequenas da mesma versão que chegam enquanto ela está ocupada (ex.:
+edições de um registro) são agrupadas por `agrupar` e aplicadas em uma única
+DML quando a versão fica livre.
+
+No modo produção o servidor roda vários processos; além da trava em memória,
+cada escrita trava arquivos em `diretorio_travas` com flock: a tabela inteira
+em modo exclusivo, ou a tabela em modo compartilhado e cada versão em modo
+exclusivo. Em sistemas sem flock (Windows), o servidor de produção usa um
+único processo e as travas em memória bastam.
+"""
+
+import logging
+import re
+import threading
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+from .config import SERVIDOR_CONFIG
+
+logger = logging.getLogger(__name__)
+
+
+class _Pedido:
+    """Mutação aguardando ser aplicada em um lote agrupado."""
+
+    __slots__ = ("item", "concluido", "resultado", "erro")
+
+    def __init__(self, item):
+        self.item = item
+        self.concluido = threading.Event()
+        self.resultado = None
+        self.erro = None
+
+
+class CoordenadorEscrita:
+    """Travas de escrita por VERSAO (ou da tabela inteira) e agrupamento de mutações pequenas."""
+
+    def __init__(self, diretorio_travas=None):
+        self.diretorio_travas = diretorio_travas if fcntl is not None else None
+        self._condicao = threading.Condition()
+        # Versão -> [thread dona, contagem de reentradas]
+        self._versoes = {}
+        # [thread dona, contagem] enquanto a tabela inteira está travada
+        self._tabela = None
+        self._tabela_aguardando = 0
+        self._lock_grupos = threading.Lock()
+        self._grupos = {}
+
+    def _reentrante(self, eu, versoes):
+        if self._tabela is not None and self._tabela[0] == eu:
+            return True
+        return versoes is not None and all(
+            versao in self._versoes and self._versoes[versao][0] == eu for versao in versoes
+        )
+
+    def _livre(self, versoes):
+        if self._tabela is not None:
+            return False
+        if versoes is None:
+            return not self._versoes
+        return self._tabela_aguardando == 0 and not any(versao in self._versoes for versao in versoes)
+
+    def _travar_arquivo(self, nome, modo):
+        arquivo = open(self.diretorio_travas / f"{re.sub(r'[^0-9A-Za-z_-]', '_', nome)}.lock", "a")
+        try:
+            fcntl.flock(arquivo, modo)
+        except BaseException:
+            arquivo.close()
+            raise
+        return arquivo
+
+    def _travar_processos(self, tabela_inteira, versoes):
+        """Trava entre processos o que esta thread acabou de travar em memória."""
+        if self.diretorio_travas is None or not (tabela_inteira or versoes):
+            return []
+        self.diretorio_travas.mkdir(parents=True, exist_ok=True)
+        arquivos = []
+        try:
+            if tabela_inteira:
+                arquivos.append(self._travar_arquivo("tabela", fcntl.LOCK_EX))
+            else:
+                arquivos.append(self._travar_arquivo("tabela", fcntl.LOCK_SH))
+                for versao in versoes:
+                    arquivos.append(self._travar_arquivo(f"versao_{versao}", fcntl.LOCK_EX))
+        except BaseException:
+            self._liberar_processos(arquivos)
+            raise
+        return arquivos
+
+    @staticmethod
+    def _liberar_processos(arquivos):
+        for arquivo in reversed(arquivos):
+            # Fechar o arquivo libera o flock
+            arquivo.close()
+
+    @contextmanager
+    def escrita(self, versoes=None):
+        """
+        Trava as versões informadas (ou a tabela inteira, se None) durante o bloco.
+
+        A trava é reentrante para a mesma thread, desde que o bloco interno
+        peça as mesmas versões (ou um subconjunto) do bloco externo.
+        """
+        eu = threading.get_ident()
+        versoes = None if versoes is None else sorted({str(versao) for versao in versoes})
+        descricao = "tabela inteira" if versoes is None else ", ".join(versoes)
+        with self._condicao:
+            if self._reentrante(eu, versoes):
+                travadas = None if self._tabela is not None and self._tabela[0] == eu else versoes
+            else:
+                if not self._livre(versoes):
+                    logger.info(f"[ESCRITA] Aguardando escrita em andamento ({descricao})")
+                if versoes is None:
+                    self._tabela_aguardando += 1
+                try:
+                    while not self._livre(versoes):
+                        self._condicao.wait()
+                finally:
+                    if versoes is None:
+                        self._tabela_aguardando -= 1
+                travadas = versoes
+            # Só o que é travado agora (fora de reentrância) precisa da trava entre processos
+            if travadas is None:
+                tabela_nova, versoes_novas = self._tabela is None, []
+                self._tabela = [eu, self._tabela[1] + 1] if self._tabela else [eu, 1]
+            else:
+                tabela_nova, versoes_novas = False, [versao for versao in travadas if versao not in self._versoes]
+                for versao in travadas:
+                    dono = self._versoes.get(versao)
+                    self._versoes[versao] = [eu, dono[1] + 1] if dono else [eu, 1]
+        arquivos = []
+        try:
+            arquivos = self._travar_processos(tabela_nova, versoes_novas)
+            yield
+        finally:
+            self._liberar_processos(arquivos)
+            with self._condicao:
+                if travadas is None:
+                    self._tabela[1] -= 1
+                    if self._tabela[1] == 0:
+                        self._tabela = None
+                else:
+                    for versao in travadas:
+                        self._versoes[versao][1] -= 1
+                        if self._versoes[versao][1] == 0:
+                            del self._versoes[versao]
+                self._condicao.notify_all()
+
+    def agrupar(self, grupo, versoes, item, aplicar_lote):
+        """
+        Aplica `item` junto com as mutações do mesmo grupo que estiverem aguardando.
+
+        A primeira chamada do grupo aguarda a trava das versões; as que chegam
+        nesse meio-tempo entram no mesmo lote. Com a trava obtida, o lote é
+        retirado do grupo e `aplicar_lote(itens)` é chamado uma única vez; ele
+        deve retornar um resultado por item, na mesma ordem.
+
+        Returns:
+            Resultado correspondente a `item`
+
+        Raises:
+            RuntimeError: Se `aplicar_lote` não retornar um resultado por item
+        """
+        pedido = _Pedido(item)
+        with self._lock_grupos:
+            lider = grupo not in self._grupos
+            self._grupos.setdefault(grupo, []).append(pedido)
+
+        if not lider:
+            pedido.concluido.wait()
+        else:
+            pedidos = None
+            try:
+                with self.escrita(versoes):
+                    with self._lock_grupos:
+                        pedidos = self._grupos.pop(grupo)
+                    if len(pedidos) > 1:
+                        logger.info(f"[ESCRITA] {len(pedidos)} mutações agrupadas em uma DML ({grupo})")
+                    resultados = list(aplicar_lote([p.item for p in pedidos]))
+                    if len(resultados) != len(pedidos):
+                        raise RuntimeError(
+                            f"O lote retornou {len(resultados)} resultados para {len(pedidos)} mutações ({grupo})"
+                        )
+                    for p, resultado in zip(pedidos, resultados):
+                        p.resultado = resultado
+            except BaseException as e:
+                # Falha ao travar ou ao aplicar o lote: o grupo é retirado (as próximas
+                # mutações formam um novo lote) e todos os pedidos recebem o erro
+                if pedidos is None:
+                    with self._lock_grupos:
+                        pedidos = self._grupos.pop(grupo)
+                erro = e if isinstance(e, Exception) else RuntimeError(f"Escrita agrupada interrompida ({grupo})")
+                for p in pedidos:
+                    p.erro = erro
+                if not isinstance(e, Exception):
+                    raise
+            finally:
+                for p in pedidos or []:
+                    p.concluido.set()
+
+        if pedido.erro is not None:
+            raise pedido.erro
+        return pedido.resultado
+
+
+coordenador_escrita = CoordenadorEscrita(
+    SERVIDOR_CONFIG["diretorio_travas"] if SERVIDOR_CONFIG["estado_compartilhado"] else None
+)
@@ -0,0 +1,86 @@
+"""
+Estimativa e limite de custo das operações pesadas no BigQuery.
+
+Antes de uma deleção ou exportação, a consulta é submetida em modo dry-run,
+que não processa dados nem é cobrado, para obter os bytes que ela vai ler.
+Se a estimativa passar do limite configurado (LIMITES_CUSTO_CONFIG) a
+operação é recusada; o mesmo limite vai para `maximum_bytes_billed` do job
+real, de forma que o BigQuery também interrompe a consulta se a estimativa
+estiver errada.
+"""
+
+import logging
+
+from google.cloud import bigquery
+
+from .config import LIMITES_CUSTO_CONFIG
+
+logger = logging.getLogger(__name__)
+
+
+class LimiteCustoExcedido(Exception):
+    """Operação recusada porque processaria mais bytes que o limite configurado."""
+
+
+def formatar_bytes(quantidade):
+    """Tamanho legível (ex.: "1.5 GB")."""
+    if quantidade is None:
+        return "desconhecido"
+    valor = float(quantidade)
+    for unidade in ("B", "KB", "MB", "GB", "TB"):
+        if valor < 1024 or unidade == "TB":
+            return f"{valor:.0f} {unidade}" if unidade == "B" else f"{valor:.1f} {unidade}"
+        valor /= 1024
+
+
+def limite_bytes(operacao):
+    """Limite de bytes processados da operação ("exclusao" ou "exportacao"); None se desativado."""
+    limite = LIMITES_CUSTO_CONFIG.get(f"max_bytes_{operacao}") or 0
+    return limite if limite > 0 else None
+
+
+def estimar_bytes(client, query, parametros):
+    """Bytes que a consulta processaria, obtidos por dry-run."""
+    job_config = bigquery.QueryJobConfig(
+        query_parameters=parametros,
+        dry_run=True,
+        use_query_cache=False
+    )
+    return client.query(query, job_config=job_config).total_bytes_processed or 0
+
+
+def verificar_limite(operacao, bytes_estimados):
+    """
+    Recusa a operação se a estimativa passar do limite configurado.
+
+    Raises:
+        LimiteCustoExcedido: Se os bytes estimados passarem do limite
+    """
+    limite = limite_bytes(operacao)
+    if limite is not None and bytes_estimados > limite:
+        raise LimiteCustoExcedido(
+            f"A {'exclusão' if operacao == 'exclusao' else 'exportação'} processaria "
+            f"{formatar_bytes(bytes_estimados)}, acima do limite de {formatar_bytes(limite)}. "
+            f"Refine os filtros (versão e período reduzem a leitura) ou ajuste o limite."
+        )
+
+
+def configuracao_limitada(operacao, parametros):
+    """QueryJobConfig do job real, com o limite da operação como `maximum_bytes_billed`."""
+    return bigquery.QueryJobConfig(
+        query_parameters=parametros,
+        maximum_bytes_billed=limite_bytes(operacao)
+    )
+
+
+def preparar_consulta(client, operacao, query, parametros):
+    """
+    Estima a consulta, aplica o limite e devolve (bytes estimados, QueryJobConfig do job real).
+
+    Raises:
+        LimiteCustoExcedido: Se a estimativa passar do limite da operação
+    """
+    bytes_estimados = estimar_bytes(client, query, parametros)
+    logger.info(f"[CUSTO] {operacao}: dry-run estimou {formatar_bytes(bytes_estimados)}")
+    verificar_limite(operacao, bytes_estimados)
+    return bytes_estimados, configuracao_limitada(operacao, parametros)
@@ -0,0 +1,175 @@
+"""
+Importação delta: envia apenas as linhas novas ou alteradas de uma versão.
+
+No modo delta o arquivo passa a ser o conteúdo completo das versões que ele
+contém. Em vez de enviar todas as linhas, o armazém fornece um hash compacto
+do conteúdo de cada linha já gravada (chave + HASH_CONTEUDO), a comparação é
+feita localmente e apenas vão para o destino:
+
+- as linhas inseridas (chave ausente na versão) e as atualizadas (hash
+  diferente);
+- a lista de chaves a excluir (presentes na versão e ausentes no arquivo).
+
+O hash é o MD5 (hex) das colunas de conteúdo convertidas em texto de forma
+canônica, calculado do mesmo jeito em Python (`hash_conteudo`) e no BigQuery
+(`expressao_hash_conteudo`), e fica gravado na coluna ROW_HASH. Os hashes de cada versão ficam em cache em
+data/hashes, validados por uma assinatura barata da versão (total de linhas e
+última atualização), para que reimportações seguidas não precisem buscá-los.
+"""
+
+import hashlib
+import json
+import logging
+
+import pandas as pd
+
+from .config import DATA_DIR
+
+logger = logging.getLogger(__name__)
+
+MODO_PADRAO = "padrao"
+MODO_DELTA = "delta"
+MODOS_IMPORTACAO = (MODO_PADRAO, MODO_DELTA)
+
+COLUNAS_CHAVE = ["N_CONTA", "N_CENTRO_CUSTO", "DATA", "VERSAO"]
+
+# Colunas comparadas (DATA_ATUALIZACAO fica de fora: muda a cada gravação)
+COLUNAS_CONTEUDO = ["DESCRICAO", "VALOR", "OPERACAO", "FILIAL", "RATEIO", "ORIGEM"]
+
+# Separador entre as colunas no texto canônico (caractere de controle US)
+SEPARADOR = "\x1f"
+
+CACHE_HASHES_DIR = DATA_DIR / "hashes"
+
+
+def _texto_coluna(serie, coluna):
+    if coluna == "VALOR":
+        return serie.astype(float).map(lambda valor: "" if pd.isna(valor) else f"{valor:.6f}")
+    return serie.fillna("").astype(str)
+
+
+def hash_conteudo(df):
+    """MD5 (hex) do conteúdo de cada linha, no mesmo formato de `expressao_hash_conteudo`."""
+    partes = [_texto_coluna(df[coluna], coluna) for coluna in COLUNAS_CONTEUDO]
+    texto = partes[0].str.cat(partes[1:], sep=SEPARADOR)
+    return pd.Series(
+        [hashlib.md5(linha.encode("utf-8")).hexdigest() for linha in texto],
+        index=df.index, dtype=object
+    )
+
+
+def expressao_hash_conteudo(alias=""):
+    """Expressão SQL (BigQuery) equivalente a `hash_conteudo`."""
+    prefixo = f"{alias}." if alias else ""
+    partes = [
+        f"COALESCE(FORMAT('%.6f', {prefixo}VALOR), '')" if coluna == "VALOR"
+        else f"COALESCE({prefixo}{coluna}, '')"
+        for coluna in COLUNAS_CONTEUDO
+    ]
+    separador = ", CODE_POINTS_TO_STRING([31]), "
+    return f"TO_HEX(MD5(CONCAT({separador.join(partes)})))"
+
+
+def com_hash(df):
+    """Retorna o lote com a coluna ROW_HASH, calculando-a se ainda não existir."""
+    if "ROW_HASH" in df.columns:
+        return df
+    return df.assign(ROW_HASH=hash_conteudo(df))
+
+
+def hash_registro(valores):
+    """ROW_HASH de um único registro (dicionário com as colunas de conteúdo)."""
+    return hash_conteudo(pd.DataFrame([{coluna: valores.get(coluna) for coluna in COLUNAS_CONTEUDO}])).iloc[0]
+
+
+def normalizar_chaves(df):
+    """Chaves como texto (DATA em AAAA-MM-DD), para comparar dados de origens diferentes."""
+    return pd.DataFrame({
+        "N_CONTA": df["N_CONTA"].astype(str).to_numpy(),
+        "N_CENTRO_CUSTO": df["N_CENTRO_CUSTO"].astype(str).to_numpy(),
+        "DATA": pd.to_datetime(df["DATA"]).dt.strftime("%Y-%m-%d").to_numpy(),
+        "VERSAO": df["VERSAO"].astype(str).to_numpy()
+    })
+
+
+def hashes_lote(df):
+    """Chaves normalizadas e HASH_CONTEUDO das linhas de um lote de importação."""
+    hashes = normalizar_chaves(df)
+    hashes["HASH_CONTEUDO"] = com_hash(df)["ROW_HASH"].to_numpy()
+    return hashes
+
+
+def calcular_delta(df, existentes):
+    """
+    Compara o lote com os hashes das linhas já gravadas nas mesmas versões.
+
+    Args:
+        df: Lote de importação (colunas de COLUNAS_REGISTRO)
+        existentes: Chaves normalizadas e HASH_CONTEUDO das linhas gravadas
+
+    Returns:
+        Tupla (linhas a enviar, chaves a excluir, contagens com INSERIDOS,
+        ATUALIZADOS, INALTERADOS e EXCLUIDOS)
+    """
+    atual = hashes_lote(df)
+    atual["_POSICAO"] = range(len(atual))
+    comparacao = atual.merge(
+        existentes[COLUNAS_CHAVE + ["HASH_CONTEUDO"]],
+        on=COLUNAS_CHAVE, how="outer", suffixes=("", "_GRAVADO"), indicator=True
+    )
+    inseridos = comparacao["_merge"] == "left_only"
+    em_ambos = comparacao["_merge"] == "both"
+    atualizados = em_ambos & (comparacao["HASH_CONTEUDO"] != comparacao["HASH_CONTEUDO_GRAVADO"])
+    excluidos = comparacao["_merge"] == "right_only"
+
+    posicoes = comparacao.loc[inseridos | atualizados, "_POSICAO"].astype(int).sort_values()
+    df_envio = df.iloc[posicoes.to_numpy()].reset_index(drop=True)
+
+    df_exclusoes = comparacao.loc[excluidos, COLUNAS_CHAVE].reset_index(drop=True)
+    df_exclusoes["DATA"] = pd.to_datetime(df_exclusoes["DATA"]).dt.date
+
+    contagens = {
+        "INSERIDOS": int(inseridos.sum()),
+        "ATUALIZADOS": int(atualizados.sum()),
+        "INALTERADOS": int((em_ambos & ~atualizados).sum()),
+        "EXCLUIDOS": int(excluidos.sum())
+    }
+    return df_envio, df_exclusoes, contagens
+
+
+def descrever_delta(contagens):
+    """Resumo das contagens para mensagens e metadados."""
+    return (
+        f"{contagens['INSERIDOS']} inseridos, {contagens['ATUALIZADOS']} atualizados, "
+        f"{contagens['INALTERADOS']} inalterados, {contagens['EXCLUIDOS']} excluídos"
+    )
+
+
+def _caminhos_cache(backend, versao):
+    nome = hashlib.sha1(f"{backend}|{versao}".encode("utf-8")).hexdigest()[:20]
+    return CACHE_HASHES_DIR / f"{nome}.parquet", CACHE_HASHES_DIR / f"{nome}.json"
+
+
+def ler_cache_hashes(backend, versao, assinatura):
+    """Retorna os hashes da versão em cache se a assinatura ainda for a mesma."""
+    caminho_dados, caminho_assinatura = _caminhos_cache(backend, versao)
+    try:
+        with open(caminho_assinatura, encoding="utf-8") as f:
+            if json.load(f).get("assinatura") != assinatura:
+                return None
+        return pd.read_parquet(caminho_dados)
+    except (OSError, ValueError):
+        return None
+
+
+def gravar_cache_hashes(backend, versao, assinatura, hashes):
+    """Grava os hashes da versão com a assinatura que os valida."""
+    caminho_dados, caminho_assinatura = _caminhos_cache(backend, versao)
+    try:
+        CACHE_HASHES_DIR.mkdir(parents=True, exist_ok=True)
+        hashes[COLUNAS_CHAVE + ["HASH_CONTEUDO"]].to_parquet(caminho_dados, index=False)
+        with open(caminho_assinatura, "w", encoding="utf-8") as f:
+            json.dump({"versao": versao, "assinatura": assinatura}, f)
+    except Exception as e:
+        logger.warning(f"Não foi possível gravar o cache de hashes da versão {versao}: {e}")
+
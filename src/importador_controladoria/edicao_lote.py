@@ -0,0 +1,128 @@
+"""
+Edição de vários registros da tabela ORCADO em uma única operação.
+
+A tela de registros acumula as edições e as envia juntas. Cada edição traz a
+chave original do registro, a DATA_ATUALIZACAO lida na tela e os valores
+originais e novos das colunas editáveis. O armazém aplica o lote de uma vez,
+com controle de concorrência otimista: uma edição só é aplicada se a linha
+ainda tiver a DATA_ATUALIZACAO lida; caso contrário ela volta como conflito,
+para que o usuário recarregue a linha antes de editar de novo.
+"""
+
+import pandas as pd
+
+from .delta_importacao import hash_registro
+
+COLUNAS_EDITAVEIS = [
+    "FILIAL", "N_CONTA", "N_CENTRO_CUSTO", "DESCRICAO", "VALOR", "OPERACAO", "RATEIO", "ORIGEM"
+]
+
+MAX_EDICOES_LOTE = 1000
+
+
+def _valor_coluna(coluna, valor):
+    if coluna == "VALOR":
+        return float(valor)
+    return "" if valor is None else str(valor)
+
+
+def _timestamp_utc(valor):
+    timestamp = pd.Timestamp(valor)
+    if pd.isna(timestamp):
+        raise ValueError("DATA_ATUALIZACAO não informada")
+    if timestamp.tzinfo is None:
+        timestamp = timestamp.tz_localize("UTC")
+    return timestamp.tz_convert("UTC").to_pydatetime()
+
+
+def descrever_alteracoes(originais, valores):
+    """Lista legível das colunas alteradas ("COLUNA: 'antes' -> 'depois'")."""
+    alteracoes = []
+    for coluna in COLUNAS_EDITAVEIS:
+        antes, depois = originais.get(coluna), valores.get(coluna)
+        if coluna == "VALOR":
+            if float(antes) != float(depois):
+                alteracoes.append(f"VALOR: {antes} -> {depois}")
+        elif antes != depois:
+            alteracoes.append(f"{coluna}: '{antes}' -> '{depois}'")
+    return alteracoes
+
+
+def descrever_chave(chave):
+    return f"{chave['N_CONTA']}/{chave['N_CENTRO_CUSTO']}/{chave['DATA']}/{chave['VERSAO']}"
+
+
+def ler_edicoes(dados):
+    """
+    Valida o corpo da requisição de edição em lote.
+
+    Args:
+        dados: Dicionário com "edicoes": lista de {"chave", "data_atualizacao",
+            "originais", "valores"}
+
+    Returns:
+        Tupla (edições com alterações, quantidade de edições sem alteração).
+        Cada edição tem ID_EDICAO, chave, DATA_ATUALIZACAO_LIDA, valores,
+        ROW_HASH e DETALHES; edições repetidas da mesma chave ficam com a última.
+
+    Raises:
+        ValueError: Se o lote estiver vazio, for grande demais ou tiver
+            edições incompletas
+    """
+    edicoes = (dados or {}).get("edicoes")
+    if not isinstance(edicoes, list) or not edicoes:
+        raise ValueError("Nenhuma edição informada")
+    if len(edicoes) > MAX_EDICOES_LOTE:
+        raise ValueError(f"O lote tem {len(edicoes)} edições; o máximo é {MAX_EDICOES_LOTE}")
+
+    por_chave = {}
+    sem_alteracao = 0
+    for posicao, edicao in enumerate(edicoes, start=1):
+        try:
+            chave = {
+                "VERSAO": str(edicao["chave"]["VERSAO"]),
+                "DATA": pd.Timestamp(edicao["chave"]["DATA"]).date(),
+                "N_CONTA": str(edicao["chave"]["N_CONTA"]),
+                "N_CENTRO_CUSTO": str(edicao["chave"]["N_CENTRO_CUSTO"])
+            }
+            lida = _timestamp_utc(edicao["data_atualizacao"])
+            originais = {coluna: _valor_coluna(coluna, edicao["originais"][coluna]) for coluna in COLUNAS_EDITAVEIS}
+            valores = {coluna: _valor_coluna(coluna, edicao["valores"][coluna]) for coluna in COLUNAS_EDITAVEIS}
+        except (KeyError, TypeError, ValueError) as e:
+            raise ValueError(f"Edição {posicao} inválida: {e}")
+
+        alteracoes = descrever_alteracoes(originais, valores)
+        if not alteracoes:
+            sem_alteracao += 1
+            continue
+        por_chave[tuple(chave.values())] = {
+            "chave": chave,
+            "DATA_ATUALIZACAO_LIDA": lida,
+            "valores": valores,
+            "ROW_HASH": hash_registro(valores),
+            "DETALHES": f"{descrever_chave(chave)}: {', '.join(alteracoes)}"
+        }
+
+    resultado = []
+    for id_edicao, edicao in enumerate(por_chave.values()):
+        edicao["ID_EDICAO"] = id_edicao
+        resultado.append(edicao)
+    return resultado, sem_alteracao
+
+
+def quadro_edicoes(edicoes):
+    """DataFrame das edições no formato da staging (SCHEMA_EDICAO)."""
+    return pd.DataFrame([
+        {
+            "ID_EDICAO": edicao["ID_EDICAO"],
+            "VERSAO": edicao["chave"]["VERSAO"],
+            "DATA": edicao["chave"]["DATA"],
+            "N_CONTA_ORIGINAL": edicao["chave"]["N_CONTA"],
+            "N_CENTRO_CUSTO_ORIGINAL": edicao["chave"]["N_CENTRO_CUSTO"],
+            "DATA_ATUALIZACAO_LIDA": edicao["DATA_ATUALIZACAO_LIDA"],
+            **edicao["valores"],
+            "ROW_HASH": edicao["ROW_HASH"],
+            "DETALHES": edicao["DETALHES"]
+        }
+        for edicao in edicoes
+    ])
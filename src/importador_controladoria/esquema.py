@@ -0,0 +1,140 @@
+"""
+Esquema e layout físico da tabela ORCADO no BigQuery.
+
+A tabela é particionada por mês da coluna DATA e clusterizada por VERSAO,
+FILIAL e N_CONTA. As consultas de importação, listagem e deleção filtram por
+essas colunas diretamente, de modo que o BigQuery lê apenas as partições e
+blocos relevantes em vez da tabela inteira.
+"""
+
+import logging
+import threading
+
+from google.api_core.exceptions import NotFound
+from google.cloud import bigquery
+
+logger = logging.getLogger(__name__)
+
+SCHEMA_ORCADO = [
+    bigquery.SchemaField("N_CONTA", "STRING", mode="REQUIRED"),
+    bigquery.SchemaField("N_CENTRO_CUSTO", "STRING", mode="REQUIRED"),
+    bigquery.SchemaField("DESCRICAO", "STRING", mode="REQUIRED"),
+    bigquery.SchemaField("VALOR", "FLOAT64", mode="REQUIRED"),
+    bigquery.SchemaField("DATA", "DATE", mode="REQUIRED"),
+    bigquery.SchemaField("VERSAO", "STRING", mode="REQUIRED"),
+    bigquery.SchemaField("OPERACAO", "STRING", mode="NULLABLE"),
+    bigquery.SchemaField("DATA_ATUALIZACAO", "TIMESTAMP", mode="REQUIRED"),
+    bigquery.SchemaField("FILIAL", "STRING", mode="REQUIRED"),
+    bigquery.SchemaField("RATEIO", "STRING", mode="NULLABLE"),
+    bigquery.SchemaField("ORIGEM", "STRING", mode="NULLABLE"),
+    # Hash do conteúdo da linha (ver delta_importacao.hash_conteudo); o MERGE só
+    # reescreve as linhas cujo hash mudou
+    bigquery.SchemaField("ROW_HASH", "STRING", mode="NULLABLE")
+]
+
+COLUNA_PARTICAO = "DATA"
+COLUNAS_CLUSTER = ["VERSAO", "FILIAL", "N_CONTA"]
+
+COLUNAS_ORCADO = [campo.name for campo in SCHEMA_ORCADO]
+
+
+def particionamento_orcado():
+    """Particionamento mensal pela coluna DATA."""
+    return bigquery.TimePartitioning(
+        type_=bigquery.TimePartitioningType.MONTH,
+        field=COLUNA_PARTICAO
+    )
+
+
+def nova_tabela_orcado(table_ref):
+    """Monta a definição da tabela ORCADO com schema, partição e cluster."""
+    tabela = bigquery.Table(table_ref, schema=SCHEMA_ORCADO)
+    tabela.time_partitioning = particionamento_orcado()
+    tabela.clustering_fields = COLUNAS_CLUSTER
+    return tabela
+
+
+def criar_tabela_orcado(client, table_ref):
+    """Cria a tabela ORCADO já particionada e clusterizada."""
+    tabela = client.create_table(nova_tabela_orcado(table_ref))
+    logger.info(
+        f"Tabela {tabela.table_id} criada com partição mensal em {COLUNA_PARTICAO} "
+        f"e cluster em {COLUNAS_CLUSTER}"
+    )
+    return tabela
+
+
+def layout_otimizado(tabela):
+    """Indica se uma tabela existente já usa o layout particionado/clusterizado."""
+    particao = tabela.time_partitioning
+    return (
+        particao is not None
+        and particao.field == COLUNA_PARTICAO
+        and list(tabela.clustering_fields or []) == COLUNAS_CLUSTER
+    )
+
+
+SCHEMA_METADATA = [
+    bigquery.SchemaField("DATA_IMPORTACAO", "TIMESTAMP", mode="REQUIRED"),
+    bigquery.SchemaField("USUARIO", "STRING", mode="REQUIRED"),
+    bigquery.SchemaField("SISTEMA_OPERACIONAL", "STRING", mode="REQUIRED"),
+    bigquery.SchemaField("VERSAO_SISTEMA", "STRING", mode="REQUIRED"),
+    bigquery.SchemaField("ARQUIVO_ORIGEM", "STRING", mode="REQUIRED"),
+    bigquery.SchemaField("TOTAL_REGISTROS", "INTEGER", mode="REQUIRED"),
+    bigquery.SchemaField("STATUS", "STRING", mode="REQUIRED"),
+    bigquery.SchemaField("DETALHES", "STRING", mode="REQUIRED")
+]
+
+# Tabelas já verificadas neste processo (evita get_table/update_table a cada importação)
+_tabelas_verificadas = set()
+_lock_verificacao = threading.Lock()
+
+
+def garantir_tabela_orcado(client, table_ref):
+    """
+    Garante que a tabela ORCADO exista e tenha as colunas opcionais.
+
+    A verificação é feita uma vez por processo; as importações seguintes não
+    repetem as chamadas de metadados.
+    """
+    chave = str(table_ref)
+    with _lock_verificacao:
+        if chave in _tabelas_verificadas:
+            return
+        try:
+            tabela = client.get_table(table_ref)
+        except NotFound:
+            criar_tabela_orcado(client, table_ref)
+        else:
+            existentes = {campo.name for campo in tabela.schema}
+            faltantes = [
+                bigquery.SchemaField(nome, "STRING", mode="NULLABLE")
+                for nome in ("RATEIO", "ORIGEM", "ROW_HASH")
+                if nome not in existentes
+            ]
+            if faltantes:
+                logger.info(f"Adicionando colunas faltantes: {[f.name for f in faltantes]}")
+                tabela.schema = tabela.schema + faltantes
+                tabela = client.update_table(tabela, ["schema"])
+            if not layout_otimizado(tabela):
+                logger.warning(
+                    f"Tabela {tabela.table_id} não está particionada/clusterizada; "
+                    "execute 'python -m importador_controladoria.migrar_orcado' para migrar"
+                )
+        _tabelas_verificadas.add(chave)
+
+
+def garantir_tabela_metadata(client, table_ref):
+    """Garante que a tabela de metadados exista (uma verificação por processo)."""
+    chave = str(table_ref)
+    with _lock_verificacao:
+        if chave in _tabelas_verificadas:
+            return
+        client.create_table(bigquery.Table(table_ref, schema=SCHEMA_METADATA), exists_ok=True)
+        _tabelas_verificadas.add(chave)
+
+
+def esquecer_tabelas_verificadas():
+    """Força nova verificação das tabelas (ex.: após uma migração)."""
+    with _lock_verificacao:
+        _tabelas_verificadas.clear()
@@ -0,0 +1,132 @@
+"""
+Estado compartilhado entre os processos do servidor em modo produção.
+
+No modo desktop a aplicação roda em um único processo e caches, status e
+travas ficam em memória. No modo produção o servidor WSGI atende as
+requisições com vários processos, então o que precisa ser visto por todos
+fica em arquivos locais em DATA_DIR:
+
+- a chave secreta do Flask, gerada uma vez e reutilizada, para que a sessão
+  (e as mensagens flash) criada por um processo seja aceita pelos outros e
+  sobreviva a reinícios;
+- contadores de geração em SQLite: uma escrita em um processo avança o
+  contador e os caches dos demais processos descartam suas entradas na
+  próxima leitura.
+
+Arquivos gravados por processo (ex.: o spool da auditoria) levam o PID no
+nome; `processo_ativo` indica se o dono de um deles ainda está em execução.
+"""
+
+import logging
+import os
+import secrets
+import sqlite3
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+
+def processo_ativo(pid):
+    """Indica se o processo `pid` ainda está em execução."""
+    if pid == os.getpid():
+        return True
+    if os.name == "nt":
+        # No Windows o servidor roda em um único processo: os demais são de execuções anteriores
+        return False
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    except OSError:
+        return False
+    return True
+
+
+def carregar_chave_secreta(caminho):
+    """
+    Chave secreta do Flask: SECRET_KEY do ambiente ou a gravada em `caminho`.
+
+    Na primeira execução a chave é gerada e gravada; as seguintes (e os outros
+    processos do servidor) leem a mesma chave.
+    """
+    chave = os.getenv("SECRET_KEY")
+    if chave:
+        return chave
+    try:
+        return caminho.read_text(encoding="utf-8").strip()
+    except FileNotFoundError:
+        pass
+
+    caminho.parent.mkdir(parents=True, exist_ok=True)
+    chave = secrets.token_hex(32)
+    try:
+        # O_EXCL: se outro processo gravou a chave primeiro, usa a dele
+        descritor = os.open(caminho, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+    except FileExistsError:
+        return caminho.read_text(encoding="utf-8").strip()
+    with os.fdopen(descritor, "w", encoding="utf-8") as arquivo:
+        arquivo.write(chave)
+    logger.info(f"Chave secreta gerada em {caminho}")
+    return chave
+
+
+class GeracaoCompartilhada:
+    """
+    Contador de invalidação gravado em SQLite e lido por todos os processos.
+
+    A leitura é reaproveitada por `intervalo_leitura_segundos`, de modo que
+    uma invalidação feita em outro processo é percebida em até esse tempo
+    (no próprio processo, `avancar` atualiza o valor na hora).
+    """
+
+    def __init__(self, caminho, nome, intervalo_leitura_segundos=0.5):
+        self.caminho = caminho
+        self.nome = nome
+        self.intervalo_leitura_segundos = intervalo_leitura_segundos
+        self._lock = threading.Lock()
+        self._valor = None
+        self._lido_em = 0.0
+        self._preparado = False
+
+    def _conexao(self):
+        if not self._preparado:
+            self.caminho.parent.mkdir(parents=True, exist_ok=True)
+        conexao = sqlite3.connect(self.caminho, timeout=30)
+        if not self._preparado:
+            conexao.execute("CREATE TABLE IF NOT EXISTS GERACOES (NOME TEXT PRIMARY KEY, VALOR INTEGER NOT NULL)")
+            conexao.execute("INSERT OR IGNORE INTO GERACOES (NOME, VALOR) VALUES (?, 0)", (self.nome,))
+            conexao.commit()
+            self._preparado = True
+        return conexao
+
+    def valor(self):
+        with self._lock:
+            if self._valor is not None and time.monotonic() - self._lido_em < self.intervalo_leitura_segundos:
+                return self._valor
+            conexao = self._conexao()
+            try:
+                self._valor = conexao.execute(
+                    "SELECT VALOR FROM GERACOES WHERE NOME = ?", (self.nome,)
+                ).fetchone()[0]
+            finally:
+                conexao.close()
+            self._lido_em = time.monotonic()
+            return self._valor
+
+    def avancar(self):
+        """Avança o contador para todos os processos e retorna o novo valor."""
+        with self._lock:
+            conexao = self._conexao()
+            try:
+                conexao.execute("UPDATE GERACOES SET VALOR = VALOR + 1 WHERE NOME = ?", (self.nome,))
+                self._valor = conexao.execute(
+                    "SELECT VALOR FROM GERACOES WHERE NOME = ?", (self.nome,)
+                ).fetchone()[0]
+                conexao.commit()
+            finally:
+                conexao.close()
+            self._lido_em = time.monotonic()
+            return self._valor
@@ -0,0 +1,249 @@
+"""
+Exportação dos registros da tabela ORCADO em XLSX, CSV ou Parquet.
+
+Os registros chegam em lotes Arrow (`ArmazemOrcado.selecionar_lotes`) e cada
+lote é gravado e descartado antes do próximo, então o consumo de memória
+depende do tamanho do lote e não do total exportado:
+
+- XLSX: xlsxwriter em modo de memória constante. As conversões de tipo são
+  feitas por coluna (Arrow compute) e os valores vão para a planilha como
+  números com formato de moeda/data, e não como texto;
+- CSV e Parquet: escritores incrementais do pyarrow, com as colunas da tabela
+  ORCADO e tipos fixos (ESQUEMA_EXPORTACAO).
+"""
+
+import logging
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.csv as pa_csv
+import pyarrow.parquet as pq
+import xlsxwriter
+
+logger = logging.getLogger(__name__)
+
+
+class ExportacaoCancelada(Exception):
+    """Exportação interrompida a pedido do usuário."""
+
+# Colunas exportadas, na ordem da planilha, com o rótulo e a largura da coluna.
+# No modo de memória constante a largura precisa ser definida antes das linhas.
+COLUNAS_EXPORTACAO = [
+    ("N_CONTA", "Conta", 14),
+    ("N_CENTRO_CUSTO", "Centro de Custo", 18),
+    ("DESCRICAO", "Descrição", 40),
+    ("VALOR", "Valor", 18),
+    ("DATA", "Data", 12),
+    ("VERSAO", "Versão", 14),
+    ("OPERACAO", "Operação", 18),
+    ("DATA_ATUALIZACAO", "Data de Atualização", 21),
+    ("FILIAL", "Filial", 8),
+    ("RATEIO", "Rateio", 8),
+    ("ORIGEM", "Origem", 14)
+]
+
+# Tipos das colunas nas exportações em CSV e Parquet
+ESQUEMA_EXPORTACAO = pa.schema([
+    (nome, {
+        "VALOR": pa.float64(),
+        "DATA": pa.date32(),
+        "DATA_ATUALIZACAO": pa.timestamp("us", tz="UTC")
+    }.get(nome, pa.string()))
+    for nome, _, _ in COLUNAS_EXPORTACAO
+])
+
+# Limite de linhas de uma planilha do Excel (incluindo o cabeçalho)
+MAX_LINHAS_PLANILHA = 1_048_576
+
+# Dia 0 das datas seriais do Excel (1899-12-30) em relação a 1970-01-01
+_EPOCA_EXCEL = 25569
+
+_DIVISOR_DIA = {"s": 86400, "ms": 86400e3, "us": 86400e6, "ns": 86400e9}
+
+
+def _serial_data(coluna):
+    """Converte uma coluna de datas em números seriais do Excel."""
+    dias = pc.cast(pc.cast(coluna, pa.date32()), pa.int32())
+    return pc.add(pc.cast(dias, pa.float64()), _EPOCA_EXCEL)
+
+
+def _serial_timestamp(coluna):
+    """Converte uma coluna de timestamps (UTC) em números seriais do Excel."""
+    unidade = coluna.type.unit
+    valores = pc.cast(pc.cast(coluna, pa.int64()), pa.float64())
+    return pc.add(pc.divide(valores, _DIVISOR_DIA[unidade]), _EPOCA_EXCEL)
+
+
+def _converter_coluna(coluna, nome):
+    """Converte uma coluna do lote para o tipo gravado na planilha."""
+    if nome == "VALOR":
+        return pc.cast(coluna, pa.float64())
+    if nome == "DATA":
+        return _serial_data(coluna)
+    if nome == "DATA_ATUALIZACAO" and pa.types.is_timestamp(coluna.type):
+        return _serial_timestamp(coluna)
+    return pc.cast(coluna, pa.string())
+
+
+class _Planilhas:
+    """Abre uma nova planilha quando a atual atinge o limite de linhas do Excel."""
+
+    def __init__(self, workbook, nome, colunas, formatos):
+        self.workbook = workbook
+        self.nome = nome
+        self.colunas = colunas
+        self.formatos = formatos
+        self.cabecalho = workbook.add_format({"bold": True})
+        self.quantidade = 0
+        self.worksheet = None
+        self.linha = MAX_LINHAS_PLANILHA
+
+    def proxima_linha(self):
+        if self.linha >= MAX_LINHAS_PLANILHA:
+            self.quantidade += 1
+            nome = self.nome if self.quantidade == 1 else f"{self.nome} ({self.quantidade})"
+            self.worksheet = self.workbook.add_worksheet(nome)
+            for indice, (_, rotulo, largura) in enumerate(self.colunas):
+                self.worksheet.set_column(indice, indice, largura, self.formatos[indice])
+                self.worksheet.write_string(0, indice, rotulo, self.cabecalho)
+            self.worksheet.freeze_panes(1, 0)
+            self.linha = 1
+        linha = self.linha
+        self.linha += 1
+        return linha
+
+
+def escrever_excel(lotes, caminho, nome_planilha="Registros", ao_progredir=None):
+    """
+    Grava os lotes Arrow em um arquivo .xlsx com memória constante.
+
+    Args:
+        lotes: Iterável de tabelas ou RecordBatches Arrow com as colunas de COLUNAS_EXPORTACAO
+        caminho: Arquivo de destino
+        nome_planilha: Nome da planilha (as seguintes recebem um sufixo numérico)
+        ao_progredir: Função opcional chamada com o total de linhas gravadas após cada lote
+
+    Returns:
+        Número de linhas gravadas
+    """
+    inicio = time.perf_counter()
+    workbook = xlsxwriter.Workbook(str(caminho), {"constant_memory": True})
+    try:
+        formatos_tipo = {
+            "VALOR": workbook.add_format({"num_format": '"R$" #,##0.00'}),
+            "DATA": workbook.add_format({"num_format": "dd/mm/yyyy"}),
+            "DATA_ATUALIZACAO": workbook.add_format({"num_format": "dd/mm/yyyy hh:mm:ss"})
+        }
+        formatos = [formatos_tipo.get(nome) for nome, _, _ in COLUNAS_EXPORTACAO]
+        planilhas = _Planilhas(workbook, nome_planilha, COLUNAS_EXPORTACAO, formatos)
+
+        total = 0
+        for lote in lotes:
+            if lote.num_rows == 0:
+                continue
+            nomes = set(lote.schema.names)
+            colunas = []
+            for nome, _, _ in COLUNAS_EXPORTACAO:
+                if nome in nomes:
+                    convertida = _converter_coluna(lote.column(nome), nome)
+                    numerica = pa.types.is_floating(convertida.type)
+                    colunas.append((convertida.to_pylist(), numerica))
+                else:
+                    colunas.append(([None] * lote.num_rows, False))
+
+            for valores in zip(*(valores for valores, _ in colunas)):
+                linha = planilhas.proxima_linha()
+                worksheet = planilhas.worksheet
+                for indice, valor in enumerate(valores):
+                    if valor is None:
+                        continue
+                    if colunas[indice][1]:
+                        worksheet.write_number(linha, indice, valor, formatos[indice])
+                    else:
+                        worksheet.write_string(linha, indice, valor)
+            total += lote.num_rows
+            if ao_progredir:
+                ao_progredir(total)
+
+        if planilhas.worksheet is None:
+            # Sem registros: planilha apenas com o cabeçalho
+            planilhas.proxima_linha()
+    finally:
+        workbook.close()
+
+    logger.info(f"[EXPORTACAO] {total} linhas gravadas em Excel em {(time.perf_counter() - inicio) * 1000:.0f} ms")
+    return total
+
+
+def normalizar_lote(lote):
+    """Converte um lote para ESQUEMA_EXPORTACAO (colunas ausentes ficam nulas)."""
+    nomes = set(lote.schema.names)
+    colunas = [
+        pc.cast(lote.column(campo.name), campo.type) if campo.name in nomes
+        else pa.nulls(lote.num_rows, campo.type)
+        for campo in ESQUEMA_EXPORTACAO
+    ]
+    return pa.Table.from_arrays(colunas, schema=ESQUEMA_EXPORTACAO)
+
+
+def escrever_csv(lotes, caminho, ao_progredir=None):
+    """Grava os lotes em CSV (separador ';', UTF-8). Retorna o número de linhas gravadas."""
+    total = 0
+    opcoes = pa_csv.WriteOptions(delimiter=";")
+    with pa_csv.CSVWriter(str(caminho), ESQUEMA_EXPORTACAO, write_options=opcoes) as writer:
+        for lote in lotes:
+            if lote.num_rows == 0:
+                continue
+            writer.write_table(normalizar_lote(lote))
+            total += lote.num_rows
+            if ao_progredir:
+                ao_progredir(total)
+    return total
+
+
+def escrever_parquet(lotes, caminho, ao_progredir=None):
+    """Grava os lotes em Parquet, um grupo de linhas por lote. Retorna o número de linhas gravadas."""
+    total = 0
+    with pq.ParquetWriter(str(caminho), ESQUEMA_EXPORTACAO) as writer:
+        for lote in lotes:
+            if lote.num_rows == 0:
+                continue
+            writer.write_table(normalizar_lote(lote))
+            total += lote.num_rows
+            if ao_progredir:
+                ao_progredir(total)
+    return total
+
+
+# Formato -> (extensão, tipo MIME, função de gravação)
+FORMATOS_EXPORTACAO = {
+    "xlsx": (".xlsx", "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet", escrever_excel),
+    "csv": (".csv", "text/csv", escrever_csv),
+    "parquet": (".parquet", "application/vnd.apache.parquet", escrever_parquet)
+}
+FORMATO_PADRAO = "xlsx"
+
+
+def exportar(formato, lotes, caminho, ao_progredir=None):
+    """Grava os lotes no formato informado (chave de FORMATOS_EXPORTACAO)."""
+    _, _, escrever = FORMATOS_EXPORTACAO[formato]
+    return escrever(lotes, caminho, ao_progredir=ao_progredir)
+
+
+def remover_exportacoes_expiradas(diretorio, retencao_horas):
+    """Remove do diretório de exportações os arquivos mais antigos que a retenção."""
+    limite = (datetime.now() - timedelta(hours=retencao_horas)).timestamp()
+    removidos = 0
+    for arquivo in Path(diretorio).glob("*"):
+        try:
+            if arquivo.is_file() and arquivo.stat().st_mtime < limite:
+                arquivo.unlink()
+                removidos += 1
+        except OSError as e:
+            logger.warning(f"Não foi possível remover a exportação expirada {arquivo}: {e}")
+    if removidos:
+        logger.info(f"{removidos} exportações expiradas removidas de {diretorio}")
+    return removidos
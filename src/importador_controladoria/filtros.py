@@ -0,0 +1,120 @@
+"""
+Compilação dos filtros da tela de registros em SQL parametrizado.
+
+Todas as rotas que filtram a tabela ORCADO (listagem, contagem, exportação e
+deleção) usam o mesmo compilador. O texto SQL gerado depende apenas de quais
+filtros estão preenchidos, nunca dos valores, e os predicados comparam as
+colunas diretamente (sem CAST), o que permite a poda de partições/clusters e
+o reaproveitamento do cache de resultados do BigQuery.
+"""
+
+from datetime import datetime
+
+from google.cloud import bigquery
+
+CAMPOS_FILTRO = (
+    'n_conta',
+    'n_centro_custo',
+    'data_inicio',
+    'data_fim',
+    'versao',
+    'operacao',
+    'filial',
+    'rateio',
+    'origem'
+)
+
+# Ordem fixa dos predicados: (campo, expressão SQL, tipo do parâmetro)
+_PREDICADOS = (
+    ('versao', "VERSAO = @versao", "STRING"),
+    ('filial', "FILIAL = @filial", "STRING"),
+    ('n_conta', "N_CONTA = @n_conta", "STRING"),
+    ('n_centro_custo', "N_CENTRO_CUSTO = @n_centro_custo", "STRING"),
+    ('data_inicio', "DATA >= @data_inicio", "DATE"),
+    ('data_fim', "DATA <= @data_fim", "DATE"),
+    ('operacao', "OPERACAO = @operacao", "STRING"),
+    ('rateio', "RATEIO = @rateio", "STRING"),
+    ('origem', "ORIGEM LIKE CONCAT('%', @origem, '%')", "STRING")
+)
+
+
+def ler_filtros(dados):
+    """
+    Lê os filtros de `request.args` ou `request.form`.
+
+    Returns:
+        Dicionário com todos os campos de filtro, vazios quando ausentes
+    """
+    return {campo: (dados.get(campo, '') or '').strip() for campo in CAMPOS_FILTRO}
+
+
+def possui_filtros(filtros):
+    """Indica se pelo menos um filtro foi preenchido."""
+    return any(filtros.get(campo) for campo in CAMPOS_FILTRO)
+
+
+def _converter_valor(valor, tipo):
+    """Converte o valor do formulário para o tipo do parâmetro."""
+    if tipo == "DATE":
+        try:
+            return datetime.strptime(valor, '%Y-%m-%d').date()
+        except ValueError:
+            raise ValueError(f"Data de filtro inválida: {valor}. Use o formato YYYY-MM-DD")
+    return valor
+
+
+def predicados_filtros(filtros):
+    """
+    Lista os predicados dos filtros preenchidos, na ordem fixa.
+
+    Returns:
+        Lista de tuplas (nome do parâmetro, expressão SQL, tipo, valor convertido)
+
+    Raises:
+        ValueError: Se uma data de filtro estiver em formato inválido
+    """
+    predicados = []
+    for campo, expressao, tipo in _PREDICADOS:
+        valor = filtros.get(campo)
+        if not valor:
+            continue
+        predicados.append((campo, expressao, tipo, _converter_valor(valor, tipo)))
+    return predicados
+
+
+def montar_where(condicoes):
+    """Junta as condições em uma cláusula WHERE (WHERE TRUE se não houver nenhuma)."""
+    if not condicoes:
+        return "WHERE TRUE"
+    return "WHERE " + "\n  AND ".join(condicoes)
+
+
+def compilar_filtros(filtros):
+    """
+    Compila os filtros em uma cláusula WHERE e seus parâmetros.
+
+    Args:
+        filtros: Dicionário retornado por `ler_filtros`
+
+    Returns:
+        Tupla (cláusula WHERE, lista de parâmetros do BigQuery). A cláusula é
+        sempre iniciada por WHERE, de modo que outros predicados podem ser
+        acrescentados com AND.
+
+    Raises:
+        ValueError: Se uma data de filtro estiver em formato inválido
+    """
+    predicados = predicados_filtros(filtros)
+    parametros = [bigquery.ScalarQueryParameter(campo, tipo, valor) for campo, _, tipo, valor in predicados]
+    return montar_where([expressao for _, expressao, _, _ in predicados]), parametros
+
+
+def descrever_filtros(filtros):
+    """Texto legível dos filtros aplicados, usado nos metadados."""
+    return (
+        f"Filial={filtros.get('filial', '')}, Conta={filtros.get('n_conta', '')}, "
+        f"Centro Custo={filtros.get('n_centro_custo', '')}, Data Início={filtros.get('data_inicio', '')}, "
+        f"Data Fim={filtros.get('data_fim', '')}, Versão={filtros.get('versao', '')}, "
+        f"Operação={filtros.get('operacao', '')}, Rateio={filtros.get('rateio', '')}, "
+        f"Origem={filtros.get('origem', '')}"
+    )
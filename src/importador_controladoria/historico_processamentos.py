@@ -0,0 +1,408 @@
+"""
+Status dos processamentos e exportações, em memória e em disco.
+
+Os status ficam em duas camadas:
+
+- memória: os dicionários de status usados pelos processamentos em
+  andamento (alterados no lugar) e os dos concluídos acessados recentemente.
+  Os concluídos saem da memória após `ttl_memoria_segundos` sem acesso ou,
+  do menos recente para o mais recente, quando a memória passa de
+  `max_memoria` status. Os em andamento nunca são removidos;
+- disco: um SQLite com o status de cada processamento, gravado ao iniciar e
+  ao concluir. Após um reinício, o status dos concluídos continua disponível e
+  os que estavam em andamento são marcados como interrompidos.
+
+No modo produção (`compartilhado`), o servidor roda vários processos e a
+requisição de status pode chegar a um processo diferente do que executa o
+processamento. O status dos processamentos locais em andamento é então
+gravado em disco a cada segundo, quando muda, e o dos processamentos de
+outros processos é sempre lido do disco enquanto não terminam. Ao iniciar, só
+são marcados como interrompidos os processamentos cujo processo não existe
+mais.
+
+Cada processamento registra a função que o cancela (`registrar_cancelamento`).
+`cancelar(id)` a chama se o processamento roda neste processo; no modo
+compartilhado, se ele roda em outro processo, o pedido fica gravado em disco
+e o processo que o executa o atende no próximo ciclo de sincronização.
+
+A lista de erros fica em uma coluna separada. Após `retencao_erros_dias`, a
+lista é apagada e o resumo do processamento (mensagem, contagens, etapas) é
+mantido; após `retencao_dias`, o processamento sai do histórico.
+
+O repositório se comporta como o dicionário `processamentos` que substitui:
+`processamentos[id] = status`, `processamentos.get(id)`, `id in processamentos`.
+"""
+
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+
+from .config import HISTORICO_CONFIG, SERVIDOR_CONFIG
+from .estado_compartilhado import processo_ativo
+
+logger = logging.getLogger(__name__)
+
+_DDL = """
+CREATE TABLE IF NOT EXISTS PROCESSAMENTOS (
+    ID TEXT PRIMARY KEY,
+    PROCESSO INTEGER NOT NULL,
+    TIPO TEXT NOT NULL,
+    DESCRICAO TEXT NOT NULL,
+    CRIADO_EM TEXT NOT NULL,
+    CONCLUIDO_EM TEXT,
+    CONCLUIDO INTEGER NOT NULL,
+    SUCESSO INTEGER NOT NULL,
+    MENSAGEM TEXT NOT NULL,
+    TOTAL_ERROS INTEGER NOT NULL,
+    STATUS TEXT NOT NULL,
+    ERROS TEXT,
+    CANCELAMENTO_SOLICITADO INTEGER NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS IX_PROCESSAMENTOS_CRIADO_EM ON PROCESSAMENTOS (CRIADO_EM);
+"""
+
+# Intervalo mínimo entre limpezas do histórico em disco
+_INTERVALO_LIMPEZA_SEGUNDOS = 3600
+
+# Intervalo de gravação dos status em andamento no modo compartilhado
+_INTERVALO_SINCRONIZACAO_SEGUNDOS = 1.0
+
+
+def _agora():
+    return datetime.now().isoformat(timespec="seconds")
+
+
+def _tipo(status):
+    return status.get("tipo", "importacao")
+
+
+def _descricao(status):
+    if _tipo(status) == "exportacao":
+        return f"{str(status.get('formato', '')).upper()}: {status.get('filtros', '')}"
+    return str(status.get("arquivo", "")).replace("\\", "/").rsplit("/", 1)[-1]
+
+
+class RepositorioProcessamentos:
+    """Status dos processamentos com camada em memória (LRU + TTL) e camada em SQLite."""
+
+    def __init__(self, caminho, max_memoria, ttl_memoria_segundos, retencao_erros_dias, retencao_dias,
+                 compartilhado=False):
+        self.caminho = caminho
+        self.compartilhado = compartilhado
+        self.max_memoria = max_memoria
+        self.ttl_memoria_segundos = ttl_memoria_segundos
+        self.retencao_erros_dias = retencao_erros_dias
+        self.retencao_dias = retencao_dias
+        self._lock = threading.RLock()
+        # ID -> [status, último acesso (monotonic)], do menos para o mais recente
+        self._memoria = OrderedDict()
+        # Processamentos executados neste processo -> último status gravado (modo compartilhado)
+        self._locais = {}
+        # Processamentos em andamento neste processo -> função que os cancela
+        self._cancelamentos = {}
+        self._sincronizacao = None
+        self._preparado = False
+        self._ultima_limpeza = None
+
+    @contextmanager
+    def _conexao(self):
+        conexao = sqlite3.connect(self.caminho, timeout=30)
+        conexao.row_factory = sqlite3.Row
+        try:
+            yield conexao
+        finally:
+            conexao.close()
+
+    def _preparar(self):
+        """Cria o banco e marca como interrompidos os processamentos de uma execução anterior."""
+        if self._preparado:
+            return
+        self.caminho.parent.mkdir(parents=True, exist_ok=True)
+        with self._conexao() as conexao:
+            conexao.executescript(_DDL)
+            interrompidos = [
+                (_agora(), linha["ID"])
+                for linha in conexao.execute("SELECT ID, PROCESSO FROM PROCESSAMENTOS WHERE CONCLUIDO = 0")
+                if not processo_ativo(linha["PROCESSO"])
+            ]
+            conexao.executemany(
+                "UPDATE PROCESSAMENTOS SET CONCLUIDO = 1, SUCESSO = 0, CONCLUIDO_EM = ?, "
+                "MENSAGEM = 'Interrompido: a aplicação foi encerrada durante o processamento' "
+                "WHERE ID = ?",
+                interrompidos
+            )
+            conexao.commit()
+        if interrompidos:
+            logger.warning(f"{len(interrompidos)} processamentos de uma execução anterior marcados como interrompidos")
+        self._preparado = True
+
+    def _gravar(self, processamento_id, status):
+        erros = status.get("erros") or []
+        resumo = {campo: valor for campo, valor in status.items() if campo != "erros"}
+        with self._conexao() as conexao:
+            conexao.execute(
+                """
+                INSERT INTO PROCESSAMENTOS
+                    (ID, PROCESSO, TIPO, DESCRICAO, CRIADO_EM, CONCLUIDO_EM, CONCLUIDO, SUCESSO, MENSAGEM,
+                     TOTAL_ERROS, STATUS, ERROS)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                ON CONFLICT (ID) DO UPDATE SET
+                    CONCLUIDO_EM = excluded.CONCLUIDO_EM,
+                    CONCLUIDO = excluded.CONCLUIDO,
+                    SUCESSO = excluded.SUCESSO,
+                    MENSAGEM = excluded.MENSAGEM,
+                    TOTAL_ERROS = excluded.TOTAL_ERROS,
+                    STATUS = excluded.STATUS,
+                    ERROS = excluded.ERROS
+                """,
+                (
+                    processamento_id, os.getpid(), _tipo(status), _descricao(status), _agora(),
+                    _agora() if status.get("concluido") else None,
+                    int(bool(status.get("concluido"))), int(bool(status.get("sucesso"))),
+                    str(status.get("mensagem", "")), len(erros),
+                    json.dumps(resumo, default=str, ensure_ascii=False),
+                    json.dumps(erros, default=str, ensure_ascii=False)
+                )
+            )
+            conexao.commit()
+
+    def _carregar(self, processamento_id):
+        with self._conexao() as conexao:
+            linha = conexao.execute(
+                "SELECT CONCLUIDO, SUCESSO, MENSAGEM, TOTAL_ERROS, STATUS, ERROS FROM PROCESSAMENTOS WHERE ID = ?",
+                (processamento_id,)
+            ).fetchone()
+        if linha is None:
+            return None
+        status = json.loads(linha["STATUS"])
+        # CONCLUIDO e MENSAGEM podem ter sido alterados ao marcar um processamento interrompido
+        status["concluido"] = bool(linha["CONCLUIDO"])
+        status["sucesso"] = bool(linha["SUCESSO"])
+        status["mensagem"] = linha["MENSAGEM"]
+        if linha["ERROS"] is not None:
+            status["erros"] = json.loads(linha["ERROS"])
+        else:
+            status["erros"] = [
+                f"{linha['TOTAL_ERROS']} erros; os detalhes foram removidos após {self.retencao_erros_dias} dias"
+            ] if linha["TOTAL_ERROS"] else []
+        return status
+
+    def _expurgar_memoria(self):
+        """Remove da memória os concluídos expirados e, acima do limite, os menos recentes."""
+        limite_acesso = time.monotonic() - self.ttl_memoria_segundos
+        for processamento_id, (status, acesso) in list(self._memoria.items()):
+            excedente = len(self._memoria) > self.max_memoria
+            if not status.get("concluido"):
+                continue
+            if acesso < limite_acesso or excedente:
+                del self._memoria[processamento_id]
+                self._locais.pop(processamento_id, None)
+            elif not excedente:
+                break
+
+    def _limpar_disco(self):
+        """Apaga os erros antigos (mantendo o resumo) e os processamentos fora da retenção."""
+        if self._ultima_limpeza is not None and time.monotonic() - self._ultima_limpeza < _INTERVALO_LIMPEZA_SEGUNDOS:
+            return
+        self._ultima_limpeza = time.monotonic()
+        limite_erros = (datetime.now() - timedelta(days=self.retencao_erros_dias)).isoformat(timespec="seconds")
+        limite = (datetime.now() - timedelta(days=self.retencao_dias)).isoformat(timespec="seconds")
+        with self._conexao() as conexao:
+            erros = conexao.execute(
+                "UPDATE PROCESSAMENTOS SET ERROS = NULL WHERE ERROS IS NOT NULL AND CONCLUIDO = 1 AND CRIADO_EM < ?",
+                (limite_erros,)
+            ).rowcount
+            removidos = conexao.execute(
+                "DELETE FROM PROCESSAMENTOS WHERE CONCLUIDO = 1 AND CRIADO_EM < ?", (limite,)
+            ).rowcount
+            conexao.commit()
+        if erros or removidos:
+            logger.info(f"[HISTORICO] Erros apagados de {erros} processamentos; {removidos} removidos do histórico")
+
+    def _cancelamentos_solicitados(self):
+        """Funções de cancelamento dos processamentos locais cancelados por outro processo."""
+        with self._conexao() as conexao:
+            ids = [linha["ID"] for linha in conexao.execute(
+                "SELECT ID FROM PROCESSAMENTOS WHERE CANCELAMENTO_SOLICITADO = 1 AND CONCLUIDO = 0 AND PROCESSO = ?",
+                (os.getpid(),)
+            )]
+            conexao.executemany(
+                "UPDATE PROCESSAMENTOS SET CANCELAMENTO_SOLICITADO = 0 WHERE ID = ?", [(i,) for i in ids]
+            )
+            conexao.commit()
+        return [self._cancelamentos[i] for i in ids if i in self._cancelamentos]
+
+    def _sincronizar(self):
+        """Grava periodicamente os status locais em andamento que mudaram (modo compartilhado)."""
+        while True:
+            time.sleep(_INTERVALO_SINCRONIZACAO_SEGUNDOS)
+            cancelar = []
+            with self._lock:
+                try:
+                    cancelar = self._cancelamentos_solicitados()
+                except Exception as e:
+                    logger.error(f"Erro ao consultar cancelamentos solicitados: {str(e)}")
+                for processamento_id, gravado in list(self._locais.items()):
+                    entrada = self._memoria.get(processamento_id)
+                    if entrada is None or entrada[0].get("concluido"):
+                        continue
+                    try:
+                        atual = json.dumps(entrada[0], default=str, sort_keys=True)
+                        if atual != gravado:
+                            self._gravar(processamento_id, entrada[0])
+                            self._locais[processamento_id] = atual
+                    except Exception as e:
+                        # O status pode ser alterado durante a serialização; tenta no próximo ciclo
+                        logger.debug(f"Status de {processamento_id} não sincronizado: {str(e)}")
+            for funcao in cancelar:
+                funcao()
+
+    def __setitem__(self, processamento_id, status):
+        with self._lock:
+            self._preparar()
+            self._memoria[processamento_id] = [status, time.monotonic()]
+            self._memoria.move_to_end(processamento_id)
+            self._gravar(processamento_id, status)
+            if self.compartilhado:
+                self._locais[processamento_id] = None
+                if self._sincronizacao is None:
+                    self._sincronizacao = threading.Thread(
+                        target=self._sincronizar, name="SincronizacaoProcessamentos", daemon=True
+                    )
+                    self._sincronizacao.start()
+            self._expurgar_memoria()
+
+    def get(self, processamento_id, padrao=None):
+        with self._lock:
+            entrada = self._memoria.get(processamento_id)
+            # Em andamento em outro processo: o status atual está apenas em disco
+            if (entrada is not None and self.compartilhado and processamento_id not in self._locais
+                    and not entrada[0].get("concluido")):
+                del self._memoria[processamento_id]
+                entrada = None
+            if entrada is not None:
+                entrada[1] = time.monotonic()
+                self._memoria.move_to_end(processamento_id)
+                return entrada[0]
+            self._preparar()
+            status = self._carregar(processamento_id)
+            if status is None:
+                return padrao
+            self._memoria[processamento_id] = [status, time.monotonic()]
+            self._expurgar_memoria()
+            return status
+
+    def __getitem__(self, processamento_id):
+        status = self.get(processamento_id)
+        if status is None:
+            raise KeyError(processamento_id)
+        return status
+
+    def __contains__(self, processamento_id):
+        return self.get(processamento_id) is not None
+
+    def pop(self, processamento_id, padrao=None):
+        with self._lock:
+            self._preparar()
+            entrada = self._memoria.pop(processamento_id, None)
+            self._locais.pop(processamento_id, None)
+            self._cancelamentos.pop(processamento_id, None)
+            with self._conexao() as conexao:
+                conexao.execute("DELETE FROM PROCESSAMENTOS WHERE ID = ?", (processamento_id,))
+                conexao.commit()
+            return entrada[0] if entrada is not None else padrao
+
+    def concluir(self, processamento_id):
+        """Grava o status final do processamento em disco."""
+        with self._lock:
+            entrada = self._memoria.get(processamento_id)
+            if entrada is None:
+                return
+            self._locais.pop(processamento_id, None)
+            self._cancelamentos.pop(processamento_id, None)
+            try:
+                self._gravar(processamento_id, entrada[0])
+                self._limpar_disco()
+            except Exception as e:
+                logger.error(f"Erro ao gravar o histórico do processamento {processamento_id}: {str(e)}")
+            self._expurgar_memoria()
+
+    def registrar_cancelamento(self, processamento_id, funcao):
+        """Registra a função (sem argumentos) que cancela o processamento em andamento."""
+        with self._lock:
+            self._cancelamentos[processamento_id] = funcao
+
+    def cancelar(self, processamento_id):
+        """
+        Pede o cancelamento de um processamento em andamento.
+
+        Returns:
+            True se o pedido foi feito; False se o processamento não existe ou já terminou
+        """
+        with self._lock:
+            funcao = self._cancelamentos.get(processamento_id)
+            if funcao is None:
+                status = self.get(processamento_id)
+                if status is None or status.get("concluido") or not self.compartilhado:
+                    return False
+                # Em andamento em outro processo: o pedido fica em disco até ele o atender
+                with self._conexao() as conexao:
+                    cursor = conexao.execute(
+                        "UPDATE PROCESSAMENTOS SET CANCELAMENTO_SOLICITADO = 1 WHERE ID = ? AND CONCLUIDO = 0",
+                        (processamento_id,)
+                    )
+                    conexao.commit()
+                return cursor.rowcount > 0
+        funcao()
+        return True
+
+    def listar(self, limite=100, tipo=None):
+        """Processamentos mais recentes primeiro, com o resumo de cada um (sem os erros)."""
+        with self._lock:
+            self._preparar()
+            clausula, parametros = ("WHERE TIPO = ?", [tipo]) if tipo else ("", [])
+            with self._conexao() as conexao:
+                linhas = [dict(linha) for linha in conexao.execute(
+                    f"""
+                    SELECT ID, TIPO, DESCRICAO, CRIADO_EM, CONCLUIDO_EM, CONCLUIDO, SUCESSO, MENSAGEM,
+                           json_extract(STATUS, '$.progresso') AS PROGRESSO,
+                           json_extract(STATUS, '$.cancelado') AS CANCELADO,
+                           TOTAL_ERROS, ERROS IS NULL AND TOTAL_ERROS > 0 AS ERROS_REMOVIDOS
+                    FROM PROCESSAMENTOS {clausula}
+                    ORDER BY CRIADO_EM DESC
+                    LIMIT ?
+                    """,
+                    parametros + [limite]
+                )]
+            # Os em andamento neste processo têm o status atual em memória
+            for linha in linhas:
+                entrada = self._memoria.get(linha["ID"])
+                if entrada is not None and not linha["CONCLUIDO"] and (
+                        not self.compartilhado or linha["ID"] in self._locais):
+                    linha["MENSAGEM"] = entrada[0].get("mensagem", linha["MENSAGEM"])
+                    linha["PROGRESSO"] = entrada[0].get("progresso", 0)
+            return linhas
+
+    def estatisticas(self):
+        with self._lock:
+            return {
+                "em_memoria": len(self._memoria),
+                "em_andamento": sum(1 for status, _ in self._memoria.values() if not status.get("concluido")),
+                "max_memoria": self.max_memoria
+            }
+
+
+processamentos = RepositorioProcessamentos(
+    HISTORICO_CONFIG["caminho"],
+    max_memoria=HISTORICO_CONFIG["max_memoria"],
+    ttl_memoria_segundos=HISTORICO_CONFIG["ttl_memoria_segundos"],
+    retencao_erros_dias=HISTORICO_CONFIG["retencao_erros_dias"],
+    retencao_dias=HISTORICO_CONFIG["retencao_dias"],
+    compartilhado=SERVIDOR_CONFIG["estado_compartilhado"]
+)
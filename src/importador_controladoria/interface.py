@@ -5,10 +5,7 @@ import getpass
 from datetime import datetime
 import pandas as pd
 import threading
-from google.cloud import bigquery
-from google.oauth2 import service_account
-from google.cloud import storage
-from flask import Flask, render_template, request, redirect, url_for, flash, jsonify, session, send_file
+from flask import Flask, render_template, request, redirect, url_for, flash, jsonify, session, send_file, g, Response, stream_with_context
 from werkzeug.utils import secure_filename
 import tempfile
 import uuid
@@ -21,12 +18,35 @@ from pathlib import Path
 import markdown
 import webbrowser
 from threading import Timer
-from io import BytesIO
 import logging.config
 from .config import LOG_CONFIG
 
 from .transformacoes import transformar_dados, validar_data
-from .config import BIGQUERY_CONFIG, GCP_STORAGE_CONFIG
+from .config import (
+    BIGQUERY_CONFIG, GCP_STORAGE_CONFIG, PAGINACAO_CONFIG, EXPORTACAO_CONFIG, SERVIDOR_CONFIG,
+    TEMPO_LIMITE_ETAPAS_CONFIG
+)
+from .clientes_gcp import obter_cliente_storage, aquecer_clientes, provedor_gcp
+from .consultas import metricas_latencia
+from .cache import cache_registros, chave_filtros, invalidar_cache_orcado
+from .armazem import obter_armazem
+from .delta_importacao import MODO_PADRAO, MODO_DELTA, MODOS_IMPORTACAO, descrever_delta, hash_conteudo
+from .filtros import ler_filtros, possui_filtros, descrever_filtros
+from .edicao_lote import descrever_alteracoes, descrever_chave, ler_edicoes
+from .resumo_orcado import AGRUPAMENTOS, montar_pivo, normalizar_agrupamento
+from .exportacao import (
+    FORMATOS_EXPORTACAO, FORMATO_PADRAO, ExportacaoCancelada, exportar, remover_exportacoes_expiradas
+)
+from .agendador import FilaCheia, agendador_importacoes
+from .cancelamento import ProcessamentoCancelado, SinalCancelamento
+from .progresso import canal_progresso, eventos_progresso, liberar_stream, reservar_stream, status_publico
+from .historico_processamentos import processamentos
+from .estado_compartilhado import carregar_chave_secreta
+from .custo_consultas import LimiteCustoExcedido, formatar_bytes, limite_bytes
+from .paginacao import (
+    DIRECAO_PROXIMA, DIRECAO_ANTERIOR,
+    normalizar_tamanho_pagina, decodificar_cursor, montar_pagina
+)
 
 # Aplica a configuração de logging
 logging.config.dictConfig(LOG_CONFIG)
@@ -36,7 +56,8 @@ logger = logging.getLogger(__name__)
 app = Flask(__name__, 
     template_folder=os.path.join(os.path.dirname(__file__), 'templates'),
     static_folder=os.path.join(os.path.dirname(__file__), 'static'))
-app.secret_key = str(uuid.uuid4())
+# Chave persistida: a sessão vale entre reinícios e entre os processos do modo produção
+app.secret_key = carregar_chave_secreta(SERVIDOR_CONFIG["chave_secreta_path"])
 app.config['UPLOAD_FOLDER'] = tempfile.gettempdir()
 app.config['MAX_CONTENT_LENGTH'] = 16 * 1024 * 1024  # 16MB max upload
 
@@ -82,21 +103,38 @@ CREDENTIALS_DIR = Path(get_config_path())
 # Caminho para o arquivo de credenciais do BigQuery
 BIGQUERY_CREDENTIALS_PATH = CREDENTIALS_DIR / "bigquery-credentials.json"
 
-# Dicionário para armazenar os status dos processamentos
-processamentos = {}
+def registrar_diagnostico_credenciais(prefixo, armazem):
+    """Logs de diagnóstico das credenciais do BigQuery (apenas com o armazém BigQuery)."""
+    if armazem.nome != "bigquery":
+        return
+    logger.info(f"[{prefixo}] Caminho credenciais: {BIGQUERY_CREDENTIALS_PATH}")
+    logger.info(f"[{prefixo}] Arquivo existe: {BIGQUERY_CREDENTIALS_PATH.exists()}")
+    logger.info(f"[{prefixo}] Caminho absoluto: {BIGQUERY_CREDENTIALS_PATH.absolute()}")
+    logger.info(f"[{prefixo}] Executável congelado: {getattr(sys, 'frozen', False)}")
+    logger.info(f"[{prefixo}] Executável: {sys.executable}")
+    logger.info(f"[{prefixo}] get_config_path(): {get_config_path()}")
+    logger.info(f"[{prefixo}] CREDENTIALS_DIR: {CREDENTIALS_DIR}")
 
-class ProcessamentoThread(threading.Thread):
-    def __init__(self, arquivo_path, processamento_id):
-        super().__init__()
+class ProcessamentoImportacao:
+    """Processamento de um arquivo enviado, executado por um worker do agendador de importações."""
+    
+    def __init__(self, arquivo_path, processamento_id, modo=MODO_PADRAO):
         self.arquivo_path = arquivo_path
         self.processamento_id = processamento_id
+        self.modo = modo
+        self.cancelamento = SinalCancelamento()
+        # Indica se a importação já foi aplicada no BigQuery (o cancelamento não a desfaz)
+        self.dados_enviados = False
         self.status = {
             "concluido": False,
             "sucesso": False,
-            "mensagem": "",
+            "cancelado": False,
+            "mensagem": "Aguardando na fila de processamento...",
             "erros": [],
             "progresso": 0,
+            "posicao_fila": None,
             "arquivo": arquivo_path,
+            "modo": modo,
             "start_time": datetime.now().strftime('%H:%M:%S'),
             "end_time": "",
             "processing_time": "",
@@ -109,6 +147,26 @@ class ProcessamentoThread(threading.Thread):
             }
         }
         processamentos[processamento_id] = self.status
+        processamentos.registrar_cancelamento(processamento_id, self.cancelar)
+    
+    def cancelar(self):
+        """Pede o cancelamento; o processamento para no próximo ponto de verificação."""
+        if self.status["concluido"]:
+            return
+        self.cancelamento.cancelar()
+        if agendador_importacoes.remover(self.processamento_id):
+            self.status["cancelado"] = True
+            self.finalizar(False, "Processamento cancelado antes de iniciar", [])
+        else:
+            self.status["mensagem"] = "Cancelando processamento..."
+            canal_progresso.notificar()
+    
+    def atualizar_posicao_fila(self, posicao, tamanho_fila):
+        """Chamado pelo agendador quando a posição na fila muda (None ao iniciar a execução)."""
+        self.status["posicao_fila"] = posicao
+        if posicao is not None:
+            self.status["mensagem"] = f"Aguardando na fila de processamento: posição {posicao} de {tamanho_fila}"
+        canal_progresso.notificar()
         
     def atualizar_etapa(self, etapa, completed=False, error=False, message=None):
         """Atualiza o status de uma etapa específica."""
@@ -121,6 +179,7 @@ class ProcessamentoThread(threading.Thread):
             self.status["steps"][etapa]["error"] = error
             self.status["steps"][etapa]["message"] = message
             self.status["current_step"] = etapa
+            canal_progresso.notificar()
             logger.info(f"Etapa {etapa} atualizada: completed={completed}, error={error}, message={message}")
     
     def run(self):
@@ -130,7 +189,10 @@ class ProcessamentoThread(threading.Thread):
             self.atualizar_etapa("load", message="Carregando dados do Excel...")
             self.atualizar_progresso(10, "Carregando dados do Excel...")
             logger.info(f"Carregando arquivo: {self.arquivo_path}")
-            df = pd.read_excel(self.arquivo_path)
+            # Cada etapa verifica o cancelamento ao entrar e ao sair e tem tempo limite próprio
+            with agendador_importacoes.etapa("cpu"), \
+                    self.cancelamento.etapa("load", TEMPO_LIMITE_ETAPAS_CONFIG["load"]):
+                df = pd.read_excel(self.arquivo_path)
             logger.info(f"Dados carregados com sucesso. Shape: {df.shape}")
             
             # Converte todas as colunas para maiúsculo
@@ -144,7 +206,9 @@ class ProcessamentoThread(threading.Thread):
             self.atualizar_etapa("validation", message="Aplicando transformações...")
             self.atualizar_progresso(40, "Aplicando transformações...")
             logger.info("Iniciando transformação dos dados...")
-            df_transformado, erros = transformar_dados(df)
+            with agendador_importacoes.etapa("cpu"), \
+                    self.cancelamento.etapa("validation", TEMPO_LIMITE_ETAPAS_CONFIG["validation"]):
+                df_transformado, erros = transformar_dados(df)
             
             if erros:
                 logger.error(f"Erros encontrados durante a transformação: {erros}")
@@ -162,10 +226,14 @@ class ProcessamentoThread(threading.Thread):
             logger.info("Iniciando exportação para BigQuery...")
             
             # Tenta exportar para o BigQuery
-            exportou_bigquery = self.exportar_para_bigquery(df_transformado)
+            with agendador_importacoes.etapa("rede"), \
+                    self.cancelamento.etapa("upload", TEMPO_LIMITE_ETAPAS_CONFIG["upload"]):
+                exportou_bigquery = self.exportar_para_bigquery(df_transformado)
+            # Motivo registrado pela exportação, usado na mensagem final em caso de falha
+            motivo_bigquery = self.status["steps"]["upload"]["message"]
             
             if exportou_bigquery:
-                self.atualizar_etapa("upload", completed=True, message="Dados exportados com sucesso para o BigQuery")
+                self.atualizar_etapa("upload", completed=True, message=motivo_bigquery)
                 self.atualizar_progresso(90, "Dados exportados com sucesso para o BigQuery")
             else:
                 self.atualizar_etapa("upload", error=True, message="Erro ao exportar para o BigQuery")
@@ -179,15 +247,17 @@ class ProcessamentoThread(threading.Thread):
             nome_base = os.path.splitext(os.path.basename(self.arquivo_path))[0]
             prefixo = f"processado_{nome_base}"
             
-            # Salva os dados processados em CSV
-            arquivo_csv = PROCESSED_DIR / f"{prefixo}.csv"
-            df_transformado.to_csv(arquivo_csv, index=False)
-            logger.info(f"Dados processados salvos em CSV: {arquivo_csv}")
-            
-            # Salva os dados processados em XML
-            arquivo_xml = PROCESSED_DIR / f"{prefixo}.xml"
-            self.exportar_para_xml(df_transformado, arquivo_xml)
-            logger.info(f"Dados processados salvos em XML: {arquivo_xml}")
+            with agendador_importacoes.etapa("cpu"), \
+                    self.cancelamento.etapa("metadata", TEMPO_LIMITE_ETAPAS_CONFIG["metadata"]):
+                # Salva os dados processados em CSV
+                arquivo_csv = PROCESSED_DIR / f"{prefixo}.csv"
+                df_transformado.to_csv(arquivo_csv, index=False)
+                logger.info(f"Dados processados salvos em CSV: {arquivo_csv}")
+                
+                # Salva os dados processados em XML
+                arquivo_xml = PROCESSED_DIR / f"{prefixo}.xml"
+                self.exportar_para_xml(df_transformado, arquivo_xml)
+                logger.info(f"Dados processados salvos em XML: {arquivo_xml}")
             
             # Atualiza o status final
             self.atualizar_etapa("metadata", completed=True, message="Metadados gerados com sucesso")
@@ -197,16 +267,17 @@ class ProcessamentoThread(threading.Thread):
             if exportou_bigquery:
                 self.finalizar(True, f"Processo concluído com sucesso! Arquivos salvos em {PROCESSED_DIR} e enviados para o BigQuery", [])
             else:
-                # Verifica o motivo específico do problema
-                motivo_bigquery = "Arquivo de credenciais não encontrado"
-                if credentials_path.exists():
-                    motivo_bigquery = "Erro na configuração das credenciais"
-                    # Adiciona informações sobre o caminho para debug
-                    motivo_bigquery += f" (Caminho: {credentials_path})"
-                
-                mensagem_final = f"Processo concluído com sucesso! Arquivos salvos em {PROCESSED_DIR} (BigQuery: {motivo_bigquery})"
+                mensagem_final = f"Processo concluído com sucesso! Arquivos salvos em {PROCESSED_DIR} ({motivo_bigquery})"
                 self.finalizar(True, mensagem_final, [])
             
+        except ProcessamentoCancelado as e:
+            logger.warning(f"Processamento {self.processamento_id} cancelado: {str(e)}")
+            mensagem = str(e)
+            if self.dados_enviados:
+                mensagem += ". Os dados já tinham sido gravados no BigQuery; apenas os arquivos processados não foram salvos"
+            self.atualizar_etapa(self.status["current_step"], error=True, message=str(e))
+            self.status["cancelado"] = True
+            self.finalizar(False, mensagem, [])
         except Exception as e:
             logger.error(f"Erro no processamento: {str(e)}")
             self.finalizar(False, f"Erro: {str(e)}", [str(e)])
@@ -231,6 +302,7 @@ class ProcessamentoThread(threading.Thread):
             self.atualizar_etapa("upload", completed=True, message="Upload concluído")
             self.atualizar_etapa("metadata", message=mensagem)
         
+        canal_progresso.notificar()
         logger.info(f"Progresso: {valor}% - {mensagem}")
     
     def finalizar(self, sucesso, mensagem, erros):
@@ -251,9 +323,20 @@ class ProcessamentoThread(threading.Thread):
         for etapa in self.status["steps"]:
             if not self.status["steps"][etapa]["error"]:
                 self.status["steps"][etapa]["completed"] = True
+        processamentos.concluir(self.processamento_id)
+        canal_progresso.notificar()
+        self.remover_arquivo_enviado()
         
         logger.info(f"Processamento finalizado - Sucesso: {sucesso} - Mensagem: {mensagem}")
     
+    def remover_arquivo_enviado(self):
+        """Apaga o arquivo enviado e o diretório temporário do envio."""
+        try:
+            os.remove(self.arquivo_path)
+            os.rmdir(os.path.dirname(self.arquivo_path))
+        except OSError as e:
+            logger.warning(f"Arquivo enviado {self.arquivo_path} não removido: {str(e)}")
+    
     def exportar_para_bigquery(self, df):
         """Exporta os dados para o BigQuery."""
         try:
@@ -265,19 +348,14 @@ class ProcessamentoThread(threading.Thread):
             logger.info(f"Executável: {sys.executable}")
             logger.info(f"Diretório atual: {os.getcwd()}")
             
-            # Detecta o caminho dinamicamente (em vez de usar a variável global)
-            config_path = get_config_path()
-            credentials_path = Path(config_path) / "bigquery-credentials.json"
-            
-            logger.info(f"get_config_path(): {config_path}")
-            logger.info(f"CREDENTIALS_DIR: {Path(config_path)}")
-            logger.info(f"BIGQUERY_CREDENTIALS_PATH (dinâmico): {credentials_path}")
-            
-            # Verifica se o arquivo de credenciais existe
-            if not credentials_path.exists():
-                logger.warning(f"Arquivo de credenciais do BigQuery não encontrado em: {credentials_path}")
-                self.atualizar_etapa("upload", completed=True, message="BigQuery: Arquivo de credenciais não encontrado")
-                return True
+            # Verifica se o armazém de dados está disponível (no BigQuery, se há credenciais)
+            armazem = obter_armazem()
+            logger.info(f"Armazém de dados: {armazem.descricao()}")
+            registrar_diagnostico_credenciais("EXPORTACAO", armazem)
+            if not armazem.disponivel():
+                logger.warning(armazem.descricao_indisponivel())
+                self.atualizar_etapa("upload", error=True, message=armazem.descricao_indisponivel())
+                return False
                 
             # Limpa os dados para remover valores nulos ou problemáticos
             # Substitui None por string vazia em todas as colunas de texto
@@ -321,6 +399,9 @@ class ProcessamentoThread(threading.Thread):
                 self.atualizar_etapa("upload", error=True, message="BigQuery: Centros de custo com formato inválido")
                 return False
             
+            # Hash do conteúdo de cada linha: o MERGE só reescreve as linhas alteradas
+            df_bigquery['ROW_HASH'] = hash_conteudo(df_bigquery)
+            
             logger.info(f"Dados mapeados para BigQuery. Shape: {df_bigquery.shape}")
             logger.info(f"Colunas do DataFrame original: {df.columns.tolist()}")
             logger.info(f"Colunas do DataFrame BigQuery: {df_bigquery.columns.tolist()}")
@@ -347,25 +428,11 @@ class ProcessamentoThread(threading.Thread):
                     self.atualizar_etapa("upload", error=True, message="BigQuery: Dados com valores nulos")
                     return False
             
-            # Cria as credenciais a partir do arquivo JSON
+            # Prepara o armazém (cliente compartilhado do BigQuery e tabelas de destino)
             try:
-                logger.info(f"Tentando carregar credenciais de: {credentials_path}")
-                logger.info(f"Arquivo existe: {credentials_path.exists()}")
-                logger.info(f"Caminho absoluto: {credentials_path.absolute()}")
-                logger.info(f"Executável congelado: {getattr(sys, 'frozen', False)}")
-                logger.info(f"Executável: {sys.executable}")
-                logger.info(f"get_config_path(): {config_path}")
-                logger.info(f"CREDENTIALS_DIR: {Path(config_path)}")
-                
-                # Usa a mesma abordagem simples da rota /registros
-                credentials = service_account.Credentials.from_service_account_file(
-                    str(credentials_path),
-                    scopes=["https://www.googleapis.com/auth/cloud-platform"]
-                )
-                logger.info("Credenciais do BigQuery carregadas com sucesso")
-                
+                armazem.preparar()
             except Exception as e:
-                logger.error(f"Erro ao carregar credenciais do BigQuery: {str(e)}")
+                logger.error(f"Erro ao preparar o armazém de dados: {str(e)}")
                 logger.error(f"Tipo do erro: {type(e).__name__}")
                 import traceback
                 logger.error(f"Stack trace completo: {traceback.format_exc()}")
@@ -375,203 +442,44 @@ class ProcessamentoThread(threading.Thread):
                 self.atualizar_etapa("upload", error=True, message=erro_detalhado)
                 return False
             
-            # Inicializa o cliente do BigQuery
-            try:
-                client = bigquery.Client(
-                    project=BIGQUERY_CONFIG.get("project_id", "projeto-teste"),
-                    credentials=credentials
-                )
-                logger.info(f"Cliente BigQuery inicializado com projeto: {BIGQUERY_CONFIG.get('project_id')}")
-            except Exception as e:
-                logger.error(f"Erro ao inicializar cliente BigQuery: {str(e)}")
-                self.atualizar_etapa("upload", error=True, message="BigQuery: Erro ao conectar com o serviço")
-                return False
-            
-            # Define o ID do dataset e tabela
-            dataset_id = BIGQUERY_CONFIG.get("dataset_id", "silver")
-            table_id = BIGQUERY_CONFIG.get("table_id", "ORCADO")
-            metadata_table_id = BIGQUERY_CONFIG.get("metadata_table_id", "ORCADO_METADATA")
-            
-            # Define o schema da tabela
-            schema = [
-                bigquery.SchemaField("N_CONTA", "STRING", mode="REQUIRED"),
-                bigquery.SchemaField("N_CENTRO_CUSTO", "STRING", mode="REQUIRED"),
-                bigquery.SchemaField("DESCRICAO", "STRING", mode="REQUIRED"),
-                bigquery.SchemaField("VALOR", "FLOAT64", mode="REQUIRED"),
-                bigquery.SchemaField("DATA", "DATE", mode="REQUIRED"),
-                bigquery.SchemaField("VERSAO", "STRING", mode="REQUIRED"),
-                bigquery.SchemaField("OPERACAO", "STRING", mode="NULLABLE"),
-                bigquery.SchemaField("DATA_ATUALIZACAO", "TIMESTAMP", mode="REQUIRED"),
-                bigquery.SchemaField("FILIAL", "STRING", mode="REQUIRED"),
-                bigquery.SchemaField("RATEIO", "STRING", mode="NULLABLE"),
-                bigquery.SchemaField("ORIGEM", "STRING", mode="NULLABLE")
-            ]
-            
             # Obtém a versão dos dados que estão sendo importados
             versao_importacao = df_bigquery['VERSAO'].iloc[0]
             logger.info(f"Importando dados da versão: {versao_importacao}")
             
-            # Verifica se é uma importação completa ou parcial
-            try:
-                # Conta quantos registros existem na versão atual
-                count_query = f"""
-                SELECT COUNT(*) as total
-                FROM `{dataset_id}.{table_id}`
-                WHERE VERSAO = '{versao_importacao}'
-                """
-                count_job = client.query(count_query)
-                count_result = count_job.result()
-                registros_existentes = next(count_result).total
-                
-                # Se não existem registros, é uma importação completa
-                is_importacao_completa = registros_existentes == 0
-                logger.info(f"Registros existentes na versão {versao_importacao}: {registros_existentes}")
-                logger.info(f"É importação completa? {is_importacao_completa}")
-            except Exception as e:
-                # Se der erro ao contar (tabela não existe), considera como importação completa
-                is_importacao_completa = True
-                logger.info(f"Erro ao verificar registros existentes: {str(e)}. Considerando como importação completa.")
-            
-            # Cria uma tabela temporária para os novos dados
-            temp_table_id = f"temp_{table_id}_{int(time.time())}"
-            temp_table_ref = client.dataset(dataset_id).table(temp_table_id)
+            # Progresso da carga em partes (70-85%) e da aplicação dos dados (85%)
+            def progresso_carga(concluidos, total):
+                self.status["carga"] = {"lotes_concluidos": concluidos, "total_lotes": total}
+                if concluidos < total:
+                    self.atualizar_progresso(
+                        70 + int(15 * concluidos / total),
+                        f"Enviando dados para o BigQuery: parte {concluidos}/{total}"
+                    )
+                else:
+                    self.atualizar_progresso(85, "Aplicando os dados na tabela ORCADO...")
             
             try:
-                # Configura o job para a tabela temporária
-                job_config = bigquery.LoadJobConfig(
-                    write_disposition=bigquery.WriteDisposition.WRITE_TRUNCATE,
-                    schema=schema
+                importar = armazem.importar_delta if self.modo == MODO_DELTA else armazem.importar
+                resumo = importar(
+                    df_bigquery,
+                    arquivo=os.path.basename(self.arquivo_path),
+                    usuario=str(getpass.getuser()),
+                    sistema_operacional=str(platform.system()),
+                    versao_sistema=str(platform.version()),
+                    ao_progredir=progresso_carga,
+                    cancelamento=self.cancelamento
                 )
+                self.dados_enviados = True
+                invalidar_cache_orcado(f"importação da versão {versao_importacao}")
                 
-                logger.info(f"Iniciando carregamento dos dados na tabela temporária {temp_table_id}")
-                # Carrega os dados na tabela temporária
-                job = client.load_table_from_dataframe(
-                    df_bigquery, temp_table_ref, job_config=job_config
+                is_importacao_completa = bool(resumo.get("IMPORTACAO_COMPLETA"))
+                logger.info(f"Registros existentes na versão {versao_importacao}: {resumo.get('REGISTROS_EXISTENTES')}")
+                logger.info(
+                    f"{'Importação completa' if is_importacao_completa else 'Atualização parcial'} concluída: "
+                    f"{resumo.get('LINHAS_MERGE')} linhas no MERGE"
                 )
-                job.result()  # Aguarda a conclusão do job
-                logger.info("Dados carregados com sucesso na tabela temporária")
-                
-                # Verifica se a tabela principal existe, se não, cria ela
-                try:
-                    table_ref = client.dataset(dataset_id).table(table_id)
-                    table = client.get_table(table_ref)
-                    logger.info(f"Tabela {table_id} já existe")
-                    
-                    # Verificar se as colunas RATEIO e ORIGEM existem
-                    existing_fields = [field.name for field in table.schema]
-                    missing_fields = []
-                    
-                    if 'RATEIO' not in existing_fields:
-                        missing_fields.append(bigquery.SchemaField("RATEIO", "STRING", mode="NULLABLE"))
-                        logger.info("Coluna RATEIO não encontrada, será adicionada")
-                    if 'ORIGEM' not in existing_fields:
-                        missing_fields.append(bigquery.SchemaField("ORIGEM", "STRING", mode="NULLABLE"))
-                        logger.info("Coluna ORIGEM não encontrada, será adicionada")
-                    
-                    if missing_fields:
-                        logger.info(f"Adicionando colunas faltantes: {[f.name for f in missing_fields]}")
-                        new_schema = table.schema + missing_fields
-                        table.schema = new_schema
-                        table = client.update_table(table, ["schema"])
-                        logger.info("Schema da tabela atualizado com sucesso")
-                        
-                except Exception as e:
-                    logger.info(f"Criando tabela {table_id} com o schema definido")
-                    table_ref = client.dataset(dataset_id).table(table_id)
-                    table = bigquery.Table(table_ref, schema=schema)
-                    client.create_table(table)
-                    logger.info(f"Tabela {table_id} criada com sucesso")
-                
-                # Se for importação completa, deleta os registros existentes da versão
-                if is_importacao_completa:
-                    delete_query = f"""
-                    DELETE FROM `{dataset_id}.{table_id}`
-                    WHERE VERSAO = '{versao_importacao}'
-                    """
-                    logger.info(f"Executando DELETE para importação completa da versão {versao_importacao}")
-                    delete_job = client.query(delete_query)
-                    delete_job.result()
-                
-                # Cria uma query para atualizar apenas os registros que existem na tabela temporária
-                merge_query = f"""
-                MERGE `{dataset_id}.{table_id}` T
-                USING `{dataset_id}.{temp_table_id}` S
-                ON T.N_CONTA = S.N_CONTA 
-                   AND T.N_CENTRO_CUSTO = S.N_CENTRO_CUSTO 
-                   AND T.DATA = S.DATA 
-                   AND T.VERSAO = S.VERSAO
-                WHEN MATCHED THEN
-                    UPDATE SET
-                        T.DESCRICAO = S.DESCRICAO,
-                        T.VALOR = S.VALOR,
-                        T.OPERACAO = S.OPERACAO,
-                        T.DATA_ATUALIZACAO = CURRENT_TIMESTAMP(),
-                        T.FILIAL = S.FILIAL,
-                        T.RATEIO = S.RATEIO,
-                        T.ORIGEM = S.ORIGEM
-                WHEN NOT MATCHED THEN
-                    INSERT (N_CONTA, N_CENTRO_CUSTO, DESCRICAO, VALOR, DATA, VERSAO, OPERACAO, DATA_ATUALIZACAO, FILIAL, RATEIO, ORIGEM)
-                    VALUES (S.N_CONTA, S.N_CENTRO_CUSTO, S.DESCRICAO, S.VALOR, S.DATA, S.VERSAO, S.OPERACAO, CURRENT_TIMESTAMP(), S.FILIAL, S.RATEIO, S.ORIGEM)
-                """
-                
-                logger.info(f"Executando MERGE para {'importação completa' if is_importacao_completa else 'atualização parcial'}")
-                logger.info(f"Query MERGE: {merge_query}")
-                merge_job = client.query(merge_query)
-                merge_job.result()
-                
-                # Registra nos metadados
-                metadata = {
-                    "DATA_IMPORTACAO": pd.Timestamp.now(),
-                    "USUARIO": str(getpass.getuser()),
-                    "SISTEMA_OPERACIONAL": str(platform.system()),
-                    "VERSAO_SISTEMA": str(platform.version()),
-                    "ARQUIVO_ORIGEM": f"{'IMPORTACAO_COMPLETA' if is_importacao_completa else 'ATUALIZACAO_PARCIAL'}: {os.path.basename(self.arquivo_path)}",
-                    "TOTAL_REGISTROS": int(len(df_bigquery)),
-                    "STATUS": "IMPORTACAO_COMPLETA" if is_importacao_completa else "ATUALIZACAO_PARCIAL",
-                    "DETALHES": f"{'Importação completa' if is_importacao_completa else 'Atualização parcial'} de {len(df_bigquery)} registros da versão {versao_importacao}"
-                }
-                
-                logger.info(f"Registrando metadados: {metadata}")
-                
-                # Cria o DataFrame com tipos explícitos
-                df_metadata = pd.DataFrame({
-                    "DATA_IMPORTACAO": [metadata["DATA_IMPORTACAO"]],
-                    "USUARIO": [metadata["USUARIO"]],
-                    "SISTEMA_OPERACIONAL": [metadata["SISTEMA_OPERACIONAL"]],
-                    "VERSAO_SISTEMA": [metadata["VERSAO_SISTEMA"]],
-                    "ARQUIVO_ORIGEM": [metadata["ARQUIVO_ORIGEM"]],
-                    "TOTAL_REGISTROS": [metadata["TOTAL_REGISTROS"]],
-                    "STATUS": [metadata["STATUS"]],
-                    "DETALHES": [metadata["DETALHES"]]
-                })
-                
-                # Define o schema da tabela de metadados
-                metadata_schema = [
-                    bigquery.SchemaField("DATA_IMPORTACAO", "TIMESTAMP", mode="REQUIRED"),
-                    bigquery.SchemaField("USUARIO", "STRING", mode="REQUIRED"),
-                    bigquery.SchemaField("SISTEMA_OPERACIONAL", "STRING", mode="REQUIRED"),
-                    bigquery.SchemaField("VERSAO_SISTEMA", "STRING", mode="REQUIRED"),
-                    bigquery.SchemaField("ARQUIVO_ORIGEM", "STRING", mode="REQUIRED"),
-                    bigquery.SchemaField("TOTAL_REGISTROS", "INTEGER", mode="REQUIRED"),
-                    bigquery.SchemaField("STATUS", "STRING", mode="REQUIRED"),
-                    bigquery.SchemaField("DETALHES", "STRING", mode="REQUIRED")
-                ]
-                
-                # Configura o job para os metadados
-                metadata_job_config = bigquery.LoadJobConfig(
-                    write_disposition=bigquery.WriteDisposition.WRITE_APPEND,
-                    schema=metadata_schema
-                )
-                
-                # Carrega os metadados
-                metadata_table_ref = client.dataset(dataset_id).table(metadata_table_id)
-                logger.info(f"Iniciando inserção dos metadados na tabela {metadata_table_id}")
-                metadata_job = client.load_table_from_dataframe(
-                    df_metadata, metadata_table_ref, job_config=metadata_job_config
-                )
-                metadata_job.result()
-                logger.info("Metadados inseridos com sucesso")
                 
+            except ProcessamentoCancelado:
+                raise
             except Exception as e:
                 logger.error(f"Erro detalhado durante a exportação para BigQuery: {str(e)}")
                 logger.error(f"Tipo do erro: {type(e).__name__}")
@@ -579,19 +487,17 @@ class ProcessamentoThread(threading.Thread):
                 logger.error(f"Stack trace: {traceback.format_exc()}")
                 self.atualizar_etapa("upload", error=True, message="BigQuery: Erro durante a exportação dos dados")
                 return False
-                
-            finally:
-                # Garante que a tabela temporária seja removida mesmo em caso de erro
-                try:
-                    client.delete_table(temp_table_ref)
-                    logger.info(f"Tabela temporária {temp_table_id} removida com sucesso")
-                except Exception as e:
-                    logger.error(f"Erro ao remover tabela temporária {temp_table_id}: {str(e)}")
             
-            self.atualizar_etapa("upload", completed=True, message="Dados exportados com sucesso para o BigQuery")
+            mensagem_upload = "Dados exportados com sucesso para o BigQuery"
+            if self.modo == MODO_DELTA:
+                self.status["delta"] = {campo: resumo[campo] for campo in ("INSERIDOS", "ATUALIZADOS", "INALTERADOS", "EXCLUIDOS")}
+                mensagem_upload += f" (delta: {descrever_delta(resumo)})"
+            self.atualizar_etapa("upload", completed=True, message=mensagem_upload)
             logger.info("Processo de exportação concluído com sucesso")
             return True
             
+        except ProcessamentoCancelado:
+            raise
         except Exception as e:
             logger.error(f"Erro ao exportar para BigQuery: {str(e)}")
             self.atualizar_etapa("upload", error=True, message="BigQuery: Erro geral na exportação")
@@ -645,6 +551,119 @@ class ProcessamentoThread(threading.Thread):
             logger.error(f"Erro ao criar XML: {str(e)}")
             return False
 
+# Limita as exportações simultâneas; as demais aguardam na fila
+_vagas_exportacao = threading.BoundedSemaphore(EXPORTACAO_CONFIG["max_simultaneas"])
+
+class ExportacaoThread(threading.Thread):
+    """Exporta os registros filtrados para um arquivo em segundo plano."""
+    
+    def __init__(self, exportacao_id, filtros, formato, total_estimado=None):
+        super().__init__(daemon=True)
+        self.exportacao_id = exportacao_id
+        self.filtros = filtros
+        self.formato = formato
+        self.cancelamento = threading.Event()
+        self.status = {
+            "tipo": "exportacao",
+            "concluido": False,
+            "sucesso": False,
+            "cancelado": False,
+            "mensagem": "Aguardando na fila de exportações...",
+            "erros": [],
+            "progresso": 0,
+            "formato": formato,
+            "filtros": descrever_filtros(filtros),
+            "linhas_lidas": 0,
+            "linhas_gravadas": 0,
+            "total_estimado": total_estimado,
+            "arquivo": "",
+            "nome_download": "",
+            "start_time": datetime.now().strftime('%H:%M:%S'),
+            "end_time": "",
+            "processing_time": ""
+        }
+        processamentos[exportacao_id] = self.status
+        processamentos.registrar_cancelamento(exportacao_id, self.cancelar)
+    
+    def cancelar(self):
+        """Pede o cancelamento; a exportação para no próximo lote."""
+        if not self.status["concluido"]:
+            self.cancelamento.set()
+            self.status["mensagem"] = "Cancelando exportação..."
+            canal_progresso.notificar()
+    
+    def _lotes(self, armazem):
+        """Lotes do armazém, contando as linhas lidas e verificando o cancelamento."""
+        lotes = armazem.selecionar_lotes(self.filtros)
+        try:
+            for lote in lotes:
+                if self.cancelamento.is_set():
+                    raise ExportacaoCancelada()
+                self.status["linhas_lidas"] += lote.num_rows
+                yield lote
+        finally:
+            # Interrompe o download das fatias restantes
+            if hasattr(lotes, 'close'):
+                lotes.close()
+    
+    def _ao_gravar(self, linhas):
+        self.status["linhas_gravadas"] = linhas
+        total = self.status["total_estimado"]
+        if total:
+            self.status["progresso"] = min(99, int(linhas * 100 / total))
+        self.status["mensagem"] = f"{linhas} registros gravados..."
+        canal_progresso.notificar()
+    
+    def run(self):
+        extensao = FORMATOS_EXPORTACAO[self.formato][0]
+        caminho = EXPORTACAO_CONFIG["diretorio"] / f"{self.exportacao_id}{extensao}"
+        try:
+            # Aguarda uma vaga, permitindo cancelar enquanto está na fila
+            while not _vagas_exportacao.acquire(timeout=1):
+                if self.cancelamento.is_set():
+                    raise ExportacaoCancelada()
+            try:
+                if self.cancelamento.is_set():
+                    raise ExportacaoCancelada()
+                self.status["mensagem"] = "Consultando registros..."
+                EXPORTACAO_CONFIG["diretorio"].mkdir(parents=True, exist_ok=True)
+                remover_exportacoes_expiradas(EXPORTACAO_CONFIG["diretorio"], EXPORTACAO_CONFIG["retencao_horas"])
+                
+                total = exportar(self.formato, self._lotes(obter_armazem()), caminho, ao_progredir=self._ao_gravar)
+            finally:
+                _vagas_exportacao.release()
+            
+            timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+            self.status["arquivo"] = str(caminho)
+            self.status["nome_download"] = f"registros_{timestamp}{extensao}"
+            self.status["linhas_gravadas"] = total
+            self.finalizar(True, f"Exportação concluída: {total} registros", [])
+        except ExportacaoCancelada:
+            caminho.unlink(missing_ok=True)
+            self.status["cancelado"] = True
+            self.finalizar(False, "Exportação cancelada", [])
+        except Exception as e:
+            logger.error(f"Erro na exportação {self.exportacao_id}: {str(e)}")
+            caminho.unlink(missing_ok=True)
+            self.finalizar(False, f"Erro: {str(e)}", [str(e)])
+    
+    def finalizar(self, sucesso, mensagem, erros):
+        self.status["concluido"] = True
+        self.status["sucesso"] = sucesso
+        self.status["mensagem"] = mensagem
+        self.status["erros"] = erros
+        self.status["progresso"] = 100 if sucesso else self.status["progresso"]
+        self.status["end_time"] = datetime.now().strftime('%H:%M:%S')
+        
+        # Calcula o tempo de processamento
+        start = datetime.strptime(self.status["start_time"], '%H:%M:%S')
+        end = datetime.strptime(self.status["end_time"], '%H:%M:%S')
+        self.status["processing_time"] = str(end - start)
+        processamentos.concluir(self.exportacao_id)
+        canal_progresso.notificar()
+        
+        logger.info(f"Exportação {self.exportacao_id} finalizada - Sucesso: {sucesso} - Mensagem: {mensagem}")
+
 def get_resource_path(relative_path):
     """
     Obtém o caminho absoluto para um recurso, funcionando tanto em desenvolvimento quanto em produção (PyInstaller).
@@ -684,6 +703,21 @@ def parse_data_flexivel(data_str):
     
     raise ValueError(f"Formato de data inválido: {data_str}. Formatos aceitos: YYYY-MM-DD, DD/MM/YYYY, YYYY/MM/DD, DD-MM-YYYY")
 
+@app.before_request
+def iniciar_cronometro_requisicao():
+    """Marca o início da requisição para medir a latência da página."""
+    g.inicio_requisicao = time.perf_counter()
+
+@app.after_request
+def registrar_latencia_requisicao(response):
+    """Registra a latência de cada página e a expõe no cabeçalho Server-Timing."""
+    inicio = g.get('inicio_requisicao')
+    if inicio is not None and request.endpoint and request.endpoint != 'static':
+        decorrido_ms = (time.perf_counter() - inicio) * 1000
+        metricas_latencia.registrar(f"pagina_{request.endpoint}", decorrido_ms)
+        response.headers['Server-Timing'] = f"app;dur={decorrido_ms:.1f}"
+    return response
+
 @app.route('/')
 def index():
     return render_template('index.html', now=datetime.now())
@@ -736,17 +770,35 @@ def upload():
             return redirect(url_for('index'))
         
         if arquivo and arquivo.filename.endswith(('.xlsx', '.xls', '.csv')):
-            # Salva o arquivo temporariamente
+            # Cria um ID para o processamento
+            processamento_id = str(uuid.uuid4())
+            
+            # Salva o arquivo temporariamente em um diretório próprio do envio: outro
+            # envio com o mesmo nome, enquanto este aguarda na fila, não o sobrescreve
             filename = secure_filename(arquivo.filename)
-            filepath = os.path.join(app.config['UPLOAD_FOLDER'], filename)
+            diretorio_envio = os.path.join(app.config['UPLOAD_FOLDER'], f"importacao_{processamento_id}")
+            os.makedirs(diretorio_envio)
+            filepath = os.path.join(diretorio_envio, filename)
             arquivo.save(filepath)
             
-            # Cria um ID para o processamento
-            processamento_id = str(uuid.uuid4())
+            # Modo da importação: padrão (completa/atualização) ou delta
+            modo = request.form.get('modo', MODO_PADRAO)
+            if modo not in MODOS_IMPORTACAO:
+                modo = MODO_PADRAO
             
-            # Inicia o processamento em background
-            thread = ProcessamentoThread(filepath, processamento_id)
-            thread.start()
+            # Coloca o processamento na fila do agendador; com a fila cheia,
+            # recusa o envio (429) em vez de sobrecarregar o servidor
+            processamento = ProcessamentoImportacao(filepath, processamento_id, modo=modo)
+            try:
+                agendador_importacoes.submeter(
+                    processamento_id, processamento.run, ao_mudar_posicao=processamento.atualizar_posicao_fila
+                )
+            except FilaCheia as e:
+                processamentos.pop(processamento_id, None)
+                processamento.remover_arquivo_enviado()
+                logger.warning(f"Upload recusado: {str(e)}")
+                flash(f'O servidor está ocupado. {str(e)}', 'warning')
+                return render_template('index.html', now=datetime.now()), 429, {'Retry-After': '60'}
             
             # Redireciona para a página de status
             return redirect(url_for('status', processamento_id=processamento_id))
@@ -766,6 +818,8 @@ def status(processamento_id):
         return redirect(url_for('index'))
     
     status = processamentos[processamento_id]
+    if status.get('tipo') == 'exportacao':
+        return redirect(url_for('status_exportacao', exportacao_id=processamento_id))
     
     # Prepara os dados para o template
     template_data = {
@@ -808,14 +862,41 @@ def progresso(processamento_id):
     if processamento_id not in processamentos:
         return jsonify({"erro": "Processamento não encontrado"}), 404
     
-    status = processamentos[processamento_id]
+    # Alternativa ao stream de eventos: com ETag, um status que não mudou
+    # desde a última consulta é respondido com 304, sem corpo
+    resposta = jsonify(status_publico(processamentos[processamento_id]))
+    resposta.headers['Cache-Control'] = 'no-cache'
+    resposta.add_etag()
+    return resposta.make_conditional(request)
+
+@app.route('/progresso/<processamento_id>/eventos')
+def eventos_progresso_processamento(processamento_id):
+    """Stream (Server-Sent Events) com o status completo e, depois, só os campos alterados."""
+    if processamento_id not in processamentos:
+        return jsonify({"erro": "Processamento não encontrado"}), 404
     
-    # Se o processamento estiver em andamento, não retorna erros
-    if not status.get('concluido', False):
-        status['mensagem'] = ''
-        status['erros'] = []
+    # Com todas as vagas de stream ocupadas, a página passa ao polling (rota com ETag)
+    if not reservar_stream():
+        resposta = jsonify({
+            "erro": "Muitos acompanhamentos abertos",
+            "polling": url_for('progresso', processamento_id=processamento_id)
+        })
+        return resposta, 503, {'Retry-After': '5'}
     
-    return jsonify(status)
+    resposta = Response(
+        stream_with_context(eventos_progresso(lambda: processamentos.get(processamento_id))),
+        mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
+    resposta.call_on_close(liberar_stream)
+    return resposta
+
+@app.route('/status/<processamento_id>/cancelar', methods=['POST'])
+def cancelar_processamento(processamento_id):
+    """Cancela um processamento na fila ou em andamento."""
+    if not processamentos.cancelar(processamento_id):
+        return jsonify({"erro": "Processamento não encontrado ou já concluído"}), 404
+    return jsonify({"cancelamento_solicitado": True})
 
 @app.route('/download_modelo')
 def download_modelo():
@@ -836,19 +917,8 @@ def download_modelo():
         logger.info(f"[REGISTROS] get_config_path(): {get_config_path()}")
         logger.info(f"[REGISTROS] CREDENTIALS_DIR: {CREDENTIALS_DIR}")
             
-        # Cria as credenciais a partir do arquivo JSON
-        credentials = service_account.Credentials.from_service_account_file(
-            BIGQUERY_CREDENTIALS_PATH,
-            scopes=["https://www.googleapis.com/auth/cloud-platform"]
-        )
-        logger.info("Credenciais do GCP carregadas com sucesso")
-        
-        # Inicializa o cliente do Storage
-        storage_client = storage.Client(
-            project=BIGQUERY_CONFIG.get("project_id", "projeto-teste"),
-            credentials=credentials
-        )
-        logger.info(f"Cliente Storage inicializado com projeto: {BIGQUERY_CONFIG.get('project_id')}")
+        # Obtém o cliente compartilhado do Storage
+        storage_client = obter_cliente_storage()
         
         # Obtém o bucket
         bucket = storage_client.bucket(GCP_STORAGE_CONFIG["bucket_name"])
@@ -885,144 +955,60 @@ def listar_registros():
         logger.info(f"Executável: {sys.executable}")
         logger.info(f"Diretório atual: {os.getcwd()}")
         
-        # Obtém os filtros da query string
-        n_conta = request.args.get('n_conta', '')
-        n_centro_custo = request.args.get('n_centro_custo', '')
-        data_inicio = request.args.get('data_inicio', '')
-        data_fim = request.args.get('data_fim', '')
-        versao = request.args.get('versao', '')
-        operacao = request.args.get('operacao', '')
-        filial = request.args.get('filial', '')
-        rateio = request.args.get('rateio', '')
-        origem = request.args.get('origem', '')
+        # Obtém os filtros da query string (também usados como chave do cache)
+        filtros = ler_filtros(request.args)
         
-        # Verifica se o arquivo de credenciais existe
-        if not BIGQUERY_CREDENTIALS_PATH.exists():
-            flash("Credenciais do BigQuery não encontradas", "error")
+        # Verifica se o armazém de dados está disponível
+        armazem = obter_armazem()
+        if not armazem.disponivel():
+            flash(armazem.descricao_indisponivel(), "error")
             return redirect(url_for('index'))
             
-        # Logs de debug para comparação
-        logger.info(f"[REGISTROS] Caminho credenciais: {BIGQUERY_CREDENTIALS_PATH}")
-        logger.info(f"[REGISTROS] Arquivo existe: {BIGQUERY_CREDENTIALS_PATH.exists()}")
-        logger.info(f"[REGISTROS] Caminho absoluto: {BIGQUERY_CREDENTIALS_PATH.absolute()}")
-        logger.info(f"[REGISTROS] Executável congelado: {getattr(sys, 'frozen', False)}")
-        logger.info(f"[REGISTROS] Executável: {sys.executable}")
-        logger.info(f"[REGISTROS] get_config_path(): {get_config_path()}")
-        logger.info(f"[REGISTROS] CREDENTIALS_DIR: {CREDENTIALS_DIR}")
-            
-        # Cria as credenciais a partir do arquivo JSON
-        credentials = service_account.Credentials.from_service_account_file(
-            BIGQUERY_CREDENTIALS_PATH,
-            scopes=["https://www.googleapis.com/auth/cloud-platform"]
-        )
-        
-        # Inicializa o cliente do BigQuery
-        client = bigquery.Client(
-            project=BIGQUERY_CONFIG.get("project_id", "projeto-teste"),
-            credentials=credentials
-        )
-        
-        # Define o ID do dataset e tabela
-        dataset_id = BIGQUERY_CONFIG.get("dataset_id", "silver")
-        table_id = BIGQUERY_CONFIG.get("table_id", "ORCADO")
-        
-        # Constrói a query base
-        query = f"""
-            SELECT 
-                N_CONTA,
-                N_CENTRO_CUSTO,
-                DESCRICAO,
-                VALOR,
-                DATA,
-                VERSAO,
-                OPERACAO,
-                DATA_ATUALIZACAO,
-                FILIAL,
-                RATEIO,
-                ORIGEM
-            FROM `{dataset_id}.{table_id}`
-            WHERE 1=1
-        """
-        
-        # Adiciona os filtros
-        if n_conta:
-            query += f" AND CAST(N_CONTA AS STRING) = '{n_conta}'"
-        if n_centro_custo:
-            query += f" AND CAST(N_CENTRO_CUSTO AS STRING) = '{n_centro_custo}'"
-        if data_inicio:
-            query += f" AND DATA >= '{data_inicio}'"
-        if data_fim:
-            query += f" AND DATA <= '{data_fim}'"
-        if versao:
-            query += f" AND VERSAO = '{versao}'"
-        if operacao:
-            query += f" AND OPERACAO = '{operacao}'"
-        if filial:
-            query += f" AND CAST(FILIAL AS STRING) = '{filial}'"
-        if rateio:
-            query += f" AND RATEIO = '{rateio}'"
-        if origem:
-            query += f" AND ORIGEM LIKE '%{origem}%'"
-        
-        # Query para contar o total de registros
-        count_query = f"""
-            SELECT COUNT(*) as total
-            FROM `{dataset_id}.{table_id}`
-            WHERE 1=1
-        """
-        
-        # Adiciona os mesmos filtros na query de contagem
-        if n_conta:
-            count_query += f" AND CAST(N_CONTA AS STRING) = '{n_conta}'"
-        if n_centro_custo:
-            count_query += f" AND CAST(N_CENTRO_CUSTO AS STRING) = '{n_centro_custo}'"
-        if data_inicio:
-            count_query += f" AND DATA >= '{data_inicio}'"
-        if data_fim:
-            count_query += f" AND DATA <= '{data_fim}'"
-        if versao:
-            count_query += f" AND VERSAO = '{versao}'"
-        if operacao:
-            count_query += f" AND OPERACAO = '{operacao}'"
-        if filial:
-            count_query += f" AND CAST(FILIAL AS STRING) = '{filial}'"
-        if rateio:
-            count_query += f" AND RATEIO = '{rateio}'"
-        if origem:
-            count_query += f" AND ORIGEM LIKE '%{origem}%'"
-        
-        # Executa a query de contagem
-        count_job = client.query(count_query)
-        total_registros = next(count_job.result()).total
-        
-        # Adiciona ordenação e limite na query principal
-        query += " ORDER BY DATA_ATUALIZACAO DESC LIMIT 100"
-        
-        # Executa a query principal
-        query_job = client.query(query)
-        registros = [dict(row) for row in query_job]
-        
-        # Obtém a lista de versões para o filtro
-        versoes_query = f"""
-            SELECT DISTINCT VERSAO 
-            FROM `{dataset_id}.{table_id}`
-            ORDER BY VERSAO DESC
-        """
-        
-        versoes_job = client.query(versoes_query)
-        versoes = [row.VERSAO for row in versoes_job]
-        
-        # Prepara os filtros para o template
-        filtros = {
-            'n_conta': n_conta,
-            'n_centro_custo': n_centro_custo,
-            'data_inicio': data_inicio,
-            'data_fim': data_fim,
-            'versao': versao,
-            'operacao': operacao,
-            'filial': filial,
-            'rateio': rateio,
-            'origem': origem
+        registrar_diagnostico_credenciais("REGISTROS", armazem)
+            
+        # Parâmetros de paginação (keyset)
+        cursor = request.args.get('cursor', '')
+        direcao = request.args.get('direcao', DIRECAO_PROXIMA)
+        tamanho = normalizar_tamanho_pagina(request.args.get('tamanho'))
+        pagina = max(request.args.get('pagina', 1, type=int) or 1, 1)
+        cursor_dados = decodificar_cursor(cursor)
+        if cursor_dados is None:
+            pagina = 1
+        
+        # Consulta o cache de resultados antes de ir ao BigQuery; o total depende
+        # apenas dos filtros e a página depende também do cursor e do tamanho
+        chave_total = chave_filtros('registros_total', filtros)
+        chave_pagina = chave_filtros('registros_pagina', filtros, cursor if cursor_dados else '', direcao, tamanho)
+        geracao_cache = cache_registros.geracao
+        total_registros = cache_registros.obter(chave_total)
+        pagina_cache = cache_registros.obter(chave_pagina)
+        
+        if total_registros is not None and pagina_cache is not None:
+            registros, cursor_proximo, cursor_anterior = pagina_cache
+            logger.info("[REGISTROS] Resultado servido pelo cache")
+        else:
+            # Busca a página e, se não estiver em cache, o total com os mesmos filtros
+            linhas, total_consultado = armazem.consultar_pagina(
+                filtros, cursor_dados, direcao, tamanho, contar_total=total_registros is None
+            )
+            if total_registros is None:
+                total_registros = total_consultado
+                cache_registros.armazenar(chave_total, total_registros, geracao_cache)
+            
+            registros, cursor_proximo, cursor_anterior = montar_pagina(
+                linhas, tamanho, direcao, cursor_dados is not None
+            )
+            cache_registros.armazenar(chave_pagina, (registros, cursor_proximo, cursor_anterior), geracao_cache)
+        
+        # A lista de versões do filtro vem do catálogo de versões (em memória)
+        versoes = armazem.listar_versoes()
+        
+        paginacao = {
+            'pagina': pagina,
+            'tamanho': tamanho,
+            'tamanhos': PAGINACAO_CONFIG["tamanhos_permitidos"],
+            'cursor_proximo': cursor_proximo,
+            'cursor_anterior': cursor_anterior
         }
         
         return render_template('registros.html', 
@@ -1030,6 +1016,9 @@ def listar_registros():
                              versoes=versoes,
                              filtros=filtros,
                              total_registros=total_registros,
+                             paginacao=paginacao,
+                             replica=armazem.estado_replica(),
+                             tempo_pagina_ms=(time.perf_counter() - g.inicio_requisicao) * 1000,
                              now=datetime.now())
                              
     except Exception as e:
@@ -1057,100 +1046,49 @@ def editar_registro():
         rateio = request.form.get('RATEIO', '')
         origem = request.form.get('ORIGEM', '')
         
-        # Verifica se o arquivo de credenciais existe
-        if not BIGQUERY_CREDENTIALS_PATH.exists():
-            flash("Credenciais do BigQuery não encontradas", "error")
+        # Verifica se o armazém de dados está disponível
+        armazem = obter_armazem()
+        if not armazem.disponivel():
+            flash(armazem.descricao_indisponivel(), "error")
             return redirect(url_for('listar_registros'))
             
-        # Logs de debug para comparação
-        logger.info(f"[EDITAR] Caminho credenciais: {BIGQUERY_CREDENTIALS_PATH}")
-        logger.info(f"[EDITAR] Arquivo existe: {BIGQUERY_CREDENTIALS_PATH.exists()}")
-        logger.info(f"[EDITAR] Caminho absoluto: {BIGQUERY_CREDENTIALS_PATH.absolute()}")
-        logger.info(f"[EDITAR] Executável congelado: {getattr(sys, 'frozen', False)}")
-        logger.info(f"[EDITAR] Executável: {sys.executable}")
-        logger.info(f"[EDITAR] get_config_path(): {get_config_path()}")
-        logger.info(f"[EDITAR] CREDENTIALS_DIR: {CREDENTIALS_DIR}")
+        registrar_diagnostico_credenciais("EDITAR", armazem)
             
-        # Cria as credenciais a partir do arquivo JSON
-        credentials = service_account.Credentials.from_service_account_file(
-            BIGQUERY_CREDENTIALS_PATH,
-            scopes=["https://www.googleapis.com/auth/cloud-platform"]
-        )
-        
-        # Inicializa o cliente do BigQuery
-        client = bigquery.Client(
-            project=BIGQUERY_CONFIG.get("project_id", "projeto-teste"),
-            credentials=credentials
-        )
-        
-        # Define o ID do dataset e tabela
-        dataset_id = BIGQUERY_CONFIG.get("dataset_id", "silver")
-        table_id = BIGQUERY_CONFIG.get("table_id", "ORCADO")
-        metadata_table_id = BIGQUERY_CONFIG.get("metadata_table_id", "ORCADO_METADATA")
-        
         # Obtém os valores originais dos campos hidden
         n_conta_original = request.form.get('N_CONTA')
         n_centro_custo_original = request.form.get('N_CENTRO_CUSTO')
         data_original = request.form.get('DATA')
         versao_original = request.form.get('VERSAO')
+        chave_original = {
+            "VERSAO": versao_original,
+            "DATA": parse_data_flexivel(data_original),
+            "N_CONTA": n_conta_original,
+            "N_CENTRO_CUSTO": n_centro_custo_original
+        }
         
         # Busca o registro original para comparar as alterações
-        query_original = f"""
-        SELECT FILIAL, N_CONTA, N_CENTRO_CUSTO, DESCRICAO, VALOR, OPERACAO, RATEIO, ORIGEM
-        FROM `{dataset_id}.{table_id}`
-        WHERE 
-            N_CONTA = '{n_conta_original}'
-            AND N_CENTRO_CUSTO = '{n_centro_custo_original}'
-            AND DATA = DATE('{data_original}')
-            AND VERSAO = '{versao_original}'
-        """
-        query_job = client.query(query_original)
-        resultado = query_job.result()
-        registro_original = next(resultado, None)
+        registro_original = armazem.obter_registro(chave_original)
         
         if registro_original:
             # Prepara o registro de metadados com as alterações
-            alteracoes = []
-            if registro_original.FILIAL != filial:
-                alteracoes.append(f"FILIAL: '{registro_original.FILIAL}' -> '{filial}'")
-            if registro_original.N_CONTA != n_conta:
-                alteracoes.append(f"N_CONTA: '{registro_original.N_CONTA}' -> '{n_conta}'")
-            if registro_original.N_CENTRO_CUSTO != n_centro_custo:
-                alteracoes.append(f"N_CENTRO_CUSTO: '{registro_original.N_CENTRO_CUSTO}' -> '{n_centro_custo}'")
-            if registro_original.DESCRICAO != descricao:
-                alteracoes.append(f"DESCRICAO: '{registro_original.DESCRICAO}' -> '{descricao}'")
-            if float(registro_original.VALOR) != valor:
-                alteracoes.append(f"VALOR: {registro_original.VALOR} -> {valor}")
-            if registro_original.OPERACAO != operacao:
-                alteracoes.append(f"OPERACAO: '{registro_original.OPERACAO}' -> '{operacao}'")
-            if registro_original.RATEIO != rateio:
-                alteracoes.append(f"RATEIO: '{registro_original.RATEIO}' -> '{rateio}'")
-            if registro_original.ORIGEM != origem:
-                alteracoes.append(f"ORIGEM: '{registro_original.ORIGEM}' -> '{origem}'")
-            
-            # Query para atualizar o registro
-            query = f"""
-            UPDATE `{dataset_id}.{table_id}`
-            SET 
-                FILIAL = '{filial}',
-                N_CONTA = '{n_conta}',
-                N_CENTRO_CUSTO = '{n_centro_custo}',
-                DESCRICAO = '{descricao}',
-                VALOR = {valor},
-                OPERACAO = '{operacao}',
-                RATEIO = '{rateio}',
-                ORIGEM = '{origem}',
-                DATA_ATUALIZACAO = CURRENT_TIMESTAMP()
-            WHERE 
-                N_CONTA = '{n_conta_original}'
-                AND N_CENTRO_CUSTO = '{n_centro_custo_original}'
-                AND DATA = DATE('{data_original}')
-                AND VERSAO = '{versao_original}'
-            """
+            valores = {
+                "FILIAL": filial,
+                "N_CONTA": n_conta,
+                "N_CENTRO_CUSTO": n_centro_custo,
+                "DESCRICAO": descricao,
+                "VALOR": valor,
+                "OPERACAO": operacao,
+                "RATEIO": rateio,
+                "ORIGEM": origem
+            }
+            alteracoes = descrever_alteracoes(registro_original, valores)
             
-            # Executa a query
-            query_job = client.query(query)
-            query_job.result()
+            # Atualiza o registro (0 se ele foi excluído desde a leitura acima)
+            atualizados = armazem.atualizar_registro(chave_original, valores)
+            invalidar_cache_orcado("edição de registro")
+            if not atualizados:
+                flash("Registro não encontrado", "error")
+                return redirect(url_for('listar_registros'))
             
             # Registra a alteração nos metadados
             if alteracoes:
@@ -1160,47 +1098,13 @@ def editar_registro():
                     "SISTEMA_OPERACIONAL": str(platform.system()),
                     "VERSAO_SISTEMA": str(platform.version()),
                     "ARQUIVO_ORIGEM": f"EDITADO: {n_conta}/{n_centro_custo}/{data}/{versao}",
-                    "TOTAL_REGISTROS": 1,
+                    "TOTAL_REGISTROS": atualizados,
                     "STATUS": "EDITADO",
                     "DETALHES": f"Alterações: {', '.join(alteracoes)}"
                 }
                 
-                # Cria o DataFrame com tipos explícitos
-                df_metadata = pd.DataFrame({
-                    "DATA_IMPORTACAO": [metadata["DATA_IMPORTACAO"]],
-                    "USUARIO": [metadata["USUARIO"]],
-                    "SISTEMA_OPERACIONAL": [metadata["SISTEMA_OPERACIONAL"]],
-                    "VERSAO_SISTEMA": [metadata["VERSAO_SISTEMA"]],
-                    "ARQUIVO_ORIGEM": [metadata["ARQUIVO_ORIGEM"]],
-                    "TOTAL_REGISTROS": [metadata["TOTAL_REGISTROS"]],
-                    "STATUS": [metadata["STATUS"]],
-                    "DETALHES": [metadata["DETALHES"]]
-                })
-                
-                # Define o schema da tabela de metadados
-                metadata_schema = [
-                    bigquery.SchemaField("DATA_IMPORTACAO", "TIMESTAMP", mode="REQUIRED"),
-                    bigquery.SchemaField("USUARIO", "STRING", mode="REQUIRED"),
-                    bigquery.SchemaField("SISTEMA_OPERACIONAL", "STRING", mode="REQUIRED"),
-                    bigquery.SchemaField("VERSAO_SISTEMA", "STRING", mode="REQUIRED"),
-                    bigquery.SchemaField("ARQUIVO_ORIGEM", "STRING", mode="REQUIRED"),
-                    bigquery.SchemaField("TOTAL_REGISTROS", "INTEGER", mode="REQUIRED"),
-                    bigquery.SchemaField("STATUS", "STRING", mode="REQUIRED"),
-                    bigquery.SchemaField("DETALHES", "STRING", mode="REQUIRED")
-                ]
-                
-                # Configura o job para os metadados
-                metadata_job_config = bigquery.LoadJobConfig(
-                    write_disposition=bigquery.WriteDisposition.WRITE_APPEND,
-                    schema=metadata_schema
-                )
-                
-                # Carrega os metadados
-                metadata_table_ref = client.dataset(dataset_id).table(metadata_table_id)
-                metadata_job = client.load_table_from_dataframe(
-                    df_metadata, metadata_table_ref, job_config=metadata_job_config
-                )
-                metadata_job.result()
+                # Registra a operação na tabela de metadados
+                armazem.registrar_metadados(metadata)
             
             flash("Registro atualizado com sucesso", "success")
         else:
@@ -1212,6 +1116,46 @@ def editar_registro():
         
     return redirect(url_for('listar_registros'))
 
+@app.route('/registros/editar_lote', methods=['POST'])
+def editar_registros_lote():
+    """Aplica de uma vez as edições acumuladas na tela de registros (JSON)."""
+    try:
+        edicoes, sem_alteracao = ler_edicoes(request.get_json(silent=True))
+    except ValueError as e:
+        return jsonify({"erro": str(e)}), 400
+    
+    try:
+        armazem = obter_armazem()
+        if not armazem.disponivel():
+            return jsonify({"erro": armazem.descricao_indisponivel()}), 503
+        
+        resultado = {"ATUALIZADOS": 0, "CONFLITOS": []}
+        if edicoes:
+            metadata = {
+                "DATA_IMPORTACAO": pd.Timestamp.now(),
+                "USUARIO": str(getpass.getuser()),
+                "SISTEMA_OPERACIONAL": str(platform.system()),
+                "VERSAO_SISTEMA": str(platform.version())
+            }
+            resultado = armazem.atualizar_registros(edicoes, metadata)
+            invalidar_cache_orcado("edição em lote")
+        
+        conflitos = set(resultado["CONFLITOS"])
+        logger.info(
+            f"[EDITAR_LOTE] {resultado['ATUALIZADOS']} atualizados, {len(conflitos)} conflitos, "
+            f"{sem_alteracao} sem alteração"
+        )
+        return jsonify({
+            "atualizados": resultado["ATUALIZADOS"],
+            "sem_alteracao": sem_alteracao,
+            "conflitos": [
+                descrever_chave(edicao["chave"]) for edicao in edicoes if edicao["ID_EDICAO"] in conflitos
+            ]
+        })
+    except Exception as e:
+        logger.error(f"Erro na edição em lote: {str(e)}")
+        return jsonify({"erro": str(e)}), 500
+
 @app.route('/registros/deletar', methods=['POST'])
 def deletar_registro():
     """Deleta um registro da tabela ORCADO e registra a deleção nos metadados."""
@@ -1220,65 +1164,42 @@ def deletar_registro():
         n_conta = request.form.get('N_CONTA')
         n_centro_custo = request.form.get('N_CENTRO_CUSTO')
         data_str = request.form.get('DATA')
+        versao = request.form.get('VERSAO')
+        
+        # Sem as quatro colunas da chave a deleção poderia atingir outros registros
+        if not all([n_conta, n_centro_custo, data_str, versao]):
+            logger.error(f"Chave incompleta na deleção de registro: N_CONTA={n_conta}, N_CENTRO_CUSTO={n_centro_custo}, DATA={data_str}, VERSAO={versao}")
+            flash("Chave do registro incompleta: informe N_CONTA, N_CENTRO_CUSTO, DATA e VERSAO", "error")
+            return redirect(url_for('listar_registros'))
         try:
             data = parse_data_flexivel(data_str)
         except ValueError as e:
             logger.error(f"Formato de data inválido: {data_str}")
             flash(f"Formato de data inválido: {str(e)}", "error")
             return redirect(url_for('listar_registros'))
-        versao = request.form.get('VERSAO')
         
         logger.info(f"Iniciando deleção de registro: N_CONTA={n_conta}, N_CENTRO_CUSTO={n_centro_custo}, DATA={data}, VERSAO={versao}")
         
-        # Verifica se o arquivo de credenciais existe
-        if not BIGQUERY_CREDENTIALS_PATH.exists():
-            logger.error(f"Arquivo de credenciais não encontrado em: {BIGQUERY_CREDENTIALS_PATH}")
-            flash("Credenciais do BigQuery não encontradas", "error")
+        # Verifica se o armazém de dados está disponível
+        armazem = obter_armazem()
+        if not armazem.disponivel():
+            logger.error(armazem.descricao_indisponivel())
+            flash(armazem.descricao_indisponivel(), "error")
             return redirect(url_for('listar_registros'))
             
-        # Logs de debug para comparação
-        logger.info(f"[DELETAR] Caminho credenciais: {BIGQUERY_CREDENTIALS_PATH}")
-        logger.info(f"[DELETAR] Arquivo existe: {BIGQUERY_CREDENTIALS_PATH.exists()}")
-        logger.info(f"[DELETAR] Caminho absoluto: {BIGQUERY_CREDENTIALS_PATH.absolute()}")
-        logger.info(f"[DELETAR] Executável congelado: {getattr(sys, 'frozen', False)}")
-        logger.info(f"[DELETAR] Executável: {sys.executable}")
-        logger.info(f"[DELETAR] get_config_path(): {get_config_path()}")
-        logger.info(f"[DELETAR] CREDENTIALS_DIR: {CREDENTIALS_DIR}")
+        registrar_diagnostico_credenciais("DELETAR", armazem)
             
-        # Cria as credenciais a partir do arquivo JSON
-        credentials = service_account.Credentials.from_service_account_file(
-            BIGQUERY_CREDENTIALS_PATH,
-            scopes=["https://www.googleapis.com/auth/cloud-platform"]
-        )
-        logger.info("Credenciais do BigQuery carregadas com sucesso")
-        
-        # Inicializa o cliente do BigQuery
-        client = bigquery.Client(
-            project=BIGQUERY_CONFIG.get("project_id", "projeto-teste"),
-            credentials=credentials
-        )
-        logger.info(f"Cliente BigQuery inicializado com projeto: {BIGQUERY_CONFIG.get('project_id')}")
-        
-        # Define o ID do dataset e tabela
-        dataset_id = BIGQUERY_CONFIG.get("dataset_id", "silver")
-        table_id = BIGQUERY_CONFIG.get("table_id", "ORCADO")
-        metadata_table_id = BIGQUERY_CONFIG.get("metadata_table_id", "ORCADO_METADATA")
-        
-        # Query para deletar o registro
-        query = f"""
-        DELETE FROM `{dataset_id}.{table_id}`
-        WHERE 
-            N_CONTA = '{n_conta}'
-            AND N_CENTRO_CUSTO = '{n_centro_custo}'
-            AND DATA = DATE('{data}')
-            AND VERSAO = '{versao}'
-        """
-        
-        logger.info(f"Executando query de deleção: {query}")
-        
-        # Executa a query
-        query_job = client.query(query)
-        query_job.result()
+        # Exclui o registro pela chave completa
+        total_registros = armazem.excluir_registro({
+            "VERSAO": versao,
+            "DATA": data,
+            "N_CONTA": n_conta,
+            "N_CENTRO_CUSTO": n_centro_custo
+        })
+        if not total_registros:
+            flash("Registro não encontrado", "error")
+            return redirect(url_for('listar_registros'))
+        invalidar_cache_orcado("deleção de registro")
         logger.info("Query de deleção executada com sucesso")
         
         # Registra a deleção nos metadados
@@ -1288,49 +1209,15 @@ def deletar_registro():
             "SISTEMA_OPERACIONAL": str(platform.system()),
             "VERSAO_SISTEMA": str(platform.version()),
             "ARQUIVO_ORIGEM": f"DELETADO: {n_conta}/{n_centro_custo}/{data}/{versao}",
-            "TOTAL_REGISTROS": 1,
+            "TOTAL_REGISTROS": total_registros,
             "STATUS": "DELETADO",
             "DETALHES": "Registro deletado manualmente"
         }
         
         logger.info(f"Registrando metadados da deleção: {metadata}")
         
-        # Cria o DataFrame com tipos explícitos
-        df_metadata = pd.DataFrame({
-            "DATA_IMPORTACAO": [metadata["DATA_IMPORTACAO"]],
-            "USUARIO": [metadata["USUARIO"]],
-            "SISTEMA_OPERACIONAL": [metadata["SISTEMA_OPERACIONAL"]],
-            "VERSAO_SISTEMA": [metadata["VERSAO_SISTEMA"]],
-            "ARQUIVO_ORIGEM": [metadata["ARQUIVO_ORIGEM"]],
-            "TOTAL_REGISTROS": [metadata["TOTAL_REGISTROS"]],
-            "STATUS": [metadata["STATUS"]],
-            "DETALHES": [metadata["DETALHES"]]
-        })
-        
-        # Define o schema da tabela de metadados
-        metadata_schema = [
-            bigquery.SchemaField("DATA_IMPORTACAO", "TIMESTAMP", mode="REQUIRED"),
-            bigquery.SchemaField("USUARIO", "STRING", mode="REQUIRED"),
-            bigquery.SchemaField("SISTEMA_OPERACIONAL", "STRING", mode="REQUIRED"),
-            bigquery.SchemaField("VERSAO_SISTEMA", "STRING", mode="REQUIRED"),
-            bigquery.SchemaField("ARQUIVO_ORIGEM", "STRING", mode="REQUIRED"),
-            bigquery.SchemaField("TOTAL_REGISTROS", "INTEGER", mode="REQUIRED"),
-            bigquery.SchemaField("STATUS", "STRING", mode="REQUIRED"),
-            bigquery.SchemaField("DETALHES", "STRING", mode="REQUIRED")
-        ]
-        
-        # Configura o job para os metadados
-        metadata_job_config = bigquery.LoadJobConfig(
-            write_disposition=bigquery.WriteDisposition.WRITE_APPEND,
-            schema=metadata_schema
-        )
-        
-        # Carrega os metadados
-        metadata_table_ref = client.dataset(dataset_id).table(metadata_table_id)
-        metadata_job = client.load_table_from_dataframe(
-            df_metadata, metadata_table_ref, job_config=metadata_job_config
-        )
-        metadata_job.result()
+        # Registra a operação na tabela de metadados
+        armazem.registrar_metadados(metadata)
         
         flash("Registro deletado com sucesso", "success")
         
@@ -1350,48 +1237,38 @@ def deletar_por_versao():
             flash("Versão não especificada", "error")
             return redirect(url_for('listar_registros'))
         
-        # Verifica se o arquivo de credenciais existe
-        if not BIGQUERY_CREDENTIALS_PATH.exists():
-            flash("Credenciais do BigQuery não encontradas", "error")
+        # Verifica se o armazém de dados está disponível
+        armazem = obter_armazem()
+        if not armazem.disponivel():
+            flash(armazem.descricao_indisponivel(), "error")
             return redirect(url_for('listar_registros'))
             
-        # Logs de debug para comparação
-        logger.info(f"[DELETAR_VERSAO] Caminho credenciais: {BIGQUERY_CREDENTIALS_PATH}")
-        logger.info(f"[DELETAR_VERSAO] Arquivo existe: {BIGQUERY_CREDENTIALS_PATH.exists()}")
-        logger.info(f"[DELETAR_VERSAO] Caminho absoluto: {BIGQUERY_CREDENTIALS_PATH.absolute()}")
-        logger.info(f"[DELETAR_VERSAO] Executável congelado: {getattr(sys, 'frozen', False)}")
-        logger.info(f"[DELETAR_VERSAO] Executável: {sys.executable}")
-        logger.info(f"[DELETAR_VERSAO] get_config_path(): {get_config_path()}")
-        logger.info(f"[DELETAR_VERSAO] CREDENTIALS_DIR: {CREDENTIALS_DIR}")
+        registrar_diagnostico_credenciais("DELETAR_VERSAO", armazem)
             
-        # Cria as credenciais a partir do arquivo JSON
-        credentials = service_account.Credentials.from_service_account_file(
-            BIGQUERY_CREDENTIALS_PATH,
-            scopes=["https://www.googleapis.com/auth/cloud-platform"]
-        )
+        # Exclui os registros da versão
+        total_registros = armazem.excluir({'versao': versao})
+        invalidar_cache_orcado(f"deleção da versão {versao}")
         
-        # Inicializa o cliente do BigQuery
-        client = bigquery.Client(
-            project=BIGQUERY_CONFIG.get("project_id", "projeto-teste"),
-            credentials=credentials
-        )
-        
-        # Define o ID do dataset e tabela
-        dataset_id = BIGQUERY_CONFIG.get("dataset_id", "silver")
-        table_id = BIGQUERY_CONFIG.get("table_id", "ORCADO")
-        
-        # Query para deletar os registros
-        query = f"""
-        DELETE FROM `{dataset_id}.{table_id}`
-        WHERE VERSAO = '{versao}'
-        """
+        # Registra a deleção nos metadados
+        metadata = {
+            "DATA_IMPORTACAO": pd.Timestamp.now(),
+            "USUARIO": str(getpass.getuser()),
+            "SISTEMA_OPERACIONAL": str(platform.system()),
+            "VERSAO_SISTEMA": str(platform.version()),
+            "ARQUIVO_ORIGEM": f"DELETADO: Versão {versao}",
+            "TOTAL_REGISTROS": total_registros,
+            "STATUS": "DELETADO",
+            "DETALHES": f"Registros deletados para versão {versao}"
+        }
         
-        # Executa a query
-        query_job = client.query(query)
-        query_job.result()
+        # Registra a operação na tabela de metadados
+        armazem.registrar_metadados(metadata)
         
-        flash(f"Todos os registros da versão {versao} foram deletados com sucesso", "success")
+        flash(f"{total_registros} registros da versão {versao} foram deletados com sucesso", "success")
         
+    except LimiteCustoExcedido as e:
+        logger.warning(f"Deleção da versão recusada pelo limite de custo: {str(e)}")
+        flash(str(e), "warning")
     except Exception as e:
         logger.error(f"Erro ao deletar registros por versão: {str(e)}")
         flash(f"Erro ao deletar registros: {str(e)}", "error")
@@ -1408,46 +1285,17 @@ def deletar_por_filial():
             flash("Filial não especificada", "error")
             return redirect(url_for('listar_registros'))
         
-        # Verifica se o arquivo de credenciais existe
-        if not BIGQUERY_CREDENTIALS_PATH.exists():
-            flash("Credenciais do BigQuery não encontradas", "error")
+        # Verifica se o armazém de dados está disponível
+        armazem = obter_armazem()
+        if not armazem.disponivel():
+            flash(armazem.descricao_indisponivel(), "error")
             return redirect(url_for('listar_registros'))
             
-        # Logs de debug para comparação
-        logger.info(f"[DELETAR_FILIAL] Caminho credenciais: {BIGQUERY_CREDENTIALS_PATH}")
-        logger.info(f"[DELETAR_FILIAL] Arquivo existe: {BIGQUERY_CREDENTIALS_PATH.exists()}")
-        logger.info(f"[DELETAR_FILIAL] Caminho absoluto: {BIGQUERY_CREDENTIALS_PATH.absolute()}")
-        logger.info(f"[DELETAR_FILIAL] Executável congelado: {getattr(sys, 'frozen', False)}")
-        logger.info(f"[DELETAR_FILIAL] Executável: {sys.executable}")
-        logger.info(f"[DELETAR_FILIAL] get_config_path(): {get_config_path()}")
-        logger.info(f"[DELETAR_FILIAL] CREDENTIALS_DIR: {CREDENTIALS_DIR}")
+        registrar_diagnostico_credenciais("DELETAR_FILIAL", armazem)
             
-        # Cria as credenciais a partir do arquivo JSON
-        credentials = service_account.Credentials.from_service_account_file(
-            BIGQUERY_CREDENTIALS_PATH,
-            scopes=["https://www.googleapis.com/auth/cloud-platform"]
-        )
-        
-        # Inicializa o cliente do BigQuery
-        client = bigquery.Client(
-            project=BIGQUERY_CONFIG.get("project_id", "projeto-teste"),
-            credentials=credentials
-        )
-        
-        # Define o ID do dataset e tabela
-        dataset_id = BIGQUERY_CONFIG.get("dataset_id", "silver")
-        table_id = BIGQUERY_CONFIG.get("table_id", "ORCADO")
-        metadata_table_id = BIGQUERY_CONFIG.get("metadata_table_id", "ORCADO_METADATA")
-        
-        # Query para deletar os registros
-        query = f"""
-        DELETE FROM `{dataset_id}.{table_id}`
-        WHERE FILIAL = '{filial}'
-        """
-        
-        # Executa a query
-        query_job = client.query(query)
-        query_job.result()
+        # Exclui os registros da filial
+        total_registros = armazem.excluir({'filial': filial})
+        invalidar_cache_orcado(f"deleção da filial {filial}")
         
         # Registra a deleção nos metadados
         metadata = {
@@ -1456,313 +1304,165 @@ def deletar_por_filial():
             "SISTEMA_OPERACIONAL": str(platform.system()),
             "VERSAO_SISTEMA": str(platform.version()),
             "ARQUIVO_ORIGEM": f"DELETADO: Filial {filial}",
-            "TOTAL_REGISTROS": 0,  # Não sabemos o número exato de registros deletados
+            "TOTAL_REGISTROS": total_registros,
             "STATUS": "DELETADO",
             "DETALHES": f"Registros deletados para filial {filial}"
         }
         
-        # Cria o DataFrame com tipos explícitos
-        df_metadata = pd.DataFrame({
-            "DATA_IMPORTACAO": [metadata["DATA_IMPORTACAO"]],
-            "USUARIO": [metadata["USUARIO"]],
-            "SISTEMA_OPERACIONAL": [metadata["SISTEMA_OPERACIONAL"]],
-            "VERSAO_SISTEMA": [metadata["VERSAO_SISTEMA"]],
-            "ARQUIVO_ORIGEM": [metadata["ARQUIVO_ORIGEM"]],
-            "TOTAL_REGISTROS": [metadata["TOTAL_REGISTROS"]],
-            "STATUS": [metadata["STATUS"]],
-            "DETALHES": [metadata["DETALHES"]]
-        })
-        
-        # Define o schema da tabela de metadados
-        metadata_schema = [
-            bigquery.SchemaField("DATA_IMPORTACAO", "TIMESTAMP", mode="REQUIRED"),
-            bigquery.SchemaField("USUARIO", "STRING", mode="REQUIRED"),
-            bigquery.SchemaField("SISTEMA_OPERACIONAL", "STRING", mode="REQUIRED"),
-            bigquery.SchemaField("VERSAO_SISTEMA", "STRING", mode="REQUIRED"),
-            bigquery.SchemaField("ARQUIVO_ORIGEM", "STRING", mode="REQUIRED"),
-            bigquery.SchemaField("TOTAL_REGISTROS", "INTEGER", mode="REQUIRED"),
-            bigquery.SchemaField("STATUS", "STRING", mode="REQUIRED"),
-            bigquery.SchemaField("DETALHES", "STRING", mode="REQUIRED")
-        ]
-        
-        # Configura o job para os metadados
-        metadata_job_config = bigquery.LoadJobConfig(
-            write_disposition=bigquery.WriteDisposition.WRITE_APPEND,
-            schema=metadata_schema
-        )
-        
-        # Carrega os metadados
-        metadata_table_ref = client.dataset(dataset_id).table(metadata_table_id)
-        metadata_job = client.load_table_from_dataframe(
-            df_metadata, metadata_table_ref, job_config=metadata_job_config
-        )
-        metadata_job.result()
+        # Registra a operação na tabela de metadados
+        armazem.registrar_metadados(metadata)
         
-        flash(f"Registros da filial {filial} foram deletados com sucesso", "success")
+        flash(f"{total_registros} registros da filial {filial} foram deletados com sucesso", "success")
         
+    except LimiteCustoExcedido as e:
+        logger.warning(f"Deleção da filial recusada pelo limite de custo: {str(e)}")
+        flash(str(e), "warning")
     except Exception as e:
         logger.error(f"Erro ao deletar registros por filial: {str(e)}")
         flash(f"Erro ao deletar registros: {str(e)}", "error")
         
     return redirect(url_for('listar_registros'))
 
+def transmitir_arquivo(caminho, tamanho_parte=1024 * 1024):
+    """Lê um arquivo em partes para uma resposta em streaming."""
+    with open(caminho, 'rb') as f:
+        while True:
+            parte = f.read(tamanho_parte)
+            if not parte:
+                break
+            yield parte
+
+@app.route('/exportar')
 @app.route('/exportar-excel')
-def exportar_excel():
-    """Exporta os registros filtrados para Excel."""
+def exportar_registros():
+    """Inicia a exportação dos registros filtrados em segundo plano."""
     try:
-        # Obtém os filtros da query string
-        n_conta = request.args.get('n_conta', '')
-        n_centro_custo = request.args.get('n_centro_custo', '')
-        data_inicio = request.args.get('data_inicio', '')
-        data_fim = request.args.get('data_fim', '')
-        versao = request.args.get('versao', '')
-        operacao = request.args.get('operacao', '')
-        filial = request.args.get('filial', '')
-        rateio = request.args.get('rateio', '')
-        origem = request.args.get('origem', '')
-        
-        # Verifica se o arquivo de credenciais existe
-        if not BIGQUERY_CREDENTIALS_PATH.exists():
-            flash("Credenciais do BigQuery não encontradas", "error")
+        # Obtém os filtros e o formato da query string
+        filtros = ler_filtros(request.args)
+        formato = request.args.get('formato', FORMATO_PADRAO)
+        if formato not in FORMATOS_EXPORTACAO:
+            flash(f"Formato de exportação inválido: {formato}", "error")
+            return redirect(url_for('listar_registros', **filtros))
+        
+        # Verifica se o armazém de dados está disponível
+        armazem = obter_armazem()
+        if not armazem.disponivel():
+            flash(armazem.descricao_indisponivel(), "error")
             return redirect(url_for('listar_registros'))
-            
-        # Logs de debug para comparação
-        logger.info(f"[EXPORTAR_EXCEL] Caminho credenciais: {BIGQUERY_CREDENTIALS_PATH}")
-        logger.info(f"[EXPORTAR_EXCEL] Arquivo existe: {BIGQUERY_CREDENTIALS_PATH.exists()}")
-        logger.info(f"[EXPORTAR_EXCEL] Caminho absoluto: {BIGQUERY_CREDENTIALS_PATH.absolute()}")
-        logger.info(f"[EXPORTAR_EXCEL] Executável congelado: {getattr(sys, 'frozen', False)}")
-        logger.info(f"[EXPORTAR_EXCEL] Executável: {sys.executable}")
-        logger.info(f"[EXPORTAR_EXCEL] get_config_path(): {get_config_path()}")
-        logger.info(f"[EXPORTAR_EXCEL] CREDENTIALS_DIR: {CREDENTIALS_DIR}")
-            
-        # Cria as credenciais a partir do arquivo JSON
-        credentials = service_account.Credentials.from_service_account_file(
-            BIGQUERY_CREDENTIALS_PATH,
-            scopes=["https://www.googleapis.com/auth/cloud-platform"]
-        )
         
-        # Inicializa o cliente do BigQuery
-        client = bigquery.Client(
-            project=BIGQUERY_CONFIG.get("project_id", "projeto-teste"),
-            credentials=credentials
-        )
-        
-        # Define o ID do dataset e tabela
-        dataset_id = BIGQUERY_CONFIG.get("dataset_id", "silver")
-        table_id = BIGQUERY_CONFIG.get("table_id", "ORCADO")
-        
-        # Constrói a query base
-        query = f"""
-            SELECT 
-                N_CONTA,
-                N_CENTRO_CUSTO,
-                DESCRICAO,
-                VALOR,
-                DATA,
-                VERSAO,
-                OPERACAO,
-                DATA_ATUALIZACAO,
-                FILIAL,
-                RATEIO,
-                ORIGEM
-            FROM `{BIGQUERY_CONFIG.get('project_id')}.{dataset_id}.{table_id}`
-            WHERE 1=1
-        """
-        
-        # Adiciona os filtros
-        if n_conta:
-            query += f" AND CAST(N_CONTA AS STRING) = '{n_conta}'"
-        if n_centro_custo:
-            query += f" AND CAST(N_CENTRO_CUSTO AS STRING) = '{n_centro_custo}'"
-        if data_inicio:
-            query += f" AND DATA >= DATE('{data_inicio}')"
-        if data_fim:
-            query += f" AND DATA <= DATE('{data_fim}')"
-        if versao:
-            query += f" AND VERSAO = '{versao}'"
-        if operacao:
-            query += f" AND OPERACAO = '{operacao}'"
-        if filial:
-            query += f" AND CAST(FILIAL AS STRING) = '{filial}'"
-        if rateio:
-            query += f" AND RATEIO = '{rateio}'"
-        if origem:
-            query += f" AND ORIGEM LIKE '%{origem}%'"
-        
-        # Adiciona ordenação
-        query += " ORDER BY DATA_ATUALIZACAO DESC"
-        
-        # Executa a query
-        query_job = client.query(query)
-        registros = [dict(row) for row in query_job]
-        
-        # Cria um DataFrame com os registros
-        df = pd.DataFrame(registros)
-        
-        # Formata as colunas
-        df['DATA'] = pd.to_datetime(df['DATA']).dt.strftime('%d/%m/%Y')
-        df['DATA_ATUALIZACAO'] = pd.to_datetime(df['DATA_ATUALIZACAO']).dt.strftime('%d/%m/%Y %H:%M:%S')
-        df['VALOR'] = df['VALOR'].apply(lambda x: f"R$ {x:,.2f}")
-        
-        # Renomeia as colunas
-        df = df.rename(columns={
-            'N_CONTA': 'Conta',
-            'N_CENTRO_CUSTO': 'Centro de Custo',
-            'DESCRICAO': 'Descrição',
-            'VALOR': 'Valor',
-            'DATA': 'Data',
-            'VERSAO': 'Versão',
-            'OPERACAO': 'Operação',
-            'DATA_ATUALIZACAO': 'Data de Atualização',
-            'FILIAL': 'Filial',
-            'RATEIO': 'Rateio',
-            'ORIGEM': 'Origem'
-        })
-        
-        # Cria o arquivo Excel
-        output = BytesIO()
-        with pd.ExcelWriter(output, engine='xlsxwriter') as writer:
-            df.to_excel(writer, sheet_name='Registros', index=False)
-            
-            # Ajusta a largura das colunas
-            worksheet = writer.sheets['Registros']
-            for i, col in enumerate(df.columns):
-                max_length = max(df[col].astype(str).apply(len).max(), len(col)) + 2
-                worksheet.set_column(i, i, max_length)
+        # O total da tela de registros (se ainda em cache) permite mostrar o percentual
+        total_estimado = cache_registros.obter(chave_filtros('registros_total', filtros))
         
-        output.seek(0)
+        exportacao_id = str(uuid.uuid4())
+        ExportacaoThread(exportacao_id, filtros, formato, total_estimado).start()
+        logger.info(f"[EXPORTACAO] {exportacao_id} iniciada ({formato}): {descrever_filtros(filtros)}")
         
-        # Gera o nome do arquivo com timestamp
-        timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-        filename = f'registros_{timestamp}.xlsx'
-        
-        return send_file(
-            output,
-            mimetype='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
-            as_attachment=True,
-            download_name=filename
-        )
+        return redirect(url_for('status_exportacao', exportacao_id=exportacao_id))
         
     except Exception as e:
-        logger.error(f"Erro ao exportar para Excel: {str(e)}")
-        flash(f"Erro ao exportar para Excel: {str(e)}", "danger")
+        logger.error(f"Erro ao iniciar exportação: {str(e)}")
+        flash(f"Erro ao iniciar exportação: {str(e)}", "danger")
+        return redirect(url_for('listar_registros'))
+
+@app.route('/exportacoes/<exportacao_id>')
+def status_exportacao(exportacao_id):
+    """Página de acompanhamento de uma exportação."""
+    status = processamentos.get(exportacao_id)
+    if status is None or status.get('tipo') != 'exportacao':
+        flash('Exportação não encontrada', 'error')
+        return redirect(url_for('listar_registros'))
+    
+    return render_template('exportacao.html',
+                         exportacao_id=exportacao_id,
+                         status=status,
+                         now=datetime.now())
+
+@app.route('/exportacoes/<exportacao_id>/cancelar', methods=['POST'])
+def cancelar_exportacao(exportacao_id):
+    """Cancela uma exportação na fila ou em andamento."""
+    if not processamentos.cancelar(exportacao_id):
+        return jsonify({"erro": "Exportação não encontrada ou já concluída"}), 404
+    return jsonify({"cancelamento_solicitado": True})
+
+@app.route('/exportacoes/<exportacao_id>/download')
+def download_exportacao(exportacao_id):
+    """Envia o arquivo de uma exportação concluída."""
+    status = processamentos.get(exportacao_id)
+    if status is None or status.get('tipo') != 'exportacao' or not status["sucesso"]:
+        flash('Exportação não encontrada ou ainda não concluída', 'error')
+        return redirect(url_for('listar_registros'))
+    
+    caminho = status["arquivo"]
+    if not os.path.exists(caminho):
+        flash('O arquivo da exportação expirou; exporte novamente', 'error')
         return redirect(url_for('listar_registros'))
+    
+    # Envia o arquivo em partes, sem carregá-lo inteiro em memória
+    return Response(
+        transmitir_arquivo(caminho),
+        mimetype=FORMATOS_EXPORTACAO[status["formato"]][1],
+        headers={
+            'Content-Disposition': f'attachment; filename={status["nome_download"]}',
+            'Content-Length': str(os.path.getsize(caminho))
+        }
+    )
+
+@app.route('/registros/previa_exclusao')
+def previa_exclusao():
+    """Prévia da deleção por filtros: registros afetados e bytes estimados (dry-run)."""
+    filtros = ler_filtros(request.args)
+    if not possui_filtros(filtros):
+        return jsonify({"erro": "É necessário aplicar pelo menos um filtro para deletar registros"}), 400
+    
+    try:
+        armazem = obter_armazem()
+        if not armazem.disponivel():
+            return jsonify({"erro": armazem.descricao_indisponivel()}), 503
+        
+        previa = armazem.estimar_exclusao(filtros)
+        limite = limite_bytes("exclusao")
+        bytes_estimados = previa["BYTES_ESTIMADOS"]
+        return jsonify({
+            "registros": previa["REGISTROS"],
+            "bytes_estimados": bytes_estimados,
+            "bytes_formatados": formatar_bytes(bytes_estimados) if bytes_estimados is not None else None,
+            "limite_bytes": limite,
+            "limite_formatado": formatar_bytes(limite) if limite is not None else None,
+            "excede_limite": bytes_estimados is not None and limite is not None and bytes_estimados > limite
+        })
+    except Exception as e:
+        logger.error(f"Erro na prévia da deleção: {str(e)}")
+        return jsonify({"erro": str(e)}), 500
 
 @app.route('/registros/deletar_filtros', methods=['POST'])
 def deletar_por_filtros():
     """Deleta registros baseado nos filtros aplicados."""
     try:
         # Obtém os parâmetros de filtro
-        n_conta = request.form.get('n_conta', '')
-        n_centro_custo = request.form.get('n_centro_custo', '')
-        data_inicio = request.form.get('data_inicio', '')
-        data_fim = request.form.get('data_fim', '')
-        versao = request.form.get('versao', '')
-        filial = request.form.get('filial', '')
-        operacao = request.form.get('operacao', '')
-        rateio = request.form.get('rateio', '')
-        origem = request.form.get('origem', '')
+        filtros = ler_filtros(request.form)
         
         # Verifica se pelo menos um filtro foi aplicado
-        if not any([n_conta, n_centro_custo, data_inicio, data_fim, versao, filial, operacao, rateio, origem]):
+        if not possui_filtros(filtros):
             flash("É necessário aplicar pelo menos um filtro para deletar registros", "error")
             return redirect(url_for('listar_registros'))
         
-        # Verifica se o arquivo de credenciais existe
-        if not BIGQUERY_CREDENTIALS_PATH.exists():
-            flash("Credenciais do BigQuery não encontradas", "error")
+        # Verifica se o armazém de dados está disponível
+        armazem = obter_armazem()
+        if not armazem.disponivel():
+            flash(armazem.descricao_indisponivel(), "error")
             return redirect(url_for('listar_registros'))
             
-        # Logs de debug para comparação
-        logger.info(f"[DELETAR_FILTROS] Caminho credenciais: {BIGQUERY_CREDENTIALS_PATH}")
-        logger.info(f"[DELETAR_FILTROS] Arquivo existe: {BIGQUERY_CREDENTIALS_PATH.exists()}")
-        logger.info(f"[DELETAR_FILTROS] Caminho absoluto: {BIGQUERY_CREDENTIALS_PATH.absolute()}")
-        logger.info(f"[DELETAR_FILTROS] Executável congelado: {getattr(sys, 'frozen', False)}")
-        logger.info(f"[DELETAR_FILTROS] Executável: {sys.executable}")
-        logger.info(f"[DELETAR_FILTROS] get_config_path(): {get_config_path()}")
-        logger.info(f"[DELETAR_FILTROS] CREDENTIALS_DIR: {CREDENTIALS_DIR}")
+        registrar_diagnostico_credenciais("DELETAR_FILTROS", armazem)
             
-        # Cria as credenciais a partir do arquivo JSON
-        credentials = service_account.Credentials.from_service_account_file(
-            BIGQUERY_CREDENTIALS_PATH,
-            scopes=["https://www.googleapis.com/auth/cloud-platform"]
-        )
-        
-        # Inicializa o cliente do BigQuery
-        client = bigquery.Client(
-            project=BIGQUERY_CONFIG.get("project_id", "projeto-teste"),
-            credentials=credentials
-        )
-        
-        # Define o ID do dataset e tabela
-        dataset_id = BIGQUERY_CONFIG.get("dataset_id", "silver")
-        table_id = BIGQUERY_CONFIG.get("table_id", "ORCADO")
-        metadata_table_id = BIGQUERY_CONFIG.get("metadata_table_id", "ORCADO_METADATA")
-        
-        # Primeiro, verifica quantos registros serão afetados
-        count_query = f"""
-        SELECT COUNT(*) as total
-        FROM `{dataset_id}.{table_id}`
-        WHERE 1=1
-        """
-        
-        if n_conta:
-            count_query += f" AND CAST(N_CONTA AS STRING) = '{n_conta}'"
-        if n_centro_custo:
-            count_query += f" AND CAST(N_CENTRO_CUSTO AS STRING) = '{n_centro_custo}'"
-        if data_inicio:
-            count_query += f" AND DATA >= DATE('{data_inicio}')"
-        if data_fim:
-            count_query += f" AND DATA <= DATE('{data_fim}')"
-        if versao:
-            count_query += f" AND VERSAO = '{versao}'"
-        if filial:
-            count_query += f" AND CAST(FILIAL AS STRING) = '{filial}'"
-        if operacao:
-            count_query += f" AND OPERACAO = '{operacao}'"
-        if rateio:
-            count_query += f" AND RATEIO = '{rateio}'"
-        if origem:
-            count_query += f" AND ORIGEM LIKE '%{origem}%'"
-        
-        # Executa a query de contagem
-        count_job = client.query(count_query)
-        count_result = count_job.result()
-        total_registros = next(count_result).total
+        # Exclui os registros filtrados; o total de linhas afetadas vem da própria
+        # deleção, dispensando a consulta de contagem anterior
+        total_registros = armazem.excluir(filtros)
+        invalidar_cache_orcado("deleção por filtros")
         
         if total_registros == 0:
             flash("Nenhum registro encontrado com os filtros aplicados", "warning")
             return redirect(url_for('listar_registros'))
         
-        # Constrói a query de deleção com os filtros
-        delete_query = f"""
-        DELETE FROM `{dataset_id}.{table_id}`
-        WHERE 1=1
-        """
-        
-        if n_conta:
-            delete_query += f" AND CAST(N_CONTA AS STRING) = '{n_conta}'"
-        if n_centro_custo:
-            delete_query += f" AND CAST(N_CENTRO_CUSTO AS STRING) = '{n_centro_custo}'"
-        if data_inicio:
-            delete_query += f" AND DATA >= DATE('{data_inicio}')"
-        if data_fim:
-            delete_query += f" AND DATA <= DATE('{data_fim}')"
-        if versao:
-            delete_query += f" AND VERSAO = '{versao}'"
-        if filial:
-            delete_query += f" AND CAST(FILIAL AS STRING) = '{filial}'"
-        if operacao:
-            delete_query += f" AND OPERACAO = '{operacao}'"
-        if rateio:
-            delete_query += f" AND RATEIO = '{rateio}'"
-        if origem:
-            delete_query += f" AND ORIGEM LIKE '%{origem}%'"
-        
-        # Executa a query de deleção
-        delete_job = client.query(delete_query)
-        delete_job.result()
-        
         # Registra a deleção nos metadados
         metadata = {
             "DATA_IMPORTACAO": pd.Timestamp.now(),
@@ -1772,54 +1472,141 @@ def deletar_por_filtros():
             "ARQUIVO_ORIGEM": f"DELETADO: Filtros aplicados",
             "TOTAL_REGISTROS": total_registros,
             "STATUS": "DELETADO",
-            "DETALHES": f"Registros deletados com filtros: Filial={filial}, Conta={n_conta}, Centro Custo={n_centro_custo}, Data Início={data_inicio}, Data Fim={data_fim}, Versão={versao}, Operação={operacao}, Rateio={rateio}, Origem={origem}"
+            "DETALHES": f"Registros deletados com filtros: {descrever_filtros(filtros)}"
         }
         
-        # Cria o DataFrame com tipos explícitos
-        df_metadata = pd.DataFrame({
-            "DATA_IMPORTACAO": [metadata["DATA_IMPORTACAO"]],
-            "USUARIO": [metadata["USUARIO"]],
-            "SISTEMA_OPERACIONAL": [metadata["SISTEMA_OPERACIONAL"]],
-            "VERSAO_SISTEMA": [metadata["VERSAO_SISTEMA"]],
-            "ARQUIVO_ORIGEM": [metadata["ARQUIVO_ORIGEM"]],
-            "TOTAL_REGISTROS": [metadata["TOTAL_REGISTROS"]],
-            "STATUS": [metadata["STATUS"]],
-            "DETALHES": [metadata["DETALHES"]]
-        })
-        
-        # Define o schema da tabela de metadados
-        metadata_schema = [
-            bigquery.SchemaField("DATA_IMPORTACAO", "TIMESTAMP", mode="REQUIRED"),
-            bigquery.SchemaField("USUARIO", "STRING", mode="REQUIRED"),
-            bigquery.SchemaField("SISTEMA_OPERACIONAL", "STRING", mode="REQUIRED"),
-            bigquery.SchemaField("VERSAO_SISTEMA", "STRING", mode="REQUIRED"),
-            bigquery.SchemaField("ARQUIVO_ORIGEM", "STRING", mode="REQUIRED"),
-            bigquery.SchemaField("TOTAL_REGISTROS", "INTEGER", mode="REQUIRED"),
-            bigquery.SchemaField("STATUS", "STRING", mode="REQUIRED"),
-            bigquery.SchemaField("DETALHES", "STRING", mode="REQUIRED")
-        ]
-        
-        # Configura o job para os metadados
-        metadata_job_config = bigquery.LoadJobConfig(
-            write_disposition=bigquery.WriteDisposition.WRITE_APPEND,
-            schema=metadata_schema
-        )
-        
-        # Carrega os metadados
-        metadata_table_ref = client.dataset(dataset_id).table(metadata_table_id)
-        metadata_job = client.load_table_from_dataframe(
-            df_metadata, metadata_table_ref, job_config=metadata_job_config
-        )
-        metadata_job.result()
+        # Registra a operação na tabela de metadados
+        armazem.registrar_metadados(metadata)
         
         flash(f"{total_registros} registros foram deletados com sucesso", "success")
         
+    except LimiteCustoExcedido as e:
+        logger.warning(f"Deleção por filtros recusada pelo limite de custo: {str(e)}")
+        flash(str(e), "warning")
     except Exception as e:
         logger.error(f"Erro ao deletar registros por filtros: {str(e)}")
         flash(f"Erro ao deletar registros: {str(e)}", "error")
         
     return redirect(url_for('listar_registros'))
 
+@app.route('/versoes')
+def listar_versoes():
+    """Retorna o catálogo de versões com total de registros e última atualização."""
+    try:
+        armazem = obter_armazem()
+        if not armazem.disponivel():
+            return jsonify({"erro": armazem.descricao_indisponivel()}), 503
+        
+        versoes = armazem.listar_versoes()
+        return jsonify([
+            {
+                "versao": v["VERSAO"],
+                "total_registros": v["TOTAL_REGISTROS"],
+                "ultima_atualizacao": v["ULTIMA_ATUALIZACAO"].isoformat() if v["ULTIMA_ATUALIZACAO"] else None
+            }
+            for v in versoes
+        ])
+    except Exception as e:
+        logger.error(f"Erro ao listar versões: {str(e)}")
+        return jsonify({"erro": str(e)}), 500
+
+def _consultar_resumo(armazem, args):
+    """
+    Lê os parâmetros do resumo e busca os totais (com cache de resultados).
+
+    Sem versão informada, usa a versão mais recente do catálogo.
+    """
+    versoes = armazem.listar_versoes()
+    parametros = {
+        'versao': args.get('versao', '').strip() or (versoes[0]["VERSAO"] if versoes else ''),
+        'filial': args.get('filial', '').strip(),
+        'n_conta': args.get('n_conta', '').strip(),
+        'agrupar': normalizar_agrupamento(args.get('agrupar', ''))
+    }
+    if not parametros['versao']:
+        return versoes, parametros, []
+    
+    chave = chave_filtros('resumo', parametros)
+    geracao_cache = cache_registros.geracao
+    linhas = cache_registros.obter(chave)
+    if linhas is None:
+        linhas = armazem.resumo(
+            parametros['versao'], parametros['filial'] or None,
+            parametros['n_conta'] or None, parametros['agrupar']
+        )
+        cache_registros.armazenar(chave, linhas, geracao_cache)
+    return versoes, parametros, linhas
+
+@app.route('/resumo')
+def resumo():
+    """Tabela dinâmica com os totais de VALOR por filial/conta e mês de uma versão."""
+    try:
+        armazem = obter_armazem()
+        if not armazem.disponivel():
+            flash(armazem.descricao_indisponivel(), "error")
+            return redirect(url_for('index'))
+        
+        versoes, parametros, linhas = _consultar_resumo(armazem, request.args)
+        return render_template('resumo.html',
+                             versoes=versoes,
+                             parametros=parametros,
+                             agrupamentos=AGRUPAMENTOS,
+                             pivo=montar_pivo(linhas, parametros['agrupar']),
+                             tempo_pagina_ms=(time.perf_counter() - g.inicio_requisicao) * 1000,
+                             now=datetime.now())
+    except Exception as e:
+        logger.error(f"Erro ao montar resumo: {str(e)}")
+        flash(f"Erro ao montar resumo: {str(e)}", "danger")
+        return redirect(url_for('index'))
+
+@app.route('/api/resumo')
+def api_resumo():
+    """Retorna os totais do resumo em JSON (mesmos parâmetros da página /resumo)."""
+    try:
+        armazem = obter_armazem()
+        if not armazem.disponivel():
+            return jsonify({"erro": armazem.descricao_indisponivel()}), 503
+        
+        _, parametros, linhas = _consultar_resumo(armazem, request.args)
+        return jsonify({
+            **parametros,
+            "totais": [
+                {
+                    **{coluna.lower(): linha[coluna] for coluna in AGRUPAMENTOS[parametros['agrupar']]},
+                    "mes": linha["MES"].isoformat(),
+                    "total_valor": float(linha["TOTAL_VALOR"] or 0),
+                    "qtd_registros": int(linha["QTD_REGISTROS"] or 0)
+                }
+                for linha in linhas
+            ]
+        })
+    except Exception as e:
+        logger.error(f"Erro ao consultar resumo: {str(e)}")
+        return jsonify({"erro": str(e)}), 500
+
+@app.route('/historico')
+def historico():
+    """Histórico dos processamentos e exportações, dos mais recentes para os mais antigos."""
+    tipo = request.args.get('tipo', '')
+    if tipo not in ('', 'importacao', 'exportacao'):
+        tipo = ''
+    try:
+        itens = processamentos.listar(limite=200, tipo=tipo or None)
+    except Exception as e:
+        logger.error(f"Erro ao listar histórico: {str(e)}")
+        flash(f"Erro ao listar histórico: {str(e)}", "danger")
+        return redirect(url_for('index'))
+    
+    return render_template('historico.html',
+                         itens=itens,
+                         tipo=tipo,
+                         now=datetime.now())
+
+@app.route('/cache/estatisticas')
+def estatisticas_cache():
+    """Retorna os contadores do cache de resultados para os operadores."""
+    return jsonify(cache_registros.estatisticas())
+
 @app.route('/diagnostico_bigquery')
 def diagnostico_bigquery():
     """Página de diagnóstico do BigQuery."""
@@ -1831,7 +1618,14 @@ def diagnostico_bigquery():
             "executavel_congelado": getattr(sys, 'frozen', False),
             "executavel": sys.executable,
             "config_path": get_config_path(),
-            "data_path": get_data_path()
+            "data_path": get_data_path(),
+            "armazem": obter_armazem().descricao(),
+            "clientes_gcp": provedor_gcp.estado(),
+            "latencias": metricas_latencia.resumo(),
+            "cache": cache_registros.estatisticas(),
+            "auditoria": obter_armazem().auditoria.estatisticas(),
+            "agendador_importacoes": agendador_importacoes.situacao(),
+            "processamentos": processamentos.estatisticas()
         }
         
         # Tenta carregar as credenciais
@@ -1864,4 +1658,5 @@ def diagnostico_bigquery():
                              now=datetime.now())
 
 if __name__ == "__main__":
+    aquecer_clientes()
     app.run(debug=True) 
\ No newline at end of file
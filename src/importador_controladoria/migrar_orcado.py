@@ -0,0 +1,239 @@
+"""
+Migração da tabela ORCADO para o layout particionado e clusterizado.
+
+Uso:
+    python -m importador_controladoria.migrar_orcado            # só relatório
+    python -m importador_controladoria.migrar_orcado --executar # migra e compara
+    python -m importador_controladoria.migrar_orcado --preencher-hash
+
+A migração cria uma nova tabela com partição mensal em DATA e cluster em
+VERSAO, FILIAL e N_CONTA, copia os dados, confere a contagem de linhas e troca
+as tabelas por renomeação. A tabela antiga é mantida como backup, a menos que
+`--remover-backup` seja informado.
+
+O relatório compara os bytes que as consultas típicas (importação, listagem e
+deleção) leriam antes e depois, estimados por dry run. O dry run considera a
+poda de partições, mas não a de clusters, então os valores "depois" são um
+limite superior: a leitura real costuma ser menor.
+
+`--preencher-hash` calcula a coluna ROW_HASH das linhas gravadas antes de ela
+existir, para que a primeira reimportação dessas versões não as reescreva.
+"""
+
+import argparse
+import logging
+import logging.config
+import time
+
+from google.cloud import bigquery
+
+from .config import BIGQUERY_CONFIG, LOG_CONFIG
+from .clientes_gcp import obter_cliente_bigquery
+from .esquema import COLUNAS_ORCADO, COLUNAS_CLUSTER, nova_tabela_orcado, layout_otimizado, garantir_tabela_orcado
+from .delta_importacao import expressao_hash_conteudo
+
+logging.config.dictConfig(LOG_CONFIG)
+logger = logging.getLogger(__name__)
+
+
+def _formatar_bytes(total):
+    """Formata um total de bytes em unidade legível."""
+    for unidade in ("B", "KB", "MB", "GB", "TB"):
+        if total < 1024 or unidade == "TB":
+            return f"{total:,.1f} {unidade}"
+        total /= 1024
+
+
+def obter_amostra(client, tabela, versao=None, filial=None):
+    """
+    Escolhe os valores usados nas consultas de referência.
+
+    Sem argumentos, usa a versão mais recente, uma filial dessa versão e o
+    intervalo de datas da versão.
+    """
+    condicao = "WHERE VERSAO = @versao" if versao else ""
+    parametros = [bigquery.ScalarQueryParameter("versao", "STRING", versao)] if versao else []
+    query = f"""
+        SELECT VERSAO, ANY_VALUE(FILIAL) AS FILIAL, MIN(DATA) AS DATA_MIN, MAX(DATA) AS DATA_MAX
+        FROM `{tabela}`
+        {condicao}
+        GROUP BY VERSAO
+        ORDER BY VERSAO DESC
+        LIMIT 1
+    """
+    linha = next(iter(client.query(query, job_config=bigquery.QueryJobConfig(query_parameters=parametros)).result()), None)
+    if linha is None:
+        raise ValueError("Tabela ORCADO sem registros para montar as consultas de referência")
+    return {
+        "versao": linha.VERSAO,
+        "filial": filial or linha.FILIAL,
+        "data_min": linha.DATA_MIN,
+        "data_max": linha.DATA_MAX
+    }
+
+
+def consultas_referencia(tabela, amostra):
+    """Consultas típicas da aplicação, com os mesmos predicados usados nas rotas."""
+    parametros = [
+        bigquery.ScalarQueryParameter("versao", "STRING", amostra["versao"]),
+        bigquery.ScalarQueryParameter("filial", "STRING", amostra["filial"]),
+        bigquery.ScalarQueryParameter("data_min", "DATE", amostra["data_min"]),
+        bigquery.ScalarQueryParameter("data_max", "DATE", amostra["data_max"])
+    ]
+    consultas = {
+        "contagem da versão (importação)": f"""
+            SELECT COUNT(*) FROM `{tabela}` WHERE VERSAO = @versao
+        """,
+        "leitura do MERGE (importação)": f"""
+            SELECT N_CONTA, N_CENTRO_CUSTO, DATA, VERSAO FROM `{tabela}`
+            WHERE VERSAO = @versao AND DATA BETWEEN @data_min AND @data_max
+        """,
+        "listagem por filial e período": f"""
+            SELECT * FROM `{tabela}`
+            WHERE VERSAO = @versao AND FILIAL = @filial
+              AND DATA >= @data_min AND DATA <= @data_max
+        """,
+        "deleção da versão": f"""
+            DELETE FROM `{tabela}` WHERE VERSAO = @versao
+        """
+    }
+    return {nome: (sql, parametros) for nome, sql in consultas.items()}
+
+
+def medir_bytes(client, consultas):
+    """Estima, por dry run, os bytes lidos por cada consulta."""
+    resultado = {}
+    for nome, (sql, parametros) in consultas.items():
+        job_config = bigquery.QueryJobConfig(
+            dry_run=True,
+            use_query_cache=False,
+            query_parameters=parametros
+        )
+        job = client.query(sql, job_config=job_config)
+        resultado[nome] = job.total_bytes_processed or 0
+    return resultado
+
+
+def imprimir_relatorio(antes, depois=None):
+    """Imprime a comparação de bytes lidos antes e depois da migração."""
+    print("\nBytes lidos por consulta (estimativa por dry run)")
+    print("-" * 78)
+    for nome, bytes_antes in antes.items():
+        linha = f"{nome:<34} antes: {_formatar_bytes(bytes_antes):>12}"
+        if depois is not None:
+            bytes_depois = depois.get(nome, 0)
+            reducao = (1 - bytes_depois / bytes_antes) * 100 if bytes_antes else 0.0
+            linha += f"  depois: {_formatar_bytes(bytes_depois):>12}  (-{reducao:.0f}%)"
+        print(linha)
+    print("-" * 78)
+
+
+def migrar(client, remover_backup=False):
+    """
+    Recria a tabela ORCADO no layout particionado/clusterizado.
+
+    Returns:
+        Nome da tabela de backup, ou None se ela foi removida ou se a tabela
+        já estava no layout otimizado
+    """
+    dataset_id = BIGQUERY_CONFIG.get("dataset_id", "silver")
+    table_id = BIGQUERY_CONFIG.get("table_id", "ORCADO")
+    tabela = f"{client.project}.{dataset_id}.{table_id}"
+
+    atual = client.get_table(tabela)
+    if layout_otimizado(atual):
+        logger.info(f"Tabela {table_id} já está particionada e clusterizada")
+        return None
+
+    sufixo = int(time.time())
+    tabela_nova_id = f"{table_id}_particionada_{sufixo}"
+    tabela_backup_id = f"{table_id}_backup_{sufixo}"
+    tabela_nova = f"{client.project}.{dataset_id}.{tabela_nova_id}"
+
+    # Cria pela API para manter os modos REQUIRED do schema (CTAS os perderia)
+    client.create_table(nova_tabela_orcado(tabela_nova))
+    colunas_existentes = {campo.name for campo in atual.schema}
+    colunas = ", ".join(COLUNAS_ORCADO)
+    selecao = ", ".join(c if c in colunas_existentes else f"CAST(NULL AS STRING) AS {c}" for c in COLUNAS_ORCADO)
+    logger.info(f"Copiando {atual.num_rows} registros para {tabela_nova_id}")
+    client.query(f"INSERT INTO `{tabela_nova}` ({colunas}) SELECT {selecao} FROM `{tabela}`").result()
+
+    total_novo = client.get_table(tabela_nova).num_rows
+    total_atual = client.get_table(tabela).num_rows
+    if total_novo != total_atual:
+        client.delete_table(tabela_nova, not_found_ok=True)
+        raise RuntimeError(
+            f"Contagem divergente após a cópia ({total_novo} != {total_atual}); migração abortada"
+        )
+
+    # Troca as tabelas: a original vira backup e a nova assume o nome original
+    client.query(f"ALTER TABLE `{tabela}` RENAME TO `{tabela_backup_id}`").result()
+    client.query(f"ALTER TABLE `{tabela_nova}` RENAME TO `{table_id}`").result()
+    logger.info(
+        f"Tabela {table_id} migrada (partição mensal em DATA, cluster em {COLUNAS_CLUSTER}); "
+        f"original mantida em {tabela_backup_id}"
+    )
+
+    if remover_backup:
+        client.delete_table(f"{client.project}.{dataset_id}.{tabela_backup_id}")
+        logger.info(f"Backup {tabela_backup_id} removido")
+        return None
+    return tabela_backup_id
+
+
+def preencher_row_hash(client, dataset_id, table_id):
+    """Calcula ROW_HASH das linhas que ainda não o têm; retorna o número de linhas atualizadas."""
+    garantir_tabela_orcado(client, client.dataset(dataset_id).table(table_id))
+    job = client.query(f"""
+        UPDATE `{client.project}.{dataset_id}.{table_id}`
+        SET ROW_HASH = {expressao_hash_conteudo()}
+        WHERE ROW_HASH IS NULL
+    """)
+    job.result()
+    return job.num_dml_affected_rows or 0
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Migra a tabela ORCADO para o layout particionado por DATA e clusterizado"
+    )
+    parser.add_argument("--executar", action="store_true",
+                        help="executa a migração (sem esta opção apenas mede as consultas atuais)")
+    parser.add_argument("--remover-backup", action="store_true",
+                        help="remove a tabela original após a troca")
+    parser.add_argument("--versao", help="versão usada nas consultas de referência")
+    parser.add_argument("--filial", help="filial usada nas consultas de referência")
+    parser.add_argument("--preencher-hash", action="store_true",
+                        help="calcula ROW_HASH das linhas existentes sem hash e termina")
+    args = parser.parse_args(argv)
+
+    client = obter_cliente_bigquery()
+    dataset_id = BIGQUERY_CONFIG.get("dataset_id", "silver")
+    table_id = BIGQUERY_CONFIG.get("table_id", "ORCADO")
+
+    if args.preencher_hash:
+        atualizadas = preencher_row_hash(client, dataset_id, table_id)
+        print(f"ROW_HASH preenchido em {atualizadas} linhas.")
+        return 0
+    tabela = f"{client.project}.{dataset_id}.{table_id}"
+
+    amostra = obter_amostra(client, tabela, args.versao, args.filial)
+    logger.info(f"Consultas de referência com: {amostra}")
+    consultas = consultas_referencia(tabela, amostra)
+    antes = medir_bytes(client, consultas)
+
+    if not args.executar:
+        imprimir_relatorio(antes)
+        print("Nenhuma alteração feita. Use --executar para migrar a tabela.")
+        return 0
+
+    backup = migrar(client, remover_backup=args.remover_backup)
+    depois = medir_bytes(client, consultas)
+    imprimir_relatorio(antes, depois)
+    if backup:
+        print(f"Tabela original preservada como {backup}.")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
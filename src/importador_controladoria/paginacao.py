@@ -0,0 +1,129 @@
+"""
+Paginação por chave (keyset) da tela de registros.
+
+Em vez de OFFSET, cada página guarda um cursor com a posição da última (ou
+primeira) linha exibida na ordenação `DATA_ATUALIZACAO DESC, CHAVE_ORDEM DESC`,
+e a próxima consulta filtra a partir desse ponto. Assim a página N custa o
+mesmo que a primeira.
+"""
+
+import base64
+import json
+from datetime import datetime
+
+from google.cloud import bigquery
+
+from .config import PAGINACAO_CONFIG
+
+# Desempate da ordenação: várias linhas de uma importação têm o mesmo DATA_ATUALIZACAO
+EXPRESSAO_CHAVE_ORDEM = "CONCAT(VERSAO, '|', N_CONTA, '|', N_CENTRO_CUSTO, '|', CAST(DATA AS STRING))"
+
+DIRECAO_PROXIMA = "apos"
+DIRECAO_ANTERIOR = "antes"
+
+
+def normalizar_tamanho_pagina(valor):
+    """Retorna um tamanho de página permitido, usando o padrão se inválido."""
+    try:
+        tamanho = int(valor)
+    except (TypeError, ValueError):
+        return PAGINACAO_CONFIG["tamanho_padrao"]
+    if tamanho not in PAGINACAO_CONFIG["tamanhos_permitidos"]:
+        return PAGINACAO_CONFIG["tamanho_padrao"]
+    return tamanho
+
+
+def codificar_cursor(registro):
+    """Gera o cursor opaco a partir de uma linha da página."""
+    dados = {
+        "ts": registro["DATA_ATUALIZACAO"].isoformat(),
+        "k": registro["CHAVE_ORDEM"]
+    }
+    return base64.urlsafe_b64encode(json.dumps(dados).encode("utf-8")).decode("ascii")
+
+
+def decodificar_cursor(cursor):
+    """
+    Decodifica o cursor recebido na query string.
+
+    Returns:
+        Tupla (timestamp, chave) ou None se o cursor estiver vazio ou inválido
+    """
+    if not cursor:
+        return None
+    try:
+        dados = json.loads(base64.urlsafe_b64decode(cursor.encode("ascii")).decode("utf-8"))
+        return datetime.fromisoformat(dados["ts"]), str(dados["k"])
+    except (ValueError, KeyError, TypeError):
+        return None
+
+
+def predicado_keyset(cursor, direcao, expressao_chave=EXPRESSAO_CHAVE_ORDEM):
+    """
+    Monta o texto do predicado do cursor e da ordenação.
+
+    O predicado usa os parâmetros @cursor_ts e @cursor_chave; `expressao_chave`
+    permite que outro dialeto SQL informe sua própria expressão da CHAVE_ORDEM.
+
+    Returns:
+        Tupla (predicado SQL iniciado por AND ou vazio, cláusula ORDER BY)
+    """
+    anterior = direcao == DIRECAO_ANTERIOR and cursor is not None
+    ordem = "ASC" if anterior else "DESC"
+    ordenacao = f" ORDER BY DATA_ATUALIZACAO {ordem}, CHAVE_ORDEM {ordem}"
+
+    if cursor is None:
+        return "", ordenacao
+
+    comparador = ">" if anterior else "<"
+    predicado = (
+        f" AND (DATA_ATUALIZACAO {comparador} @cursor_ts"
+        f" OR (DATA_ATUALIZACAO = @cursor_ts AND {expressao_chave} {comparador} @cursor_chave))"
+    )
+    return predicado, ordenacao
+
+
+def clausulas_keyset(cursor, direcao):
+    """
+    Monta o predicado do cursor, a ordenação e os parâmetros da consulta.
+
+    Args:
+        cursor: Tupla (timestamp, chave) decodificada ou None para a primeira página
+        direcao: DIRECAO_PROXIMA ou DIRECAO_ANTERIOR
+
+    Returns:
+        Tupla (predicado SQL iniciado por AND ou vazio, cláusula ORDER BY, parâmetros)
+    """
+    predicado, ordenacao = predicado_keyset(cursor, direcao)
+    if cursor is None:
+        return predicado, ordenacao, []
+    parametros = [
+        bigquery.ScalarQueryParameter("cursor_ts", "TIMESTAMP", cursor[0]),
+        bigquery.ScalarQueryParameter("cursor_chave", "STRING", cursor[1])
+    ]
+    return predicado, ordenacao, parametros
+
+
+def montar_pagina(linhas, tamanho, direcao, tem_cursor):
+    """
+    Recorta as linhas buscadas (tamanho + 1) e calcula os cursores de navegação.
+
+    Returns:
+        Tupla (registros na ordem de exibição, cursor da próxima página, cursor da anterior)
+    """
+    tem_mais = len(linhas) > tamanho
+    registros = list(linhas[:tamanho])
+    anterior = direcao == DIRECAO_ANTERIOR and tem_cursor
+
+    if anterior:
+        # A página anterior é buscada em ordem crescente e invertida para exibição
+        registros.reverse()
+        cursor_proximo = codificar_cursor(registros[-1]) if registros else None
+        cursor_anterior = codificar_cursor(registros[0]) if registros and tem_mais else None
+    else:
+        cursor_proximo = codificar_cursor(registros[-1]) if registros and tem_mais else None
+        cursor_anterior = codificar_cursor(registros[0]) if registros and tem_cursor else None
+
+    for registro in registros:
+        registro.pop("CHAVE_ORDEM", None)
+    return registros, cursor_proximo, cursor_anterior
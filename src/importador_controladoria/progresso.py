@@ -0,0 +1,133 @@
+"""
+Canal de progresso dos processamentos e exportações.
+
+As páginas de acompanhamento recebem o progresso por Server-Sent Events: o
+primeiro evento traz o status completo e os seguintes apenas os campos que
+mudaram. Os processamentos chamam `canal_progresso.notificar()` ao mudar de
+etapa ou percentual, o que envia a atualização na hora; por garantia, cada
+stream também confere o status uma vez por segundo, já que alguns campos são
+alterados sem notificação. A rota de polling continua disponível como
+alternativa, com ETag para responder 304 quando nada mudou.
+
+Cada stream aberto ocupa uma thread do servidor. Por isso cada processo
+atende no máximo PROGRESSO_CONFIG["max_streams"] streams ao mesmo tempo (os
+demais clientes recebem 503 e passam ao polling), e um stream é encerrado
+após PROGRESSO_CONFIG["duracao_maxima_segundos"] com o evento `reconectar` e
+uma dica `retry:`: o navegador reconecta em seguida e recebe de novo o status
+completo, liberando a thread entre uma conexão e outra.
+"""
+
+import json
+import threading
+import time
+
+from .config import PROGRESSO_CONFIG
+
+# Intervalo máximo entre conferências do status de um stream
+INTERVALO_CONFERENCIA_SEGUNDOS = 1.0
+
+# Comentário enviado quando o stream fica sem eventos, para manter a conexão aberta
+INTERVALO_HEARTBEAT_SEGUNDOS = 15.0
+
+# Espera do navegador antes de reconectar um stream encerrado por duração
+RECONEXAO_MILISSEGUNDOS = 1000
+
+_vagas_streams = threading.BoundedSemaphore(max(1, PROGRESSO_CONFIG["max_streams"]))
+
+
+def reservar_stream():
+    """Reserva uma vaga de stream neste processo; False se todas estão ocupadas."""
+    return _vagas_streams.acquire(blocking=False)
+
+
+def liberar_stream():
+    """Libera a vaga reservada por `reservar_stream` quando o stream termina."""
+    _vagas_streams.release()
+
+
+class CanalProgresso:
+    """Avisa os streams abertos de que algum status mudou."""
+
+    def __init__(self):
+        self._condicao = threading.Condition()
+        self._versao = 0
+
+    @property
+    def versao(self):
+        with self._condicao:
+            return self._versao
+
+    def notificar(self):
+        with self._condicao:
+            self._versao += 1
+            self._condicao.notify_all()
+
+    def aguardar(self, versao_vista, timeout):
+        """Aguarda uma notificação posterior a `versao_vista` (ou o timeout) e retorna a versão atual."""
+        with self._condicao:
+            self._condicao.wait_for(lambda: self._versao != versao_vista, timeout)
+            return self._versao
+
+
+canal_progresso = CanalProgresso()
+
+
+def status_publico(status):
+    """
+    Status enviado ao navegador. Enquanto em andamento não inclui os erros;
+    a mensagem é mantida para exibir o andamento (ex.: parte da carga em envio).
+    """
+    if not status.get('concluido', False):
+        return dict(status, erros=[])
+    return status
+
+
+def serializar(status):
+    return json.dumps(status_publico(status), default=str, ensure_ascii=False, sort_keys=True)
+
+
+def campos_alterados(anterior, atual):
+    """Campos de primeiro nível de `atual` novos ou diferentes de `anterior`."""
+    return {campo: valor for campo, valor in atual.items() if campo not in anterior or anterior[campo] != valor}
+
+
+def eventos_progresso(obter_status, duracao_maxima_segundos=None):
+    """
+    Gera os eventos SSE de um status até ele ser concluído ou até a duração máxima do stream.
+
+    Args:
+        obter_status: Função sem argumentos que retorna o status atual (ou None
+            se ele não existir mais)
+        duracao_maxima_segundos: Sobrescreve PROGRESSO_CONFIG["duracao_maxima_segundos"]
+    """
+    if duracao_maxima_segundos is None:
+        duracao_maxima_segundos = PROGRESSO_CONFIG["duracao_maxima_segundos"]
+    anterior = {}
+    versao = canal_progresso.versao
+    inicio = ultimo_envio = time.monotonic()
+    while True:
+        status = obter_status()
+        if status is None:
+            yield "event: fim\ndata: {}\n\n"
+            return
+
+        # Cópia serializada: o status é alterado no lugar pelo processamento
+        atual = json.loads(serializar(status))
+        alterados = campos_alterados(anterior, atual)
+        if alterados:
+            yield f"data: {json.dumps(alterados, ensure_ascii=False)}\n\n"
+            anterior = atual
+            ultimo_envio = time.monotonic()
+        elif time.monotonic() - ultimo_envio >= INTERVALO_HEARTBEAT_SEGUNDOS:
+            yield ": ping\n\n"
+            ultimo_envio = time.monotonic()
+
+        if atual.get('concluido'):
+            yield "event: fim\ndata: {}\n\n"
+            return
+
+        if time.monotonic() - inicio >= duracao_maxima_segundos:
+            yield f"retry: {RECONEXAO_MILISSEGUNDOS}\nevent: reconectar\ndata: {{}}\n\n"
+            return
+
+        versao = canal_progresso.aguardar(versao, INTERVALO_CONFERENCIA_SEGUNDOS)
@@ -0,0 +1,487 @@
+"""
+Réplica local da tabela ORCADO em Parquet, para leitura sem custo no BigQuery.
+
+A réplica fica em REPLICA_CONFIG["diretorio"] (padrão data/replica), com uma
+partição por versão no layout Hive (`dados/VERSAO=<versão>/dados.parquet`), e é
+consultada com pyarrow.dataset: os filtros viram expressões do Arrow e o filtro
+de versão lê apenas a partição correspondente.
+
+`ArmazemReplicado` envolve o armazém de origem (BigQuery ou local):
+
+- a listagem da tela de registros e a exportação para Excel são atendidas pela
+  réplica quando as versões envolvidas estão atualizadas; caso contrário a
+  consulta vai para a origem e as versões desatualizadas são sincronizadas em
+  segundo plano;
+- as escritas (importação, edição, deleção) vão para a origem e, em seguida,
+  apenas as versões afetadas são baixadas novamente.
+
+Uma versão está atualizada quando o total de registros e a última atualização
+no catálogo de versões são os mesmos observados no início da sua última
+sincronização (guardados em manifesto.json).
+
+No modo produção os processos do servidor compartilham o diretório da
+réplica: a troca de uma partição e a gravação do manifesto são feitas sob uma
+trava exclusiva (flock em replica.lock), as leituras sob a trava
+compartilhada, e cada processo relê o manifesto quando outro o altera. Em
+sistemas sem flock (Windows) o servidor usa um único processo e a trava em
+memória basta.
+"""
+
+import json
+import logging
+import shutil
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from datetime import datetime
+from pathlib import Path
+from urllib.parse import quote
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+from .armazem import ArmazemOrcado, COLUNAS_REGISTRO
+from .config import CONSULTAS_CONFIG
+from .filtros import predicados_filtros
+from .paginacao import DIRECAO_ANTERIOR
+from .resumo_orcado import AGRUPAMENTO_PADRAO
+
+logger = logging.getLogger(__name__)
+
+_TIPO_TIMESTAMP = pa.timestamp("us", tz="UTC")
+
+ESQUEMA_ARQUIVO = pa.schema([
+    ("N_CONTA", pa.string()),
+    ("N_CENTRO_CUSTO", pa.string()),
+    ("DESCRICAO", pa.string()),
+    ("VALOR", pa.float64()),
+    ("DATA", pa.date32()),
+    ("OPERACAO", pa.string()),
+    ("DATA_ATUALIZACAO", _TIPO_TIMESTAMP),
+    ("FILIAL", pa.string()),
+    ("RATEIO", pa.string()),
+    ("ORIGEM", pa.string())
+])
+
+ESQUEMA_PARTICAO = pa.schema([("VERSAO", pa.string())])
+
+# Coluna e operação de cada filtro da tela de registros (ver filtros._PREDICADOS)
+_OPERACOES_FILTRO = {
+    'versao': ("VERSAO", "igual"),
+    'filial': ("FILIAL", "igual"),
+    'n_conta': ("N_CONTA", "igual"),
+    'n_centro_custo': ("N_CENTRO_CUSTO", "igual"),
+    'data_inicio': ("DATA", "maior_igual"),
+    'data_fim': ("DATA", "menor_igual"),
+    'operacao': ("OPERACAO", "igual"),
+    'rateio': ("RATEIO", "igual"),
+    'origem': ("ORIGEM", "contem")
+}
+
+
+def expressao_filtros(filtros):
+    """Converte os filtros da tela de registros em uma expressão do pyarrow.dataset."""
+    expressao = None
+    for campo, _, _, valor in predicados_filtros(filtros):
+        coluna, operacao = _OPERACOES_FILTRO[campo]
+        if operacao == "igual":
+            condicao = ds.field(coluna) == valor
+        elif operacao == "maior_igual":
+            condicao = ds.field(coluna) >= valor
+        elif operacao == "menor_igual":
+            condicao = ds.field(coluna) <= valor
+        else:
+            condicao = pc.match_substring(ds.field(coluna), valor)
+        expressao = condicao if expressao is None else expressao & condicao
+    return expressao
+
+
+def _marca_catalogo(versao):
+    """Total e última atualização de uma linha do catálogo, em formato comparável."""
+    ultima = versao.get("ULTIMA_ATUALIZACAO")
+    return {
+        "total": int(versao.get("TOTAL_REGISTROS") or 0),
+        "ultima_atualizacao": pd.Timestamp(ultima).isoformat() if ultima is not None else None
+    }
+
+
+class ReplicaParquet:
+    """Arquivos Parquet particionados por versão e o manifesto da sincronização."""
+
+    def __init__(self, diretorio):
+        self.diretorio = Path(diretorio)
+        self.dados = self.diretorio / "dados"
+        self._caminho_manifesto = self.diretorio / "manifesto.json"
+        self._caminho_trava = self.diretorio / "replica.lock"
+        self._lock = threading.Lock()
+        self.dados.mkdir(parents=True, exist_ok=True)
+        self._manifesto = {}
+        self._versao_manifesto = None
+
+    @contextmanager
+    def _travar(self, exclusiva=True):
+        """Trava a réplica neste processo e, com flock, entre os processos que usam o diretório."""
+        with self._lock:
+            if fcntl is None:
+                yield
+                return
+            with open(self._caminho_trava, "a") as arquivo:
+                # Fechar o arquivo libera o flock
+                fcntl.flock(arquivo, fcntl.LOCK_EX if exclusiva else fcntl.LOCK_SH)
+                yield
+
+    def _recarregar_manifesto(self):
+        """Relê o manifesto se outro processo o alterou (chamado com a trava adquirida)."""
+        try:
+            estado = self._caminho_manifesto.stat()
+        except FileNotFoundError:
+            self._manifesto, self._versao_manifesto = {}, None
+            return
+        versao = (estado.st_mtime_ns, estado.st_size)
+        if versao == self._versao_manifesto:
+            return
+        try:
+            with open(self._caminho_manifesto, encoding="utf-8") as f:
+                self._manifesto = json.load(f)
+        except (OSError, ValueError):
+            self._manifesto = {}
+        self._versao_manifesto = versao
+
+    def _gravar_manifesto(self):
+        """Grava o manifesto (chamado com a trava exclusiva adquirida)."""
+        temporario = self._caminho_manifesto.with_suffix(".tmp")
+        with open(temporario, "w", encoding="utf-8") as f:
+            json.dump(self._manifesto, f)
+        temporario.replace(self._caminho_manifesto)
+        estado = self._caminho_manifesto.stat()
+        self._versao_manifesto = (estado.st_mtime_ns, estado.st_size)
+
+    def manifesto(self):
+        with self._travar(exclusiva=False):
+            self._recarregar_manifesto()
+            return dict(self._manifesto)
+
+    def _diretorio_versao(self, versao):
+        return self.dados / f"VERSAO={quote(versao, safe='')}"
+
+    def gravar_versao(self, versao, registros, marca):
+        """Substitui a partição da versão pelos registros baixados da origem."""
+        df = pd.DataFrame(registros, columns=COLUNAS_REGISTRO)
+        df["DATA"] = pd.to_datetime(df["DATA"]).dt.date
+        df["DATA_ATUALIZACAO"] = pd.to_datetime(df["DATA_ATUALIZACAO"], utc=True)
+        df["VALOR"] = df["VALOR"].astype(float)
+        tabela = pa.Table.from_pandas(
+            df[ESQUEMA_ARQUIVO.names], schema=ESQUEMA_ARQUIVO, preserve_index=False
+        )
+
+        # Diretórios iniciados por "." são ignorados pelo pyarrow.dataset
+        temporario = self.dados / f".tmp_{uuid.uuid4().hex}"
+        temporario.mkdir()
+        pq.write_table(tabela, temporario / "dados.parquet")
+
+        destino = self._diretorio_versao(versao)
+        descarte = self.dados / f".old_{uuid.uuid4().hex}"
+        with self._travar():
+            if destino.exists():
+                destino.replace(descarte)
+            temporario.replace(destino)
+            self._recarregar_manifesto()
+            self._manifesto[versao] = {**marca, "sincronizado_em": datetime.now().isoformat(timespec="seconds")}
+            self._gravar_manifesto()
+        shutil.rmtree(descarte, ignore_errors=True)
+
+    def remover_versao(self, versao):
+        descarte = self.dados / f".old_{uuid.uuid4().hex}"
+        with self._travar():
+            destino = self._diretorio_versao(versao)
+            if destino.exists():
+                destino.replace(descarte)
+            self._recarregar_manifesto()
+            self._manifesto.pop(versao, None)
+            self._gravar_manifesto()
+        shutil.rmtree(descarte, ignore_errors=True)
+
+    def descartar_marca(self, versao):
+        """Marca a versão como desatualizada (as leituras vão para a origem)."""
+        with self._travar():
+            self._recarregar_manifesto()
+            if self._manifesto.pop(versao, None) is not None:
+                self._gravar_manifesto()
+
+    def ler(self, filtros):
+        """Tabela Arrow com as linhas que atendem aos filtros."""
+        with self._travar(exclusiva=False):
+            dataset = ds.dataset(
+                self.dados,
+                schema=ESQUEMA_ARQUIVO.append(ESQUEMA_PARTICAO.field("VERSAO")),
+                format="parquet",
+                partitioning=ds.partitioning(ESQUEMA_PARTICAO, flavor="hive")
+            )
+            return dataset.to_table(columns=COLUNAS_REGISTRO, filter=expressao_filtros(filtros))
+
+
+class ArmazemReplicado(ArmazemOrcado):
+    """Armazém de origem com leituras servidas pela réplica Parquet quando atualizada."""
+
+    def __init__(self, origem, diretorio):
+        self.origem = origem
+        self.nome = origem.nome
+        self.replica = ReplicaParquet(diretorio)
+        self._lock_sincronizacao = threading.Lock()
+        self._pendentes = set()
+        self._sincronizar_todas = False
+        self._thread = None
+
+    # Operações repassadas à origem
+
+    def disponivel(self):
+        return self.origem.disponivel()
+
+    def descricao(self):
+        return f"{self.origem.descricao()} (réplica Parquet em {self.replica.diretorio})"
+
+    def descricao_indisponivel(self):
+        return self.origem.descricao_indisponivel()
+
+    def preparar(self):
+        self.origem.preparar()
+
+    def listar_versoes(self):
+        return self.origem.listar_versoes()
+
+    def obter_registro(self, chave):
+        return self.origem.obter_registro(chave)
+
+    def resumo(self, versao, filial=None, n_conta=None, agrupar=AGRUPAMENTO_PADRAO):
+        return self.origem.resumo(versao, filial, n_conta, agrupar)
+
+    def registrar_metadados(self, metadata):
+        self.origem.registrar_metadados(metadata)
+
+    def gravar_metadados(self, id_lote, eventos):
+        self.origem.gravar_metadados(id_lote, eventos)
+
+    @property
+    def auditoria(self):
+        return self.origem.auditoria
+
+    def assinatura_versao(self, versao):
+        return self.origem.assinatura_versao(versao)
+
+    def consultar_hashes(self, versao):
+        return self.origem.consultar_hashes(versao)
+
+    # Escritas: vão para a origem e ressincronizam as versões afetadas
+
+    def _apos_escrita(self, versoes):
+        for versao in versoes or []:
+            self.replica.descartar_marca(versao)
+        self.agendar_sincronizacao(versoes)
+
+    def importar(self, df, arquivo, usuario, sistema_operacional, versao_sistema, ao_progredir=None,
+                 cancelamento=None):
+        try:
+            return self.origem.importar(
+                df, arquivo, usuario, sistema_operacional, versao_sistema, ao_progredir, cancelamento
+            )
+        finally:
+            self._apos_escrita(sorted(df['VERSAO'].astype(str).unique()))
+
+    def importar_delta(self, df, arquivo, usuario, sistema_operacional, versao_sistema, ao_progredir=None,
+                       cancelamento=None):
+        try:
+            return self.origem.importar_delta(
+                df, arquivo, usuario, sistema_operacional, versao_sistema, ao_progredir, cancelamento
+            )
+        finally:
+            self._apos_escrita(sorted(df['VERSAO'].astype(str).unique()))
+
+    def aplicar_delta(self, df_envio, df_exclusoes, versoes, metadata, ao_progredir=None, cancelamento=None):
+        try:
+            return self.origem.aplicar_delta(df_envio, df_exclusoes, versoes, metadata, ao_progredir, cancelamento)
+        finally:
+            self._apos_escrita(versoes)
+
+    def estimar_exclusao(self, filtros):
+        return self.origem.estimar_exclusao(filtros)
+
+    def versoes_afetadas(self, filtros):
+        return self.origem.versoes_afetadas(filtros)
+
+    def excluir(self, filtros):
+        # Apenas as versões com registros atingidos pela deleção são baixadas novamente
+        versoes = self.origem.versoes_afetadas(filtros)
+        try:
+            return self.origem.excluir(filtros)
+        finally:
+            self._apos_escrita(versoes)
+
+    def excluir_registro(self, chave):
+        try:
+            return self.origem.excluir_registro(chave)
+        finally:
+            self._apos_escrita([chave["VERSAO"]])
+
+    def atualizar_registro(self, chave, valores):
+        try:
+            return self.origem.atualizar_registro(chave, valores)
+        finally:
+            self._apos_escrita([chave["VERSAO"]])
+
+    def atualizar_registros(self, edicoes, metadata):
+        try:
+            return self.origem.atualizar_registros(edicoes, metadata)
+        finally:
+            self._apos_escrita(sorted({edicao["chave"]["VERSAO"] for edicao in edicoes}))
+
+    # Leituras: réplica quando atualizada, origem caso contrário
+
+    def _versoes_desatualizadas(self, filtros):
+        """
+        Versões necessárias para a consulta que não estão atualizadas na réplica.
+
+        Sem filtro de versão todas as versões do catálogo são necessárias, e
+        versões removidas da origem também contam como desatualizadas.
+        """
+        catalogo = {str(v["VERSAO"]): _marca_catalogo(v) for v in self.origem.listar_versoes()}
+        manifesto = self.replica.manifesto()
+        versao = filtros.get('versao')
+        necessarias = [versao] if versao else sorted(set(catalogo) | set(manifesto))
+        desatualizadas = []
+        for nome in necessarias:
+            marca = catalogo.get(nome)
+            gravada = manifesto.get(nome)
+            if marca is None:
+                if gravada is not None:
+                    desatualizadas.append(nome)
+            elif gravada is None or {k: gravada.get(k) for k in marca} != marca:
+                desatualizadas.append(nome)
+        return desatualizadas
+
+    def _replica_atende(self, filtros):
+        desatualizadas = self._versoes_desatualizadas(filtros)
+        if desatualizadas:
+            self.agendar_sincronizacao(desatualizadas)
+            return False
+        return True
+
+    def consultar_pagina(self, filtros, cursor, direcao, tamanho, contar_total=True):
+        if not self._replica_atende(filtros):
+            return self.origem.consultar_pagina(filtros, cursor, direcao, tamanho, contar_total)
+
+        inicio = time.perf_counter()
+        tabela = self.replica.ler(filtros)
+        total = tabela.num_rows if contar_total else None
+
+        # Mesma CHAVE_ORDEM da consulta no BigQuery, para que os cursores sejam intercambiáveis
+        chave = pc.binary_join_element_wise(
+            tabela["VERSAO"], tabela["N_CONTA"], tabela["N_CENTRO_CUSTO"],
+            pc.cast(tabela["DATA"], pa.string()), "|"
+        )
+        tabela = tabela.append_column("CHAVE_ORDEM", chave)
+
+        anterior = direcao == DIRECAO_ANTERIOR and cursor is not None
+        if cursor is not None:
+            cursor_ts = pd.Timestamp(cursor[0])
+            cursor_ts = cursor_ts.tz_localize("UTC") if cursor_ts.tzinfo is None else cursor_ts.tz_convert("UTC")
+            ts = pa.scalar(cursor_ts.to_pydatetime(), type=_TIPO_TIMESTAMP)
+            comparar = pc.greater if anterior else pc.less
+            mascara = pc.or_(
+                comparar(tabela["DATA_ATUALIZACAO"], ts),
+                pc.and_(
+                    pc.equal(tabela["DATA_ATUALIZACAO"], ts),
+                    comparar(tabela["CHAVE_ORDEM"], pa.scalar(cursor[1]))
+                )
+            )
+            tabela = tabela.filter(mascara)
+
+        ordem = "ascending" if anterior else "descending"
+        tabela = tabela.sort_by([("DATA_ATUALIZACAO", ordem), ("CHAVE_ORDEM", ordem)])
+        linhas = tabela.slice(0, tamanho + 1).to_pylist()
+        logger.info(f"[REPLICA] Página servida pela réplica local em {(time.perf_counter() - inicio) * 1000:.1f} ms")
+        return linhas, total
+
+    def selecionar(self, filtros):
+        if not self._replica_atende(filtros):
+            return self.origem.selecionar(filtros)
+        tabela = self.replica.ler(filtros).sort_by([("DATA_ATUALIZACAO", "descending")])
+        return tabela.to_pylist()
+
+    def selecionar_lotes(self, filtros, linhas_por_lote=None):
+        if not self._replica_atende(filtros):
+            return self.origem.selecionar_lotes(filtros, linhas_por_lote)
+        tabela = self.replica.ler(filtros).sort_by([("DATA_ATUALIZACAO", "descending")])
+        return tabela.to_batches(max_chunksize=linhas_por_lote or CONSULTAS_CONFIG["linhas_por_fatia"])
+
+    # Sincronização em segundo plano
+
+    def agendar_sincronizacao(self, versoes=None):
+        """Agenda o download das versões informadas (ou de todas as desatualizadas)."""
+        with self._lock_sincronizacao:
+            if versoes:
+                self._pendentes.update(str(v) for v in versoes)
+            else:
+                self._sincronizar_todas = True
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._sincronizar, name="replica", daemon=True)
+                self._thread.start()
+
+    def _sincronizar(self):
+        while True:
+            with self._lock_sincronizacao:
+                if self._sincronizar_todas:
+                    self._sincronizar_todas = False
+                    try:
+                        self._pendentes.update(self._versoes_desatualizadas({}))
+                    except Exception as e:
+                        logger.error(f"Erro ao comparar a réplica com o catálogo de versões: {e}")
+                if not self._pendentes:
+                    self._thread = None
+                    return
+                versao = self._pendentes.pop()
+            try:
+                self.sincronizar_versao(versao)
+            except Exception as e:
+                logger.error(f"Erro ao sincronizar a versão {versao} na réplica local: {e}")
+
+    def sincronizar_versao(self, versao):
+        """Baixa a versão da origem e substitui sua partição na réplica."""
+        catalogo = {str(v["VERSAO"]): v for v in self.origem.listar_versoes()}
+        if versao not in catalogo:
+            self.replica.remover_versao(versao)
+            logger.info(f"[REPLICA] Versão {versao} removida da réplica")
+            return
+        # A marca é lida antes do download: uma escrita durante o download a torna desatualizada
+        marca = _marca_catalogo(catalogo[versao])
+        inicio = time.perf_counter()
+        registros = self.origem.selecionar({'versao': versao})
+        self.replica.gravar_versao(versao, registros, marca)
+        logger.info(
+            f"[REPLICA] Versão {versao} sincronizada: {len(registros)} registros "
+            f"em {(time.perf_counter() - inicio) * 1000:.0f} ms"
+        )
+
+    def estado_replica(self):
+        manifesto = self.replica.manifesto()
+        try:
+            atualizada = not self._versoes_desatualizadas({})
+        except Exception:
+            atualizada = False
+        sincronizacoes = [dados.get("sincronizado_em") for dados in manifesto.values() if dados.get("sincronizado_em")]
+        with self._lock_sincronizacao:
+            sincronizando = self._thread is not None
+        return {
+            "atualizada": atualizada,
+            "sincronizando": sincronizando,
+            "versoes": len(manifesto),
+            "sincronizada_em": max(sincronizacoes) if sincronizacoes else None
+        }
@@ -0,0 +1,206 @@
+"""
+Resumo pré-calculado da tabela ORCADO.
+
+Mantém uma tabela pequena (ORCADO_RESUMO) com a soma de VALOR e o total de
+registros por VERSAO, FILIAL, N_CONTA e mês. Assim como o catálogo de versões,
+ela é recalculada pelas rotas de importação, edição e deleção apenas para as
+versões afetadas, e a tela de resumo lê os totais dela em vez de varrer e
+baixar as linhas de detalhe da tabela de fatos.
+"""
+
+import logging
+
+from google.api_core.exceptions import NotFound
+from google.cloud import bigquery
+
+from .config import BIGQUERY_CONFIG
+
+logger = logging.getLogger(__name__)
+
+SCHEMA_RESUMO = [
+    bigquery.SchemaField("VERSAO", "STRING", mode="REQUIRED"),
+    bigquery.SchemaField("FILIAL", "STRING", mode="REQUIRED"),
+    bigquery.SchemaField("N_CONTA", "STRING", mode="REQUIRED"),
+    bigquery.SchemaField("MES", "DATE", mode="REQUIRED"),
+    bigquery.SchemaField("TOTAL_VALOR", "FLOAT64", mode="REQUIRED"),
+    bigquery.SchemaField("QTD_REGISTROS", "INTEGER", mode="REQUIRED"),
+    bigquery.SchemaField("ULTIMA_ATUALIZACAO", "TIMESTAMP", mode="NULLABLE")
+]
+
+COLUNAS_CLUSTER_RESUMO = ["VERSAO", "FILIAL", "N_CONTA"]
+
+# Linhas da tabela dinâmica para cada agrupamento aceito pela tela de resumo
+AGRUPAMENTOS = {
+    "filial": ["FILIAL"],
+    "conta": ["N_CONTA"],
+    "filial_conta": ["FILIAL", "N_CONTA"]
+}
+AGRUPAMENTO_PADRAO = "filial"
+
+
+def _tabelas():
+    """Retorna os nomes qualificados da tabela de fatos e do resumo."""
+    dataset_id = BIGQUERY_CONFIG.get("dataset_id", "silver")
+    table_id = BIGQUERY_CONFIG.get("table_id", "ORCADO")
+    resumo_table_id = BIGQUERY_CONFIG.get("resumo_table_id", "ORCADO_RESUMO")
+    return f"{dataset_id}.{table_id}", f"{dataset_id}.{resumo_table_id}"
+
+
+def _select_agregado(tabela_orcado, where=""):
+    return f"""
+        SELECT
+            VERSAO,
+            FILIAL,
+            N_CONTA,
+            DATE_TRUNC(DATA, MONTH) AS MES,
+            SUM(VALOR) AS TOTAL_VALOR,
+            COUNT(*) AS QTD_REGISTROS,
+            MAX(DATA_ATUALIZACAO) AS ULTIMA_ATUALIZACAO
+        FROM `{tabela_orcado}`
+        {where}
+        GROUP BY VERSAO, FILIAL, N_CONTA, MES
+    """
+
+
+def normalizar_agrupamento(agrupar):
+    """Retorna o agrupamento informado ou o padrão, se for inválido."""
+    return agrupar if agrupar in AGRUPAMENTOS else AGRUPAMENTO_PADRAO
+
+
+def montar_pivo(linhas, agrupar):
+    """
+    Monta a tabela dinâmica (agrupamento x mês) a partir das linhas do resumo.
+
+    Args:
+        linhas: Dicionários com as colunas do agrupamento, MES, TOTAL_VALOR e QTD_REGISTROS
+        agrupar: Chave de AGRUPAMENTOS
+
+    Returns:
+        Dicionário com meses (ordenados), linhas (grupo, valores por mês e
+        total), totais por mês e total geral
+    """
+    colunas = AGRUPAMENTOS[normalizar_agrupamento(agrupar)]
+    meses = sorted({linha["MES"] for linha in linhas})
+    grupos = {}
+    totais_mes = dict.fromkeys(meses, 0.0)
+    total_registros = 0
+    for linha in linhas:
+        grupo = tuple(linha[coluna] for coluna in colunas)
+        valores = grupos.setdefault(grupo, {})
+        valor = float(linha["TOTAL_VALOR"] or 0)
+        valores[linha["MES"]] = valores.get(linha["MES"], 0.0) + valor
+        totais_mes[linha["MES"]] += valor
+        total_registros += int(linha["QTD_REGISTROS"] or 0)
+    return {
+        "colunas": colunas,
+        "meses": meses,
+        "linhas": [
+            {"grupo": grupo, "valores": valores, "total": sum(valores.values())}
+            for grupo, valores in sorted(grupos.items())
+        ],
+        "totais_mes": totais_mes,
+        "total_geral": sum(totais_mes.values()),
+        "total_registros": total_registros
+    }
+
+
+class ResumoOrcado:
+    """Leitura e manutenção da tabela de resumo por versão, filial, conta e mês."""
+
+    def reconstruir(self, client):
+        """Recria o resumo inteiro a partir da tabela ORCADO."""
+        tabela_orcado, tabela_resumo = _tabelas()
+        query = f"""
+            CREATE OR REPLACE TABLE `{tabela_resumo}`
+            CLUSTER BY {', '.join(COLUNAS_CLUSTER_RESUMO)}
+            AS {_select_agregado(tabela_orcado)}
+        """
+        try:
+            client.query(query).result()
+            logger.info("Resumo do ORCADO reconstruído")
+        except NotFound:
+            # Sem tabela de fatos ainda: cria o resumo vazio
+            tabela = bigquery.Table(f"{client.project}.{tabela_resumo}", schema=SCHEMA_RESUMO)
+            tabela.clustering_fields = COLUNAS_CLUSTER_RESUMO
+            client.create_table(tabela, exists_ok=True)
+            logger.info("Resumo do ORCADO criado vazio")
+
+    def atualizar(self, client, versoes):
+        """
+        Recalcula as linhas do resumo apenas para as versões informadas.
+
+        A remoção das linhas antigas e a inserção das novas rodam em uma única
+        transação, para que a tela de resumo nunca veja a versão pela metade.
+        Se o resumo ainda não existir, ele é reconstruído por completo; os
+        demais erros são propagados.
+        """
+        versoes = sorted({str(v) for v in versoes if v})
+        if not versoes:
+            return
+        tabela_orcado, tabela_resumo = _tabelas()
+        script = f"""
+            BEGIN TRANSACTION;
+            DELETE FROM `{tabela_resumo}` WHERE VERSAO IN UNNEST(@versoes);
+            INSERT INTO `{tabela_resumo}` (
+                VERSAO, FILIAL, N_CONTA, MES, TOTAL_VALOR, QTD_REGISTROS, ULTIMA_ATUALIZACAO
+            )
+            {_select_agregado(tabela_orcado, "WHERE VERSAO IN UNNEST(@versoes)")};
+            COMMIT TRANSACTION;
+        """
+        job_config = bigquery.QueryJobConfig(
+            query_parameters=[bigquery.ArrayQueryParameter("versoes", "STRING", versoes)]
+        )
+        try:
+            client.query(script, job_config=job_config).result()
+            logger.info(f"Resumo do ORCADO atualizado para: {versoes}")
+        except NotFound:
+            self.reconstruir(client)
+
+    def atualizar_ou_reconstruir(self, client, versoes=None):
+        """
+        Atualiza as versões informadas ou, se não for possível saber quais
+        versões foram afetadas (ex.: deleção por filial), reconstrói o resumo.
+        Erros são propagados para quem chamou.
+        """
+        if versoes:
+            self.atualizar(client, versoes)
+        else:
+            self.reconstruir(client)
+
+    def consultar(self, client, versao, filial=None, n_conta=None, agrupar=AGRUPAMENTO_PADRAO):
+        """
+        Soma os totais do resumo de uma versão pelo agrupamento e mês.
+
+        Returns:
+            Lista de dicionários com as colunas do agrupamento, MES,
+            TOTAL_VALOR e QTD_REGISTROS
+        """
+        _, tabela_resumo = _tabelas()
+        colunas = AGRUPAMENTOS[normalizar_agrupamento(agrupar)]
+        condicoes = ["VERSAO = @versao"]
+        parametros = [bigquery.ScalarQueryParameter("versao", "STRING", versao)]
+        if filial:
+            condicoes.append("FILIAL = @filial")
+            parametros.append(bigquery.ScalarQueryParameter("filial", "STRING", filial))
+        if n_conta:
+            condicoes.append("N_CONTA = @n_conta")
+            parametros.append(bigquery.ScalarQueryParameter("n_conta", "STRING", n_conta))
+        grupo = ", ".join(colunas + ["MES"])
+        query = f"""
+            SELECT {grupo}, SUM(TOTAL_VALOR) AS TOTAL_VALOR, SUM(QTD_REGISTROS) AS QTD_REGISTROS
+            FROM `{tabela_resumo}`
+            WHERE {' AND '.join(condicoes)}
+            GROUP BY {grupo}
+            ORDER BY {grupo}
+        """
+        job_config = bigquery.QueryJobConfig(query_parameters=parametros)
+        try:
+            return [dict(row) for row in client.query(query, job_config=job_config).result()]
+        except NotFound:
+            # Primeira execução: o resumo ainda não existe e é montado a partir da tabela de fatos
+            logger.info("Resumo do ORCADO não encontrado, reconstruindo")
+            self.reconstruir(client)
+            return [dict(row) for row in client.query(query, job_config=job_config).result()]
+
+
+resumo_orcado = ResumoOrcado()
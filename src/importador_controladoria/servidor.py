@@ -0,0 +1,99 @@
+"""
+Inicialização do servidor web.
+
+Com SERVIDOR_MODO=desktop (padrão) a aplicação roda no servidor do Flask, em
+um único processo, como no executável da interface gráfica. Com
+SERVIDOR_MODO=producao ela roda em um servidor WSGI:
+
+- gunicorn (Linux), com `SERVIDOR_WORKERS` processos de `SERVIDOR_THREADS`
+  threads cada, para usar todos os núcleos do servidor;
+- waitress (Windows, ou se o gunicorn não estiver instalado), com um único
+  processo e `SERVIDOR_WORKERS * SERVIDOR_THREADS` threads.
+
+O modo é lido na importação da configuração, pois define se caches, status e
+travas de escrita são compartilhados entre processos (ver
+estado_compartilhado); por isso é definido por variável de ambiente e não
+por argumento. Os servidores de produção são dependências opcionais:
+`pip install .[producao]`.
+"""
+
+import argparse
+import importlib.util
+import logging
+import os
+import threading
+
+from .config import SERVIDOR_CONFIG
+from .clientes_gcp import aquecer_clientes
+from .interface import app
+
+logger = logging.getLogger(__name__)
+
+
+def _aquecer_em_segundo_plano():
+    threading.Thread(target=aquecer_clientes, name="AquecimentoGCP", daemon=True).start()
+
+
+def servir_gunicorn(host, porta, workers, threads, timeout):
+    from gunicorn.app.base import BaseApplication
+
+    class AplicacaoGunicorn(BaseApplication):
+        def load_config(self):
+            opcoes = {
+                "bind": f"{host}:{porta}",
+                "workers": workers,
+                "worker_class": "gthread",
+                "threads": threads,
+                # Os streams de progresso ficam abertos enquanto o processamento roda
+                "timeout": timeout,
+                # Os clientes do GCP são criados em cada processo, após o fork
+                "post_worker_init": lambda worker: _aquecer_em_segundo_plano()
+            }
+            for chave, valor in opcoes.items():
+                self.cfg.set(chave, valor)
+
+        def load(self):
+            return app
+
+    logger.info(f"Servidor de produção (gunicorn): {workers} processos x {threads} threads em {host}:{porta}")
+    AplicacaoGunicorn().run()
+
+
+def servir_waitress(host, porta, threads):
+    from waitress import serve
+
+    _aquecer_em_segundo_plano()
+    logger.info(f"Servidor de produção (waitress): {threads} threads em {host}:{porta}")
+    serve(app, host=host, port=porta, threads=threads)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Servidor web do Importador Controladoria")
+    parser.add_argument("--host", default=SERVIDOR_CONFIG["host"], help="endereço de escuta")
+    parser.add_argument("--porta", type=int, default=SERVIDOR_CONFIG["porta"], help="porta de escuta")
+    parser.add_argument("--workers", type=int, default=SERVIDOR_CONFIG["workers"],
+                        help="processos do servidor (modo produção)")
+    parser.add_argument("--threads", type=int, default=SERVIDOR_CONFIG["threads"],
+                        help="threads por processo (modo produção)")
+    args = parser.parse_args(argv)
+
+    if SERVIDOR_CONFIG["modo"] != "producao":
+        _aquecer_em_segundo_plano()
+        app.run(debug=False, host=args.host, port=args.porta, threaded=True)
+        return 0
+
+    # O gunicorn (e o flock das travas de escrita entre processos) não existe no Windows
+    if os.name != "nt" and importlib.util.find_spec("gunicorn") is not None:
+        servir_gunicorn(args.host, args.porta, max(1, args.workers), max(1, args.threads),
+                        SERVIDOR_CONFIG["timeout_segundos"])
+    else:
+        try:
+            servir_waitress(args.host, args.porta, max(1, args.workers) * max(1, args.threads))
+        except ImportError:
+            logger.error("Modo produção requer gunicorn ou waitress: pip install .[producao]")
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,342 @@
+"""
+Script transacional da importação para o BigQuery.
+
+Depois que o lote é carregado na tabela de staging, a contagem da versão, a
+deleção da importação completa, o MERGE e o registro nos metadados são
+executados em um único job (script com várias instruções dentro de uma
+transação). Ou tudo é aplicado, ou nada é: se qualquer etapa falhar, a
+transação é desfeita e o erro é propagado para o job.
+"""
+
+from datetime import timedelta
+
+import pandas as pd
+from google.cloud import bigquery
+
+from .cancelamento import aguardar_job
+from .esquema import SCHEMA_ORCADO
+
+# Tempo de vida da tabela de staging; ela é removida ao final, mas expira
+# sozinha caso o processo seja interrompido antes disso
+EXPIRACAO_STAGING = timedelta(hours=1)
+
+
+# Staging das chaves a excluir na importação delta
+SCHEMA_CHAVES = [campo for campo in SCHEMA_ORCADO if campo.name in ("N_CONTA", "N_CENTRO_CUSTO", "DATA", "VERSAO")]
+
+
+# Staging da edição em lote: chave original, DATA_ATUALIZACAO lida e novos valores
+SCHEMA_EDICAO = [
+    bigquery.SchemaField("ID_EDICAO", "INTEGER", mode="REQUIRED"),
+    bigquery.SchemaField("VERSAO", "STRING", mode="REQUIRED"),
+    bigquery.SchemaField("DATA", "DATE", mode="REQUIRED"),
+    bigquery.SchemaField("N_CONTA_ORIGINAL", "STRING", mode="REQUIRED"),
+    bigquery.SchemaField("N_CENTRO_CUSTO_ORIGINAL", "STRING", mode="REQUIRED"),
+    bigquery.SchemaField("DATA_ATUALIZACAO_LIDA", "TIMESTAMP", mode="REQUIRED")
+] + [
+    campo for campo in SCHEMA_ORCADO
+    if campo.name in ("FILIAL", "N_CONTA", "N_CENTRO_CUSTO", "DESCRICAO", "VALOR", "OPERACAO", "RATEIO", "ORIGEM", "ROW_HASH")
+] + [
+    bigquery.SchemaField("DETALHES", "STRING", mode="REQUIRED")
+]
+
+
+def criar_tabela_staging(client, table_ref, schema=None):
+    """Cria a tabela de staging com expiração automática."""
+    tabela = bigquery.Table(table_ref, schema=schema or SCHEMA_ORCADO)
+    tabela.expires = pd.Timestamp.now(tz="UTC").to_pydatetime() + EXPIRACAO_STAGING
+    return client.create_table(tabela)
+
+
+def _merge_staging(tabela, tabela_staging):
+    """
+    MERGE da staging na tabela, limitado às versões e ao intervalo de datas do
+    lote. @@row_count depois do MERGE conta só as linhas inseridas ou alteradas.
+    """
+    return f"""
+    -- Os filtros constantes sobre T limitam a leitura às partições e clusters do lote
+    MERGE `{tabela}` T
+    USING `{tabela_staging}` S
+    ON T.VERSAO IN UNNEST(@versoes)
+       AND T.DATA BETWEEN @data_min AND @data_max
+       AND T.N_CONTA = S.N_CONTA
+       AND T.N_CENTRO_CUSTO = S.N_CENTRO_CUSTO
+       AND T.DATA = S.DATA
+       AND T.VERSAO = S.VERSAO
+    -- Linhas com o mesmo conteúdo não são reescritas e mantêm DATA_ATUALIZACAO
+    WHEN MATCHED AND T.ROW_HASH IS DISTINCT FROM S.ROW_HASH THEN
+        UPDATE SET
+            T.DESCRICAO = S.DESCRICAO,
+            T.VALOR = S.VALOR,
+            T.OPERACAO = S.OPERACAO,
+            T.DATA_ATUALIZACAO = CURRENT_TIMESTAMP(),
+            T.FILIAL = S.FILIAL,
+            T.RATEIO = S.RATEIO,
+            T.ORIGEM = S.ORIGEM,
+            T.ROW_HASH = S.ROW_HASH
+    WHEN NOT MATCHED THEN
+        INSERT (N_CONTA, N_CENTRO_CUSTO, DESCRICAO, VALOR, DATA, VERSAO, OPERACAO, DATA_ATUALIZACAO, FILIAL, RATEIO, ORIGEM, ROW_HASH)
+        VALUES (S.N_CONTA, S.N_CENTRO_CUSTO, S.DESCRICAO, S.VALOR, S.DATA, S.VERSAO, S.OPERACAO, CURRENT_TIMESTAMP(), S.FILIAL, S.RATEIO, S.ORIGEM, S.ROW_HASH);"""
+
+
+def montar_script_importacao(tabela, tabela_staging, tabela_metadata):
+    """
+    Monta o script da importação.
+
+    A última instrução retorna uma linha com REGISTROS_EXISTENTES,
+    IMPORTACAO_COMPLETA e LINHAS_MERGE.
+    """
+    return f"""
+DECLARE registros_existentes INT64 DEFAULT (
+    SELECT COUNT(*) FROM `{tabela}` WHERE VERSAO = @versao
+);
+DECLARE importacao_completa BOOL DEFAULT registros_existentes = 0;
+DECLARE linhas_merge INT64 DEFAULT 0;
+
+BEGIN
+    BEGIN TRANSACTION;
+
+    -- Importação completa: remove os registros da versão antes de inserir
+    IF importacao_completa THEN
+        DELETE FROM `{tabela}` WHERE VERSAO = @versao;
+    END IF;
+
+{_merge_staging(tabela, tabela_staging)}
+    SET linhas_merge = @@row_count;
+
+    INSERT INTO `{tabela_metadata}`
+        (DATA_IMPORTACAO, USUARIO, SISTEMA_OPERACIONAL, VERSAO_SISTEMA, ARQUIVO_ORIGEM, TOTAL_REGISTROS, STATUS, DETALHES)
+    VALUES (
+        @data_importacao,
+        @usuario,
+        @sistema_operacional,
+        @versao_sistema,
+        CONCAT(IF(importacao_completa, 'IMPORTACAO_COMPLETA', 'ATUALIZACAO_PARCIAL'), ': ', @arquivo),
+        @total_registros,
+        IF(importacao_completa, 'IMPORTACAO_COMPLETA', 'ATUALIZACAO_PARCIAL'),
+        CONCAT(
+            IF(importacao_completa, 'Importação completa', 'Atualização parcial'),
+            ' de ', CAST(@total_registros AS STRING), ' registros da versão ', @versao
+        )
+    );
+
+    COMMIT TRANSACTION;
+EXCEPTION WHEN ERROR THEN
+    ROLLBACK TRANSACTION;
+    RAISE USING MESSAGE = @@error.message;
+END;
+
+SELECT
+    registros_existentes AS REGISTROS_EXISTENTES,
+    importacao_completa AS IMPORTACAO_COMPLETA,
+    linhas_merge AS LINHAS_MERGE;
+"""
+
+
+def parametros_importacao(df_bigquery, versao, arquivo, usuario, sistema_operacional, versao_sistema):
+    """Parâmetros do script: versão, limites do lote (para poda) e dados dos metadados."""
+    return [
+        bigquery.ScalarQueryParameter("versao", "STRING", versao),
+        bigquery.ArrayQueryParameter("versoes", "STRING", sorted(df_bigquery['VERSAO'].unique().tolist())),
+        bigquery.ScalarQueryParameter("data_min", "DATE", df_bigquery['DATA'].min()),
+        bigquery.ScalarQueryParameter("data_max", "DATE", df_bigquery['DATA'].max()),
+        bigquery.ScalarQueryParameter("data_importacao", "TIMESTAMP", pd.Timestamp.now().to_pydatetime()),
+        bigquery.ScalarQueryParameter("usuario", "STRING", usuario),
+        bigquery.ScalarQueryParameter("sistema_operacional", "STRING", sistema_operacional),
+        bigquery.ScalarQueryParameter("versao_sistema", "STRING", versao_sistema),
+        bigquery.ScalarQueryParameter("arquivo", "STRING", arquivo),
+        bigquery.ScalarQueryParameter("total_registros", "INT64", int(len(df_bigquery)))
+    ]
+
+
+def montar_script_delta(tabela, tabela_staging, tabela_exclusoes, tabela_metadata):
+    """
+    Monta o script da importação delta: exclui as chaves da staging de
+    exclusões, aplica o MERGE das linhas inseridas/alteradas e registra os
+    metadados, na mesma transação. `tabela_staging` ou `tabela_exclusoes`
+    podem ser None quando não há linhas daquele tipo.
+
+    A última instrução retorna uma linha com LINHAS_MERGE e LINHAS_EXCLUIDAS.
+    """
+    exclusao = ""
+    if tabela_exclusoes:
+        exclusao = f"""
+    MERGE `{tabela}` T
+    USING `{tabela_exclusoes}` E
+    ON T.VERSAO IN UNNEST(@versoes)
+       AND T.DATA BETWEEN @exclusao_data_min AND @exclusao_data_max
+       AND T.N_CONTA = E.N_CONTA
+       AND T.N_CENTRO_CUSTO = E.N_CENTRO_CUSTO
+       AND T.DATA = E.DATA
+       AND T.VERSAO = E.VERSAO
+    WHEN MATCHED THEN DELETE;
+    SET linhas_excluidas = @@row_count;
+"""
+    merge = ""
+    if tabela_staging:
+        merge = f"""{_merge_staging(tabela, tabela_staging)}
+    SET linhas_merge = @@row_count;
+"""
+    return f"""
+DECLARE linhas_merge INT64 DEFAULT 0;
+DECLARE linhas_excluidas INT64 DEFAULT 0;
+
+BEGIN
+    BEGIN TRANSACTION;
+{exclusao}{merge}
+    INSERT INTO `{tabela_metadata}`
+        (DATA_IMPORTACAO, USUARIO, SISTEMA_OPERACIONAL, VERSAO_SISTEMA, ARQUIVO_ORIGEM, TOTAL_REGISTROS, STATUS, DETALHES)
+    VALUES (
+        @data_importacao, @usuario, @sistema_operacional, @versao_sistema,
+        @arquivo_origem, @total_registros, @status, @detalhes
+    );
+
+    COMMIT TRANSACTION;
+EXCEPTION WHEN ERROR THEN
+    ROLLBACK TRANSACTION;
+    RAISE USING MESSAGE = @@error.message;
+END;
+
+SELECT
+    linhas_merge AS LINHAS_MERGE,
+    linhas_excluidas AS LINHAS_EXCLUIDAS;
+"""
+
+
+def parametros_delta(versoes, df_envio, df_exclusoes, metadata):
+    """Parâmetros do script delta: versões, limites de datas (para poda) e metadados."""
+    parametros = [
+        bigquery.ArrayQueryParameter("versoes", "STRING", sorted(versoes)),
+        bigquery.ScalarQueryParameter("data_importacao", "TIMESTAMP", metadata["DATA_IMPORTACAO"].to_pydatetime()),
+        bigquery.ScalarQueryParameter("usuario", "STRING", metadata["USUARIO"]),
+        bigquery.ScalarQueryParameter("sistema_operacional", "STRING", metadata["SISTEMA_OPERACIONAL"]),
+        bigquery.ScalarQueryParameter("versao_sistema", "STRING", metadata["VERSAO_SISTEMA"]),
+        bigquery.ScalarQueryParameter("arquivo_origem", "STRING", metadata["ARQUIVO_ORIGEM"]),
+        bigquery.ScalarQueryParameter("total_registros", "INT64", int(metadata["TOTAL_REGISTROS"])),
+        bigquery.ScalarQueryParameter("status", "STRING", metadata["STATUS"]),
+        bigquery.ScalarQueryParameter("detalhes", "STRING", metadata["DETALHES"])
+    ]
+    if not df_envio.empty:
+        parametros += [
+            bigquery.ScalarQueryParameter("data_min", "DATE", df_envio['DATA'].min()),
+            bigquery.ScalarQueryParameter("data_max", "DATE", df_envio['DATA'].max())
+        ]
+    if not df_exclusoes.empty:
+        parametros += [
+            bigquery.ScalarQueryParameter("exclusao_data_min", "DATE", df_exclusoes['DATA'].min()),
+            bigquery.ScalarQueryParameter("exclusao_data_max", "DATE", df_exclusoes['DATA'].max())
+        ]
+    return parametros
+
+
+def montar_script_edicao(tabela, tabela_staging, tabela_metadata):
+    """
+    Monta o script da edição em lote.
+
+    Edições cuja linha não existe mais ou tem DATA_ATUALIZACAO diferente da
+    lida são conflitos e não são aplicadas; as demais são aplicadas com um
+    único MERGE, e um único registro de metadados reúne os detalhes de todas.
+    A última instrução retorna LINHAS_ATUALIZADAS e CONFLITOS (IDs das edições).
+    """
+    return f"""
+DECLARE linhas_atualizadas INT64 DEFAULT 0;
+
+BEGIN
+    BEGIN TRANSACTION;
+
+    -- Conflitos: linha excluída ou alterada desde que foi lida na tela
+    CREATE TEMP TABLE conflitos AS
+    SELECT S.ID_EDICAO
+    FROM `{tabela_staging}` S
+    LEFT JOIN (
+        SELECT VERSAO, DATA, N_CONTA, N_CENTRO_CUSTO, DATA_ATUALIZACAO
+        FROM `{tabela}`
+        WHERE VERSAO IN UNNEST(@versoes) AND DATA BETWEEN @data_min AND @data_max
+    ) T
+    ON T.VERSAO = S.VERSAO
+       AND T.DATA = S.DATA
+       AND T.N_CONTA = S.N_CONTA_ORIGINAL
+       AND T.N_CENTRO_CUSTO = S.N_CENTRO_CUSTO_ORIGINAL
+       AND T.DATA_ATUALIZACAO = S.DATA_ATUALIZACAO_LIDA
+    WHERE T.VERSAO IS NULL;
+
+    MERGE `{tabela}` T
+    USING (
+        SELECT * FROM `{tabela_staging}`
+        WHERE ID_EDICAO NOT IN (SELECT ID_EDICAO FROM conflitos)
+    ) S
+    ON T.VERSAO IN UNNEST(@versoes)
+       AND T.DATA BETWEEN @data_min AND @data_max
+       AND T.VERSAO = S.VERSAO
+       AND T.DATA = S.DATA
+       AND T.N_CONTA = S.N_CONTA_ORIGINAL
+       AND T.N_CENTRO_CUSTO = S.N_CENTRO_CUSTO_ORIGINAL
+       -- Concorrência otimista: a linha não pode ter mudado desde que foi lida
+       AND T.DATA_ATUALIZACAO = S.DATA_ATUALIZACAO_LIDA
+    WHEN MATCHED THEN
+        UPDATE SET
+            T.FILIAL = S.FILIAL,
+            T.N_CONTA = S.N_CONTA,
+            T.N_CENTRO_CUSTO = S.N_CENTRO_CUSTO,
+            T.DESCRICAO = S.DESCRICAO,
+            T.VALOR = S.VALOR,
+            T.OPERACAO = S.OPERACAO,
+            T.RATEIO = S.RATEIO,
+            T.ORIGEM = S.ORIGEM,
+            T.ROW_HASH = S.ROW_HASH,
+            T.DATA_ATUALIZACAO = CURRENT_TIMESTAMP();
+    SET linhas_atualizadas = @@row_count;
+
+    IF linhas_atualizadas > 0 THEN
+        INSERT INTO `{tabela_metadata}`
+            (DATA_IMPORTACAO, USUARIO, SISTEMA_OPERACIONAL, VERSAO_SISTEMA, ARQUIVO_ORIGEM, TOTAL_REGISTROS, STATUS, DETALHES)
+        SELECT
+            @data_importacao, @usuario, @sistema_operacional, @versao_sistema,
+            CONCAT('EDITADO_LOTE: ', CAST(linhas_atualizadas AS STRING), ' registros'),
+            linhas_atualizadas,
+            'EDITADO_LOTE',
+            CONCAT('Alterações: ', STRING_AGG(DETALHES, '; ' ORDER BY ID_EDICAO))
+        FROM `{tabela_staging}`
+        WHERE ID_EDICAO NOT IN (SELECT ID_EDICAO FROM conflitos);
+    END IF;
+
+    COMMIT TRANSACTION;
+EXCEPTION WHEN ERROR THEN
+    ROLLBACK TRANSACTION;
+    RAISE USING MESSAGE = @@error.message;
+END;
+
+SELECT
+    linhas_atualizadas AS LINHAS_ATUALIZADAS,
+    ARRAY(SELECT ID_EDICAO FROM conflitos ORDER BY ID_EDICAO) AS CONFLITOS;
+"""
+
+
+def parametros_edicao(df_edicoes, metadata):
+    """Parâmetros do script de edição: versões e datas do lote (para poda) e metadados."""
+    return [
+        bigquery.ArrayQueryParameter("versoes", "STRING", sorted(df_edicoes['VERSAO'].unique().tolist())),
+        bigquery.ScalarQueryParameter("data_min", "DATE", df_edicoes['DATA'].min()),
+        bigquery.ScalarQueryParameter("data_max", "DATE", df_edicoes['DATA'].max()),
+        bigquery.ScalarQueryParameter("data_importacao", "TIMESTAMP", metadata["DATA_IMPORTACAO"].to_pydatetime()),
+        bigquery.ScalarQueryParameter("usuario", "STRING", metadata["USUARIO"]),
+        bigquery.ScalarQueryParameter("sistema_operacional", "STRING", metadata["SISTEMA_OPERACIONAL"]),
+        bigquery.ScalarQueryParameter("versao_sistema", "STRING", metadata["VERSAO_SISTEMA"])
+    ]
+
+
+def executar_script_importacao(client, script, parametros, cancelamento=None):
+    """
+    Executa o script em um único job e retorna o resumo da importação.
+
+    Com `cancelamento`, o job é cancelado se o processamento for cancelado;
+    a transação é desfeita e nada é aplicado.
+
+    Returns:
+        Tupla (dicionário com REGISTROS_EXISTENTES, IMPORTACAO_COMPLETA e
+        LINHAS_MERGE, job executado)
+    """
+    job = client.query(script, job_config=bigquery.QueryJobConfig(query_parameters=parametros))
+    linha = next(iter(aguardar_job(job, cancelamento)), None)
+    resumo = dict(linha) if linha is not None else {}
+    return resumo, job
@@ -0,0 +1,50 @@
+import pandas as pd
+import pytest
+
+from importador_controladoria import delta_importacao
+from importador_controladoria.armazem_local import ArmazemLocal
+from importador_controladoria.config import AUDITORIA_CONFIG
+from importador_controladoria.historico_processamentos import RepositorioProcessamentos
+
+
+def montar_lote(linhas, versao="2025-V01"):
+    """DataFrame no formato da tabela ORCADO a partir de tuplas (conta, centro de custo, data, valor)."""
+    return pd.DataFrame([
+        {
+            "N_CONTA": conta,
+            "N_CENTRO_CUSTO": centro_custo,
+            "DESCRICAO": f"Conta {conta}",
+            "VALOR": valor,
+            "DATA": data,
+            "VERSAO": versao,
+            "OPERACAO": "OPERACIONAL",
+            "FILIAL": "0001",
+            "RATEIO": "N",
+            "ORIGEM": "PLANILHA"
+        }
+        for conta, centro_custo, data, valor in linhas
+    ])
+
+
+@pytest.fixture
+def armazem(tmp_path, monkeypatch):
+    """Armazém local em um diretório temporário, sem spool de auditoria nem cache de hashes do projeto."""
+    monkeypatch.setattr(delta_importacao, "CACHE_HASHES_DIR", tmp_path / "hashes")
+    monkeypatch.setitem(AUDITORIA_CONFIG, "em_lote", False)
+    return ArmazemLocal(tmp_path / "orcado.sqlite3")
+
+
+@pytest.fixture
+def interface(tmp_path, monkeypatch):
+    """Módulo da interface com histórico e pasta de envios temporários."""
+    # Sem SECRET_KEY a importação gravaria a chave em config/
+    monkeypatch.setenv("SECRET_KEY", "teste")
+    from importador_controladoria import interface
+    monkeypatch.setattr(interface, "processamentos", RepositorioProcessamentos(
+        tmp_path / "historico.sqlite3", max_memoria=100, ttl_memoria_segundos=3600,
+        retencao_erros_dias=7, retencao_dias=30
+    ))
+    (tmp_path / "envios").mkdir()
+    monkeypatch.setitem(interface.app.config, "UPLOAD_FOLDER", str(tmp_path / "envios"))
+    monkeypatch.setitem(interface.app.config, "TESTING", True)
+    return interface
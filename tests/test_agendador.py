@@ -0,0 +1,97 @@
+import threading
+
+import pytest
+
+from importador_controladoria.agendador import Agendador, FilaCheia
+
+
+def _agendador(workers=1, tamanho_fila=5):
+    return Agendador("teste", workers=workers, tamanho_fila=tamanho_fila, limites_etapas={"cpu": 1, "rede": 1})
+
+
+def _bloqueante(liberar, iniciou=None):
+    def funcao():
+        if iniciou is not None:
+            iniciou.set()
+        liberar.wait(5)
+    return funcao
+
+
+def test_fila_fifo_e_fila_cheia():
+    agendador = _agendador(tamanho_fila=2)
+    liberar, iniciou = threading.Event(), threading.Event()
+    agendador.submeter("t0", _bloqueante(liberar, iniciou))
+    assert iniciou.wait(5)
+
+    executadas, terminou = [], threading.Event()
+    assert agendador.submeter("t1", lambda: executadas.append("t1")) == 1
+    assert agendador.submeter("t2", lambda: (executadas.append("t2"), terminou.set())) == 2
+    with pytest.raises(FilaCheia):
+        agendador.submeter("t3", lambda: None)
+    assert agendador.situacao() == {"workers": 1, "em_execucao": 1, "na_fila": 2, "tamanho_fila": 2}
+
+    liberar.set()
+    assert terminou.wait(5)
+    assert executadas == ["t1", "t2"]
+
+
+def test_remover_e_posicoes():
+    agendador = _agendador()
+    liberar, iniciou = threading.Event(), threading.Event()
+    agendador.submeter("t0", _bloqueante(liberar, iniciou))
+    assert iniciou.wait(5)
+
+    posicoes = []
+    agendador.submeter("t1", lambda: None)
+    agendador.submeter("t2", lambda: None, ao_mudar_posicao=lambda posicao, total: posicoes.append((posicao, total)))
+    assert agendador.posicao("t2") == 2
+
+    assert agendador.remover("t1") is True
+    assert agendador.remover("t1") is False
+    assert agendador.posicao("t2") == 1
+    assert posicoes == [(2, 2), (1, 1)]
+    liberar.set()
+
+
+def test_callback_com_erro_nao_derruba_o_worker():
+    agendador = _agendador()
+    liberar, iniciou = threading.Event(), threading.Event()
+    agendador.submeter("t0", _bloqueante(liberar, iniciou))
+    assert iniciou.wait(5)
+
+    def falhar(posicao, total):
+        raise RuntimeError("callback com erro")
+
+    executou = threading.Event()
+    agendador.submeter("t1", lambda: None, ao_mudar_posicao=falhar)
+    agendador.submeter("t2", executou.set)
+    liberar.set()
+    assert executou.wait(5)
+    assert agendador.situacao()["workers"] == 1
+
+
+def test_etapa_limita_execucoes_simultaneas():
+    agendador = Agendador("teste", workers=1, tamanho_fila=1, limites_etapas={"cpu": 1})
+    dentro, liberar, concorrentes = threading.Event(), threading.Event(), []
+
+    def ocupar():
+        with agendador.etapa("cpu"):
+            dentro.set()
+            liberar.wait(5)
+
+    def tentar():
+        with agendador.etapa("cpu"):
+            concorrentes.append(dentro.is_set() and not liberar.is_set())
+
+    primeira = threading.Thread(target=ocupar)
+    primeira.start()
+    assert dentro.wait(5)
+    segunda = threading.Thread(target=tentar)
+    segunda.start()
+    segunda.join(0.1)
+    assert segunda.is_alive()
+
+    liberar.set()
+    primeira.join(5)
+    segunda.join(5)
+    assert concorrentes == [False]
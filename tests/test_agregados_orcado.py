@@ -0,0 +1,74 @@
+import pytest
+
+from importador_controladoria.agregados_orcado import AtualizadorAgregados
+from importador_controladoria.catalogo_versoes import CatalogoVersoes
+
+
+class Aplicar:
+    """Recálculo falso que registra as versões recebidas e pode falhar."""
+
+    def __init__(self):
+        self.falhar = False
+        self.chamadas = []
+
+    def __call__(self, versoes):
+        if self.falhar:
+            raise RuntimeError("BigQuery indisponível")
+        self.chamadas.append(versoes)
+
+
+def test_edicoes_esperam_e_importacao_recalcula_na_hora():
+    aplicar = Aplicar()
+    atualizador = AtualizadorAgregados(aplicar, intervalo_segundos=3600)
+
+    atualizador.marcar(["V1"])
+    atualizador.marcar(["V1", "V2"])
+    assert aplicar.chamadas == []
+    assert atualizador.pendentes() == ["V1", "V2"]
+
+    # A importação recalcula a versão dela junto com as edições pendentes
+    atualizador.marcar(["V3"], imediato=True)
+    assert aplicar.chamadas == [["V1", "V2", "V3"]]
+    assert atualizador.pendentes() == []
+
+
+def test_falha_no_recalculo_mantem_as_versoes_pendentes():
+    aplicar = Aplicar()
+    aplicar.falhar = True
+    atualizador = AtualizadorAgregados(aplicar, intervalo_segundos=3600)
+
+    atualizador.marcar(["V1"], imediato=True)
+    assert atualizador.pendentes() == ["V1"]
+
+    aplicar.falhar = False
+    atualizador.descarregar()
+    assert aplicar.chamadas == [["V1"]]
+    assert atualizador.pendentes() == []
+
+
+def test_reconstrucao_pendente_apos_falha():
+    aplicar = Aplicar()
+    aplicar.falhar = True
+    atualizador = AtualizadorAgregados(aplicar, intervalo_segundos=3600)
+
+    atualizador.marcar(None, imediato=True)
+    assert atualizador.pendentes() is None
+
+    aplicar.falhar = False
+    atualizador.descarregar()
+    assert aplicar.chamadas == [None]
+
+
+class ClienteComFalha:
+    project = "projeto"
+
+    def query(self, query, job_config=None):
+        raise RuntimeError("cota excedida")
+
+
+def test_erro_no_catalogo_chega_ao_atualizador():
+    catalogo = CatalogoVersoes(ttl_segundos=60)
+    with pytest.raises(RuntimeError):
+        catalogo.atualizar_ou_reconstruir(ClienteComFalha(), ["V1"])
+    with pytest.raises(RuntimeError):
+        catalogo.atualizar_ou_reconstruir(ClienteComFalha())
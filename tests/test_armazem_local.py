@@ -0,0 +1,176 @@
+from datetime import date
+
+import pytest
+
+from importador_controladoria.edicao_lote import COLUNAS_EDITAVEIS, ler_edicoes
+from importador_controladoria.paginacao import (
+    DIRECAO_ANTERIOR, DIRECAO_PROXIMA, decodificar_cursor, montar_pagina
+)
+
+from conftest import montar_lote
+
+LINHAS = [
+    ("30000001", "100000001", "2025-01-01", 100.0),
+    ("30000001", "100000001", "2025-02-01", 110.0),
+    ("30000002", "100000001", "2025-01-01", 200.0),
+    ("30000002", "100000002", "2025-01-01", 300.0),
+    ("30000003", "100000002", "2025-03-01", 400.0),
+]
+
+METADATA = {
+    "DATA_IMPORTACAO": "2025-01-01 00:00:00",
+    "USUARIO": "teste",
+    "SISTEMA_OPERACIONAL": "teste",
+    "VERSAO_SISTEMA": "teste"
+}
+
+
+def _importar(armazem, df):
+    return armazem.importar(
+        df, arquivo="teste.xlsx", usuario="teste", sistema_operacional="teste", versao_sistema="teste"
+    )
+
+
+def _importar_delta(armazem, df):
+    return armazem.importar_delta(
+        df, arquivo="teste.xlsx", usuario="teste", sistema_operacional="teste", versao_sistema="teste"
+    )
+
+
+def _chave(registro):
+    return {campo: registro[campo] for campo in ("VERSAO", "DATA", "N_CONTA", "N_CENTRO_CUSTO")}
+
+
+def _edicao(registro, **novos):
+    originais = {coluna: registro[coluna] for coluna in COLUNAS_EDITAVEIS}
+    return {
+        "chave": {**_chave(registro), "DATA": registro["DATA"].isoformat()},
+        "data_atualizacao": registro["DATA_ATUALIZACAO"].isoformat(),
+        "originais": originais,
+        "valores": {**originais, **novos}
+    }
+
+
+def test_importacao_completa_e_parcial(armazem):
+    resultado = _importar(armazem, montar_lote(LINHAS))
+    assert resultado["IMPORTACAO_COMPLETA"] is True
+    assert resultado["REGISTROS_EXISTENTES"] == 0
+    assert resultado["LINHAS_MERGE"] == len(LINHAS)
+
+    # Reimportação da mesma versão: só a linha com valor diferente é regravada
+    resultado = _importar(armazem, montar_lote([LINHAS[0][:3] + (150.0,), LINHAS[1]]))
+    assert resultado["IMPORTACAO_COMPLETA"] is False
+    assert resultado["REGISTROS_EXISTENTES"] == len(LINHAS)
+    assert resultado["LINHAS_MERGE"] == 1
+
+    registros = armazem.selecionar({"versao": "2025-V01"})
+    assert len(registros) == len(LINHAS)
+    valores = {(r["N_CONTA"], r["N_CENTRO_CUSTO"], r["DATA"]): r["VALOR"] for r in registros}
+    assert valores[("30000001", "100000001", date(2025, 1, 1))] == 150.0
+    assert armazem.listar_versoes()[0]["TOTAL_REGISTROS"] == len(LINHAS)
+
+
+def test_reimportacao_delta(armazem):
+    contagens = _importar_delta(armazem, montar_lote(LINHAS))
+    assert contagens["INSERIDOS"] == len(LINHAS)
+    assert contagens["IMPORTACAO_COMPLETA"] is True
+
+    # Uma linha alterada, uma removida do arquivo e uma nova
+    novas = [LINHAS[0][:3] + (999.0,)] + LINHAS[1:4] + [("30000004", "100000003", "2025-04-01", 500.0)]
+    contagens = _importar_delta(armazem, montar_lote(novas))
+    assert (contagens["INSERIDOS"], contagens["ATUALIZADOS"], contagens["INALTERADOS"], contagens["EXCLUIDOS"]) == (
+        1, 1, 3, 1
+    )
+    assert contagens["REGISTROS_EXISTENTES"] == len(LINHAS)
+
+    chaves = {(r["N_CONTA"], r["DATA"].isoformat()) for r in armazem.selecionar({"versao": "2025-V01"})}
+    assert ("30000003", "2025-03-01") not in chaves
+    assert ("30000004", "2025-04-01") in chaves
+
+    # O mesmo arquivo de novo não envia nada
+    contagens = _importar_delta(armazem, montar_lote(novas))
+    assert contagens["INALTERADOS"] == len(novas)
+    assert contagens["LINHAS_MERGE"] == 0
+
+
+def test_paginacao_keyset(armazem):
+    _importar(armazem, montar_lote(LINHAS))
+    todas, _ = armazem.consultar_pagina({}, None, DIRECAO_PROXIMA, 100)
+
+    paginas, cursor = [], None
+    while True:
+        linhas, total = armazem.consultar_pagina({}, decodificar_cursor(cursor), DIRECAO_PROXIMA, 2)
+        assert total == len(LINHAS)
+        registros, cursor, _ = montar_pagina(linhas, 2, DIRECAO_PROXIMA, cursor is not None)
+        paginas.append(registros)
+        if cursor is None:
+            break
+
+    assert [len(pagina) for pagina in paginas] == [2, 2, 1]
+    vistas = [_chave(r) for pagina in paginas for r in pagina]
+    assert vistas == [_chave(r) for r in todas[:len(LINHAS)]]
+
+    # Voltando da segunda página chega-se à primeira, na mesma ordem
+    linhas, _ = armazem.consultar_pagina({}, None, DIRECAO_PROXIMA, 2)
+    _, cursor_proximo, _ = montar_pagina(linhas, 2, DIRECAO_PROXIMA, False)
+    linhas, _ = armazem.consultar_pagina({}, decodificar_cursor(cursor_proximo), DIRECAO_PROXIMA, 2)
+    _, _, cursor_anterior = montar_pagina(linhas, 2, DIRECAO_PROXIMA, True)
+    linhas, _ = armazem.consultar_pagina({}, decodificar_cursor(cursor_anterior), DIRECAO_ANTERIOR, 2)
+    registros, _, cursor_anterior = montar_pagina(linhas, 2, DIRECAO_ANTERIOR, True)
+    assert [_chave(r) for r in registros] == [_chave(r) for r in paginas[0]]
+    assert cursor_anterior is None
+
+
+def test_paginacao_com_filtro(armazem):
+    _importar(armazem, montar_lote(LINHAS))
+    linhas, total = armazem.consultar_pagina({"n_conta": "30000002"}, None, DIRECAO_PROXIMA, 10)
+    assert total == 2
+    assert {linha["N_CONTA"] for linha in linhas} == {"30000002"}
+
+
+def test_exclusao_por_filtros(armazem):
+    _importar(armazem, montar_lote(LINHAS))
+    _importar(armazem, montar_lote(LINHAS[:2], versao="2025-V02"))
+
+    with pytest.raises(ValueError):
+        armazem.excluir({})
+
+    filtros = {"n_conta": "30000001"}
+    assert armazem.estimar_exclusao(filtros)["REGISTROS"] == 4
+    assert armazem.versoes_afetadas(filtros) == ["2025-V01", "2025-V02"]
+    assert armazem.excluir(filtros) == 4
+    assert armazem.estimar_exclusao(filtros)["REGISTROS"] == 0
+    assert len(armazem.selecionar({"versao": "2025-V01"})) == len(LINHAS) - 2
+
+
+def test_exclusao_por_chave(armazem):
+    _importar(armazem, montar_lote(LINHAS))
+    registro = armazem.selecionar({"n_conta": "30000002", "n_centro_custo": "100000002"})[0]
+
+    assert armazem.excluir_registro(_chave(registro)) == 1
+    assert armazem.obter_registro(_chave(registro)) is None
+    assert armazem.excluir_registro(_chave(registro)) == 0
+    assert len(armazem.selecionar({"versao": "2025-V01"})) == len(LINHAS) - 1
+
+
+def test_edicao_em_lote_com_conflito(armazem):
+    _importar(armazem, montar_lote(LINHAS))
+    primeiro, segundo = armazem.selecionar({"n_conta": "30000001"})
+
+    # Outra edição altera o segundo registro depois que a tela o leu
+    edicoes, _ = ler_edicoes({"edicoes": [_edicao(segundo, DESCRICAO="Editada antes")]})
+    assert armazem.atualizar_registros(edicoes, METADATA) == {"ATUALIZADOS": 1, "CONFLITOS": []}
+
+    edicoes, sem_alteracao = ler_edicoes({"edicoes": [
+        _edicao(primeiro, VALOR=1.5),
+        _edicao(segundo, VALOR=2.5),
+        _edicao(primeiro)
+    ]})
+    assert sem_alteracao == 1
+    resultado = armazem.atualizar_registros(edicoes, METADATA)
+    assert resultado == {"ATUALIZADOS": 1, "CONFLITOS": [1]}
+
+    assert armazem.obter_registro(_chave(primeiro))["VALOR"] == 1.5
+    atual = armazem.obter_registro(_chave(segundo))
+    assert atual["VALOR"] == segundo["VALOR"]
+    assert atual["DESCRICAO"] == "Editada antes"
@@ -0,0 +1,101 @@
+import json
+import threading
+
+from importador_controladoria.auditoria import EscritorAuditoria
+
+CONFIG = {"registros_por_lote": 1000, "intervalo_segundos": 3600}
+
+
+def _metadata(indice):
+    return {
+        "DATA_IMPORTACAO": "2025-01-01T00:00:00",
+        "USUARIO": "teste",
+        "SISTEMA_OPERACIONAL": "teste",
+        "VERSAO_SISTEMA": "teste",
+        "ARQUIVO_ORIGEM": f"EDITADO: {indice}",
+        "TOTAL_REGISTROS": 1,
+        "STATUS": "EDITADO",
+        "DETALHES": f"evento {indice}"
+    }
+
+
+class Destino:
+    """Destino em memória que registra os lotes recebidos."""
+
+    def __init__(self, falhar=False):
+        self.falhar = falhar
+        self.lotes = {}
+        self._lock = threading.Lock()
+
+    def __call__(self, id_lote, eventos):
+        if self.falhar:
+            raise RuntimeError("destino indisponível")
+        with self._lock:
+            self.lotes[id_lote] = [evento["DETALHES"] for evento in eventos]
+
+    def detalhes(self):
+        return sorted(detalhe for eventos in self.lotes.values() for detalhe in eventos)
+
+
+def test_dois_escritores_no_mesmo_diretorio(tmp_path):
+    destino_a, destino_b = Destino(), Destino()
+    escritor_a = EscritorAuditoria(destino_a, tmp_path, CONFIG)
+    escritor_b = EscritorAuditoria(destino_b, tmp_path, CONFIG)
+
+    for indice in range(3):
+        escritor_a.registrar(_metadata(f"a{indice}"))
+        escritor_b.registrar(_metadata(f"b{indice}"))
+
+    # Cada escritor roda o próprio spool sem mexer no do outro. A thread de
+    # descarga pode enviar parte dos lotes; ao fim de `descarregar` tudo foi enviado
+    escritor_a.descarregar()
+    escritor_b.registrar(_metadata("b3"))
+    escritor_b.descarregar()
+    escritor_a.descarregar()
+
+    assert destino_a.detalhes() == ["evento a0", "evento a1", "evento a2"]
+    assert destino_b.detalhes() == ["evento b0", "evento b1", "evento b2", "evento b3"]
+    for escritor in (escritor_a, escritor_b):
+        estatisticas = escritor.estatisticas()
+        assert (estatisticas["pendentes"], estatisticas["lotes_pendentes"]) == (0, 0)
+    assert list(tmp_path.iterdir()) == []
+
+
+def test_spool_ja_renomeado_zera_os_pendentes(tmp_path):
+    escritor = EscritorAuditoria(Destino(), tmp_path, CONFIG)
+    escritor.registrar(_metadata(1))
+    escritor._spool.unlink()
+
+    escritor.descarregar()
+    assert escritor.estatisticas()["pendentes"] == 0
+
+
+def test_lote_com_falha_e_reenviado_com_o_mesmo_id(tmp_path):
+    destino = Destino(falhar=True)
+    escritor = EscritorAuditoria(destino, tmp_path, CONFIG)
+    escritor.registrar(_metadata(1))
+    escritor.descarregar()
+    assert escritor.estatisticas()["lotes_pendentes"] == 1
+    (lote,) = escritor._lotes_pendentes()
+
+    destino.falhar = False
+    escritor.descarregar()
+    # O lote reenviado mantém o identificador (lote_<ns>_<id>) da primeira tentativa
+    assert destino.lotes == {"lote_" + "_".join(lote.stem.split("_")[-2:]): ["evento 1"]}
+    assert escritor.estatisticas()["lotes_pendentes"] == 0
+
+
+def test_arquivos_de_processo_encerrado_sao_assumidos(tmp_path):
+    evento = json.dumps({**_metadata(1), "ID_EVENTO": "x"})
+    # Spool e lote de um processo que não existe mais, e um lote sem PID de uma versão anterior
+    (tmp_path / "pendentes_pid999999999_abcd1234.jsonl").write_text(evento + "\n", encoding="utf-8")
+    (tmp_path / "lote_pid999999999_abcd1234_1_ffff0000.jsonl").write_text(evento + "\n", encoding="utf-8")
+    (tmp_path / "lote_2_eeee0000.jsonl").write_text(evento + "\n", encoding="utf-8")
+
+    destino = Destino()
+    escritor = EscritorAuditoria(destino, tmp_path, CONFIG)
+    escritor.descarregar()
+    assert destino.detalhes() == ["evento 1"] * 3
+    # Os lotes assumidos mantêm o identificador original
+    assert {"lote_1_ffff0000", "lote_2_eeee0000"} <= set(destino.lotes)
+    assert list(tmp_path.iterdir()) == []
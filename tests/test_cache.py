@@ -0,0 +1,52 @@
+import time
+
+from importador_controladoria.cache import CacheResultados, chave_filtros
+from importador_controladoria.estado_compartilhado import GeracaoCompartilhada
+
+
+def test_ttl_expira_entradas():
+    cache = CacheResultados("teste", ttl_segundos=0.05, max_entradas=10)
+    cache.armazenar("a", 1)
+    assert cache.obter("a") == 1
+    time.sleep(0.06)
+    assert cache.obter("a") is None
+    assert cache.estatisticas()["expiradas"] == 1
+
+
+def test_lru_descarta_menos_usada():
+    cache = CacheResultados("teste", ttl_segundos=60, max_entradas=2)
+    cache.armazenar("a", 1)
+    cache.armazenar("b", 2)
+    cache.obter("a")
+    cache.armazenar("c", 3)
+    assert cache.obter("b") is None
+    assert (cache.obter("a"), cache.obter("c")) == (1, 3)
+    assert cache.estatisticas()["descartadas"] == 1
+
+
+def test_geracao_descarta_resultado_anterior_a_invalidacao():
+    cache = CacheResultados("teste", ttl_segundos=60, max_entradas=10)
+    cache.armazenar("a", 1)
+    geracao = cache.geracao
+    cache.invalidar("escrita")
+    assert cache.obter("a") is None
+    # Consulta iniciada antes da escrita não grava o resultado
+    assert cache.armazenar("a", 1, geracao=geracao) is False
+    assert cache.armazenar("a", 2, geracao=cache.geracao) is True
+    assert cache.obter("a") == 2
+
+
+def test_geracao_compartilhada_entre_processos(tmp_path):
+    caminho = tmp_path / "estado.sqlite3"
+    # Cada cache representa um processo diferente
+    cache = CacheResultados("a", geracao_compartilhada=GeracaoCompartilhada(caminho, "orcado", 0))
+    outro = CacheResultados("b", geracao_compartilhada=GeracaoCompartilhada(caminho, "orcado", 0))
+    cache.armazenar("x", 1)
+    assert cache.obter("x") == 1
+
+    outro.invalidar("escrita em outro processo")
+    assert cache.obter("x") is None
+
+
+def test_chave_filtros_ignora_vazios_e_ordem():
+    assert chave_filtros("p", {"b": " 2 ", "a": "1", "c": ""}) == chave_filtros("p", {"a": "1", "b": "2", "c": None})
@@ -0,0 +1,82 @@
+import concurrent.futures
+
+import pytest
+
+from importador_controladoria import cancelamento as modulo_cancelamento
+from importador_controladoria.cancelamento import ProcessamentoCancelado, SinalCancelamento, aguardar_job
+
+
+class JobFalso:
+    """Job do BigQuery simulado: conclui (ou não) durante a primeira espera."""
+
+    job_id = "job_teste"
+
+    def __init__(self, sinal, concluir_na_espera):
+        self.sinal = sinal
+        self.concluir_na_espera = concluir_na_espera
+        self.estado = "RUNNING"
+        self.error_result = None
+        self.esperas = 0
+        self.cancelado = False
+
+    def result(self, timeout=None):
+        if self.esperas == 0:
+            self.esperas += 1
+            # O cancelamento chega enquanto o job roda; o COMMIT pode ter acontecido
+            # logo antes, sem que esta espera tenha visto o job terminar
+            if self.concluir_na_espera:
+                self.estado = "DONE"
+            self.sinal.cancelar()
+            raise concurrent.futures.TimeoutError()
+        if self.error_result is not None:
+            raise RuntimeError(self.error_result["message"])
+        return ["resumo"]
+
+    def cancel(self):
+        self.cancelado = True
+        if self.estado != "DONE":
+            self.estado = "DONE"
+            self.error_result = {"reason": "stopped", "message": "Job cancelado"}
+
+    def reload(self):
+        pass
+
+    def done(self):
+        return self.estado == "DONE"
+
+
+@pytest.fixture(autouse=True)
+def sem_espera(monkeypatch):
+    monkeypatch.setattr(modulo_cancelamento, "INTERVALO_VERIFICACAO_SEGUNDOS", 0.01)
+
+
+def test_sem_cancelamento_retorna_o_resultado():
+    sinal = SinalCancelamento()
+    job = JobFalso(sinal, concluir_na_espera=False)
+    job.esperas = 1
+    assert aguardar_job(job, sinal) == ["resumo"]
+
+
+def test_cancelamento_com_job_em_andamento():
+    sinal = SinalCancelamento()
+    job = JobFalso(sinal, concluir_na_espera=False)
+    with pytest.raises(ProcessamentoCancelado):
+        aguardar_job(job, sinal)
+    assert job.cancelado
+
+
+def test_cancelamento_apos_o_commit_mantem_o_resultado():
+    sinal = SinalCancelamento()
+    job = JobFalso(sinal, concluir_na_espera=True)
+    # O job já tinha concluído: o resultado volta para o chamador atualizar agregados e cache
+    assert aguardar_job(job, sinal) == ["resumo"]
+    assert sinal.cancelado
+    with pytest.raises(ProcessamentoCancelado):
+        sinal.verificar()
+
+
+def test_tempo_limite_da_etapa_cancela_o_sinal():
+    sinal = SinalCancelamento()
+    with pytest.raises(ProcessamentoCancelado, match="Tempo limite da etapa upload"):
+        with sinal.etapa("upload", limite_segundos=0.01):
+            sinal._cancelado.wait(1)
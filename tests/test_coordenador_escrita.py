@@ -0,0 +1,105 @@
+import threading
+import time
+
+import pytest
+
+from importador_controladoria.coordenador_escrita import CoordenadorEscrita
+
+
+def test_escrita_reentrante():
+    coordenador = CoordenadorEscrita()
+    with coordenador.escrita(["V1", "V2"]):
+        with coordenador.escrita(["V1"]):
+            pass
+        with coordenador.escrita(["V2"]):
+            pass
+    with coordenador.escrita(None):
+        with coordenador.escrita(["V1"]):
+            pass
+
+
+def test_versoes_diferentes_em_paralelo_e_mesma_versao_serializada():
+    coordenador = CoordenadorEscrita()
+    eventos = []
+    dentro = threading.Event()
+
+    def escrever(versao, nome):
+        with coordenador.escrita([versao]):
+            eventos.append(f"{nome}:inicio")
+            time.sleep(0.05)
+            eventos.append(f"{nome}:fim")
+
+    with coordenador.escrita(["V1"]):
+        outra_versao = threading.Thread(target=lambda: (escrever("V2", "b"), dentro.set()))
+        outra_versao.start()
+        # Versão diferente não espera a V1
+        assert dentro.wait(5)
+        mesma_versao = threading.Thread(target=escrever, args=("V1", "c"))
+        mesma_versao.start()
+        mesma_versao.join(0.1)
+        assert mesma_versao.is_alive()
+        eventos.append("a:fim")
+    mesma_versao.join(5)
+    assert eventos == ["b:inicio", "b:fim", "a:fim", "c:inicio", "c:fim"]
+
+
+def _agrupar_com_lider_ocupado(coordenador, itens, aplicar_lote):
+    """Chama `agrupar` para cada item enquanto a versão está travada, e solta a trava."""
+    resultados, erros = {}, {}
+
+    def chamar(item):
+        try:
+            resultados[item] = coordenador.agrupar("grupo", ["V1"], item, aplicar_lote)
+        except Exception as e:
+            erros[item] = e
+
+    threads = [threading.Thread(target=chamar, args=(item,)) for item in itens]
+    with coordenador.escrita(["V1"]):
+        for thread in threads:
+            thread.start()
+        # Espera todos entrarem no grupo antes de liberar a versão
+        while len(coordenador._grupos.get("grupo", [])) < len(itens):
+            time.sleep(0.01)
+    for thread in threads:
+        thread.join(5)
+        assert not thread.is_alive()
+    return resultados, erros
+
+
+def test_agrupar_aplica_um_lote_com_resultado_por_item():
+    coordenador = CoordenadorEscrita()
+    lotes = []
+
+    def aplicar_lote(itens):
+        lotes.append(sorted(itens))
+        return [item * 10 for item in itens]
+
+    resultados, erros = _agrupar_com_lider_ocupado(coordenador, [1, 2, 3], aplicar_lote)
+    assert lotes == [[1, 2, 3]]
+    assert resultados == {1: 10, 2: 20, 3: 30}
+    assert erros == {}
+
+
+def test_agrupar_falha_do_lote_chega_a_todos():
+    coordenador = CoordenadorEscrita()
+
+    def aplicar_lote(itens):
+        raise ValueError("DML falhou")
+
+    resultados, erros = _agrupar_com_lider_ocupado(coordenador, [1, 2, 3], aplicar_lote)
+    assert resultados == {}
+    assert set(erros) == {1, 2, 3}
+    assert all(isinstance(erro, ValueError) for erro in erros.values())
+    # O grupo foi retirado: a próxima mutação forma um novo lote
+    assert coordenador.agrupar("grupo", ["V1"], 4, lambda itens: list(itens)) == 4
+
+
+def test_agrupar_resultado_incompleto():
+    coordenador = CoordenadorEscrita()
+    resultados, erros = _agrupar_com_lider_ocupado(coordenador, [1, 2], lambda itens: [0])
+    assert resultados == {}
+    assert set(erros) == {1, 2}
+    assert all(isinstance(erro, RuntimeError) for erro in erros.values())
+
+    with pytest.raises(RuntimeError):
+        coordenador.agrupar("grupo", ["V1"], 3, lambda itens: [])
@@ -0,0 +1,76 @@
+from datetime import date, datetime, timezone
+
+import openpyxl
+import pyarrow as pa
+import pyarrow.csv as pa_csv
+import pytest
+
+from importador_controladoria import exportacao
+from importador_controladoria.exportacao import escrever_csv, escrever_excel
+
+
+def _lote(inicio, quantidade):
+    return pa.table({
+        "N_CONTA": [f"{inicio + indice}" for indice in range(quantidade)],
+        "N_CENTRO_CUSTO": ["CC1"] * quantidade,
+        "DESCRICAO": ["Conta"] * quantidade,
+        "VALOR": pa.array([1234.5 + indice for indice in range(quantidade)], pa.float64()),
+        "DATA": pa.array([date(2025, 3, 1)] * quantidade, pa.date32()),
+        "VERSAO": ["2025-V01"] * quantidade,
+        "DATA_ATUALIZACAO": pa.array(
+            [datetime(2025, 3, 2, 10, 30, tzinfo=timezone.utc)] * quantidade, pa.timestamp("us", tz="UTC")
+        )
+    })
+
+
+def test_excel_grava_numeros_e_datas(tmp_path):
+    caminho = tmp_path / "orcado.xlsx"
+    progresso = []
+    total = escrever_excel([_lote(1, 2), _lote(3, 0), _lote(3, 1)], caminho, ao_progredir=progresso.append)
+    assert total == 3
+    assert progresso == [2, 3]
+
+    planilha = openpyxl.load_workbook(caminho).active
+    linhas = list(planilha.iter_rows(values_only=True))
+    assert linhas[0] == tuple(rotulo for _, rotulo, _ in exportacao.COLUNAS_EXPORTACAO)
+    assert [linha[0] for linha in linhas[1:]] == ["1", "2", "3"]
+    primeira = dict(zip([nome for nome, _, _ in exportacao.COLUNAS_EXPORTACAO], linhas[1]))
+    assert primeira["VALOR"] == 1234.5
+    assert primeira["DATA"] == datetime(2025, 3, 1)
+    assert primeira["DATA_ATUALIZACAO"] == datetime(2025, 3, 2, 10, 30)
+    # Colunas ausentes no lote ficam em branco
+    assert primeira["FILIAL"] is None
+
+
+def test_excel_abre_nova_planilha_no_limite_de_linhas(tmp_path, monkeypatch):
+    monkeypatch.setattr(exportacao, "MAX_LINHAS_PLANILHA", 3)
+    caminho = tmp_path / "orcado.xlsx"
+    assert escrever_excel([_lote(1, 5)], caminho) == 5
+
+    workbook = openpyxl.load_workbook(caminho)
+    assert workbook.sheetnames == ["Registros", "Registros (2)", "Registros (3)"]
+    contas = [linha[0] for planilha in workbook for linha in planilha.iter_rows(min_row=2, values_only=True)]
+    assert contas == ["1", "2", "3", "4", "5"]
+
+
+def test_excel_sem_registros_tem_so_o_cabecalho(tmp_path):
+    caminho = tmp_path / "orcado.xlsx"
+    assert escrever_excel([], caminho) == 0
+    assert openpyxl.load_workbook(caminho).active.max_row == 1
+
+
+def test_csv_ida_e_volta(tmp_path):
+    caminho = tmp_path / "orcado.csv"
+    assert escrever_csv([_lote(1, 2), _lote(3, 1)], caminho) == 3
+
+    lido = pa_csv.read_csv(
+        caminho,
+        parse_options=pa_csv.ParseOptions(delimiter=";"),
+        convert_options=pa_csv.ConvertOptions(column_types=exportacao.ESQUEMA_EXPORTACAO, strings_can_be_null=True)
+    )
+    assert lido.schema.names == exportacao.ESQUEMA_EXPORTACAO.names
+    assert lido.column("N_CONTA").to_pylist() == ["1", "2", "3"]
+    assert lido.column("VALOR").to_pylist() == pytest.approx([1234.5, 1235.5, 1234.5])
+    assert lido.column("DATA").to_pylist() == [date(2025, 3, 1)] * 3
+    assert lido.column("DATA_ATUALIZACAO")[0].as_py() == datetime(2025, 3, 2, 10, 30, tzinfo=timezone.utc)
+    assert lido.column("FILIAL").null_count == 3
@@ -0,0 +1,64 @@
+from datetime import date, datetime, timezone
+
+import pytest
+
+from importador_controladoria.config import PAGINACAO_CONFIG
+from importador_controladoria.filtros import compilar_filtros, ler_filtros, possui_filtros
+from importador_controladoria.paginacao import (
+    codificar_cursor, decodificar_cursor, normalizar_tamanho_pagina
+)
+
+
+def test_compilar_sem_filtros():
+    filtros = ler_filtros({})
+    assert not possui_filtros(filtros)
+    assert compilar_filtros(filtros) == ("WHERE TRUE", [])
+
+
+def test_compilar_filtros_preenchidos():
+    filtros = ler_filtros({"versao": " 2025-V01 ", "data_inicio": "2025-01-01", "n_conta": "", "origem": "PLAN"})
+    assert possui_filtros(filtros)
+
+    clausula, parametros = compilar_filtros(filtros)
+    # Ordem fixa dos predicados; campos vazios ficam de fora
+    assert clausula == (
+        "WHERE VERSAO = @versao\n  AND DATA >= @data_inicio\n  AND ORIGEM LIKE CONCAT('%', @origem, '%')"
+    )
+    assert [(p.name, p.type_, p.value) for p in parametros] == [
+        ("versao", "STRING", "2025-V01"),
+        ("data_inicio", "DATE", date(2025, 1, 1)),
+        ("origem", "STRING", "PLAN")
+    ]
+
+
+def test_compilar_texto_independe_dos_valores():
+    primeiro, _ = compilar_filtros({"filial": "0001", "data_fim": "2025-12-31"})
+    segundo, _ = compilar_filtros({"filial": "0002", "data_fim": "2024-06-30"})
+    assert primeiro == segundo
+
+
+def test_compilar_data_invalida():
+    with pytest.raises(ValueError, match="Data de filtro inválida"):
+        compilar_filtros({"data_fim": "31/12/2025"})
+
+
+def test_cursor_ida_e_volta():
+    registro = {
+        "DATA_ATUALIZACAO": datetime(2025, 3, 4, 5, 6, 7, 890123, tzinfo=timezone.utc),
+        "CHAVE_ORDEM": "2025-V01|30000001|100000001|2025-01-01"
+    }
+    assert decodificar_cursor(codificar_cursor(registro)) == (
+        registro["DATA_ATUALIZACAO"], registro["CHAVE_ORDEM"]
+    )
+
+
+@pytest.mark.parametrize("cursor", [None, "", "nao-e-base64!", "eyJ4IjogMX0="])
+def test_cursor_invalido(cursor):
+    assert decodificar_cursor(cursor) is None
+
+
+def test_normalizar_tamanho_pagina():
+    permitido = PAGINACAO_CONFIG["tamanhos_permitidos"][-1]
+    assert normalizar_tamanho_pagina(str(permitido)) == permitido
+    assert normalizar_tamanho_pagina("abc") == PAGINACAO_CONFIG["tamanho_padrao"]
+    assert normalizar_tamanho_pagina(7) == PAGINACAO_CONFIG["tamanho_padrao"]
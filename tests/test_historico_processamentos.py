@@ -0,0 +1,100 @@
+import sqlite3
+from datetime import datetime, timedelta
+
+from importador_controladoria.historico_processamentos import RepositorioProcessamentos
+
+
+def _repositorio(tmp_path, **opcoes):
+    parametros = {"max_memoria": 2, "ttl_memoria_segundos": 3600, "retencao_erros_dias": 7, "retencao_dias": 30}
+    parametros.update(opcoes)
+    return RepositorioProcessamentos(tmp_path / "historico.sqlite3", **parametros)
+
+
+def _status(concluido=False, erros=None):
+    return {
+        "arquivo": "orcado.xlsx",
+        "concluido": concluido,
+        "sucesso": concluido,
+        "mensagem": "Concluído" if concluido else "Processando",
+        "progresso": 100 if concluido else 10,
+        "erros": erros or []
+    }
+
+
+def _envelhecer(repositorio, processamento_id, dias):
+    criado_em = (datetime.now() - timedelta(days=dias)).isoformat(timespec="seconds")
+    with sqlite3.connect(repositorio.caminho) as conexao:
+        conexao.execute("UPDATE PROCESSAMENTOS SET CRIADO_EM = ? WHERE ID = ?", (criado_em, processamento_id))
+
+
+def test_status_persistido_em_disco(tmp_path):
+    repositorio = _repositorio(tmp_path)
+    repositorio["p1"] = _status()
+    repositorio["p1"].update(_status(concluido=True, erros=["linha 3: valor inválido"]))
+    repositorio.concluir("p1")
+
+    # Outra instância (ex.: após um reinício) lê o status do disco
+    outro = _repositorio(tmp_path)
+    assert "p1" in outro
+    assert outro["p1"]["sucesso"] is True
+    assert outro["p1"]["erros"] == ["linha 3: valor inválido"]
+    assert outro.get("inexistente") is None
+    assert [linha["ID"] for linha in outro.listar()] == ["p1"]
+
+
+def test_expurgo_mantem_em_andamento(tmp_path):
+    repositorio = _repositorio(tmp_path)
+    repositorio["andamento"] = _status()
+    for indice in range(3):
+        repositorio[f"c{indice}"] = _status(concluido=True)
+        repositorio.concluir(f"c{indice}")
+
+    # Acima de max_memoria saem os concluídos menos recentes; o em andamento fica
+    assert repositorio.estatisticas() == {"em_memoria": 2, "em_andamento": 1, "max_memoria": 2}
+    assert "andamento" in repositorio._memoria
+    assert "c2" in repositorio._memoria
+    # Os expurgados continuam disponíveis a partir do disco
+    assert repositorio["c0"]["concluido"] is True
+
+
+def test_expurgo_por_ttl(tmp_path):
+    repositorio = _repositorio(tmp_path, max_memoria=10, ttl_memoria_segundos=-1)
+    repositorio["c1"] = _status(concluido=True)
+    repositorio["c2"] = _status(concluido=True)
+    repositorio["andamento"] = _status()
+    assert repositorio.estatisticas()["em_memoria"] == 1
+
+
+def test_retencao_de_erros_e_de_processamentos(tmp_path):
+    repositorio = _repositorio(tmp_path)
+    for processamento_id, dias in (("recente", 1), ("sem_erros", 10), ("antigo", 40)):
+        repositorio[processamento_id] = _status(concluido=True, erros=["erro 1", "erro 2"])
+        _envelhecer(repositorio, processamento_id, dias)
+    repositorio["andamento_antigo"] = _status()
+    _envelhecer(repositorio, "andamento_antigo", 40)
+
+    repositorio._ultima_limpeza = None
+    repositorio._limpar_disco()
+
+    outro = _repositorio(tmp_path)
+    assert outro["recente"]["erros"] == ["erro 1", "erro 2"]
+    # Após retencao_erros_dias a lista sai e o resumo fica
+    assert outro["sem_erros"]["erros"] == ["2 erros; os detalhes foram removidos após 7 dias"]
+    assert outro["sem_erros"]["mensagem"] == "Concluído"
+    # Após retencao_dias o processamento concluído sai do histórico; o em andamento fica
+    assert outro.get("antigo") is None
+    assert outro.get("andamento_antigo") is not None
+
+
+def test_cancelar(tmp_path):
+    repositorio = _repositorio(tmp_path)
+    repositorio["p1"] = _status()
+    cancelados = []
+    repositorio.registrar_cancelamento("p1", lambda: cancelados.append("p1"))
+
+    assert repositorio.cancelar("p1") is True
+    assert cancelados == ["p1"]
+    assert repositorio.cancelar("inexistente") is False
+
+    repositorio.concluir("p1")
+    assert repositorio.cancelar("p1") is False
@@ -0,0 +1,73 @@
+import json
+
+from importador_controladoria import progresso
+from importador_controladoria.progresso import campos_alterados, eventos_progresso
+
+
+def _eventos(texto):
+    """Separa os eventos SSE em (tipo, dados), ignorando os heartbeats."""
+    eventos = []
+    for bloco in texto:
+        linhas = dict(linha.split(": ", 1) for linha in bloco.strip().split("\n") if not linha.startswith(":"))
+        if linhas:
+            eventos.append((linhas.get("event", "message"), json.loads(linhas["data"]), linhas.get("retry")))
+    return eventos
+
+
+def test_campos_alterados():
+    anterior = {"progresso": 10, "mensagem": "Lendo", "erros": []}
+    atual = {"progresso": 40, "mensagem": "Lendo", "erros": [], "fila": 0}
+    assert campos_alterados(anterior, atual) == {"progresso": 40, "fila": 0}
+    assert campos_alterados(atual, dict(atual)) == {}
+
+
+def test_status_completo_depois_so_alteracoes_e_fim(monkeypatch):
+    monkeypatch.setattr(progresso, "INTERVALO_CONFERENCIA_SEGUNDOS", 0.01)
+    estados = iter([
+        {"progresso": 10, "mensagem": "Lendo", "concluido": False, "erros": []},
+        {"progresso": 10, "mensagem": "Lendo", "concluido": False, "erros": []},
+        {"progresso": 60, "mensagem": "Lendo", "concluido": False, "erros": []},
+        {"progresso": 100, "mensagem": "Concluído", "concluido": True, "erros": []}
+    ])
+    eventos = _eventos(eventos_progresso(lambda: next(estados), duracao_maxima_segundos=60))
+
+    assert eventos == [
+        ("message", {"progresso": 10, "mensagem": "Lendo", "concluido": False, "erros": []}, None),
+        ("message", {"progresso": 60}, None),
+        ("message", {"progresso": 100, "mensagem": "Concluído", "concluido": True}, None),
+        ("fim", {}, None)
+    ]
+
+
+def test_stream_encerrado_pela_duracao_maxima_pede_reconexao(monkeypatch):
+    monkeypatch.setattr(progresso, "INTERVALO_CONFERENCIA_SEGUNDOS", 0.01)
+    eventos = _eventos(eventos_progresso(lambda: {"progresso": 10, "concluido": False, "erros": []}, duracao_maxima_segundos=0))
+
+    assert eventos == [
+        ("message", {"progresso": 10, "concluido": False, "erros": []}, None),
+        ("reconectar", {}, str(progresso.RECONEXAO_MILISSEGUNDOS))
+    ]
+
+
+def test_sem_vagas_de_stream_responde_503(interface, monkeypatch):
+    interface.processamentos["p1"] = {"arquivo": "orcado.xlsx", "concluido": False, "progresso": 0}
+    cliente = interface.app.test_client()
+
+    monkeypatch.setattr(interface, "reservar_stream", lambda: False)
+    resposta = cliente.get("/progresso/p1/eventos")
+    assert resposta.status_code == 503
+    assert resposta.headers["Retry-After"] == "5"
+    assert resposta.get_json()["polling"] == "/progresso/p1"
+
+
+def test_vaga_liberada_quando_o_stream_fecha(interface, monkeypatch):
+    interface.processamentos["p1"] = {"arquivo": "orcado.xlsx", "concluido": True, "progresso": 100}
+    cliente = interface.app.test_client()
+    reservas = []
+    monkeypatch.setattr(interface, "reservar_stream", lambda: reservas.append(1) or True)
+    monkeypatch.setattr(interface, "liberar_stream", lambda: reservas.pop())
+
+    resposta = cliente.get("/progresso/p1/eventos")
+    assert "event: fim" in resposta.get_data(as_text=True)
+    resposta.close()
+    assert reservas == []
@@ -0,0 +1,40 @@
+from datetime import date, datetime, timezone
+
+from importador_controladoria.replica_local import ReplicaParquet
+
+MARCA = {"total": 1, "ultima_atualizacao": "2025-01-01T00:00:00+00:00"}
+
+
+def _registros(versao, valor):
+    return [{
+        "N_CONTA": "30000001",
+        "N_CENTRO_CUSTO": "100000001",
+        "DESCRICAO": "Conta",
+        "VALOR": valor,
+        "DATA": date(2025, 1, 1),
+        "VERSAO": versao,
+        "OPERACAO": "OPERACIONAL",
+        "DATA_ATUALIZACAO": datetime(2025, 1, 1, tzinfo=timezone.utc),
+        "FILIAL": "0001",
+        "RATEIO": "N",
+        "ORIGEM": "PLANILHA"
+    }]
+
+
+def test_manifesto_compartilhado_entre_instancias(tmp_path):
+    # Cada instância representa um processo do servidor usando o mesmo diretório
+    replica_a = ReplicaParquet(tmp_path)
+    replica_b = ReplicaParquet(tmp_path)
+
+    replica_a.gravar_versao("V1", _registros("V1", 10.0), MARCA)
+    replica_b.gravar_versao("V2", _registros("V2", 20.0), MARCA)
+    assert set(replica_a.manifesto()) == set(replica_b.manifesto()) == {"V1", "V2"}
+
+    replica_a.descartar_marca("V2")
+    assert set(replica_b.manifesto()) == {"V1"}
+
+    replica_b.gravar_versao("V1", _registros("V1", 11.0), MARCA)
+    assert replica_a.ler({"versao": "V1"}).column("VALOR").to_pylist() == [11.0]
+    replica_a.remover_versao("V1")
+    assert replica_b.manifesto() == {}
+    assert replica_b.ler({}).num_rows == 1
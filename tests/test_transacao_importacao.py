@@ -0,0 +1,74 @@
+import re
+from datetime import date
+
+import pandas as pd
+
+from importador_controladoria.transacao_importacao import (
+    montar_script_delta,
+    montar_script_edicao,
+    montar_script_importacao,
+    parametros_delta,
+    parametros_edicao,
+    parametros_importacao,
+)
+
+METADATA = {
+    "DATA_IMPORTACAO": pd.Timestamp("2025-03-02 10:30:00"),
+    "USUARIO": "teste",
+    "SISTEMA_OPERACIONAL": "teste",
+    "VERSAO_SISTEMA": "1.0",
+    "ARQUIVO_ORIGEM": "orcado.xlsx",
+    "TOTAL_REGISTROS": 2,
+    "STATUS": "ATUALIZACAO_DELTA",
+    "DETALHES": "2 linhas"
+}
+
+
+def _referenciados(script):
+    """Parâmetros (@nome) usados pelo script, sem as variáveis de sistema (@@row_count)."""
+    return set(re.findall(r"(?<!@)@([a-z_]+)", script))
+
+
+def _parametros(parametros):
+    return {parametro.name: parametro for parametro in parametros}
+
+
+def _lote():
+    return pd.DataFrame({
+        "VERSAO": ["2025-V02", "2025-V01", "2025-V02"],
+        "DATA": [date(2025, 3, 1), date(2025, 1, 1), date(2025, 12, 1)]
+    })
+
+
+def test_parametros_da_importacao():
+    script = montar_script_importacao("p.d.ORCADO", "p.d.STAGING", "p.d.ORCADO_METADATA")
+    parametros = _parametros(parametros_importacao(_lote(), "2025-V02", "orcado.xlsx", "teste", "linux", "1.0"))
+
+    assert _referenciados(script) == set(parametros)
+    assert parametros["versoes"].values == ["2025-V01", "2025-V02"]
+    assert (parametros["data_min"].value, parametros["data_max"].value) == (date(2025, 1, 1), date(2025, 12, 1))
+    assert parametros["total_registros"].value == 3
+    assert "`p.d.STAGING`" in script and "`p.d.ORCADO_METADATA`" in script
+
+
+def test_parametros_da_edicao():
+    script = montar_script_edicao("p.d.ORCADO", "p.d.STAGING", "p.d.ORCADO_METADATA")
+    parametros = _parametros(parametros_edicao(_lote(), METADATA))
+
+    assert _referenciados(script) == set(parametros)
+    assert parametros["versoes"].values == ["2025-V01", "2025-V02"]
+    assert (parametros["data_min"].value, parametros["data_max"].value) == (date(2025, 1, 1), date(2025, 12, 1))
+    assert parametros["usuario"].value == "teste"
+
+
+def test_parametros_do_delta_acompanham_as_partes_do_script():
+    vazio = _lote().iloc[0:0]
+    casos = [
+        ("p.d.STAGING", "p.d.EXCLUSOES", _lote(), _lote()),
+        ("p.d.STAGING", None, _lote(), vazio),
+        (None, "p.d.EXCLUSOES", vazio, _lote())
+    ]
+    for staging, exclusoes, df_envio, df_exclusoes in casos:
+        script = montar_script_delta("p.d.ORCADO", staging, exclusoes, "p.d.ORCADO_METADATA")
+        parametros = _parametros(parametros_delta({"2025-V01", "2025-V02"}, df_envio, df_exclusoes, METADATA))
+        assert _referenciados(script) == set(parametros)
@@ -0,0 +1,31 @@
+import io
+import os
+
+from importador_controladoria.agendador import Agendador
+
+
+def _enviar(cliente, conteudo):
+    return cliente.post("/upload", data={"arquivo": (io.BytesIO(conteudo), "orcado.xlsx")})
+
+
+def test_envios_com_o_mesmo_nome_nao_se_sobrescrevem(interface, monkeypatch):
+    # Sem workers: os envios ficam aguardando na fila
+    fila = Agendador("teste", workers=0, tamanho_fila=5, limites_etapas={"cpu": 1, "rede": 1})
+    monkeypatch.setattr(interface, "agendador_importacoes", fila)
+    cliente = interface.app.test_client()
+
+    assert _enviar(cliente, b"primeiro").status_code == 302
+    assert _enviar(cliente, b"segundo").status_code == 302
+
+    processamentos = [funcao.__self__ for _, funcao, _ in fila._fila]
+    caminhos = [processamento.arquivo_path for processamento in processamentos]
+    assert caminhos[0] != caminhos[1]
+    assert [os.path.basename(caminho) for caminho in caminhos] == ["orcado.xlsx", "orcado.xlsx"]
+    with open(caminhos[0], "rb") as f:
+        assert f.read() == b"primeiro"
+
+    # Cancelado na fila, o arquivo e o diretório do envio são apagados
+    processamentos[0].cancelar()
+    assert not os.path.exists(os.path.dirname(caminhos[0]))
+    with open(caminhos[1], "rb") as f:
+        assert f.read() == b"segundo"